@@ -11,6 +11,7 @@ import {
 } from "@/components/ui/popover";
 import { Bell, CheckCheck, Info, AlertTriangle, CheckCircle2, XCircle, Loader2 } from "lucide-react";
 import { useAuth } from "@/hooks/use-auth";
+import { useEventsRefetchInterval } from "@/hooks/use-tenant-events";
 import { useLocation } from "wouter";
 
 interface Notification {
@@ -60,11 +61,12 @@ const typeColors: Record<string, string> = {
 export function NotificationCenter({ organizationId, onNavigate }: { organizationId: string; onNavigate?: (section: string) => void }) {
   const [open, setOpen] = useState(false);
   const [, navigate] = useLocation();
+  const refetchInterval = useEventsRefetchInterval(60000);
 
   const { data, isLoading } = useQuery<NotificationsResponse>({
     queryKey: ["/api/organizations", organizationId, "notifications"],
     enabled: !!organizationId,
-    refetchInterval: 60000,
+    refetchInterval,
   });
 
   const markReadMutation = useMutation({
@@ -1,5 +1,5 @@
 import { useEffect, useState } from "react";
-import { useQuery } from "@tanstack/react-query";
+import { useQuery, useQueryClient } from "@tanstack/react-query";
 import { Card, CardContent } from "@/components/ui/card";
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
 import { apiRequest } from "@/lib/queryClient";
@@ -97,25 +97,44 @@ export function QueueDisplayBoard({ organizationId, organizationName, branchId:
     timestamp: string;
   }
 
+  const queryClient = useQueryClient();
+  const displayKey = ["/api/organizations", organizationId, "queue-display", branchId];
+  const [streaming, setStreaming] = useState(false);
+
+  // The server pushes the board on every change; polling is only the fallback while the stream is down
+  useEffect(() => {
+    if (!branchId || typeof EventSource === "undefined") return;
+    const source = new EventSource(`/api/organizations/${organizationId}/queue-display/stream?branch_id=${branchId}`);
+    source.addEventListener("queue", (event) => {
+      queryClient.setQueryData(displayKey, JSON.parse((event as MessageEvent).data));
+      setStreaming(true);
+    });
+    source.onerror = () => setStreaming(false);
+    return () => {
+      source.close();
+      setStreaming(false);
+    };
+  }, [organizationId, branchId]);
+
   const { data: displayData } = useQuery<DisplayData>({
-    queryKey: ["/api/organizations", organizationId, "queue-display", branchId],
+    queryKey: displayKey,
     queryFn: async () => {
       const response = await apiRequest("GET", `/api/organizations/${organizationId}/queue-display?branch_id=${branchId}`);
       return await response.json();
     },
-    refetchInterval: 3000,
+    refetchInterval: streaming ? false : 3000,
     enabled: !!branchId,
   });
 
-  // Compute waiting counts from waiting array
+  // Waiting counts cover the whole queue; the waiting array only its head
   const waitingCounts: Record<string, number> = {};
-  if (displayData?.waiting) {
+  if (displayData?.waiting_counts) {
+    Object.assign(waitingCounts, displayData.waiting_counts);
+  } else if (displayData?.waiting) {
     displayData.waiting.forEach(ticket => {
       const category = ticket.service_category;
       waitingCounts[category] = (waitingCounts[category] || 0) + 1;
     });
-  } else if (displayData?.waiting_counts) {
-    Object.assign(waitingCounts, displayData.waiting_counts);
   }
 
   useEffect(() => {
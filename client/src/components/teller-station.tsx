@@ -40,6 +40,7 @@ import { useResourcePermissions, RESOURCES } from "@/hooks/use-resource-permissi
 import { usePermissions } from "@/hooks/use-permissions";
 import { useFeatures } from "@/hooks/use-features";
 import { useCurrency } from "@/hooks/use-currency";
+import { useEventsRefetchInterval } from "@/hooks/use-tenant-events";
 import { 
   ArrowDownLeft, 
   ArrowUpRight, 
@@ -333,6 +334,7 @@ export default function TellerStation({ organizationId }: TellerStationProps) {
   });
 
   // Queue management - fetch tickets for teller's branch
+  const queueRefetchInterval = useEventsRefetchInterval(10000);
   const { data: queueTickets = [], refetch: refetchQueue } = useQuery<QueueTicket[]>({
     queryKey: ["/api/organizations", organizationId, "queue-tickets", myStaffInfo?.branch_id],
     queryFn: async () => {
@@ -345,7 +347,7 @@ export default function TellerStation({ organizationId }: TellerStationProps) {
       return res.json();
     },
     enabled: !!myStaffInfo?.branch_id,
-    refetchInterval: 10000, // Auto-refresh every 10 seconds
+    refetchInterval: queueRefetchInterval, // Every 10 seconds, or rarely while queue events stream in
   });
 
   const currentlyServing = queueTickets.find(t => t.status === "serving" && t.teller_id === myStaffInfo?.id);
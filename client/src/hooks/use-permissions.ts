@@ -1,4 +1,5 @@
 import { useQuery, useQueryClient } from "@tanstack/react-query";
+import { useEventsRefetchInterval } from "./use-tenant-events";
 
 interface PermissionsData {
   role: string | null;
@@ -10,6 +11,7 @@ interface PermissionsData {
 export function usePermissions(organizationId: string | null, options?: { deferToSession?: boolean }) {
   const queryClient = useQueryClient();
   const deferToSession = options?.deferToSession ?? false;
+  const refetchInterval = useEventsRefetchInterval(60000);
 
   const hasSessionData = deferToSession
     ? !!queryClient.getQueryData(["/api/auth/permissions", organizationId])
@@ -24,7 +26,7 @@ export function usePermissions(organizationId: string | null, options?: { deferT
       return res.json();
     },
     enabled: !!organizationId && (!deferToSession || hasSessionData),
-    refetchInterval: deferToSession ? undefined : 60000,
+    refetchInterval: deferToSession ? undefined : refetchInterval,
     refetchIntervalInBackground: deferToSession ? false : true,
     staleTime: deferToSession ? 1000 * 60 * 5 : 0,
     gcTime: deferToSession ? 1000 * 60 * 10 : undefined,
@@ -1,5 +1,6 @@
 import { useQuery, useQueryClient } from "@tanstack/react-query";
 import type { FeatureAccess } from "./use-features";
+import { useEventsRefetchInterval } from "./use-tenant-events";
 
 interface PermissionsData {
   role: string | null;
@@ -16,6 +17,7 @@ interface SessionBundle {
 
 export function useSession(organizationId: string | undefined) {
   const queryClient = useQueryClient();
+  const refetchInterval = useEventsRefetchInterval(60000);
 
   const { data, isLoading } = useQuery<SessionBundle>({
     queryKey: ["/api/auth/session", organizationId],
@@ -42,7 +44,7 @@ export function useSession(organizationId: string | undefined) {
     staleTime: 1000 * 60 * 1,
     retry: 3,
     retryDelay: (attemptIndex) => Math.min(1000 * 2 ** attemptIndex, 10000),
-    refetchInterval: 60000,
+    refetchInterval,
     refetchIntervalInBackground: true,
   });
 
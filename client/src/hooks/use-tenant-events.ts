@@ -0,0 +1,93 @@
+import { useEffect, useSyncExternalStore } from "react";
+import { useQueryClient } from "@tanstack/react-query";
+
+// While the event stream is open, polling only has to catch what a dropped connection missed
+export const EVENTS_FALLBACK_INTERVAL = 5 * 60 * 1000;
+
+const FLUSH_DELAY = 1000;
+
+let connected = false;
+const listeners = new Set<() => void>();
+
+function setConnected(value: boolean) {
+  if (connected === value) return;
+  connected = value;
+  listeners.forEach((listener) => listener());
+}
+
+function subscribe(listener: () => void) {
+  listeners.add(listener);
+  return () => listeners.delete(listener);
+}
+
+export function useTenantEventsConnected() {
+  return useSyncExternalStore(subscribe, () => connected);
+}
+
+/** Polling interval for data kept fresh by the event stream */
+export function useEventsRefetchInterval(interval: number) {
+  return useTenantEventsConnected() ? EVENTS_FALLBACK_INTERVAL : interval;
+}
+
+function keysFor(organizationId: string, type: string, data: any): unknown[][] {
+  const org = ["/api/organizations", organizationId];
+  switch (type) {
+    case "queue":
+      return data.branch_id
+        ? [[...org, "queue-tickets", data.branch_id], [...org, "queue-display", data.branch_id]]
+        : [[...org, "queue-tickets"], [...org, "queue-display"]];
+    case "notification":
+      return [[...org, "notifications"]];
+    case "role":
+      return [["/api/auth/permissions", organizationId], ["/api/auth/session", organizationId]];
+    case "transaction":
+      return [[...org, "transactions"]];
+    case "float":
+      return [[...org, "floats"]];
+    default:
+      return [];
+  }
+}
+
+/** Listen to the organization's change events and refresh the affected queries; mount once per page */
+export function useTenantEvents(organizationId: string | null | undefined) {
+  const queryClient = useQueryClient();
+
+  useEffect(() => {
+    if (!organizationId || typeof EventSource === "undefined") return;
+
+    const source = new EventSource(`/api/organizations/${organizationId}/events`, { withCredentials: true });
+    // Busy branches produce bursts of events; refresh each query once per burst
+    const pending = new Map<string, unknown[]>();
+    let timer: ReturnType<typeof setTimeout> | null = null;
+
+    const flush = () => {
+      timer = null;
+      pending.forEach((queryKey) => queryClient.invalidateQueries({ queryKey }));
+      pending.clear();
+    };
+
+    const handler = (event: MessageEvent) => {
+      let data: any = {};
+      try {
+        data = JSON.parse(event.data);
+      } catch {
+        // refresh anyway
+      }
+      keysFor(organizationId, event.type, data).forEach((key) => pending.set(JSON.stringify(key), key));
+      if (!timer) timer = setTimeout(flush, FLUSH_DELAY);
+    };
+
+    const types = ["queue", "notification", "role", "transaction", "float"];
+    types.forEach((type) => source.addEventListener(type, handler));
+    source.onopen = () => setConnected(true);
+    source.onerror = () => setConnected(false);
+
+    return () => {
+      types.forEach((type) => source.removeEventListener(type, handler));
+      source.close();
+      if (timer) clearTimeout(timer);
+      setConnected(false);
+    };
+  }, [organizationId, queryClient]);
+}
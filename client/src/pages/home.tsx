@@ -7,6 +7,7 @@ import { useAuth } from "@/hooks/use-auth";
 import { usePermissions } from "@/hooks/use-permissions";
 import { useFeatures } from "@/hooks/use-features";
 import { useSession } from "@/hooks/use-session";
+import { useTenantEvents } from "@/hooks/use-tenant-events";
 import { useBranding } from "@/context/BrandingContext";
 import { CURRENCIES } from "@/lib/currency";
 import { Button } from "@/components/ui/button";
@@ -404,6 +405,7 @@ export default function Home() {
   }, [activeSection, selectedOrg, queryClient]);
 
   const { isLoading: sessionLoading } = useSession(selectedOrg?.id);
+  useTenantEvents(selectedOrg?.id);
 
   interface AttendanceStatus {
     clocked_in: boolean;
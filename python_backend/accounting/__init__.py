@@ -13,6 +13,7 @@ from .models import (
     JournalEntry,
     JournalLine,
     FiscalPeriod,
+    AccountBalanceDelta,
     AccountType,
     ACCOUNT_TYPES
 )
@@ -24,6 +25,7 @@ __all__ = [
     "JournalEntry",
     "JournalLine",
     "FiscalPeriod",
+    "AccountBalanceDelta",
     "AccountType",
     "ACCOUNT_TYPES",
     "AccountingService",
@@ -0,0 +1,227 @@
+"""
+Account balances in delta mode.
+
+In the default (direct) balance mode every posting updates
+chart_of_accounts.current_balance in place, so all postings that touch the
+cash, M-Pesa clearing or member savings control accounts queue on those
+few rows until each other's transactions commit.
+
+A tenant that sets gl_balance_mode = "delta" in organization_settings
+posts balance changes as rows in gl_balance_deltas instead (see
+AccountingService._write). Inserts never wait on each other. The
+compactor folds the deltas into current_balance every few seconds:
+
+- One DELETE ... RETURNING takes a batch of deltas, so a delta is either
+  folded by this pass or left for the next one, never both or neither.
+- The sums are applied with one UPDATE per account, in account id order.
+- On Postgres a transaction-level advisory lock lets only one compactor
+  work on a tenant at a time; the others skip it.
+
+The settings routes mirror the mode onto organizations.gl_balance_mode
+(record_balance_mode) so the background compactor only visits delta-mode
+tenants, plus tenants switched back to direct within DRAIN_AFTER_DIRECT.
+Its first sweep in a process visits every tenant and fills the mirror in.
+A session-level advisory lock on the master database keeps the sweep to
+one app process at a time.
+
+Readers use get_account_balances(), which adds the pending deltas to the
+compacted balance in the same SELECT, so balances are exact whatever the
+compactor's lag. Switching a tenant back to direct mode is safe: leftover
+deltas are still folded in and still counted by readers.
+"""
+
+import os
+import threading
+import traceback
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, func, or_, select, text
+
+from .models import AccountBalanceDelta, ChartOfAccounts
+
+COMPACT_BATCH = 5000
+DEFAULT_COMPACT_SECONDS = 5.0
+_ADVISORY_LOCK_KEY = 0x474C4231  # "GLB1"
+_SWEEP_LOCK_KEY = 0x474C4232  # "GLB2"
+# Longer than the chart cache, through which processes may keep writing deltas after a switch
+DRAIN_AFTER_DIRECT = timedelta(minutes=15)
+
+
+def get_account_balances(session, account_ids: Optional[Iterable[str]] = None) -> Dict[str, Decimal]:
+    """Current balance per account: compacted balance plus pending deltas, read in one statement"""
+    pending = select(func.coalesce(func.sum(AccountBalanceDelta.delta), 0)).where(
+        AccountBalanceDelta.account_id == ChartOfAccounts.id
+    ).correlate(ChartOfAccounts).scalar_subquery()
+    query = session.query(ChartOfAccounts.id, func.coalesce(ChartOfAccounts.current_balance, 0) + pending)
+    if account_ids is not None:
+        query = query.filter(ChartOfAccounts.id.in_(list(account_ids)))
+    return {account_id: Decimal(balance or 0) for account_id, balance in query.all()}
+
+
+def read_balance_mode(session) -> str:
+    from models.tenant import OrganizationSettings
+
+    mode = session.query(OrganizationSettings.setting_value).filter(
+        OrganizationSettings.setting_key == "gl_balance_mode"
+    ).scalar()
+    return "delta" if mode == "delta" else "direct"
+
+
+def record_balance_mode(db, org_id: str, mode: str) -> None:
+    """Mirror a tenant's gl_balance_mode onto its master organization row; the caller commits"""
+    from models.master import Organization
+
+    mode = "delta" if mode == "delta" else "direct"
+    org = db.query(Organization).filter(Organization.id == org_id).first()
+    if org is not None and org.gl_balance_mode != mode:
+        org.gl_balance_mode = mode
+        org.gl_balance_mode_changed_at = datetime.utcnow()
+
+
+def compact_balances(session, limit: int = COMPACT_BATCH) -> int:
+    """Fold up to limit pending deltas into current_balance and commit; returns how many"""
+    if session.get_bind().dialect.name == "postgresql":
+        locked = session.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": _ADVISORY_LOCK_KEY}).scalar()
+        if not locked:
+            session.rollback()
+            return 0
+
+    deltas = AccountBalanceDelta.__table__
+    batch = select(deltas.c.id).order_by(deltas.c.id).limit(limit).scalar_subquery()
+    rows = session.execute(
+        deltas.delete().where(deltas.c.id.in_(batch)).returning(deltas.c.account_id, deltas.c.delta)
+    ).all()
+    if not rows:
+        session.rollback()
+        return 0
+
+    totals: Dict[str, Decimal] = {}
+    for account_id, delta in rows:
+        totals[account_id] = totals.get(account_id, Decimal("0")) + delta
+    accounts = ChartOfAccounts.__table__
+    updates = [{"account": account_id, "delta": delta} for account_id, delta in sorted(totals.items()) if delta != 0]
+    if updates:
+        session.execute(
+            accounts.update().where(accounts.c.id == bindparam("account")).values(
+                current_balance=func.coalesce(accounts.c.current_balance, 0) + bindparam("delta")
+            ),
+            updates,
+        )
+    session.commit()
+    return len(rows)
+
+
+def compact_tenant(connection_string: str, with_mode: bool = False):
+    """Compact one tenant database until no deltas are left; returns how many were folded
+
+    With with_mode, returns (folded, the tenant's gl_balance_mode) instead.
+    """
+    from services.tenant_context import TenantContext
+
+    tenant_ctx = TenantContext(connection_string)
+    session = tenant_ctx.create_session()
+    total = 0
+    try:
+        while True:
+            folded = compact_balances(session)
+            total += folded
+            if folded < COMPACT_BATCH:
+                break
+        if not with_mode:
+            return total
+        mode = read_balance_mode(session)
+        session.rollback()
+        return total, mode
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+        tenant_ctx.close()
+
+
+class BalanceCompactor:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._full_sweep_done = False
+
+    def targets(self, db, full: bool = False) -> List[Tuple[str, str]]:
+        """(organization id, connection string) of the tenants a sweep visits"""
+        from models.master import Organization
+
+        query = db.query(Organization.id, Organization.connection_string).filter(
+            Organization.connection_string.isnot(None)
+        )
+        if not full:
+            query = query.filter(or_(
+                Organization.gl_balance_mode == "delta",
+                Organization.gl_balance_mode_changed_at >= datetime.utcnow() - DRAIN_AFTER_DIRECT,
+            ))
+        return [(row.id, row.connection_string) for row in query.all()]
+
+    def sweep(self) -> int:
+        """Compact the tenants' deltas unless another process is already sweeping; returns how many were folded"""
+        from models.database import SessionLocal, engine
+
+        with engine.connect() as lock_conn:
+            if engine.dialect.name == "postgresql" and not lock_conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": _SWEEP_LOCK_KEY}
+            ).scalar():
+                return 0
+            try:
+                full = not self._full_sweep_done
+                db = SessionLocal()
+                try:
+                    total = 0
+                    for org_id, connection_string in self.targets(db, full):
+                        if self._stop.is_set():
+                            break
+                        try:
+                            if not full:
+                                total += compact_tenant(connection_string)
+                                continue
+                            folded, mode = compact_tenant(connection_string, with_mode=True)
+                            total += folded
+                            record_balance_mode(db, org_id, mode)
+                            db.commit()
+                        except Exception as e:
+                            db.rollback()
+                            print(f"[GL Compactor] Tenant compaction error: {e}")
+                            traceback.print_exc()
+                    self._full_sweep_done = self._full_sweep_done or (full and not self._stop.is_set())
+                    return total
+                finally:
+                    db.close()
+            finally:
+                if engine.dialect.name == "postgresql":
+                    lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _SWEEP_LOCK_KEY})
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"[GL Compactor] Sweep error: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="gl-balance-compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval * 2)
+
+
+def start_balance_compactor() -> Optional[BalanceCompactor]:
+    """Start the compactor thread (every GL_COMPACT_SECONDS, default 5; 0 disables it in this process)"""
+    interval = float(os.environ.get("GL_COMPACT_SECONDS", str(DEFAULT_COMPACT_SECONDS)))
+    if interval <= 0:
+        return None
+    compactor = BalanceCompactor(interval)
+    compactor.start()
+    return compactor
@@ -107,6 +107,19 @@ class JournalLine(TenantBase):
         Index("idx_jl_entry", "journal_entry_id"),
     )
 
+class AccountBalanceDelta(TenantBase):
+    """Balance Delta - Pending change to an account's current_balance (delta balance mode)"""
+    __tablename__ = "gl_balance_deltas"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    account_id = Column(String, ForeignKey("chart_of_accounts.id"), nullable=False)
+    delta = Column(Numeric(15, 2), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("idx_gl_delta_account", "account_id"),
+    )
+
 class FiscalPeriod(TenantBase):
     """Fiscal Period - Accounting periods for reporting"""
     __tablename__ = "fiscal_periods"
@@ -24,6 +24,7 @@ from .schemas import (
     AccountBalanceResponse
 )
 from .service import AccountingService
+from .balances import get_account_balances
 
 router = APIRouter()
 
@@ -41,7 +42,7 @@ def require_permission(membership, permission: str, db: Session):
         raise HTTPException(status_code=403, detail=f"Permission denied: {permission}")
 
 @router.get("/{org_id}/accounting/accounts", response_model=List[AccountResponse])
-async def list_accounts(
+def list_accounts(
     org_id: str,
     account_type: Optional[str] = None,
     include_inactive: bool = False,
@@ -66,13 +67,17 @@ async def list_accounts(
             query = query.filter(ChartOfAccounts.is_active == True)
         
         accounts = query.order_by(ChartOfAccounts.code).all()
-        return [AccountResponse.model_validate(a) for a in accounts]
+        balances = get_account_balances(tenant_session)
+        return [
+            AccountResponse.model_validate(a).model_copy(update={"current_balance": balances.get(a.id, Decimal("0"))})
+            for a in accounts
+        ]
     finally:
         tenant_session.close()
         tenant_ctx.close()
 
 @router.post("/{org_id}/accounting/accounts", response_model=AccountResponse)
-async def create_account(
+def create_account(
     org_id: str,
     data: AccountCreate,
     user=Depends(get_current_user),
@@ -113,7 +118,7 @@ async def create_account(
         tenant_ctx.close()
 
 @router.put("/{org_id}/accounting/accounts/{account_id}", response_model=AccountResponse)
-async def update_account(
+def update_account(
     org_id: str,
     account_id: str,
     data: AccountUpdate,
@@ -146,13 +151,14 @@ async def update_account(
             account.is_active = data.is_active
         
         tenant_session.commit()
-        return AccountResponse.model_validate(account)
+        balance = get_account_balances(tenant_session, [account.id]).get(account.id, Decimal("0"))
+        return AccountResponse.model_validate(account).model_copy(update={"current_balance": balance})
     finally:
         tenant_session.close()
         tenant_ctx.close()
 
 @router.get("/{org_id}/accounting/accounts/{account_id}/ledger")
-async def get_account_ledger(
+def get_account_ledger(
     org_id: str,
     account_id: str,
     start_date: Optional[date] = None,
@@ -175,7 +181,7 @@ async def get_account_ledger(
         tenant_ctx.close()
 
 @router.get("/{org_id}/accounting/journal-entries", response_model=List[JournalEntryResponse])
-async def list_journal_entries(
+def list_journal_entries(
     org_id: str,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
@@ -219,7 +225,7 @@ async def list_journal_entries(
         tenant_ctx.close()
 
 @router.post("/{org_id}/accounting/journal-entries", response_model=JournalEntryResponse)
-async def create_journal_entry(
+def create_journal_entry(
     org_id: str,
     data: JournalEntryCreate,
     user=Depends(get_current_user),
@@ -265,7 +271,7 @@ async def create_journal_entry(
         tenant_ctx.close()
 
 @router.post("/{org_id}/accounting/journal-entries/{entry_id}/reverse", response_model=JournalEntryResponse)
-async def reverse_journal_entry(
+def reverse_journal_entry(
     org_id: str,
     entry_id: str,
     user=Depends(get_current_user),
@@ -291,7 +297,7 @@ async def reverse_journal_entry(
         tenant_ctx.close()
 
 @router.get("/{org_id}/accounting/reports/trial-balance")
-async def get_trial_balance(
+def get_trial_balance(
     org_id: str,
     as_of_date: date = Query(default=None),
     user=Depends(get_current_user),
@@ -313,7 +319,7 @@ async def get_trial_balance(
         tenant_ctx.close()
 
 @router.get("/{org_id}/accounting/reports/income-statement")
-async def get_income_statement(
+def get_income_statement(
     org_id: str,
     start_date: date,
     end_date: date,
@@ -335,7 +341,7 @@ async def get_income_statement(
         tenant_ctx.close()
 
 @router.get("/{org_id}/accounting/reports/balance-sheet")
-async def get_balance_sheet(
+def get_balance_sheet(
     org_id: str,
     as_of_date: date = Query(default=None),
     user=Depends(get_current_user),
@@ -357,7 +363,7 @@ async def get_balance_sheet(
         tenant_ctx.close()
 
 @router.post("/{org_id}/accounting/seed-accounts")
-async def seed_default_accounts(
+def seed_default_accounts(
     org_id: str,
     user=Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -388,7 +394,7 @@ class OpeningBalanceRequest(BaseModel):
 
 
 @router.get("/{org_id}/accounting/opening-balances/preview")
-async def preview_opening_balances(
+def preview_opening_balances(
     org_id: str,
     user=Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -420,7 +426,7 @@ async def preview_opening_balances(
 
 
 @router.post("/{org_id}/accounting/opening-balances/post")
-async def post_opening_balances(
+def post_opening_balances(
     org_id: str,
     data: OpeningBalanceRequest,
     user=Depends(get_current_user),
@@ -2,13 +2,18 @@
 Accounting Service - Core business logic for double-entry bookkeeping
 """
 
+import threading
+import time
 from datetime import date, datetime
 from decimal import Decimal
 from typing import List, Optional, Dict, Any
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
+from sqlalchemy import bindparam, event, func, and_, or_
 
-from .models import ChartOfAccounts, JournalEntry, JournalLine, FiscalPeriod, AccountType, ACCOUNT_TYPES
+from .models import (
+    ChartOfAccounts, JournalEntry, JournalLine, FiscalPeriod, AccountBalanceDelta, AccountType, ACCOUNT_TYPES, generate_uuid
+)
+from models.tenant import OrganizationSettings
 from services.code_generator import generate_journal_code
 
 DEFAULT_ACCOUNTS = [
@@ -64,31 +69,103 @@ DEFAULT_ACCOUNTS = [
     {"code": "5050", "name": "Cash Shortage Expense", "type": "expense", "is_system": True},
 ]
 
+_CHART_TTL = 300
+BALANCE_MODE_SETTING = "gl_balance_mode"
+_chart_cache: Dict[str, "ChartSnapshot"] = {}
+_chart_lock = threading.Lock()
+
+
+class ChartSnapshot:
+    """Code -> (account id, normal balance) for one tenant's chart of accounts, plus its balance mode"""
+
+    def __init__(self, rows, balance_mode: Optional[str] = None):
+        self.by_code = {code: (account_id, normal_balance or "debit") for account_id, code, normal_balance in rows}
+        self.normal_balance = {account_id: nb for account_id, nb in self.by_code.values()}
+        self.balance_mode = "delta" if balance_mode == "delta" else "direct"
+        self.loaded_at = time.monotonic()
+
+
+def _chart_key(bind) -> str:
+    engine = getattr(bind, "engine", bind)
+    key = engine.url.render_as_string(hide_password=True)
+    if engine.url.database in (None, "", ":memory:"):
+        # Every in-memory engine is a separate database
+        key += f"#{id(engine)}"
+    return key
+
+
+def get_chart(session: Session, refresh: bool = False) -> ChartSnapshot:
+    """Cached chart of accounts for the session's tenant (reloaded after _CHART_TTL or on change)"""
+    key = _chart_key(session.get_bind())
+    chart = _chart_cache.get(key)
+    if refresh or chart is None or time.monotonic() - chart.loaded_at > _CHART_TTL:
+        rows = session.query(ChartOfAccounts.id, ChartOfAccounts.code, ChartOfAccounts.normal_balance).all()
+        balance_mode = session.query(OrganizationSettings.setting_value).filter(
+            OrganizationSettings.setting_key == BALANCE_MODE_SETTING
+        ).scalar()
+        chart = ChartSnapshot(rows, balance_mode)
+        with _chart_lock:
+            _chart_cache[key] = chart
+    return chart
+
+
+def invalidate_chart_cache(bind=None):
+    with _chart_lock:
+        if bind is None:
+            _chart_cache.clear()
+        else:
+            _chart_cache.pop(_chart_key(bind), None)
+
+
+@event.listens_for(ChartOfAccounts, "after_insert")
+@event.listens_for(ChartOfAccounts, "after_update")
+@event.listens_for(ChartOfAccounts, "after_delete")
+def _chart_changed(mapper, connection, target):
+    invalidate_chart_cache(connection)
+
+
+@event.listens_for(OrganizationSettings, "after_insert")
+@event.listens_for(OrganizationSettings, "after_update")
+@event.listens_for(OrganizationSettings, "after_delete")
+def _balance_mode_changed(mapper, connection, target):
+    if target.setting_key == BALANCE_MODE_SETTING:
+        invalidate_chart_cache(connection)
+
+
 class AccountingService:
-    """Core accounting service for double-entry bookkeeping"""
+    """Core accounting service for double-entry bookkeeping.
+
+    By default create_journal_entry writes and commits each entry. With
+    deferred=True entries are validated when created but only written by
+    flush() (or post_batch), in one batch and without committing, so the
+    caller keeps control of the transaction.
+    """
     
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, deferred: bool = False):
         self.session = session
+        self.deferred = deferred
+        self._pending: List[Dict[str, Any]] = []
     
     def seed_default_accounts(self) -> int:
         """Create default chart of accounts if not exists"""
+        chart = get_chart(self.session)
+        missing = [acc for acc in DEFAULT_ACCOUNTS if acc["code"] not in chart.by_code]
+        if missing:
+            chart = get_chart(self.session, refresh=True)
+            missing = [acc for acc in DEFAULT_ACCOUNTS if acc["code"] not in chart.by_code]
         created = 0
-        for acc in DEFAULT_ACCOUNTS:
-            existing = self.session.query(ChartOfAccounts).filter(
-                ChartOfAccounts.code == acc["code"]
-            ).first()
-            if not existing:
-                normal_balance = ACCOUNT_TYPES[AccountType(acc["type"])]["normal_balance"]
-                account = ChartOfAccounts(
-                    code=acc["code"],
-                    name=acc["name"],
-                    account_type=acc["type"],
-                    normal_balance=normal_balance,
-                    is_system=acc.get("is_system", False),
-                    is_active=True
-                )
-                self.session.add(account)
-                created += 1
+        for acc in missing:
+            normal_balance = ACCOUNT_TYPES[AccountType(acc["type"])]["normal_balance"]
+            account = ChartOfAccounts(
+                code=acc["code"],
+                name=acc["name"],
+                account_type=acc["type"],
+                normal_balance=normal_balance,
+                is_system=acc.get("is_system", False),
+                is_active=True
+            )
+            self.session.add(account)
+            created += 1
         if created > 0:
             self.session.commit()
         return created
@@ -102,9 +179,17 @@ class AccountingService:
     def get_next_entry_number(self) -> str:
         """Generate next journal entry number"""
         return generate_journal_code()
-    
-    def create_journal_entry(
+
+    def _resolve_account(self, chart: ChartSnapshot, line: Dict[str, Any]):
+        if "account_code" in line:
+            return chart.by_code.get(line["account_code"])
+        if "account_id" in line and line["account_id"] in chart.normal_balance:
+            return line["account_id"], chart.normal_balance[line["account_id"]]
+        return None
+
+    def _prepare_entry(
         self,
+        chart: ChartSnapshot,
         entry_date: date,
         description: str,
         lines: List[Dict[str, Any]],
@@ -112,38 +197,20 @@ class AccountingService:
         source_type: Optional[str] = None,
         source_id: Optional[str] = None,
         created_by_id: Optional[str] = None
-    ) -> JournalEntry:
-        """
-        Create a balanced journal entry with debit/credit lines.
-        
-        Args:
-            entry_date: Date of the entry
-            description: Description of the transaction
-            lines: List of dicts with keys: account_code or account_id, debit, credit, memo
-            reference: External reference number
-            source_type: Type of source (transaction, loan, repayment, fixed_deposit, etc.)
-            source_id: ID of the source record
-            created_by_id: Staff ID who created the entry
-        
-        Returns:
-            Created JournalEntry object
-        
-        Raises:
-            ValueError if entry is not balanced
-        """
+    ) -> Dict[str, Any]:
+        """Validate one entry and build its journal_entries/journal_lines rows"""
         total_debit = Decimal("0")
         total_credit = Decimal("0")
+        entry_id = generate_uuid()
+        now = datetime.utcnow()
         
-        resolved_lines = []
+        line_rows = []
         for line in lines:
-            account = None
-            if "account_code" in line:
-                account = self.get_account_by_code(line["account_code"])
-            elif "account_id" in line:
-                account = self.session.query(ChartOfAccounts).filter(
-                    ChartOfAccounts.id == line["account_id"]
-                ).first()
-            
+            account = self._resolve_account(chart, line)
+            if not account:
+                # Accounts created by another process since the chart was cached
+                chart = get_chart(self.session, refresh=True)
+                account = self._resolve_account(chart, line)
             if not account:
                 raise ValueError(f"Account not found: {line.get('account_code') or line.get('account_id')}")
             
@@ -156,13 +223,17 @@ class AccountingService:
             total_debit += debit
             total_credit += credit
             
-            resolved_lines.append({
-                "account": account,
+            line_rows.append({
+                "id": generate_uuid(),
+                "journal_entry_id": entry_id,
+                "account_id": account[0],
                 "debit": debit,
                 "credit": credit,
                 "memo": line.get("memo"),
                 "member_id": line.get("member_id"),
-                "loan_id": line.get("loan_id")
+                "loan_id": line.get("loan_id"),
+                "created_at": now,
+                "_normal_balance": account[1],
             })
         
         if total_debit != total_credit:
@@ -171,44 +242,126 @@ class AccountingService:
         if total_debit == 0:
             raise ValueError("Journal entry cannot have zero amounts")
         
-        entry = JournalEntry(
-            entry_number=self.get_next_entry_number(),
-            entry_date=entry_date,
-            description=description,
-            reference=reference,
-            source_type=source_type,
-            source_id=source_id,
-            total_debit=total_debit,
-            total_credit=total_credit,
-            created_by_id=created_by_id,
-            status="posted"
-        )
-        self.session.add(entry)
+        entry = {
+            "id": entry_id,
+            "entry_number": self.get_next_entry_number(),
+            "entry_date": entry_date,
+            "description": description,
+            "reference": reference,
+            "source_type": source_type,
+            "source_id": source_id,
+            "is_reversed": False,
+            "status": "posted",
+            "total_debit": total_debit,
+            "total_credit": total_credit,
+            "created_by_id": created_by_id,
+            "created_at": now,
+            "updated_at": now,
+        }
+        return {"entry": entry, "lines": line_rows}
+
+    def _write(self, prepared: List[Dict[str, Any]]):
+        """Insert prepared entries and lines and apply one balance delta per account.
+
+        In delta balance mode the deltas are appended to gl_balance_deltas
+        instead of updating chart_of_accounts, so concurrent postings never
+        wait on each other's account rows; accounting.balances folds them in.
+        """
+        if not prepared:
+            return
+        deltas: Dict[str, Decimal] = {}
+        line_rows = []
+        for item in prepared:
+            for row in item["lines"]:
+                row = dict(row)
+                normal_balance = row.pop("_normal_balance")
+                delta = row["debit"] - row["credit"] if normal_balance == "debit" else row["credit"] - row["debit"]
+                deltas[row["account_id"]] = deltas.get(row["account_id"], Decimal("0")) + delta
+                line_rows.append(row)
+
         self.session.flush()
-        
-        for line_data in resolved_lines:
-            account = line_data["account"]
-            debit = line_data["debit"]
-            credit = line_data["credit"]
-            
-            journal_line = JournalLine(
-                journal_entry_id=entry.id,
-                account_id=account.id,
-                debit=debit,
-                credit=credit,
-                memo=line_data.get("memo"),
-                member_id=line_data.get("member_id"),
-                loan_id=line_data.get("loan_id")
+        self.session.execute(JournalEntry.__table__.insert(), [item["entry"] for item in prepared])
+        self.session.execute(JournalLine.__table__.insert(), line_rows)
+
+        table = ChartOfAccounts.__table__
+        updates = [{"account": account_id, "delta": delta} for account_id, delta in sorted(deltas.items()) if delta != 0]
+        if updates and get_chart(self.session).balance_mode == "delta":
+            now = datetime.utcnow()
+            self.session.execute(AccountBalanceDelta.__table__.insert(), [
+                {"account_id": u["account"], "delta": u["delta"], "created_at": now} for u in updates
+            ])
+        elif updates:
+            # Sorted by id so concurrent batches lock accounts in the same order
+            self.session.execute(
+                table.update().where(table.c.id == bindparam("account")).values(
+                    current_balance=func.coalesce(table.c.current_balance, 0) + bindparam("delta")
+                ),
+                updates,
             )
-            self.session.add(journal_line)
-            
-            if account.normal_balance == "debit":
-                account.current_balance = (account.current_balance or Decimal("0")) + debit - credit
-            else:
-                account.current_balance = (account.current_balance or Decimal("0")) + credit - debit
+            for obj in list(self.session.identity_map.values()):
+                if isinstance(obj, ChartOfAccounts) and obj.id in deltas:
+                    self.session.expire(obj, ["current_balance"])
+
+    def post_batch(self, entries: List[Dict[str, Any]]) -> List[str]:
+        """
+        Validate and post many journal entries in one round of multi-row inserts.
+        
+        Each entry is a dict of create_journal_entry's arguments. Nothing is
+        written unless every entry is valid; the caller commits.
+        
+        Returns:
+            The new journal entry ids, in order
+        """
+        chart = get_chart(self.session)
+        prepared = [self._prepare_entry(chart, **entry) for entry in entries]
+        self._write(prepared)
+        return [item["entry"]["id"] for item in prepared]
+
+    def flush(self) -> int:
+        """Write the entries queued in deferred mode (without committing); returns how many"""
+        pending, self._pending = self._pending, []
+        self._write(pending)
+        return len(pending)
+    
+    def create_journal_entry(
+        self,
+        entry_date: date,
+        description: str,
+        lines: List[Dict[str, Any]],
+        reference: Optional[str] = None,
+        source_type: Optional[str] = None,
+        source_id: Optional[str] = None,
+        created_by_id: Optional[str] = None
+    ) -> JournalEntry:
+        """
+        Create a balanced journal entry with debit/credit lines.
+        
+        Args:
+            entry_date: Date of the entry
+            description: Description of the transaction
+            lines: List of dicts with keys: account_code or account_id, debit, credit, memo
+            reference: External reference number
+            source_type: Type of source (transaction, loan, repayment, fixed_deposit, etc.)
+            source_id: ID of the source record
+            created_by_id: Staff ID who created the entry
+        
+        Returns:
+            Created JournalEntry object (in deferred mode an unsaved copy until flush())
+        
+        Raises:
+            ValueError if entry is not balanced
+        """
+        prepared = self._prepare_entry(
+            get_chart(self.session), entry_date, description, lines,
+            reference=reference, source_type=source_type, source_id=source_id, created_by_id=created_by_id
+        )
+        if self.deferred:
+            self._pending.append(prepared)
+            return JournalEntry(**prepared["entry"])
         
+        self._write([prepared])
         self.session.commit()
-        return entry
+        return self.session.get(JournalEntry, prepared["entry"]["id"])
     
     def reverse_journal_entry(self, entry_id: str, created_by_id: Optional[str] = None) -> JournalEntry:
         """Reverse a journal entry by creating an opposite entry"""
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Cron job script for audit log maintenance.
+For every organization it rolls up the audit logs of each day closed since
+the previous run into audit_log_daily (the first run backfills all
+history), then archives the months older than the organization's
+audit_retention_months setting to compressed files under
+uploads/audit_archive/ (see services/audit_retention.py). Runs daily from
+the scheduler.
+
+Usage: python cron_audit_logs.py
+"""
+
+import os
+import sys
+from datetime import date
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.master import Organization
+from services.tenant_context import TenantContext
+from services.audit_retention import maintain_audit_logs
+
+
+def process_organization(org_id, org_name, connection_string):
+    """Roll up and archive the audit logs of a single organization"""
+    print(f"\n--- Processing organization: {org_name} ({org_id}) ---")
+
+    try:
+        tenant_ctx = TenantContext(connection_string)
+        session = tenant_ctx.create_session()
+    except Exception as e:
+        print(f"  Error connecting to tenant database: {e}")
+        return {"archived": 0, "errors": 1}
+
+    try:
+        stats = maintain_audit_logs(session, org_id)
+        print(f"  Rolled up {stats['rollup']['days']} day(s)")
+        if stats["archived"]["months"]:
+            print(f"  Archived {stats['archived']['months']} month(s), {stats['archived']['rows']} logs")
+        return {"archived": stats["archived"]["rows"], "errors": 0}
+    except Exception as e:
+        session.rollback()
+        print(f"  [ERROR] Audit log maintenance failed: {e}")
+        return {"archived": 0, "errors": 1}
+    finally:
+        session.close()
+        tenant_ctx.close()
+
+
+def main():
+    print(f"=== Audit Log Maintenance - {date.today()} ===")
+
+    database_url = os.environ.get("DATABASE_URL")
+    if not database_url:
+        print("ERROR: DATABASE_URL not set")
+        sys.exit(1)
+
+    engine = create_engine(database_url)
+    Session = sessionmaker(bind=engine)
+    master_session = Session()
+
+    try:
+        organizations = master_session.query(Organization).filter(
+            Organization.is_active == True,
+            Organization.connection_string.isnot(None)
+        ).all()
+
+        print(f"Found {len(organizations)} active organizations")
+
+        total_archived = 0
+        total_errors = 0
+        for org in organizations:
+            result = process_organization(org.id, org.name, org.connection_string)
+            total_archived += result["archived"]
+            total_errors += result["errors"]
+
+        print(f"\n=== TOTAL SUMMARY ===")
+        print(f"Audit logs archived: {total_archived}")
+        print(f"Errors: {total_errors}")
+
+    except Exception as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    finally:
+        master_session.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
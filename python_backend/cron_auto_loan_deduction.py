@@ -103,6 +103,12 @@ def process_auto_deductions(org_id, org_name, connection_string, force=False):
             loan_instalments_map.setdefault(inst.loan_id, []).append(inst)
 
         from services.instalment_service import allocate_payment_to_instalments
+        from accounting.service import AccountingService
+
+        # Each repayment's GL entry is written in the same commit as the repayment
+        ledger = AccountingService(session, deferred=True)
+        ledger.seed_default_accounts()
+        gl_posted = 0
 
         for loan_id, instalments in loan_instalments_map.items():
             try:
@@ -245,15 +251,18 @@ def process_auto_deductions(org_id, org_name, connection_string, force=False):
                     }
                 )
                 session.add(audit_log)
-
-                session.commit()
+                session.flush()
 
                 try:
                     from routes.repayments import post_repayment_to_gl
-                    post_repayment_to_gl(session, repayment, loan, member)
+                    with session.begin_nested():
+                        post_repayment_to_gl(session, repayment, loan, member, svc=ledger)
+                        gl_posted += ledger.flush()
                 except Exception as gl_err:
                     print(f"  [GL] Warning: Failed to post GL entry for {repayment.repayment_number}: {gl_err}")
 
+                session.commit()
+
                 try:
                     from routes.repayments import try_send_sms
                     if member.phone:
@@ -284,6 +293,9 @@ def process_auto_deductions(org_id, org_name, connection_string, force=False):
                 traceback.print_exc()
                 error_count += 1
 
+        if gl_posted:
+            print(f"  [GL] Posted {gl_posted} repayment entries")
+
         last_run_setting = session.query(OrganizationSettings).filter(
             OrganizationSettings.setting_key == "auto_loan_deduction_last_run"
         ).first()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Cron job script to close the daily cash position.
+For every organization it freezes the branch and teller cash positions of
+each day before today that nobody closed with the end-of-day close step
+(see services/cash_position.py); the first run backfills all float
+history. Runs hourly from the scheduler, so yesterday is closed shortly
+after midnight.
+
+Usage: python cron_cash_position.py
+"""
+
+import os
+import sys
+from datetime import date
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.master import Organization
+from services.tenant_context import TenantContext
+from services.cash_position import run_close
+
+
+def process_organization(org_id, org_name, connection_string):
+    """Close the open past days of a single organization"""
+    print(f"\n--- Processing organization: {org_name} ({org_id}) ---")
+
+    try:
+        tenant_ctx = TenantContext(connection_string)
+        session = tenant_ctx.create_session()
+    except Exception as e:
+        print(f"  Error connecting to tenant database: {e}")
+        return {"days": 0, "errors": 1}
+
+    try:
+        stats = run_close(session)
+        if stats["days"]:
+            print(f"  Closed {stats['days']} day(s), {stats['branches']} branch positions")
+        else:
+            print("  Cash positions up to date")
+        return {"days": stats["days"], "errors": 0}
+    except Exception as e:
+        session.rollback()
+        print(f"  [ERROR] Cash position close failed: {e}")
+        return {"days": 0, "errors": 1}
+    finally:
+        session.close()
+        tenant_ctx.close()
+
+
+def main():
+    print(f"=== Cash Position Close - {date.today()} ===")
+
+    database_url = os.environ.get("DATABASE_URL")
+    if not database_url:
+        print("ERROR: DATABASE_URL not set")
+        sys.exit(1)
+
+    engine = create_engine(database_url)
+    Session = sessionmaker(bind=engine)
+    master_session = Session()
+
+    try:
+        organizations = master_session.query(Organization).filter(
+            Organization.is_active == True,
+            Organization.connection_string.isnot(None)
+        ).all()
+
+        print(f"Found {len(organizations)} active organizations")
+
+        total_days = 0
+        total_errors = 0
+        for org in organizations:
+            result = process_organization(org.id, org.name, org.connection_string)
+            total_days += result["days"]
+            total_errors += result["errors"]
+
+        print(f"\n=== TOTAL SUMMARY ===")
+        print(f"Days closed: {total_days}")
+        print(f"Errors: {total_errors}")
+
+    except Exception as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    finally:
+        master_session.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Cron job script to run the delinquency engine.
+For every organization it marks newly past-due instalments overdue, charges
+late payment penalties and updates loan default records, touching only what
+changed since the previous run (see services/delinquency.py).
+
+Usage: python cron_delinquency.py [--full]
+"""
+
+import os
+import sys
+from datetime import date
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.master import Organization
+from services.tenant_context import TenantContext
+from services.delinquency import run_delinquency
+
+
+def process_organization(org_id, org_name, connection_string, full=False):
+    """Run one delinquency pass for a single organization"""
+    print(f"\n--- Processing organization: {org_name} ({org_id}) ---")
+
+    try:
+        tenant_ctx = TenantContext(connection_string)
+        session = tenant_ctx.create_session()
+    except Exception as e:
+        print(f"  Error connecting to tenant database: {e}")
+        return {"loans": 0, "errors": 1}
+
+    try:
+        stats = run_delinquency(session, full=full)
+        print(f"  {stats['mode']}: {stats['loans']} loans, {stats['instalments_marked_overdue']} instalments overdue, "
+              f"{stats['defaults_opened']} opened, {stats['defaults_resolved']} resolved, {stats['penalties']} penalties")
+        return {"loans": stats["loans"], "errors": 0}
+    except Exception as e:
+        session.rollback()
+        print(f"  [ERROR] Delinquency run failed: {e}")
+        return {"loans": 0, "errors": 1}
+    finally:
+        session.close()
+        tenant_ctx.close()
+
+
+def main():
+    print(f"=== Delinquency Processing - {date.today()} ===")
+
+    database_url = os.environ.get("DATABASE_URL")
+    if not database_url:
+        print("ERROR: DATABASE_URL not set")
+        sys.exit(1)
+
+    full = "--full" in sys.argv[1:]
+
+    engine = create_engine(database_url)
+    Session = sessionmaker(bind=engine)
+    master_session = Session()
+
+    try:
+        organizations = master_session.query(Organization).filter(
+            Organization.is_active == True,
+            Organization.connection_string.isnot(None)
+        ).all()
+
+        print(f"Found {len(organizations)} active organizations")
+
+        total_loans = 0
+        total_errors = 0
+        for org in organizations:
+            result = process_organization(org.id, org.name, org.connection_string, full=full)
+            total_loans += result["loans"]
+            total_errors += result["errors"]
+
+        print(f"\n=== TOTAL SUMMARY ===")
+        print(f"Loans processed: {total_loans}")
+        print(f"Errors: {total_errors}")
+
+    except Exception as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    finally:
+        master_session.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
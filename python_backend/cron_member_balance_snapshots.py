@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Cron job script to build month-end member balance snapshots.
+For every organization it rebuilds the snapshots of each month closed since
+the previous run from that month's transactions; the first run backfills
+all history (see services/balance_snapshots.py). Runs hourly from the
+scheduler and does nothing until a month closes.
+
+Usage: python cron_member_balance_snapshots.py [--full]
+"""
+
+import os
+import sys
+from datetime import date
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.master import Organization
+from services.tenant_context import TenantContext
+from services.balance_snapshots import run_snapshots
+
+
+def process_organization(org_id, org_name, connection_string, full=False):
+    """Bring the member balance snapshots of a single organization up to date"""
+    print(f"\n--- Processing organization: {org_name} ({org_id}) ---")
+
+    try:
+        tenant_ctx = TenantContext(connection_string)
+        session = tenant_ctx.create_session()
+    except Exception as e:
+        print(f"  Error connecting to tenant database: {e}")
+        return {"rows": 0, "errors": 1}
+
+    try:
+        stats = run_snapshots(session, full=full)
+        if stats["months"]:
+            print(f"  Rebuilt {stats['months']} month(s), {stats['rows']} snapshot rows")
+        else:
+            print("  Snapshots up to date")
+        return {"rows": stats["rows"], "errors": 0}
+    except Exception as e:
+        session.rollback()
+        print(f"  [ERROR] Snapshot run failed: {e}")
+        return {"rows": 0, "errors": 1}
+    finally:
+        session.close()
+        tenant_ctx.close()
+
+
+def main():
+    print(f"=== Member Balance Snapshots - {date.today()} ===")
+
+    database_url = os.environ.get("DATABASE_URL")
+    if not database_url:
+        print("ERROR: DATABASE_URL not set")
+        sys.exit(1)
+
+    full = "--full" in sys.argv[1:]
+
+    engine = create_engine(database_url)
+    Session = sessionmaker(bind=engine)
+    master_session = Session()
+
+    try:
+        organizations = master_session.query(Organization).filter(
+            Organization.is_active == True,
+            Organization.connection_string.isnot(None)
+        ).all()
+
+        print(f"Found {len(organizations)} active organizations")
+
+        total_rows = 0
+        total_errors = 0
+        for org in organizations:
+            result = process_organization(org.id, org.name, org.connection_string, full=full)
+            total_rows += result["rows"]
+            total_errors += result["errors"]
+
+        print(f"\n=== TOTAL SUMMARY ===")
+        print(f"Snapshot rows written: {total_rows}")
+        print(f"Errors: {total_errors}")
+
+    except Exception as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    finally:
+        master_session.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Cron job script to create upcoming monthly partitions.
+For every organization whose transactions or float_transactions table has
+been partitioned (scripts/partition_tenant.py) it makes sure partitions
+exist from the current month to FUTURE_MONTHS ahead, so new rows never
+land in the default partition (see services/partitioning.py). Tenants that
+were not converted are skipped.
+
+Usage: python cron_partitions.py
+"""
+
+import os
+import sys
+from datetime import date
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.master import Organization
+from services.tenant_context import TenantContext
+from services.partitioning import FUTURE_MONTHS, PARTITIONED_TABLES, add_months, ensure_partitions, is_partitioned, month_start
+
+
+def process_organization(org_id, org_name, connection_string):
+    """Create the missing future partitions of a single organization"""
+    print(f"\n--- Processing organization: {org_name} ({org_id}) ---")
+
+    try:
+        tenant_ctx = TenantContext(connection_string)
+    except Exception as e:
+        print(f"  Error connecting to tenant database: {e}")
+        return {"created": 0, "errors": 1}
+
+    through = add_months(month_start(date.today()), FUTURE_MONTHS)
+    created = 0
+    try:
+        for table in PARTITIONED_TABLES:
+            with tenant_ctx.engine.begin() as conn:
+                if not is_partitioned(conn, table):
+                    continue
+                names = ensure_partitions(conn, table, through)
+            if names:
+                print(f"  {table}: created {', '.join(names)}")
+            created += len(names)
+        return {"created": created, "errors": 0}
+    except Exception as e:
+        print(f"  [ERROR] Partition maintenance failed: {e}")
+        return {"created": created, "errors": 1}
+    finally:
+        tenant_ctx.close()
+
+
+def main():
+    print(f"=== Partition Maintenance - {date.today()} ===")
+
+    database_url = os.environ.get("DATABASE_URL")
+    if not database_url:
+        print("ERROR: DATABASE_URL not set")
+        sys.exit(1)
+
+    engine = create_engine(database_url)
+    Session = sessionmaker(bind=engine)
+    master_session = Session()
+
+    try:
+        organizations = master_session.query(Organization).filter(
+            Organization.is_active == True,
+            Organization.connection_string.isnot(None)
+        ).all()
+
+        print(f"Found {len(organizations)} active organizations")
+
+        total_created = 0
+        total_errors = 0
+        for org in organizations:
+            result = process_organization(org.id, org.name, org.connection_string)
+            total_created += result["created"]
+            total_errors += result["errors"]
+
+        print(f"\n=== TOTAL SUMMARY ===")
+        print(f"Partitions created: {total_created}")
+        print(f"Errors: {total_errors}")
+
+    except Exception as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    finally:
+        master_session.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
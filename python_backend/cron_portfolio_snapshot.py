@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Cron job script to write the daily loan portfolio snapshot.
+For every organization it stores per-branch, per-product aging buckets and
+outstanding totals for today (see services/portfolio_snapshot.py). Tenants
+that already have today's snapshot are skipped unless --force is given, so
+the scheduler can run this hourly and the first run after midnight wins.
+
+Usage: python cron_portfolio_snapshot.py [--force]
+"""
+
+import os
+import sys
+from datetime import date
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.master import Organization
+from services.tenant_context import TenantContext
+from services.portfolio_snapshot import latest_snapshot_time, take_portfolio_snapshot
+
+
+def snapshot_organization(org_id, org_name, connection_string, force=False):
+    """Write today's portfolio snapshot for a single organization"""
+    print(f"\n--- Processing organization: {org_name} ({org_id}) ---")
+
+    try:
+        tenant_ctx = TenantContext(connection_string)
+        session = tenant_ctx.create_session()
+    except Exception as e:
+        print(f"  Error connecting to tenant database: {e}")
+        return {"written": 0, "skipped": 0, "errors": 1}
+
+    today = date.today()
+    try:
+        if not force and latest_snapshot_time(session, today) is not None:
+            print("  Snapshot for today already exists")
+            return {"written": 0, "skipped": 1, "errors": 0}
+        rows = take_portfolio_snapshot(session, today)
+        print(f"  Wrote {rows} snapshot rows")
+        return {"written": 1, "skipped": 0, "errors": 0}
+    except Exception as e:
+        session.rollback()
+        print(f"  [ERROR] Snapshot failed: {e}")
+        return {"written": 0, "skipped": 0, "errors": 1}
+    finally:
+        session.close()
+        tenant_ctx.close()
+
+
+def main():
+    print(f"=== Portfolio Snapshot - {date.today()} ===")
+
+    database_url = os.environ.get("DATABASE_URL")
+    if not database_url:
+        print("ERROR: DATABASE_URL not set")
+        sys.exit(1)
+
+    force = "--force" in sys.argv[1:]
+
+    engine = create_engine(database_url)
+    Session = sessionmaker(bind=engine)
+    master_session = Session()
+
+    try:
+        organizations = master_session.query(Organization).filter(
+            Organization.is_active == True,
+            Organization.connection_string.isnot(None)
+        ).all()
+
+        print(f"Found {len(organizations)} active organizations")
+
+        totals = {"written": 0, "skipped": 0, "errors": 0}
+        for org in organizations:
+            result = snapshot_organization(org.id, org.name, org.connection_string, force=force)
+            for key in totals:
+                totals[key] += result[key]
+
+        print(f"\n=== TOTAL SUMMARY ===")
+        print(f"Snapshots written: {totals['written']}")
+        print(f"Already up to date: {totals['skipped']}")
+        print(f"Errors: {totals['errors']}")
+
+    except Exception as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    finally:
+        master_session.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,11 @@ import subprocess
 import sys
 import time
 from pathlib import Path
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import Depends, FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, HTMLResponse
+from starlette.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
@@ -45,6 +46,8 @@ from routes.features import router as features_router
 from routes.crm import router as crm_router
 from routes.collateral import router as collateral_router
 from routes.notifications import router as notifications_router
+from routes.events import router as events_router
+from services.tenant_context import tenant_unit_of_work
 from routes.exports import router as exports_router
 from routes.subscription_payments import router as subscription_payments_router
 from routes.mobile import router as mobile_router
@@ -258,7 +261,7 @@ def run_pending_migrations_sync():
         db.close()
     print("All tenant migrations complete")
 
-_MASTER_SCHEMA_VERSION = 7
+_MASTER_SCHEMA_VERSION = 8
 
 def _get_master_migration_version():
     """Check the migration version stored in the master database"""
@@ -345,6 +348,8 @@ def run_master_migrations():
             ("neon_branch_id", "VARCHAR(255)"),
             ("connection_string", "TEXT"),
             ("institution_type", "VARCHAR(50)"),
+            ("gl_balance_mode", "VARCHAR(20)"),
+            ("gl_balance_mode_changed_at", "TIMESTAMP"),
         ]
         for col_name, col_type in org_columns:
             _add_master_column_if_not_exists(conn, "organizations", col_name, col_type)
@@ -464,9 +469,43 @@ async def lifespan(app: FastAPI):
     migration_thread = threading.Thread(target=run_pending_migrations_sync, daemon=True)
     migration_thread.start()
     
-    yield
+    from services.mpesa_inbox import start_callback_workers
+    callback_workers = start_callback_workers()
+
+    from services.stk_reconciler import start_stk_reconciler
+    stk_reconciler = start_stk_reconciler()
+
+    from accounting.balances import start_balance_compactor
+    balance_compactor = start_balance_compactor()
 
-app = FastAPI(title="BANKYKIT - Bank & Sacco Management System", lifespan=lifespan)
+    from services.event_bus import start_event_bus
+    event_bus = start_event_bus()
+
+    from services.loop_monitor import start_loop_monitor
+    loop_monitor = start_loop_monitor()
+    
+    yield
+    
+    if callback_workers:
+        callback_workers.stop()
+    if stk_reconciler:
+        stk_reconciler.stop()
+    if balance_compactor:
+        balance_compactor.stop()
+    if event_bus:
+        event_bus.stop()
+    if loop_monitor:
+        loop_monitor.stop()
+
+    from services.daraja import gateway as daraja_gateway
+    await daraja_gateway.aclose()
+
+# One tenant session per request, lent to auth, permission checks and the handler
+app = FastAPI(
+    title="BANKYKIT - Bank & Sacco Management System",
+    lifespan=lifespan,
+    dependencies=[Depends(tenant_unit_of_work, scope="function")],
+)
 
 ALLOWED_ORIGINS = [
     "http://localhost:5000",
@@ -500,6 +539,7 @@ async def timing_middleware(request: Request, call_next):
             print(f"[TIMING] {request.method} {request.url.path} -> {response.status_code} in {duration_ms:.0f}ms")
             return response
         finally:
+            # Set only when auth ran outside the request's unit of work
             if hasattr(request.state, 'tenant_session'):
                 try:
                     request.state.tenant_session.close()
@@ -550,6 +590,7 @@ app.include_router(crm_router, prefix="/api/organizations", tags=["CRM"])
 app.include_router(collateral_router, prefix="/api/organizations", tags=["Collateral"])
 app.include_router(features_router, prefix="/api/organizations", tags=["Features"])
 app.include_router(notifications_router, prefix="/api/organizations", tags=["Notifications"])
+app.include_router(events_router, prefix="/api/organizations", tags=["Events"])
 app.include_router(exports_router, prefix="/api/organizations", tags=["Data Export"])
 app.include_router(subscription_payments_router, prefix="/api/organizations", tags=["Subscription Payments"])
 app.include_router(mobile_router, prefix="/api/mobile", tags=["Mobile App"])
@@ -797,26 +838,27 @@ async def paystack_subscription_webhook(request: Request):
         db.close()
 
 
-@app.get("/api/public/plans", tags=["Public"])
-async def get_public_plans():
-    """
-    Get available subscription plans (public endpoint for landing page).
-    No authentication required. All content is fetched from the database.
-    """
+def _platform_setting_values(keys):
+    """PlatformSettings values by key, for the async public handlers to read in the threadpool"""
     from models.database import SessionLocal
-    from models.master import SubscriptionPlan, PlatformSettings
-    from sqlalchemy import or_
-    from services.exchange_rate import fetch_exchange_rates, convert_usd_to, get_currency_symbol
-    
+    from models.master import PlatformSettings
+
     db = SessionLocal()
     try:
-        settings = {s.setting_key: s.setting_value for s in db.query(PlatformSettings).filter(
-            PlatformSettings.setting_key.in_([
-                'pricing_title', 'pricing_subtitle', 
-                'pricing_saas_label', 'pricing_enterprise_label'
-            ])
+        return {s.setting_key: s.setting_value for s in db.query(PlatformSettings).filter(
+            PlatformSettings.setting_key.in_(keys)
         ).all()}
-        
+    finally:
+        db.close()
+
+
+def _load_public_plans():
+    from models.database import SessionLocal
+    from models.master import SubscriptionPlan
+    from sqlalchemy import or_
+
+    db = SessionLocal()
+    try:
         saas_plans = db.query(SubscriptionPlan).filter(
             SubscriptionPlan.is_active == True,
             or_(SubscriptionPlan.pricing_model == 'saas', SubscriptionPlan.pricing_model == None)
@@ -826,110 +868,126 @@ async def get_public_plans():
             SubscriptionPlan.is_active == True,
             SubscriptionPlan.pricing_model == 'enterprise'
         ).order_by(SubscriptionPlan.sort_order).all()
-        
-        feature_display_names = {
-            "core_banking": "Core Banking",
-            "members": "Member Management",
-            "savings": "Savings Accounts",
-            "shares": "Share Capital",
-            "loans": "Loan Management",
-            "teller_station": "Teller Station",
-            "float_management": "Float Management",
-            "analytics": "Analytics Dashboard",
-            "analytics_export": "Analytics Export",
-            "sms_notifications": "SMS Notifications",
-            "bulk_sms": "Bulk SMS",
-            "expenses": "Expense Tracking",
-            "leave_management": "Leave Management",
-            "multiple_branches": "Multiple Branches",
-            "audit_logs": "Audit Logs",
-            "accounting": "Full Accounting",
-            "fixed_deposits": "Fixed Deposits",
-            "dividends": "Dividends",
-            "hr": "HR Management",
-            "payroll": "Payroll",
-            "api_access": "API Access",
-            "custom_reports": "Custom Reports",
-            "white_label": "White Label",
-            "mpesa_integration": "M-Pesa Integration",
-            "bank_integration": "Bank Integration",
-            "priority_support": "Priority Support"
+        return saas_plans, enterprise_plans
+    finally:
+        db.close()
+
+
+@app.get("/api/public/plans", tags=["Public"])
+async def get_public_plans():
+    """
+    Get available subscription plans (public endpoint for landing page).
+    No authentication required. All content is fetched from the database.
+    """
+    from services.exchange_rate import fetch_exchange_rates, convert_usd_to, get_currency_symbol
+    
+    settings = await run_in_threadpool(_platform_setting_values, [
+        'pricing_title', 'pricing_subtitle', 
+        'pricing_saas_label', 'pricing_enterprise_label'
+    ])
+    saas_plans, enterprise_plans = await run_in_threadpool(_load_public_plans)
+    
+    feature_display_names = {
+        "core_banking": "Core Banking",
+        "members": "Member Management",
+        "savings": "Savings Accounts",
+        "shares": "Share Capital",
+        "loans": "Loan Management",
+        "teller_station": "Teller Station",
+        "float_management": "Float Management",
+        "analytics": "Analytics Dashboard",
+        "analytics_export": "Analytics Export",
+        "sms_notifications": "SMS Notifications",
+        "bulk_sms": "Bulk SMS",
+        "expenses": "Expense Tracking",
+        "leave_management": "Leave Management",
+        "multiple_branches": "Multiple Branches",
+        "audit_logs": "Audit Logs",
+        "accounting": "Full Accounting",
+        "fixed_deposits": "Fixed Deposits",
+        "dividends": "Dividends",
+        "hr": "HR Management",
+        "payroll": "Payroll",
+        "api_access": "API Access",
+        "custom_reports": "Custom Reports",
+        "white_label": "White Label",
+        "mpesa_integration": "M-Pesa Integration",
+        "bank_integration": "Bank Integration",
+        "priority_support": "Priority Support"
+    }
+    
+    def get_display_features(plan):
+        enabled = plan.features.get("enabled", []) if plan.features else []
+        custom = plan.features.get("custom", []) if plan.features else []
+        return {"enabled": [feature_display_names.get(f, f.replace("_", " ").title()) for f in enabled], "custom": custom}
+    
+    rates = await fetch_exchange_rates()
+    currency = "KES"
+    symbol = get_currency_symbol(currency)
+
+    def to_kes(usd_amount):
+        return convert_usd_to(usd_amount, currency, rates) if usd_amount else 0
+
+    def plan_to_saas_dict(p):
+        return {
+            "id": str(p.id) if hasattr(p, 'id') else p.name,
+            "name": p.name,
+            "plan_type": p.plan_type,
+            "pricing_model": p.pricing_model or "saas",
+            "business_type": p.business_type,
+            "monthly_price": round(float(p.monthly_price) if p.monthly_price else 0),
+            "annual_price": round(float(p.annual_price) if p.annual_price else 0),
+            "one_time_price": 0,
+            "max_members": p.max_members,
+            "max_staff": p.max_staff,
+            "max_branches": p.max_branches,
+            "is_popular": getattr(p, 'is_popular', False) or False,
+            "features": get_display_features(p)
         }
-        
-        def get_display_features(plan):
-            enabled = plan.features.get("enabled", []) if plan.features else []
-            custom = plan.features.get("custom", []) if plan.features else []
-            return {"enabled": [feature_display_names.get(f, f.replace("_", " ").title()) for f in enabled], "custom": custom}
-        
-        rates = await fetch_exchange_rates()
-        currency = "KES"
-        symbol = get_currency_symbol(currency)
-
-        def to_kes(usd_amount):
-            return convert_usd_to(usd_amount, currency, rates) if usd_amount else 0
-
-        def plan_to_saas_dict(p):
-            return {
-                "id": str(p.id) if hasattr(p, 'id') else p.name,
-                "name": p.name,
-                "plan_type": p.plan_type,
-                "pricing_model": p.pricing_model or "saas",
-                "business_type": p.business_type,
-                "monthly_price": round(float(p.monthly_price) if p.monthly_price else 0),
-                "annual_price": round(float(p.annual_price) if p.annual_price else 0),
-                "one_time_price": 0,
-                "max_members": p.max_members,
-                "max_staff": p.max_staff,
-                "max_branches": p.max_branches,
-                "is_popular": getattr(p, 'is_popular', False) or False,
-                "features": get_display_features(p)
-            }
-
-        def plan_to_enterprise_dict(p):
-            return {
-                "id": str(p.id) if hasattr(p, 'id') else p.name,
-                "name": p.name,
-                "plan_type": p.plan_type,
-                "pricing_model": p.pricing_model or "enterprise",
-                "business_type": p.business_type,
-                "monthly_price": 0,
-                "annual_price": 0,
-                "one_time_price": round(float(p.one_time_price) if p.one_time_price else 0),
-                "max_members": p.max_members,
-                "max_staff": p.max_staff,
-                "max_branches": p.max_branches,
-                "is_popular": getattr(p, 'is_popular', False) or False,
-                "support_years": p.support_years or 1,
-                "features": get_display_features(p)
-            }
-
-        all_saas = [plan_to_saas_dict(p) for p in saas_plans]
-        all_enterprise = [plan_to_enterprise_dict(p) for p in enterprise_plans]
-
-        business_types = ["chama", "sacco", "mfi", "bank"]
-        by_type = {}
-        for bt in business_types:
-            by_type[bt] = {
-                "saas": [p for p in all_saas if p["business_type"] == bt],
-                "enterprise": [p for p in all_enterprise if p["business_type"] == bt],
-            }
 
+    def plan_to_enterprise_dict(p):
         return {
-            "title": settings.get('pricing_title', 'Choose Your Plan'),
-            "subtitle": settings.get('pricing_subtitle', 'Flexible options for every financial institution'),
-            "saas_label": settings.get('pricing_saas_label', 'SaaS (Monthly)'),
-            "enterprise_label": settings.get('pricing_enterprise_label', 'Perpetual Licence'),
-            "currency": currency,
-            "currency_symbol": symbol,
-            "saas": all_saas,
-            "enterprise": all_enterprise,
-            "by_type": by_type,
+            "id": str(p.id) if hasattr(p, 'id') else p.name,
+            "name": p.name,
+            "plan_type": p.plan_type,
+            "pricing_model": p.pricing_model or "enterprise",
+            "business_type": p.business_type,
+            "monthly_price": 0,
+            "annual_price": 0,
+            "one_time_price": round(float(p.one_time_price) if p.one_time_price else 0),
+            "max_members": p.max_members,
+            "max_staff": p.max_staff,
+            "max_branches": p.max_branches,
+            "is_popular": getattr(p, 'is_popular', False) or False,
+            "support_years": p.support_years or 1,
+            "features": get_display_features(p)
+        }
+
+    all_saas = [plan_to_saas_dict(p) for p in saas_plans]
+    all_enterprise = [plan_to_enterprise_dict(p) for p in enterprise_plans]
+
+    business_types = ["chama", "sacco", "mfi", "bank"]
+    by_type = {}
+    for bt in business_types:
+        by_type[bt] = {
+            "saas": [p for p in all_saas if p["business_type"] == bt],
+            "enterprise": [p for p in all_enterprise if p["business_type"] == bt],
         }
-    finally:
-        db.close()
+
+    return {
+        "title": settings.get('pricing_title', 'Choose Your Plan'),
+        "subtitle": settings.get('pricing_subtitle', 'Flexible options for every financial institution'),
+        "saas_label": settings.get('pricing_saas_label', 'SaaS (Monthly)'),
+        "enterprise_label": settings.get('pricing_enterprise_label', 'Perpetual Licence'),
+        "currency": currency,
+        "currency_symbol": symbol,
+        "saas": all_saas,
+        "enterprise": all_enterprise,
+        "by_type": by_type,
+    }
 
 @app.get("/api/public/branding", tags=["Public"])
-async def get_public_branding():
+def get_public_branding():
     """Get public platform branding settings (no auth required)."""
     from models.database import SessionLocal
     from models.master import PlatformSettings
@@ -968,19 +1026,10 @@ async def get_public_branding():
 async def get_exchange_rates():
     """Get current USD exchange rates for subscription pricing."""
     from services.exchange_rate import fetch_exchange_rates
-    from models.database import SessionLocal
-    from models.master import PlatformSettings
 
     rates = await fetch_exchange_rates()
-
-    db = SessionLocal()
-    try:
-        paystack_setting = db.query(PlatformSettings).filter(
-            PlatformSettings.setting_key == "paystack_currency"
-        ).first()
-        paystack_currency = paystack_setting.setting_value if paystack_setting else "KES"
-    finally:
-        db.close()
+    settings = await run_in_threadpool(_platform_setting_values, ["paystack_currency"])
+    paystack_currency = settings.get("paystack_currency", "KES")
 
     return {
         "base": "USD",
@@ -1006,18 +1055,11 @@ class ContactFormRequest(BaseModel):
 @app.post("/api/public/contact", tags=["Public"])
 async def submit_contact_form(request: ContactFormRequest):
     """Handle contact form submissions from the landing page."""
-    from models.database import SessionLocal
-    from models.master import PlatformSettings
     from services.email_service import BrevoEmailService
     import logging
 
-    db = SessionLocal()
     try:
-        settings_keys = ["platform_name", "support_email", "brevo_api_key"]
-        settings = db.query(PlatformSettings).filter(
-            PlatformSettings.setting_key.in_(settings_keys)
-        ).all()
-        config = {s.setting_key: s.setting_value for s in settings}
+        config = await run_in_threadpool(_platform_setting_values, ["platform_name", "support_email", "brevo_api_key"])
 
         platform_name = config.get("platform_name", "BANKYKIT")
         support_email = config.get("support_email")
@@ -1069,24 +1111,16 @@ async def submit_contact_form(request: ContactFormRequest):
     except Exception as e:
         logging.error(f"Contact form error: {e}")
         return {"success": True, "message": "Thank you for reaching out! We'll get back to you soon."}
-    finally:
-        db.close()
 
 @app.post("/api/public/sales-inquiry", tags=["Public"])
 async def send_sales_inquiry(request: SalesInquiryRequest):
     """Send sales inquiry email via Brevo (public endpoint)."""
-    from models.database import SessionLocal
-    from models.master import PlatformSettings
     from services.email_service import BrevoEmailService
     
-    db = SessionLocal()
     try:
-        settings_keys = ["platform_name", "sales_email", "brevo_api_key", "support_email"]
-        settings = db.query(PlatformSettings).filter(
-            PlatformSettings.setting_key.in_(settings_keys)
-        ).all()
-        
-        config = {s.setting_key: s.setting_value for s in settings}
+        config = await run_in_threadpool(
+            _platform_setting_values, ["platform_name", "sales_email", "brevo_api_key", "support_email"]
+        )
         
         platform_name = config.get("platform_name", "BANKYKIT")
         sales_email = config.get("sales_email") or config.get("support_email")
@@ -1163,11 +1197,9 @@ This inquiry was submitted via the {platform_name} application.
         import logging
         logging.error(f"Failed to send sales inquiry: {e}")
         return {"success": False, "error": "Failed to send inquiry. Please try again later."}
-    finally:
-        db.close()
 
 @app.get("/api/public/landing-settings", tags=["Public"])
-async def get_public_landing_settings():
+def get_public_landing_settings():
     """Get landing page settings (public endpoint for landing page)."""
     from models.database import SessionLocal
     from models.master import PlatformSettings
@@ -1209,7 +1241,7 @@ async def get_public_landing_settings():
         db.close()
 
 @app.get("/api/public/landing-content/{section}", tags=["Public"])
-async def get_public_landing_content(section: str):
+def get_public_landing_content(section: str):
     """Get landing page content for a specific section (public endpoint)."""
     import json as json_lib
     from models.database import SessionLocal
@@ -1233,7 +1265,7 @@ async def get_public_landing_content(section: str):
         db.close()
 
 @app.get("/api/public/hero_placeholders", tags=["Public"])
-async def list_public_hero_placeholders():
+def list_public_hero_placeholders():
     """List all uploaded hero placeholder names."""
     import re as _re
     _valid = _re.compile(r'^[a-zA-Z0-9_-]{1,64}$')
@@ -1248,7 +1280,7 @@ async def list_public_hero_placeholders():
     return results
 
 @app.get("/api/public/hero_placeholders/{name}", tags=["Public"])
-async def get_public_hero_placeholder(name: str):
+def get_public_hero_placeholder(name: str):
     """Serve an uploaded hero placeholder image."""
     import re as _re
     if not _re.match(r'^[a-zA-Z0-9_-]{1,64}$', name):
@@ -1261,7 +1293,7 @@ async def get_public_hero_placeholder(name: str):
     raise HTTPException(status_code=404, detail="Placeholder not uploaded yet")
 
 @app.get("/api/public/docs-config", tags=["Public"])
-async def get_public_docs_config():
+def get_public_docs_config():
     """Get docs page configuration."""
     from models.database import SessionLocal
     from models.master import PlatformSettings
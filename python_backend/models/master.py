@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Text, Time, JSON, Integer, Numeric, Enum as SQLEnum, UniqueConstraint
+from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Text, Time, JSON, Integer, Numeric, Enum as SQLEnum, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from models.database import Base
 import enum
@@ -200,6 +200,8 @@ class Organization(Base):
     neon_project_id = Column(String(255))
     neon_branch_id = Column(String(255))
     connection_string = Column(Text)
+    gl_balance_mode = Column(String(20))
+    gl_balance_mode_changed_at = Column(DateTime)
     
     members = relationship("OrganizationMember", back_populates="organization")
 
@@ -275,3 +277,62 @@ class MobileDeviceRegistry(Base):
     __table_args__ = (
         UniqueConstraint('account_number', 'org_id', name='uq_mobile_registry_account_org'),
     )
+
+
+class MpesaCallback(Base):
+    """
+    Durable inbox for Safaricom callbacks (C2B confirmations, STK results).
+
+    The callback endpoints only insert here and acknowledge; the worker pool in
+    services/mpesa_inbox.py applies each row to the tenant database, oldest
+    first per organization. (organization_id, kind, dedupe_key) makes
+    Safaricom's retries idempotent: dedupe_key is the TransID for C2B and the
+    CheckoutRequestID for STK.
+    """
+    __tablename__ = "mpesa_callbacks"
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    organization_id = Column(String, ForeignKey("organizations.id"), nullable=False)
+    kind = Column(String(10), nullable=False)  # c2b, stk
+    dedupe_key = Column(String(100), nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(String(20), default="queued", nullable=False)  # queued, processing, done, dead
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    locked_until = Column(DateTime)
+    last_error = Column(Text)
+    result = Column(String(255))
+    received_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = Column(DateTime)
+
+    __table_args__ = (
+        UniqueConstraint('organization_id', 'kind', 'dedupe_key', name='uq_mpesa_callback_dedupe'),
+        Index('ix_mpesa_callbacks_org_status_received', 'organization_id', 'status', 'received_at'),
+    )
+
+
+class StkPushRequest(Base):
+    """
+    STK pushes awaiting a final status, tracked by services/stk_reconciler.py.
+
+    Rows are added when Safaricom accepts a push and are queried on a backoff
+    schedule (next_query_at) until the tenant's mpesa_payments record is no
+    longer pending, Daraja returns a final result, or the request expires.
+    """
+    __tablename__ = "stk_push_requests"
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    organization_id = Column(String, ForeignKey("organizations.id"), nullable=False)
+    checkout_request_id = Column(String(100), nullable=False)
+    status = Column(String(20), default="pending", nullable=False)  # pending, resolved, expired
+    attempts = Column(Integer, default=0, nullable=False)
+    next_query_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_result_code = Column(String(20))
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    resolved_at = Column(DateTime)
+
+    __table_args__ = (
+        UniqueConstraint('organization_id', 'checkout_request_id', name='uq_stk_push_request_checkout'),
+        Index('ix_stk_push_requests_status_next', 'status', 'next_query_at'),
+    )
@@ -1,7 +1,9 @@
 import uuid
 from datetime import datetime, date
-from sqlalchemy import Column, String, Boolean, DateTime, Numeric, Text, Integer, ForeignKey, Date, Time, JSON, UniqueConstraint
-from sqlalchemy.orm import relationship, declarative_base
+import re
+from sqlalchemy import Column, String, Boolean, DateTime, Numeric, Text, Integer, ForeignKey, Date, Time, JSON, UniqueConstraint, event, inspect, select
+from sqlalchemy.orm import relationship, declarative_base, object_session, Session
+from sqlalchemy.orm.util import identity_key
 
 TenantBase = declarative_base()
 
@@ -177,6 +179,10 @@ class Member(TenantBase):
     id_document_url = Column(String(500))
     signature_url = Column(String(500))
     
+    # Search keys, maintained on write (see _refresh_member_search_keys)
+    search_text = Column(Text)  # lowercased names, number, ID, email and phone; pg_trgm GIN index
+    phone_normalized = Column(String(20))  # last 9 digits of phone, for prefix lookups
+    
     branch = relationship("Branch", back_populates="members")
     loan_applications = relationship("LoanApplication", back_populates="member")
     transactions = relationship("Transaction", back_populates="member")
@@ -184,6 +190,29 @@ class Member(TenantBase):
     created_by = relationship("Staff", foreign_keys=[created_by_id])
     documents = relationship("MemberDocument", back_populates="member")
 
+MEMBER_SEARCH_FIELDS = ("first_name", "middle_name", "last_name", "member_number", "id_number", "email", "phone")
+
+
+def normalize_phone(phone) -> str:
+    """Digits-only phone reduced to its last 9 digits, so 0712..., 254712... and +254712... agree"""
+    digits = re.sub(r"\D", "", phone or "")
+    return digits[-9:]
+
+
+def member_search_text(member) -> str:
+    return " ".join(
+        str(value).strip().lower()
+        for value in (getattr(member, field, None) for field in MEMBER_SEARCH_FIELDS)
+        if value and str(value).strip()
+    )
+
+
+@event.listens_for(Member, "before_insert")
+@event.listens_for(Member, "before_update")
+def _refresh_member_search_keys(mapper, connection, member):
+    member.search_text = member_search_text(member)
+    member.phone_normalized = normalize_phone(member.phone) or None
+
 class MemberDocument(TenantBase):
     __tablename__ = "member_documents"
     
@@ -258,6 +287,7 @@ class LoanApplication(TenantBase):
     id = Column(String, primary_key=True, default=generate_uuid)
     application_number = Column(String(50), unique=True, nullable=False)
     member_id = Column(String, ForeignKey("members.id"), nullable=False)
+    branch_id = Column(String, ForeignKey("branches.id"), index=True)  # member's branch, maintained on write
     loan_product_id = Column(String, ForeignKey("loan_products.id"), nullable=False)
     amount = Column(Numeric(15, 2), nullable=False)
     term_months = Column(Integer, nullable=False)
@@ -297,6 +327,7 @@ class LoanApplication(TenantBase):
     disbursed_at = Column(DateTime)
     closed_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     member = relationship("Member", back_populates="loan_applications")
     loan_product = relationship("LoanProduct", back_populates="loan_applications")
@@ -434,6 +465,7 @@ class Transaction(TenantBase):
     id = Column(String, primary_key=True, default=generate_uuid)
     transaction_number = Column(String(50), unique=True, nullable=False)
     member_id = Column(String, ForeignKey("members.id"), nullable=False)
+    branch_id = Column(String, ForeignKey("branches.id"), index=True)  # member's branch, maintained on write
     transaction_type = Column(String(50), nullable=False)
     account_type = Column(String(50), nullable=False)
     amount = Column(Numeric(15, 2), nullable=False)
@@ -447,6 +479,50 @@ class Transaction(TenantBase):
     
     member = relationship("Member", back_populates="transactions")
 
+
+def _member_branch_id(connection, target):
+    session = object_session(target)
+    member = target.__dict__.get("member")
+    if member is None and session is not None:
+        member = session.identity_map.get(identity_key(Member, target.member_id))
+    if member is not None:
+        return member.branch_id
+    return connection.execute(select(Member.branch_id).where(Member.id == target.member_id)).scalar()
+
+
+@event.listens_for(LoanApplication, "before_insert")
+@event.listens_for(Transaction, "before_insert")
+def _fill_branch_id(mapper, connection, target):
+    """Copy the member's branch onto loans and transactions so branch filters need no join"""
+    if target.branch_id is None and target.member_id:
+        target.branch_id = _member_branch_id(connection, target)
+
+
+@event.listens_for(Member, "after_update")
+def _cascade_member_branch(mapper, connection, member):
+    """Keep denormalized branch_id in step when a member moves branch"""
+    # has_changes, not deleted: the old value is unknown when the attribute was expired (e.g. after a commit)
+    if not inspect(member).attrs.branch_id.history.has_changes():
+        return
+    for table in (LoanApplication.__table__, Transaction.__table__):
+        connection.execute(
+            table.update().where(table.c.member_id == member.id).values(branch_id=member.branch_id)
+        )
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _forbid_bulk_member_branch_update(orm_execute_state):
+    """Bulk UPDATEs skip _cascade_member_branch, so members change branch through the ORM only"""
+    if not orm_execute_state.is_update or orm_execute_state.bind_mapper is not inspect(Member):
+        return
+    params = orm_execute_state.parameters or {}
+    rows = params if isinstance(params, list) else [params]
+    if "branch_id" in orm_execute_state.statement.compile().params or any("branch_id" in row for row in rows):
+        raise ValueError(
+            "Bulk updates of members.branch_id would leave loans and transactions on the old branch; "
+            "update each Member through the session instead"
+        )
+
 class SMSNotification(TenantBase):
     __tablename__ = "sms_notifications"
     
@@ -537,6 +613,7 @@ class LoanDefault(TenantBase):
     id = Column(String, primary_key=True, default=generate_uuid)
     loan_id = Column(String, ForeignKey("loan_applications.id"), nullable=False)
     days_overdue = Column(Integer, nullable=False)
+    oldest_due_date = Column(Date, index=True)  # earliest unpaid instalment; days_overdue is refreshed from it
     amount_overdue = Column(Numeric(15, 2), nullable=False)
     penalty_amount = Column(Numeric(15, 2), default=0)
     status = Column(String(50), default="overdue")
@@ -751,7 +828,7 @@ class MpesaPayment(TenantBase):
     trans_time = Column(String(50))
     amount = Column(Numeric(15, 2), nullable=False)
     phone_number = Column(String(20))
-    bill_ref_number = Column(String(100))
+    bill_ref_number = Column(String(100), index=True)
     first_name = Column(String(100))
     middle_name = Column(String(100))
     last_name = Column(String(100))
@@ -1113,6 +1190,9 @@ class Payslip(TenantBase):
     approved_at = Column(DateTime)
     paid_at = Column(DateTime)
     emailed_at = Column(DateTime)
+    email_status = Column(String(20))  # queued, sent, failed (bulk email pipeline)
+    email_error = Column(Text)
+    email_queued_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     staff = relationship("Staff", foreign_keys=[staff_id])
@@ -1593,3 +1673,248 @@ class SoftLoanConfig(TenantBase):
 
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ExportJob(TenantBase):
+    """Background data export producing a compressed artifact under uploads/exports."""
+    __tablename__ = "export_jobs"
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    export_type = Column(String(50), nullable=False)  # members, transactions, loans
+    format = Column(String(20), nullable=False, default="csv")  # csv (gzip), parquet
+    filters = Column(JSON)
+    dedupe_key = Column(String(64), index=True)
+    status = Column(String(20), default="pending")  # pending, running, completed, failed, expired
+    total_rows = Column(Integer)
+    rows_written = Column(Integer, default=0)
+    file_path = Column(String(500))
+    file_size = Column(Integer)
+    error = Column(Text)
+    requested_by = Column(String(255))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    completed_at = Column(DateTime)
+    expires_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)  # refreshed while a worker holds the job
+
+
+class PortfolioSnapshot(TenantBase):
+    """Daily loan portfolio aging per branch and product (written by cron_portfolio_snapshot)."""
+    __tablename__ = "portfolio_snapshots"
+    __table_args__ = (
+        UniqueConstraint("snapshot_date", "branch_id", "loan_product_id", name="uq_portfolio_snapshot_scope"),
+    )
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    snapshot_date = Column(Date, nullable=False, index=True)
+    branch_id = Column(String, ForeignKey("branches.id"))
+    loan_product_id = Column(String, ForeignKey("loan_products.id"))
+    loan_count = Column(Integer, default=0)
+    total_outstanding = Column(Numeric(15, 2), default=0)
+    current_count = Column(Integer, default=0)
+    current_amount = Column(Numeric(15, 2), default=0)
+    days_1_30_count = Column(Integer, default=0)
+    days_1_30_amount = Column(Numeric(15, 2), default=0)
+    days_31_60_count = Column(Integer, default=0)
+    days_31_60_amount = Column(Numeric(15, 2), default=0)
+    days_61_90_count = Column(Integer, default=0)
+    days_61_90_amount = Column(Numeric(15, 2), default=0)
+    over_90_count = Column(Integer, default=0)
+    over_90_amount = Column(Numeric(15, 2), default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class PortfolioSnapshotLoan(TenantBase):
+    """Per-loan bucket behind the latest portfolio snapshot, used to apply intraday deltas."""
+    __tablename__ = "portfolio_snapshot_loans"
+
+    loan_id = Column(String, ForeignKey("loan_applications.id"), primary_key=True)
+    snapshot_date = Column(Date, nullable=False)
+    branch_id = Column(String)
+    loan_product_id = Column(String)
+    bucket = Column(String(20), nullable=False)
+    outstanding = Column(Numeric(15, 2), default=0)
+
+
+class JobWatermark(TenantBase):
+    """High-water mark of an incremental background job (e.g. the delinquency engine)."""
+    __tablename__ = "job_watermarks"
+
+    job_name = Column(String(100), primary_key=True)
+    watermark_date = Column(Date)  # business date the last run processed up to (exclusive)
+    watermark_at = Column(DateTime)  # start time of the last successful run
+    last_run_at = Column(DateTime)
+    last_result = Column(JSON)
+
+
+class SequenceCounter(TenantBase):
+    """Last number handed out per named sequence (member numbers per branch, branch/staff/loan codes).
+
+    Allocated by services/sequences.py with an atomic UPDATE ... RETURNING, so the
+    row lock serializes concurrent allocations until the allocating transaction ends.
+    """
+    __tablename__ = "sequence_counters"
+
+    name = Column(String(100), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class PaymentReference(TenantBase):
+    """Normalized payment references (member number, loan number, phone) -> member/loan, for M-Pesa matching.
+
+    Rows are maintained by the Member and LoanApplication mapper events below.
+    """
+    __tablename__ = "payment_references"
+
+    kind = Column(String(10), primary_key=True)  # member, loan, phone
+    ref_key = Column(String(100), primary_key=True)  # normalize_reference() / normalize_phone()
+    member_id = Column(String, ForeignKey("members.id", ondelete="CASCADE"), primary_key=True, index=True)
+    loan_id = Column(String, ForeignKey("loan_applications.id", ondelete="CASCADE"), index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+def normalize_reference(value) -> str:
+    """Account reference as typed into M-Pesa, compared case-insensitively without surrounding spaces"""
+    return (value or "").strip().upper()
+
+
+def _member_reference_rows(member) -> list:
+    rows = []
+    if normalize_reference(member.member_number):
+        rows.append({"kind": "member", "ref_key": normalize_reference(member.member_number)})
+    if member.phone_normalized:
+        rows.append({"kind": "phone", "ref_key": member.phone_normalized})
+    return [dict(row, member_id=member.id, loan_id=None, updated_at=datetime.utcnow()) for row in rows]
+
+
+@event.listens_for(Member, "after_insert")
+@event.listens_for(Member, "after_update")
+def _sync_member_references(mapper, connection, member):
+    state = inspect(member)
+    if not (state.attrs.member_number.history.has_changes() or state.attrs.phone_normalized.history.has_changes()):
+        return
+    table = PaymentReference.__table__
+    connection.execute(table.delete().where(table.c.member_id == member.id, table.c.kind.in_(["member", "phone"])))
+    rows = _member_reference_rows(member)
+    if rows:
+        connection.execute(table.insert(), rows)
+
+
+@event.listens_for(LoanApplication, "after_insert")
+@event.listens_for(LoanApplication, "after_update")
+def _sync_loan_reference(mapper, connection, loan):
+    state = inspect(loan)
+    if not (state.attrs.application_number.history.has_changes() or state.attrs.member_id.history.has_changes()):
+        return
+    table = PaymentReference.__table__
+    connection.execute(table.delete().where(table.c.loan_id == loan.id))
+    ref_key = normalize_reference(loan.application_number)
+    if ref_key and loan.member_id:
+        connection.execute(table.insert(), [{
+            "kind": "loan", "ref_key": ref_key, "member_id": loan.member_id,
+            "loan_id": loan.id, "updated_at": datetime.utcnow(),
+        }])
+
+
+@event.listens_for(Member, "before_delete")
+@event.listens_for(LoanApplication, "before_delete")
+def _drop_references(mapper, connection, target):
+    table = PaymentReference.__table__
+    column = table.c.member_id if isinstance(target, Member) else table.c.loan_id
+    connection.execute(table.delete().where(column == target.id))
+
+
+class MemberBalanceSnapshot(TenantBase):
+    """Member savings/shares/deposits balance at the end of a month (latest transaction of the month).
+
+    The current month's row follows every transaction (Transaction after_insert event
+    below); cron_member_balance_snapshots rebuilds closed months. Read through
+    services/balance_snapshots.py.
+    """
+    __tablename__ = "member_balance_snapshots"
+
+    member_id = Column(String, ForeignKey("members.id", ondelete="CASCADE"), primary_key=True)
+    account_type = Column(String(20), primary_key=True)
+    month = Column(Date, primary_key=True)  # first day of the month
+    balance = Column(Numeric(15, 2), nullable=False, default=0)
+    last_transaction_id = Column(String)
+    last_transaction_at = Column(DateTime)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+@event.listens_for(Transaction, "after_insert")
+def _track_member_balance(mapper, connection, txn):
+    from services.balance_snapshots import record_transaction
+    record_transaction(connection, txn)
+
+
+class AuditLogDaily(TenantBase):
+    """Audit log counts per day, action, entity type and staff (services/audit_retention.py).
+
+    Serves the audit summary, and keeps counting days whose logs were archived.
+    Missing entity type or staff are stored as "".
+    """
+    __tablename__ = "audit_log_daily"
+
+    day = Column(Date, primary_key=True)
+    action = Column(String(100), primary_key=True)
+    entity_type = Column(String(100), primary_key=True, default="")
+    staff_id = Column(String, primary_key=True, default="")
+    count = Column(Integer, nullable=False, default=0)
+
+
+class AuditLogArchive(TenantBase):
+    """Manifest entry for one compressed JSONL file of audit logs moved out of audit_logs."""
+    __tablename__ = "audit_log_archives"
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    month = Column(Date, nullable=False, index=True)  # first day of the archived month
+    file_path = Column(String(500), nullable=False)
+    row_count = Column(Integer, nullable=False, default=0)
+    file_size = Column(Integer)
+    sha256 = Column(String(64))
+    first_at = Column(DateTime)
+    last_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class CashPositionSnapshot(TenantBase):
+    """A branch's or a teller's cash position frozen at the end of a day (services/cash_position.py).
+
+    staff_id "" is the branch row (vault, teller total); the other rows are one per
+    teller float of the day. Past daily cash position reports read these rows only.
+    """
+    __tablename__ = "cash_position_snapshots"
+
+    snapshot_date = Column(Date, primary_key=True)
+    branch_id = Column(String, primary_key=True)
+    staff_id = Column(String, primary_key=True, default="")
+    staff_name = Column(String(255))
+    teller_float_id = Column(String)
+    vault_balance = Column(Numeric(15, 2), default=0)
+    opening_balance = Column(Numeric(15, 2), default=0)
+    current_balance = Column(Numeric(15, 2), default=0)
+    deposits = Column(Numeric(15, 2), default=0)
+    withdrawals = Column(Numeric(15, 2), default=0)
+    teller_count = Column(Integer, default=0)
+    status = Column(String(50))
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+@event.listens_for(Transaction, "after_insert")
+@event.listens_for(FloatTransaction, "after_insert")
+@event.listens_for(TellerFloat, "after_insert")
+@event.listens_for(TellerFloat, "after_update")
+@event.listens_for(InAppNotification, "after_insert")
+@event.listens_for(QueueTicket, "after_insert")
+@event.listens_for(QueueTicket, "after_update")
+@event.listens_for(Role, "after_insert")
+@event.listens_for(Role, "after_update")
+@event.listens_for(Role, "after_delete")
+@event.listens_for(RolePermission, "after_insert")
+@event.listens_for(RolePermission, "after_delete")
+def _emit_tenant_event(mapper, connection, target):
+    # Sent to other workers and browsers when the session commits (services/event_bus.py)
+    from services.event_bus import emit_for
+    emit_for(target)
@@ -8,11 +8,13 @@ from models.database import get_db
 from models.tenant import Member, LoanApplication, LoanRepayment, LoanInstalment, Transaction, Branch, Staff, LoanDefault, CollateralItem, LoanProduct, Attendance, DisciplinaryRecord
 from routes.auth import get_current_user
 from routes.common import get_tenant_session_context, require_permission
+from services.portfolio_snapshot import aging_summary, par_ratios
+from services.partitioning import date_bounds
 
 router = APIRouter()
 
 @router.get("/{org_id}/analytics/dashboard")
-async def get_dashboard_analytics(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_dashboard_analytics(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "dashboard:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -79,7 +81,7 @@ async def get_dashboard_analytics(org_id: str, user=Depends(get_current_user), d
         tenant_ctx.close()
 
 @router.get("/{org_id}/analytics/branches")
-async def get_branch_performance(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_branch_performance(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "analytics:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -241,7 +243,7 @@ def _compute_score(role: str, loans_processed: int, loans_approved: int, loans_r
     }
 
 @router.get("/{org_id}/analytics/staff")
-async def get_staff_performance(org_id: str, period: str = "this_month", user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_staff_performance(org_id: str, period: str = "this_month", user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "analytics:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -303,10 +305,7 @@ async def get_staff_performance(org_id: str, period: str = "this_month", user=De
                 total_collected = Decimal("0")
 
             txn_q = tenant_session.query(Transaction).filter(Transaction.processed_by_id == staff.id)
-            if start_date:
-                txn_q = txn_q.filter(func.date(Transaction.created_at) >= start_date)
-            if end_date:
-                txn_q = txn_q.filter(func.date(Transaction.created_at) <= end_date)
+            txn_q = txn_q.filter(*date_bounds(Transaction.created_at, start_date, end_date))
             txns = txn_q.all()
             transactions_processed = len(txns)
             transaction_volume = float(sum(t.amount or Decimal("0") for t in txns))
@@ -379,7 +378,7 @@ async def get_staff_performance(org_id: str, period: str = "this_month", user=De
         tenant_ctx.close()
 
 @router.get("/{org_id}/analytics/trends")
-async def get_trends(org_id: str, period: str = "monthly", user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_trends(org_id: str, period: str = "monthly", user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "analytics:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -439,24 +438,35 @@ async def get_trends(org_id: str, period: str = "monthly", user=Depends(get_curr
         tenant_ctx.close()
 
 @router.get("/{org_id}/analytics/institution-health")
-async def get_institution_health(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_institution_health(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "analytics:read", db)
     tenant_session = tenant_ctx.create_session()
     try:
-        members = tenant_session.query(Member).filter(Member.is_active == True).all()
-        total_member_funds = sum(
-            (m.savings_balance or Decimal("0")) + 
-            (m.shares_balance or Decimal("0")) + 
-            (m.deposits_balance or Decimal("0")) 
-            for m in members
-        )
+        member_row = tenant_session.query(
+            func.count(Member.id),
+            func.coalesce(func.sum(Member.savings_balance), 0),
+            func.coalesce(func.sum(Member.shares_balance), 0),
+            func.coalesce(func.sum(Member.deposits_balance), 0),
+        ).filter(Member.is_active == True).first()
+        active_members = int(member_row[0] or 0)
+        total_savings = Decimal(str(member_row[1]))
+        total_member_funds = total_savings + Decimal(str(member_row[2])) + Decimal(str(member_row[3]))
         
-        loans = tenant_session.query(LoanApplication).filter(LoanApplication.status == "disbursed").all()
-        total_loan_portfolio = sum(l.outstanding_balance or Decimal("0") for l in loans)
+        loan_row = tenant_session.query(
+            func.count(LoanApplication.id),
+            func.coalesce(func.sum(LoanApplication.outstanding_balance), 0),
+            func.coalesce(func.sum(LoanApplication.amount), 0),
+        ).filter(LoanApplication.status == "disbursed").first()
+        active_loans = int(loan_row[0] or 0)
+        total_loan_portfolio = Decimal(str(loan_row[1]))
         
-        defaults = tenant_session.query(LoanDefault).filter(LoanDefault.status.in_(["overdue", "in_collection"])).all()
-        total_at_risk = sum(d.amount_overdue for d in defaults)
+        default_row = tenant_session.query(
+            func.count(LoanDefault.id),
+            func.coalesce(func.sum(LoanDefault.amount_overdue), 0),
+        ).filter(LoanDefault.status.in_(["overdue", "in_collection"])).first()
+        default_count = int(default_row[0] or 0)
+        total_at_risk = Decimal(str(default_row[1]))
         
         if total_loan_portfolio > 0:
             par_ratio = float(total_at_risk / total_loan_portfolio * 100)
@@ -469,15 +479,17 @@ async def get_institution_health(org_id: str, user=Depends(get_current_user), db
             loan_to_deposit_ratio = 0
         
         today = date.today()
+        aging = par_ratios(aging_summary(tenant_session, today)["buckets"])
 
         # Collection efficiency based on instalments that were actually due up to today
-        loan_ids = [l.id for l in loans]
-        if loan_ids:
+        if active_loans:
             due_row = tenant_session.query(
                 func.sum(LoanInstalment.expected_principal + LoanInstalment.expected_interest),
                 func.sum(LoanInstalment.paid_principal + LoanInstalment.paid_interest),
+            ).join(
+                LoanApplication, LoanApplication.id == LoanInstalment.loan_id
             ).filter(
-                LoanInstalment.loan_id.in_(loan_ids),
+                LoanApplication.status == "disbursed",
                 LoanInstalment.due_date <= today,
             ).first()
             expected_due = Decimal(str(due_row[0] or 0))
@@ -510,17 +522,19 @@ async def get_institution_health(org_id: str, user=Depends(get_current_user), db
                 "total_loan_portfolio": float(total_loan_portfolio),
                 "portfolio_at_risk": float(total_at_risk),
                 "par_ratio": round(par_ratio, 2),
+                "par30_ratio": aging["par30"],
+                "par90_ratio": aging["par90"],
                 "loan_to_deposit_ratio": round(loan_to_deposit_ratio, 2),
                 "collection_efficiency": round(collection_efficiency, 2)
             },
             "member_stats": {
-                "total_active": len(members),
-                "average_savings": float(sum(m.savings_balance or Decimal("0") for m in members) / len(members)) if members else 0
+                "total_active": active_members,
+                "average_savings": float(total_savings / active_members) if active_members else 0
             },
             "loan_stats": {
-                "active_loans": len(loans),
-                "average_loan_size": float(sum(l.amount for l in loans) / len(loans)) if loans else 0,
-                "default_count": len(defaults)
+                "active_loans": active_loans,
+                "average_loan_size": float(Decimal(str(loan_row[2])) / active_loans) if active_loans else 0,
+                "default_count": default_count
             }
         }
     finally:
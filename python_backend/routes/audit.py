@@ -1,13 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from typing import List
 from datetime import datetime, date, timedelta
 from models.database import get_db
-from models.tenant import AuditLog, Staff
+from models.tenant import AuditLog, AuditLogArchive, Staff
 from schemas.tenant import AuditLogResponse
 from routes.auth import get_current_user
 from routes.common import get_tenant_session_context, require_permission, require_role
+from services.pagination import COUNT_MODE_PATTERN, count_rows, cursor_page_meta, keyset_page
+from services.branch_scope import scope_staff_records
+from services.partitioning import date_bounds
+from services.audit_retention import audit_summary
 
 router = APIRouter()
 
@@ -105,7 +111,7 @@ def format_audit_details(log: AuditLog) -> str:
     return " | ".join(details) if details else "-"
 
 @router.get("/{org_id}/audit-logs")
-async def list_audit_logs(
+def list_audit_logs(
     org_id: str, 
     staff_id: str = None,
     entity_type: str = None,
@@ -115,6 +121,8 @@ async def list_audit_logs(
     end_date: date = None,
     limit: int = 20,
     page: int = 1,
+    cursor: str = None,
+    count: str = Query(None, pattern=COUNT_MODE_PATTERN),
     user=Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -132,10 +140,7 @@ async def list_audit_logs(
         
         # Filter audit logs by branch - staff can only see logs from their branch's staff
         user_branch_id = get_branch_filter(user)
-        if user_branch_id:
-            # Get staff IDs from user's branch
-            branch_staff_ids = [s.id for s in tenant_session.query(Staff).filter(Staff.branch_id == user_branch_id).all()]
-            query = query.filter(AuditLog.staff_id.in_(branch_staff_ids))
+        query = scope_staff_records(query, AuditLog.staff_id, user_branch_id)
         
         if staff_id:
             query = query.filter(AuditLog.staff_id == staff_id)
@@ -154,18 +159,28 @@ async def list_audit_logs(
                     cast(AuditLog.new_values, String).ilike(search_pattern)
                 )
             )
-        if start_date:
-            query = query.filter(func.date(AuditLog.created_at) >= start_date)
-        if end_date:
-            query = query.filter(func.date(AuditLog.created_at) <= end_date)
+        query = query.filter(*date_bounds(AuditLog.created_at, start_date, end_date))
         
-        # Get total count for pagination
-        total = query.count()
-        
-        # Calculate offset from page
-        offset = (page - 1) * limit
-        
-        logs = query.order_by(AuditLog.created_at.desc()).offset(offset).limit(limit).all()
+        if cursor is not None:
+            logs, next_cursor = keyset_page(query, AuditLog.created_at, AuditLog.id, cursor, limit)
+            pagination = {
+                "limit": limit,
+                **cursor_page_meta(tenant_session, query, cursor, next_cursor, count),
+            }
+        else:
+            # Get total count for pagination
+            total, _ = count_rows(tenant_session, query, count or "exact")
+            
+            # Calculate offset from page
+            offset = (page - 1) * limit
+            
+            logs = query.order_by(AuditLog.created_at.desc(), AuditLog.id.desc()).offset(offset).limit(limit).all()
+            pagination = {
+                "total": total,
+                "page": page,
+                "limit": limit,
+                "total_pages": (total + limit - 1) // limit if total is not None else None,
+            }
         
         # Build response with staff info and details
         result = []
@@ -191,17 +206,14 @@ async def list_audit_logs(
         
         return {
             "logs": result,
-            "total": total,
-            "page": page,
-            "limit": limit,
-            "total_pages": (total + limit - 1) // limit
+            **pagination,
         }
     finally:
         tenant_session.close()
         tenant_ctx.close()
 
 @router.get("/{org_id}/audit-logs/entity/{entity_type}/{entity_id}")
-async def get_entity_audit_trail(org_id: str, entity_type: str, entity_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_entity_audit_trail(org_id: str, entity_type: str, entity_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "audit:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -229,56 +241,38 @@ async def get_entity_audit_trail(org_id: str, entity_type: str, entity_id: str,
         tenant_ctx.close()
 
 @router.get("/{org_id}/audit-logs/summary")
-async def get_audit_summary(org_id: str, days: int = 30, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_audit_summary(org_id: str, days: int = 30, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "audit:read", db)
     tenant_session = tenant_ctx.create_session()
     try:
         start_date = date.today() - timedelta(days=days)
+        summary = audit_summary(tenant_session, start_date)
         
-        total_logs = tenant_session.query(func.count(AuditLog.id)).filter(
-            func.date(AuditLog.created_at) >= start_date
-        ).scalar() or 0
-        
-        by_action = tenant_session.query(
-            AuditLog.action,
-            func.count(AuditLog.id)
-        ).filter(
-            func.date(AuditLog.created_at) >= start_date
-        ).group_by(AuditLog.action).all()
-        
-        by_entity = tenant_session.query(
-            AuditLog.entity_type,
-            func.count(AuditLog.id)
-        ).filter(
-            func.date(AuditLog.created_at) >= start_date,
-            AuditLog.entity_type.isnot(None)
-        ).group_by(AuditLog.entity_type).all()
-        
-        by_staff = tenant_session.query(
-            Staff.first_name,
-            Staff.last_name,
-            func.count(AuditLog.id)
-        ).join(Staff, AuditLog.staff_id == Staff.id).filter(
-            func.date(AuditLog.created_at) >= start_date
-        ).group_by(Staff.id, Staff.first_name, Staff.last_name).limit(10).all()
+        top = sorted(summary["by_staff"].items(), key=lambda item: item[1], reverse=True)
+        names = {
+            s.id: f"{s.first_name} {s.last_name}"
+            for s in tenant_session.query(Staff.id, Staff.first_name, Staff.last_name).filter(
+                Staff.id.in_([staff_id for staff_id, _ in top])
+            ).all()
+        } if top else {}
         
         return {
             "period_days": days,
-            "total_logs": total_logs,
-            "by_action": {action: count for action, count in by_action},
-            "by_entity": {entity: count for entity, count in by_entity if entity},
+            "total_logs": summary["total"],
+            "by_action": summary["by_action"],
+            "by_entity": summary["by_entity"],
             "top_staff": [
-                {"name": f"{first} {last}", "actions": count}
-                for first, last, count in by_staff
-            ]
+                {"name": names[staff_id], "actions": count}
+                for staff_id, count in top if staff_id in names
+            ][:10]
         }
     finally:
         tenant_session.close()
         tenant_ctx.close()
 
 @router.get("/{org_id}/audit-logs/staff/{staff_id}/activity")
-async def get_staff_activity(org_id: str, staff_id: str, days: int = 30, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_staff_activity(org_id: str, staff_id: str, days: int = 30, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "audit:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -291,7 +285,7 @@ async def get_staff_activity(org_id: str, staff_id: str, days: int = 30, user=De
         
         logs = tenant_session.query(AuditLog).filter(
             AuditLog.staff_id == staff_id,
-            func.date(AuditLog.created_at) >= start_date
+            *date_bounds(AuditLog.created_at, start=start_date)
         ).order_by(AuditLog.created_at.desc()).all()
         
         by_date = {}
@@ -314,8 +308,44 @@ async def get_staff_activity(org_id: str, staff_id: str, days: int = 30, user=De
         tenant_session.close()
         tenant_ctx.close()
 
+@router.get("/{org_id}/audit-logs/archives")
+def list_audit_archives(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    """Manifest of audit log months moved out of the live table by the retention job"""
+    tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
+    require_permission(membership, "audit:read", db)
+    tenant_session = tenant_ctx.create_session()
+    try:
+        archives = tenant_session.query(AuditLogArchive).order_by(AuditLogArchive.month.desc(), AuditLogArchive.created_at).all()
+        return [{
+            "id": a.id,
+            "month": a.month.strftime("%Y-%m"),
+            "row_count": a.row_count,
+            "file_size": a.file_size,
+            "sha256": a.sha256,
+            "first_at": a.first_at.isoformat() if a.first_at else None,
+            "last_at": a.last_at.isoformat() if a.last_at else None,
+            "archived_at": a.created_at.isoformat() if a.created_at else None,
+        } for a in archives]
+    finally:
+        tenant_session.close()
+        tenant_ctx.close()
+
+@router.get("/{org_id}/audit-logs/archives/{archive_id}/download")
+def download_audit_archive(org_id: str, archive_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
+    require_permission(membership, "audit:read", db)
+    tenant_session = tenant_ctx.create_session()
+    try:
+        archive = tenant_session.query(AuditLogArchive).filter(AuditLogArchive.id == archive_id).first()
+        if not archive or not os.path.exists(archive.file_path):
+            raise HTTPException(status_code=404, detail="Archive not found")
+        return FileResponse(archive.file_path, media_type="application/gzip", filename=os.path.basename(archive.file_path))
+    finally:
+        tenant_session.close()
+        tenant_ctx.close()
+
 @router.get("/{org_id}/audit-logs/{log_id}")
-async def get_audit_log(org_id: str, log_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_audit_log(org_id: str, log_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "audit:read", db)
     tenant_session = tenant_ctx.create_session()
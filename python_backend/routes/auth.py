@@ -118,6 +118,18 @@ class AuthContext:
             return f"{self.staff.first_name} {self.staff.last_name}"
         return self.user.name
 
+def _keep_for_request(request: Request, tenant_ctx, tenant_session):
+    """Keep the staff member's tenant session open for the rest of the request"""
+    from services.tenant_context import RequestSession
+    
+    if isinstance(tenant_session, RequestSession):
+        # Lent by the request's unit of work, which closes it when the handler returns
+        tenant_session.pin()
+    else:
+        # Closed by timing_middleware
+        request.state.tenant_session = tenant_session
+        request.state.tenant_ctx = tenant_ctx
+
 def get_current_user(request: Request, db: Session = Depends(get_db)):
     from services.tenant_context import get_tenant_context_simple
     
@@ -154,9 +166,7 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
             # Get branch info
             branch = tenant_session.query(Branch).filter(Branch.id == staff.branch_id).first() if staff.branch_id else None
             
-            # Store tenant_session in request state for later use
-            request.state.tenant_session = tenant_session
-            request.state.tenant_ctx = tenant_ctx
+            _keep_for_request(request, tenant_ctx, tenant_session)
             
             return AuthContext(
                 staff=staff, 
@@ -203,13 +213,14 @@ def get_optional_user(request: Request, db: Session = Depends(get_db)):
             return None
         
         tenant_session = tenant_ctx.create_session()
+        kept = False
         try:
             from models.tenant import Branch
             staff = get_staff_by_session(tenant_session, token)
             if staff:
                 branch = tenant_session.query(Branch).filter(Branch.id == staff.branch_id).first() if staff.branch_id else None
-                request.state.tenant_session = tenant_session
-                request.state.tenant_ctx = tenant_ctx
+                _keep_for_request(request, tenant_ctx, tenant_session)
+                kept = True
                 return AuthContext(
                     staff=staff, 
                     organization_id=org_id, 
@@ -221,7 +232,7 @@ def get_optional_user(request: Request, db: Session = Depends(get_db)):
         except:
             pass
         finally:
-            if not hasattr(request.state, 'tenant_session'):
+            if not kept:
                 tenant_session.close()
                 tenant_ctx.close()
         return None
@@ -455,7 +466,7 @@ def get_staff_by_session(tenant_session, token: str):
     return tenant_session.query(Staff).filter(Staff.id == session.staff_id).first()
 
 @router.post("/login")
-async def login(data: UserLogin, request: Request, response: Response, db: Session = Depends(get_db)):
+def login(data: UserLogin, request: Request, response: Response, db: Session = Depends(get_db)):
     from middleware.rate_limit import check_login_rate_limit
     check_login_rate_limit(request)
     from services.tenant_context import get_tenant_context_simple
@@ -572,7 +583,7 @@ class StaffLogin(BaseModel):
     password: str
 
 @router.post("/staff-login")
-async def staff_login(data: StaffLogin, response: Response, db: Session = Depends(get_db)):
+def staff_login(data: StaffLogin, response: Response, db: Session = Depends(get_db)):
     """Login as staff using tenant database credentials"""
     from services.tenant_context import get_tenant_context_simple
     from models.tenant import Staff
@@ -649,7 +660,7 @@ async def staff_login(data: StaffLogin, response: Response, db: Session = Depend
         tenant_ctx.close()
 
 @router.post("/logout")
-async def logout(request: Request, response: Response, db: Session = Depends(get_db)):
+def logout(request: Request, response: Response, db: Session = Depends(get_db)):
     from services.tenant_context import get_tenant_context_simple
     from models.tenant import StaffSession, Staff
     from routes.audit import create_audit_log
@@ -744,7 +755,7 @@ async def forgot_password(data: ForgotPasswordRequest, request: Request, db: Ses
     return {"message": "If an account exists with that email, we've sent a password reset link."}
 
 @router.post("/reset-password")
-async def reset_password(data: ResetPasswordRequest, db: Session = Depends(get_db)):
+def reset_password(data: ResetPasswordRequest, db: Session = Depends(get_db)):
     from models.master import PasswordResetToken, User
     from services.auth import hash_password
     
@@ -767,7 +778,7 @@ async def reset_password(data: ResetPasswordRequest, db: Session = Depends(get_d
     return {"message": "Password has been reset successfully"}
 
 @router.get("/verify-reset-token/{token}")
-async def verify_reset_token(token: str, db: Session = Depends(get_db)):
+def verify_reset_token(token: str, db: Session = Depends(get_db)):
     from models.master import PasswordResetToken
     
     reset_token = db.query(PasswordResetToken).filter(
@@ -965,7 +976,7 @@ async def send_verification_email(request: Request, auth: AuthContext = Depends(
     return {"message": "Verification email sent successfully"}
 
 @router.get("/verify-email/{token}")
-async def verify_email(token: str, db: Session = Depends(get_db)):
+def verify_email(token: str, db: Session = Depends(get_db)):
     from models.master import EmailVerificationToken, User
     
     verification_token = db.query(EmailVerificationToken).filter(
@@ -987,11 +998,11 @@ async def verify_email(token: str, db: Session = Depends(get_db)):
     return {"message": "Email verified successfully", "verified": True}
 
 @router.post("/skip-email-verification")
-async def skip_email_verification(auth: AuthContext = Depends(get_current_user)):
+def skip_email_verification(auth: AuthContext = Depends(get_current_user)):
     return {"message": "Email verification skipped"}
 
 @router.get("/me")
-async def get_me(auth: AuthContext = Depends(get_current_user)):
+def get_me(auth: AuthContext = Depends(get_current_user)):
     if auth.is_staff:
         return {
             "id": auth.staff.id,
@@ -1009,7 +1020,7 @@ async def get_me(auth: AuthContext = Depends(get_current_user)):
     return UserResponse.model_validate(auth.user)
 
 @router.get("/user")
-async def get_user_optional(auth = Depends(get_optional_user)):
+def get_user_optional(auth = Depends(get_optional_user)):
     if not auth:
         return None
     
@@ -1030,7 +1041,7 @@ async def get_user_optional(auth = Depends(get_optional_user)):
     return UserResponse.model_validate(auth.user)
 
 @router.get("/permissions/{org_id}")
-async def get_user_permissions(org_id: str, auth = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_user_permissions(org_id: str, auth = Depends(get_current_user), db: Session = Depends(get_db)):
     from models.master import OrganizationMember, Organization
     from models.tenant import Role, RolePermission
     from services.tenant_context import get_tenant_context, get_tenant_context_simple
@@ -1172,7 +1183,7 @@ async def activate_license(request: Request, auth = Depends(get_current_user), d
 
 
 @router.get("/session/{org_id}")
-async def get_session_bundle(org_id: str, auth = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_session_bundle(org_id: str, auth = Depends(get_current_user), db: Session = Depends(get_db)):
     from models.master import OrganizationMember, Organization
     from models.tenant import Role, RolePermission
     from services.tenant_context import get_tenant_context, get_tenant_context_simple
@@ -1401,7 +1412,7 @@ class MemberActivateRequest(BaseModel):
     account_number: str
 
 @router.post("/member/activate")
-async def member_activate(data: MemberActivateRequest, db: Session = Depends(get_db)):
+def member_activate(data: MemberActivateRequest, db: Session = Depends(get_db)):
     """Step 1: Member enters account number to start mobile banking activation.
     Validates account exists, has a phone number, and sends OTP."""
     
@@ -1449,7 +1460,7 @@ class MemberVerifyOTPRequest(BaseModel):
     pin_confirm: str
 
 @router.post("/member/verify-otp")
-async def member_verify_otp(data: MemberVerifyOTPRequest, db: Session = Depends(get_db)):
+def member_verify_otp(data: MemberVerifyOTPRequest, db: Session = Depends(get_db)):
     """Step 2: Member verifies OTP and sets their PIN to complete activation."""
     from services.auth import hash_password
     
@@ -1497,7 +1508,7 @@ class MemberLoginRequest(BaseModel):
     pin: str
 
 @router.post("/member/login")
-async def member_login(data: MemberLoginRequest, db: Session = Depends(get_db)):
+def member_login(data: MemberLoginRequest, db: Session = Depends(get_db)):
     """Step 1 of login: Member enters account number + PIN, receives OTP to phone."""
     
     member, org, tenant_session, tenant_ctx = _find_member_across_tenants(data.account_number, db)
@@ -1540,7 +1551,7 @@ class MemberLoginVerifyRequest(BaseModel):
     otp: str
 
 @router.post("/member/login-verify")
-async def member_login_verify(data: MemberLoginVerifyRequest, response: Response, db: Session = Depends(get_db)):
+def member_login_verify(data: MemberLoginVerifyRequest, response: Response, db: Session = Depends(get_db)):
     """Step 2 of login: Member verifies OTP to complete login."""
     import secrets as secrets_mod
     
@@ -1604,7 +1615,7 @@ class MemberResendOTPRequest(BaseModel):
     account_number: str
 
 @router.post("/member/resend-otp")
-async def member_resend_otp(data: MemberResendOTPRequest, db: Session = Depends(get_db)):
+def member_resend_otp(data: MemberResendOTPRequest, db: Session = Depends(get_db)):
     """Resend OTP to member's phone (for activation or login)."""
     
     member, org, tenant_session, tenant_ctx = _find_member_across_tenants(data.account_number, db)
@@ -10,7 +10,7 @@ from middleware.demo_guard import require_not_demo
 router = APIRouter()
 
 @router.get("/{org_id}/branches")
-async def get_branches(
+def get_branches(
     org_id: str,
     user = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -25,7 +25,7 @@ async def get_branches(
         tenant_ctx.close()
 
 @router.post("/{org_id}/branches")
-async def create_branch(
+def create_branch(
     org_id: str,
     data: BranchCreate,
     user = Depends(get_current_user),
@@ -57,7 +57,7 @@ async def create_branch(
         tenant_ctx.close()
 
 @router.patch("/{org_id}/branches/{branch_id}")
-async def update_branch(
+def update_branch(
     org_id: str,
     branch_id: str,
     data: BranchUpdate,
@@ -86,7 +86,7 @@ async def update_branch(
         tenant_ctx.close()
 
 @router.delete("/{org_id}/branches/{branch_id}", dependencies=[Depends(require_not_demo)])
-async def delete_branch(
+def delete_branch(
     org_id: str,
     branch_id: str,
     user = Depends(get_current_user),
@@ -952,7 +952,7 @@ def delete_insurance(
 
 
 @router.post("/{organization_id}/collateral/insurance/{policy_id}/upload-document", dependencies=[Depends(require_not_demo)])
-async def upload_insurance_document(
+def upload_insurance_document(
     organization_id: str,
     policy_id: str,
     file: UploadFile = File(...),
@@ -1331,7 +1331,7 @@ def delete_valuer(
 # ── Valuation Document Upload ──────────────────────────────────────────────────
 
 @router.post("/{organization_id}/collateral/items/{item_id}/upload-document", dependencies=[Depends(require_not_demo)])
-async def upload_valuation_document(
+def upload_valuation_document(
     organization_id: str,
     item_id: str,
     file: UploadFile = File(...),
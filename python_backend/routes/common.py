@@ -1,24 +1,30 @@
+import functools
+
+import anyio.from_thread
 from fastapi import Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from models.database import get_db
 from routes.auth import get_current_user
 from services.tenant_context import get_tenant_context, get_tenant_context_simple
+from services.sequences import allocate
+from services.event_bus import bus as event_bus
 
 def generate_code(db: Session, model, column_name: str, prefix: str) -> str:
     """Generate a code like BR01, ST01, MB01, etc."""
     column = getattr(model, column_name)
-    max_code = db.query(func.max(column)).scalar()
-    
-    if max_code and max_code.startswith(prefix):
-        try:
-            max_num = int(max_code[len(prefix):])
-            return f"{prefix}{max_num + 1:02d}"
-        except ValueError:
-            pass
-    
-    count = db.query(func.count(getattr(model, 'id'))).scalar() or 0
-    return f"{prefix}{count + 1:02d}"
+
+    def last_in_use() -> int:
+        max_code = db.query(func.max(column)).scalar()
+        if max_code and max_code.startswith(prefix):
+            try:
+                return int(max_code[len(prefix):])
+            except ValueError:
+                pass
+        return db.query(func.count(getattr(model, 'id'))).scalar() or 0
+
+    number = allocate(db, f"code:{model.__tablename__}.{column_name}:{prefix}", seed=last_in_use)
+    return f"{prefix}{number:02d}"
 
 
 def _luhn_check_digit(number_str: str) -> int:
@@ -53,11 +59,24 @@ def generate_account_number(db: Session, branch_code: str) -> str:
     
     Example: 0100000015  (branch 01, member 1, check digit 5)
     """
+    return generate_account_numbers(db, branch_code, 1)[0]
+
+
+def generate_account_numbers(db: Session, branch_code: str, count: int) -> list:
+    """Reserve count consecutive account numbers for a branch (see generate_account_number)."""
+    prefix = _extract_branch_number(branch_code)
+    first = allocate(db, f"member_number:{prefix}", count, seed=lambda: _max_member_sequence(db, prefix))
+    numbers = []
+    for seq in range(first, first + count):
+        base = f"{prefix}{seq:07d}"
+        numbers.append(f"{base}{_luhn_check_digit(base)}")
+    return numbers
+
+
+def _max_member_sequence(db: Session, prefix: str) -> int:
+    """Highest sequence used by a branch's account numbers (seeds its counter once)."""
     from models.tenant import Member
-    
-    branch_num = _extract_branch_number(branch_code)
-    
-    prefix = branch_num
+
     existing = db.query(Member.member_number).filter(
         Member.member_number.like(f"{prefix}%")
     ).all()
@@ -71,11 +90,7 @@ def generate_account_number(db: Session, branch_code: str) -> str:
                     max_seq = seq
             except ValueError:
                 continue
-    
-    next_seq = max_seq + 1
-    base = f"{prefix}{next_seq:07d}"
-    check = _luhn_check_digit(base)
-    return f"{base}{check}"
+    return max_seq
 
 class StaffMembership:
     """Synthetic membership object for staff users."""
@@ -272,6 +287,16 @@ def invalidate_permissions_cache(org_id: str = None, role_name: str = None):
         for k in keys_to_remove:
             _permissions_cache.pop(k, None)
 
+def _on_role_event(org_id, event_type, data, local):
+    # A role edited in another worker (or process) clears this worker's cached permissions
+    invalidate_permissions_cache(org_id)
+
+event_bus.on(("role",), _on_role_event)
+
+def run_async(func, *args, **kwargs):
+    """Call an async helper (M-Pesa, e-mail) from a sync handler: it runs on the event loop while the handler's thread waits"""
+    return anyio.from_thread.run(functools.partial(func, *args, **kwargs))
+
 def require_permission(membership, permission: str, db: Session = None):
     """Raise 403 if user doesn't have the required permission."""
     if not check_permission(membership, permission, db):
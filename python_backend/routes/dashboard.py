@@ -8,7 +8,7 @@ from routes.common import get_tenant_session_context, require_permission
 router = APIRouter()
 
 @router.get("/{org_id}/dashboard/stats")
-async def get_dashboard_stats(
+def get_dashboard_stats(
     org_id: str,
     user = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -5,11 +5,12 @@ from typing import List
 from decimal import Decimal
 from datetime import datetime, timedelta, date
 from models.database import get_db
-from models.tenant import LoanApplication, LoanDefault, Member, LoanRepayment, AuditLog, LoanInstalment, Transaction
+from models.tenant import LoanApplication, LoanDefault, Member, LoanRepayment, AuditLog, LoanInstalment, Transaction, JobWatermark
 from services.code_generator import generate_txn_code
 from schemas.tenant import LoanDefaultResponse, LoanDefaultUpdate, LoanDefaultLoanInfo, LoanDefaultMemberInfo
 from routes.auth import get_current_user
 from routes.common import get_tenant_session_context, require_permission
+from services.delinquency import DELINQUENCY_JOB, run_delinquency
 
 router = APIRouter()
 
@@ -34,184 +35,6 @@ def post_write_off_to_gl(tenant_session, loan, amount: Decimal, reason: str):
     )
     print(f"[GL] Posted loan write-off to GL: {loan.application_number}")
 
-def calculate_overdue_for_loan(loan):
-    """Calculate overdue using stored data: instalment minus partial payments.
-    Uses amount_repaid modulo instalment to find what's left on the current period."""
-    instalment = loan.monthly_repayment or Decimal("0")
-    if instalment <= 0:
-        return Decimal("0")
-    
-    amount_repaid = loan.amount_repaid or Decimal("0")
-    outstanding = loan.outstanding_balance or Decimal("0")
-    
-    partial_payment = amount_repaid % instalment
-    amount_owed = instalment - partial_payment if partial_payment > 0 else instalment
-    
-    return min(amount_owed, outstanding)
-
-def check_and_create_defaults(tenant_session):
-    """Detect overdue loans and create/update default records.
-    Uses batched queries to avoid N+1 performance issues."""
-    today = date.today()
-    from models.tenant import LoanInstalment
-    from collections import defaultdict
-
-    active_loans = tenant_session.query(LoanApplication).options(
-        joinedload(LoanApplication.loan_product)
-    ).filter(
-        LoanApplication.status.in_(["disbursed", "defaulted", "restructured"]),
-        LoanApplication.outstanding_balance > 0
-    ).all()
-
-    if not active_loans:
-        return
-
-    all_loan_ids_str = [str(loan.id) for loan in active_loans]
-
-    past_due_pending = tenant_session.query(LoanInstalment).filter(
-        LoanInstalment.loan_id.in_(all_loan_ids_str),
-        LoanInstalment.due_date < today,
-        LoanInstalment.status.in_(["pending", "partial"])
-    ).all()
-    for inst in past_due_pending:
-        if inst.status == "pending":
-            inst.status = "overdue"
-    if past_due_pending:
-        tenant_session.flush()
-
-    all_overdue_insts = tenant_session.query(LoanInstalment).filter(
-        LoanInstalment.loan_id.in_(all_loan_ids_str),
-        LoanInstalment.due_date < today,
-        LoanInstalment.status.in_(["overdue", "partial"])
-    ).order_by(LoanInstalment.due_date.asc()).all()
-
-    insts_by_loan = defaultdict(list)
-    for inst in all_overdue_insts:
-        insts_by_loan[inst.loan_id].append(inst)
-
-    overdue_loans = [l for l in active_loans if str(l.id) in insts_by_loan]
-
-    if not overdue_loans:
-        return
-
-    loan_ids = [loan.id for loan in overdue_loans]
-    existing_defaults = tenant_session.query(LoanDefault).filter(
-        LoanDefault.loan_id.in_(loan_ids),
-        LoanDefault.status.in_(["overdue", "in_collection"])
-    ).all()
-    defaults_by_loan = {d.loan_id: d for d in existing_defaults}
-
-    for loan in overdue_loans:
-        existing_default = defaults_by_loan.get(loan.id)
-        loan_insts = insts_by_loan.get(str(loan.id), [])
-
-        if loan_insts:
-            earliest_date = loan_insts[0].due_date
-            days_overdue = (today - earliest_date).days
-            amount_overdue = sum(
-                (i.expected_principal + i.expected_interest + i.expected_penalty) -
-                (i.paid_principal + i.paid_interest + i.paid_penalty)
-                for i in loan_insts
-            )
-        else:
-            days_overdue = (today - loan.next_payment_date).days if loan.next_payment_date and loan.next_payment_date < today else 0
-            amount_overdue = calculate_overdue_for_loan(loan)
-
-        if amount_overdue <= 0:
-            if existing_default:
-                existing_default.status = "resolved"
-                existing_default.resolved_at = datetime.utcnow()
-            continue
-
-        penalty_rate = Decimal("0")
-        if loan.loan_product and loan.loan_product.late_payment_penalty:
-            penalty_rate = loan.loan_product.late_payment_penalty
-
-        penalty_amount = amount_overdue * penalty_rate / Decimal("100")
-
-        if penalty_amount > 0 and loan_insts:
-            existing_penalty_on_insts = sum(
-                Decimal(str(i.expected_penalty or 0)) for i in loan_insts
-            )
-            new_penalty = penalty_amount - existing_penalty_on_insts
-            if new_penalty > Decimal("0.01"):
-                last_overdue = loan_insts[-1]
-                old_penalty = last_overdue.expected_penalty or Decimal("0")
-                last_overdue.expected_penalty = old_penalty + new_penalty
-                old_outstanding = loan.outstanding_balance or Decimal("0")
-                loan.outstanding_balance = old_outstanding + new_penalty
-
-                member = tenant_session.query(Member).filter(Member.id == loan.member_id).first()
-                member_name = f"{member.first_name} {member.last_name}" if member else "Unknown"
-
-                audit_log = AuditLog(
-                    staff_id=None,
-                    action="late_penalty_charged",
-                    entity_type="loan",
-                    entity_id=str(loan.id),
-                    old_values={
-                        "outstanding_balance": str(old_outstanding),
-                        "instalment_penalty": str(old_penalty),
-                        "instalment_number": last_overdue.instalment_number,
-                    },
-                    new_values={
-                        "penalty_charged": str(new_penalty),
-                        "penalty_rate": str(penalty_rate),
-                        "amount_overdue": str(amount_overdue),
-                        "outstanding_balance": str(loan.outstanding_balance),
-                        "instalment_penalty": str(last_overdue.expected_penalty),
-                        "loan_number": loan.application_number,
-                        "member": member_name,
-                        "reason": f"Late payment penalty ({penalty_rate}% on overdue amount {amount_overdue})",
-                    }
-                )
-                tenant_session.add(audit_log)
-
-                penalty_txn = Transaction(
-                    transaction_number=generate_txn_code(),
-                    member_id=str(member.id) if member else None,
-                    transaction_type="penalty_charge",
-                    account_type="loan",
-                    amount=new_penalty,
-                    reference=f"PENALTY-{today.strftime('%Y%m%d')}-{loan.application_number}",
-                    description=f"Late payment penalty ({penalty_rate}%) on overdue amount {amount_overdue} for loan {loan.application_number}"
-                )
-                tenant_session.add(penalty_txn)
-
-                try:
-                    from accounting.service import AccountingService
-                    svc = AccountingService(tenant_session)
-                    svc.seed_default_accounts()
-                    lines = [
-                        {"account_code": "1100", "debit": new_penalty, "credit": Decimal("0"), "loan_id": str(loan.id), "memo": f"Late penalty on {loan.application_number}"},
-                        {"account_code": "4020", "debit": Decimal("0"), "credit": new_penalty, "loan_id": str(loan.id), "memo": f"Penalty income - {loan.application_number}"},
-                    ]
-                    svc.create_journal_entry(
-                        entry_date=today,
-                        description=f"Late payment penalty - {loan.application_number} - {member_name} - {penalty_rate}% on overdue {amount_overdue}",
-                        lines=lines,
-                        source_type="penalty_charge",
-                        reference=f"PENALTY-{today.strftime('%Y%m%d')}-{loan.application_number}"
-                    )
-                except Exception as gl_err:
-                    print(f"  [GL] Warning: Failed to post penalty GL entry for {loan.application_number}: {gl_err}")
-
-        if not existing_default:
-            default_record = LoanDefault(
-                loan_id=loan.id,
-                days_overdue=days_overdue,
-                amount_overdue=amount_overdue,
-                penalty_amount=penalty_amount,
-                status="overdue"
-            )
-            tenant_session.add(default_record)
-        else:
-            existing_default.days_overdue = days_overdue
-            existing_default.amount_overdue = amount_overdue
-            existing_default.penalty_amount = penalty_amount
-
-    tenant_session.commit()
-
 def serialize_default_with_loan(d):
     data = {
         "id": str(d.id),
@@ -246,13 +69,11 @@ def serialize_default_with_loan(d):
     return data
 
 @router.get("/{org_id}/defaults")
-async def list_defaults(org_id: str, status: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_defaults(org_id: str, status: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "defaults:read", db)
     tenant_session = tenant_ctx.create_session()
     try:
-        check_and_create_defaults(tenant_session)
-        
         query = tenant_session.query(LoanDefault).options(
             joinedload(LoanDefault.loan).joinedload(LoanApplication.member)
         )
@@ -266,13 +87,11 @@ async def list_defaults(org_id: str, status: str = None, user=Depends(get_curren
         tenant_ctx.close()
 
 @router.get("/{org_id}/defaults/summary")
-async def get_defaults_summary(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_defaults_summary(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "defaults:read", db)
     tenant_session = tenant_ctx.create_session()
     try:
-        check_and_create_defaults(tenant_session)
-        
         active_filter = LoanDefault.status.in_(["overdue", "in_collection"])
         
         results = tenant_session.query(
@@ -305,8 +124,36 @@ async def get_defaults_summary(org_id: str, user=Depends(get_current_user), db:
         tenant_session.close()
         tenant_ctx.close()
 
+@router.post("/{org_id}/defaults/refresh")
+def refresh_defaults(org_id: str, full: bool = False, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    """Run the delinquency engine now instead of waiting for the scheduler"""
+    tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
+    require_permission(membership, "defaults:write", db)
+    tenant_session = tenant_ctx.create_session()
+    try:
+        return run_delinquency(tenant_session, full=full)
+    finally:
+        tenant_session.close()
+        tenant_ctx.close()
+
+@router.get("/{org_id}/defaults/status")
+def get_defaults_engine_status(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
+    require_permission(membership, "defaults:read", db)
+    tenant_session = tenant_ctx.create_session()
+    try:
+        mark = tenant_session.get(JobWatermark, DELINQUENCY_JOB)
+        return {
+            "last_run_at": mark.last_run_at if mark else None,
+            "processed_through": mark.watermark_date if mark else None,
+            "last_result": mark.last_result if mark else None,
+        }
+    finally:
+        tenant_session.close()
+        tenant_ctx.close()
+
 @router.get("/{org_id}/defaults/due-today")
-async def get_due_today(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_due_today(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "defaults:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -423,7 +270,7 @@ async def get_due_today(org_id: str, user=Depends(get_current_user), db: Session
         tenant_ctx.close()
 
 @router.get("/{org_id}/defaults/{default_id}")
-async def get_default(org_id: str, default_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_default(org_id: str, default_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "defaults:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -437,7 +284,7 @@ async def get_default(org_id: str, default_id: str, user=Depends(get_current_use
         tenant_ctx.close()
 
 @router.put("/{org_id}/defaults/{default_id}")
-async def update_default(org_id: str, default_id: str, data: LoanDefaultUpdate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def update_default(org_id: str, default_id: str, data: LoanDefaultUpdate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "defaults:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -474,7 +321,7 @@ async def update_default(org_id: str, default_id: str, data: LoanDefaultUpdate,
         tenant_ctx.close()
 
 @router.get("/{org_id}/loans/{loan_id}/defaults")
-async def get_loan_defaults(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_loan_defaults(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     tenant_session = tenant_ctx.create_session()
     try:
@@ -494,7 +341,7 @@ class WriteOffRequest(BaseModel):
     reason: str
 
 @router.post("/{org_id}/defaults/{default_id}/write-off")
-async def write_off_loan(org_id: str, default_id: str, data: WriteOffRequest, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def write_off_loan(org_id: str, default_id: str, data: WriteOffRequest, user=Depends(get_current_user), db: Session = Depends(get_db)):
     """Write off a defaulted loan as uncollectible"""
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "defaults:write", db)
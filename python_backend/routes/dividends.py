@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func
 from typing import List, Optional
 from decimal import Decimal
-from datetime import datetime, date
+from datetime import datetime, date, time, timedelta
 from pydantic import BaseModel
 
 from models.database import get_db
@@ -12,6 +12,7 @@ from routes.auth import get_current_user
 from routes.common import get_tenant_session_context, require_permission
 from routes.sms import send_sms
 from services.feature_flags import check_org_feature
+from services.balance_snapshots import balances_at, members_with_history, snapshots_ready
 
 router = APIRouter()
 
@@ -68,11 +69,25 @@ class MemberDividendResponse(BaseModel):
     class Config:
         from_attributes = True
 
+def _share_balances_at(tenant_session, effective_date: date, members) -> dict:
+    """Shares per member at the end of effective_date"""
+    current = {m.id: Decimal(str(m.shares_balance or 0)) for m in members}
+    if effective_date >= date.today() or not snapshots_ready(tenant_session):
+        return current
+    at = datetime.combine(effective_date + timedelta(days=1), time.min)
+    balances = balances_at(tenant_session, "shares", at)
+    # Members who never traded shares keep their (imported) current balance
+    tracked = members_with_history(tenant_session, "shares")
+    return {
+        m.id: Decimal(str(balances.get(m.id, 0))) if m.id in tracked or m.id in balances else current[m.id]
+        for m in members
+    }
+
 def post_dividend_to_gl(tenant_session, declaration, total_amount: Decimal, distribution_type: str):
     """Post dividend distribution to General Ledger. Raises exception on failure to ensure atomic transaction."""
     from accounting.service import AccountingService
     
-    svc = AccountingService(tenant_session)
+    svc = AccountingService(tenant_session, deferred=True)
     svc.seed_default_accounts()
     
     if distribution_type == "savings":
@@ -94,10 +109,12 @@ def post_dividend_to_gl(tenant_session, declaration, total_amount: Decimal, dist
         source_id=str(declaration.id),
         lines=lines
     )
+    # Written without committing: the caller commits it with the member credits
+    svc.flush()
     print(f"[GL] Posted dividend distribution to GL: FY{declaration.fiscal_year}")
 
 @router.get("/{org_id}/dividends")
-async def list_dividends(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_dividends(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     """List all dividend declarations"""
     if not check_org_feature(org_id, "dividends", db):
         raise HTTPException(status_code=403, detail="Dividends is not available in your subscription plan")
@@ -137,11 +154,12 @@ async def list_dividends(org_id: str, user=Depends(get_current_user), db: Sessio
         tenant_ctx.close()
 
 @router.post("/{org_id}/dividends/declare")
-async def declare_dividend(org_id: str, data: DividendDeclareRequest, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def declare_dividend(org_id: str, data: DividendDeclareRequest, user=Depends(get_current_user), db: Session = Depends(get_db)):
     """
-    Declare a new dividend. Member share balances are captured at declaration time
-    and stored for each member. The effective_date is used as the reference date for
-    record-keeping purposes. For accurate dividends, declare on or shortly after the effective date.
+    Declare a new dividend. Member share balances at the end of the effective_date
+    (month-end snapshot plus that month's transactions) are captured and stored for
+    each member. Until the first snapshot run, or for an effective date of today or
+    later, current balances are used.
     """
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "settings:write", db)
@@ -164,15 +182,14 @@ async def declare_dividend(org_id: str, data: DividendDeclareRequest, user=Depen
         
         staff = tenant_session.query(Staff).filter(Staff.email == user.email).first()
         
-        members = tenant_session.query(Member).filter(
-            Member.is_active == True,
-            Member.shares_balance > 0
-        ).all()
+        active_members = tenant_session.query(Member).filter(Member.is_active == True).all()
+        share_balances = _share_balances_at(tenant_session, data.effective_date, active_members)
+        members = [m for m in active_members if share_balances[m.id] > 0]
         
         if not members:
             raise HTTPException(status_code=400, detail="No eligible members found with share balance > 0")
         
-        total_shares = sum(Decimal(str(m.shares_balance or 0)) for m in members)
+        total_shares = sum(share_balances[m.id] for m in members)
         dividend_rate = Decimal(str(data.dividend_rate))
         total_dividend = total_shares * dividend_rate / Decimal("100")
         
@@ -192,7 +209,7 @@ async def declare_dividend(org_id: str, data: DividendDeclareRequest, user=Depen
         tenant_session.flush()
         
         for member in members:
-            member_shares = Decimal(str(member.shares_balance or 0))
+            member_shares = share_balances[member.id]
             member_dividend = member_shares * dividend_rate / Decimal("100")
             
             md = MemberDividend(
@@ -223,7 +240,7 @@ async def declare_dividend(org_id: str, data: DividendDeclareRequest, user=Depen
         tenant_ctx.close()
 
 @router.get("/{org_id}/dividends/{dividend_id}")
-async def get_dividend(org_id: str, dividend_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_dividend(org_id: str, dividend_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     """Get dividend declaration details"""
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "settings:read", db)
@@ -279,7 +296,7 @@ async def get_dividend(org_id: str, dividend_id: str, user=Depends(get_current_u
         tenant_ctx.close()
 
 @router.post("/{org_id}/dividends/{dividend_id}/approve")
-async def approve_dividend(org_id: str, dividend_id: str, data: DividendApproveRequest, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def approve_dividend(org_id: str, dividend_id: str, data: DividendApproveRequest, user=Depends(get_current_user), db: Session = Depends(get_db)):
     """Approve a dividend declaration (simulates AGM approval)"""
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "settings:write", db)
@@ -311,7 +328,7 @@ async def approve_dividend(org_id: str, dividend_id: str, data: DividendApproveR
         tenant_ctx.close()
 
 @router.post("/{org_id}/dividends/{dividend_id}/distribute")
-async def distribute_dividend(org_id: str, dividend_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def distribute_dividend(org_id: str, dividend_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     """Distribute dividend to all members (credit to savings/shares)"""
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "settings:write", db)
@@ -414,7 +431,7 @@ async def distribute_dividend(org_id: str, dividend_id: str, user=Depends(get_cu
         tenant_ctx.close()
 
 @router.post("/{org_id}/dividends/{dividend_id}/cancel")
-async def cancel_dividend(org_id: str, dividend_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def cancel_dividend(org_id: str, dividend_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     """Cancel a dividend declaration (only if not distributed)"""
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "settings:write", db)
@@ -444,7 +461,7 @@ async def cancel_dividend(org_id: str, dividend_id: str, user=Depends(get_curren
         tenant_ctx.close()
 
 @router.get("/{org_id}/dividends/member/{member_id}")
-async def get_member_dividend_history(org_id: str, member_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_member_dividend_history(org_id: str, member_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     """Get dividend history for a specific member"""
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     tenant_session = tenant_ctx.create_session()
@@ -35,7 +35,7 @@ def ensure_upload_dir(org_id: str, member_id: str):
     return path
 
 @router.get("/{org_id}/members/{member_id}/documents")
-async def get_member_documents(org_id: str, member_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_member_documents(org_id: str, member_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "members:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -140,7 +140,7 @@ async def upload_member_document(
         tenant_ctx.close()
 
 @router.get("/{org_id}/members/{member_id}/documents/{document_id}/file")
-async def get_document_file(org_id: str, member_id: str, document_id: str, download: int = 0, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_document_file(org_id: str, member_id: str, document_id: str, download: int = 0, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "members:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -171,7 +171,7 @@ async def get_document_file(org_id: str, member_id: str, document_id: str, downl
         tenant_ctx.close()
 
 @router.delete("/{org_id}/members/{member_id}/documents/{document_id}", dependencies=[Depends(require_not_demo)])
-async def delete_member_document(org_id: str, member_id: str, document_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_member_document(org_id: str, member_id: str, document_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "members:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -196,7 +196,7 @@ async def delete_member_document(org_id: str, member_id: str, document_id: str,
         tenant_ctx.close()
 
 @router.put("/{org_id}/members/{member_id}/documents/{document_id}/verify")
-async def verify_document(org_id: str, member_id: str, document_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def verify_document(org_id: str, member_id: str, document_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "members:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -223,7 +223,7 @@ async def verify_document(org_id: str, member_id: str, document_id: str, user=De
         tenant_ctx.close()
 
 @router.get("/{org_id}/document-types")
-async def get_document_types(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_document_types(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     return [{"value": key, "label": value} for key, value in DOCUMENT_TYPES.items()]
 
 STAFF_DOCUMENT_TYPES = {
@@ -246,7 +246,7 @@ def ensure_staff_upload_dir(org_id: str, staff_id: str):
     return path
 
 @router.get("/{org_id}/staff/{staff_id}/documents")
-async def get_staff_documents(org_id: str, staff_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_staff_documents(org_id: str, staff_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "staff:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -343,7 +343,7 @@ async def upload_staff_document(
         tenant_ctx.close()
 
 @router.get("/{org_id}/staff/{staff_id}/documents/{document_id}/file")
-async def get_staff_document_file(org_id: str, staff_id: str, document_id: str, download: int = 0, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_staff_document_file(org_id: str, staff_id: str, document_id: str, download: int = 0, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "staff:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -374,7 +374,7 @@ async def get_staff_document_file(org_id: str, staff_id: str, document_id: str,
         tenant_ctx.close()
 
 @router.delete("/{org_id}/staff/{staff_id}/documents/{document_id}", dependencies=[Depends(require_not_demo)])
-async def delete_staff_document(org_id: str, staff_id: str, document_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_staff_document(org_id: str, staff_id: str, document_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "staff:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -399,5 +399,5 @@ async def delete_staff_document(org_id: str, staff_id: str, document_id: str, us
         tenant_ctx.close()
 
 @router.get("/{org_id}/staff-document-types")
-async def get_staff_document_types(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_staff_document_types(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     return [{"value": key, "label": value} for key, value in STAFF_DOCUMENT_TYPES.items()]
@@ -0,0 +1,61 @@
+import asyncio
+import json
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from models.database import get_db
+from routes.auth import get_current_user
+from routes.common import get_tenant_session_context
+from services.event_bus import bus as event_bus
+
+router = APIRouter()
+
+KEEPALIVE_SECONDS = 15
+
+
+async def _event_stream(org_id: str, staff_id, request: Request):
+    subscriber = event_bus.subscribe(org_id)
+    queue = subscriber[1]
+    try:
+        yield ": connected\n\n"
+        while not await request.is_disconnected():
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            event_type = event.pop("type")
+            # Other staff members' personal notifications are not announced
+            if event_type == "notification" and event.get("staff_id") not in (None, staff_id):
+                continue
+            yield f"event: {event_type}\ndata: {json.dumps(event, default=str)}\n\n"
+    finally:
+        event_bus.unsubscribe(org_id, subscriber)
+
+
+@router.get("/{org_id}/events")
+def stream_events(
+    org_id: str,
+    request: Request,
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Server-Sent Events telling the browser which of its data changed (transactions, floats, notifications, queue, roles)"""
+    from models.tenant import Staff
+
+    tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
+    tenant_session = tenant_ctx.create_session()
+    try:
+        staff = tenant_session.query(Staff).filter(Staff.email == user.email).first()
+        staff_id = staff.id if staff else None
+    finally:
+        tenant_session.close()
+        tenant_ctx.close()
+    db.close()  # the stream outlives the request's master DB work
+    return StreamingResponse(
+        _event_stream(org_id, staff_id, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -97,7 +97,7 @@ def generate_expense_number(session) -> str:
     return f"EXP-{count + 1:05d}"
 
 @router.get("/organizations/{org_id}/expenses/categories")
-async def get_expense_categories(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_expense_categories(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "expenses:read", db)
     session = tenant_ctx.create_session()
@@ -109,7 +109,7 @@ async def get_expense_categories(org_id: str, user=Depends(get_current_user), db
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/expenses/categories")
-async def create_expense_category(org_id: str, data: ExpenseCategoryCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def create_expense_category(org_id: str, data: ExpenseCategoryCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "expenses:write", db)
     session = tenant_ctx.create_session()
@@ -134,7 +134,7 @@ async def create_expense_category(org_id: str, data: ExpenseCategoryCreate, user
         tenant_ctx.close()
 
 @router.put("/organizations/{org_id}/expenses/categories/{category_id}")
-async def update_expense_category(org_id: str, category_id: str, data: ExpenseCategoryCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def update_expense_category(org_id: str, category_id: str, data: ExpenseCategoryCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "expenses:write", db)
     session = tenant_ctx.create_session()
@@ -155,7 +155,7 @@ async def update_expense_category(org_id: str, category_id: str, data: ExpenseCa
         tenant_ctx.close()
 
 @router.delete("/organizations/{org_id}/expenses/categories/{category_id}", dependencies=[Depends(require_not_demo)])
-async def delete_expense_category(org_id: str, category_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_expense_category(org_id: str, category_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "expenses:write", db)
     session = tenant_ctx.create_session()
@@ -176,7 +176,7 @@ async def delete_expense_category(org_id: str, category_id: str, user=Depends(ge
         tenant_ctx.close()
 
 @router.get("/organizations/{org_id}/expenses")
-async def get_expenses(
+def get_expenses(
     org_id: str, 
     branch_id: Optional[str] = None,
     category_id: Optional[str] = None,
@@ -257,7 +257,7 @@ async def get_expenses(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/expenses")
-async def create_expense(org_id: str, data: ExpenseCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def create_expense(org_id: str, data: ExpenseCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "expenses:write", db)
     session = tenant_ctx.create_session()
@@ -306,7 +306,7 @@ async def create_expense(org_id: str, data: ExpenseCreate, user=Depends(get_curr
         tenant_ctx.close()
 
 @router.put("/organizations/{org_id}/expenses/{expense_id}")
-async def update_expense(org_id: str, expense_id: str, data: ExpenseUpdate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def update_expense(org_id: str, expense_id: str, data: ExpenseUpdate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "expenses:write", db)
     session = tenant_ctx.create_session()
@@ -331,7 +331,7 @@ async def update_expense(org_id: str, expense_id: str, data: ExpenseUpdate, user
         tenant_ctx.close()
 
 @router.delete("/organizations/{org_id}/expenses/{expense_id}", dependencies=[Depends(require_not_demo)])
-async def delete_expense(org_id: str, expense_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_expense(org_id: str, expense_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "expenses:write", db)
     session = tenant_ctx.create_session()
@@ -351,7 +351,7 @@ async def delete_expense(org_id: str, expense_id: str, user=Depends(get_current_
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/expenses/{expense_id}/approve")
-async def approve_expense(org_id: str, expense_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def approve_expense(org_id: str, expense_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "expenses:approve", db)
     session = tenant_ctx.create_session()
@@ -376,7 +376,7 @@ async def approve_expense(org_id: str, expense_id: str, user=Depends(get_current
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/expenses/{expense_id}/reject")
-async def reject_expense(org_id: str, expense_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def reject_expense(org_id: str, expense_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "expenses:approve", db)
     session = tenant_ctx.create_session()
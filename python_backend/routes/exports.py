@@ -1,184 +1,345 @@
-import csv
-import io
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from models.database import get_db
 from routes.auth import get_current_user
-from routes.common import get_tenant_session_context, require_permission
+from routes.common import get_tenant_session_context, require_permission, check_permission
+from schemas.tenant import ExportJobCreate
+from services.export_engine import EXPORT_BATCH_SIZE, csv_export_response, fmt_amount, fmt_date
+from services.export_jobs import (
+    PARQUET_AVAILABLE, create_export_job, submit_export_job, cleanup_expired_export_jobs,
+)
 
 router = APIRouter()
 
+MEMBER_EXPORT_HEADER = [
+    "Member Number", "First Name", "Last Name", "Email", "Phone",
+    "ID Number", "Gender", "Date of Birth", "KRA PIN",
+    "Savings Balance", "Shares Balance", "Status", "Join Date"
+]
+
+TRANSACTION_EXPORT_HEADER = [
+    "Transaction ID", "Reference", "Member", "Type",
+    "Amount", "Running Balance", "Description", "Method",
+    "Status", "Date"
+]
+
+LOAN_EXPORT_HEADER = [
+    "Loan Number", "Member", "Product", "Principal",
+    "Interest Rate (%)", "Term (months)", "Total Due",
+    "Amount Paid", "Outstanding", "Status", "Disbursed Date", "Created Date"
+]
+
+
+def _apply_filters(query, created_col, branch_col, start_date=None, end_date=None, branch_id=None):
+    """Apply export job filters; dates may be date objects or ISO strings (from the job's JSON)"""
+    if start_date:
+        start = date.fromisoformat(start_date) if isinstance(start_date, str) else start_date
+        query = query.filter(created_col >= datetime.combine(start, datetime.min.time()))
+    if end_date:
+        end = date.fromisoformat(end_date) if isinstance(end_date, str) else end_date
+        query = query.filter(created_col < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    if branch_id:
+        query = query.filter(branch_col == branch_id)
+    return query
+
+
+def member_export_rows(session, **filters):
+    from models.tenant import Member
+
+    query = session.query(
+        Member.member_number, Member.first_name, Member.last_name, Member.email, Member.phone,
+        Member.id_number, Member.gender, Member.date_of_birth, Member.kra_pin,
+        Member.savings_balance, Member.shares_balance, Member.is_active, Member.created_at,
+    )
+    query = _apply_filters(query, Member.created_at, Member.branch_id, **filters)
+    query = query.order_by(Member.created_at.desc()).yield_per(EXPORT_BATCH_SIZE)
+
+    for m in query:
+        yield [
+            m.member_number or "",
+            m.first_name or "",
+            m.last_name or "",
+            m.email or "",
+            m.phone or "",
+            m.id_number or "",
+            m.gender or "",
+            m.date_of_birth.isoformat() if m.date_of_birth else "",
+            m.kra_pin or "",
+            fmt_amount(m.savings_balance),
+            fmt_amount(m.shares_balance),
+            "Active" if m.is_active else "Inactive",
+            fmt_date(m.created_at),
+        ]
+
+
+def transaction_export_rows(session, **filters):
+    from models.tenant import Transaction, Member
+
+    query = session.query(
+        Transaction.id, Transaction.reference, Transaction.transaction_type, Transaction.amount,
+        Transaction.balance_after, Transaction.description, Transaction.payment_method,
+        Transaction.created_at, Member.first_name, Member.last_name,
+    ).outerjoin(Member, Member.id == Transaction.member_id)
+    query = _apply_filters(query, Transaction.created_at, Transaction.branch_id, **filters)
+    query = query.order_by(Transaction.created_at.desc()).yield_per(EXPORT_BATCH_SIZE)
+
+    for t in query:
+        yield [
+            t.id or "",
+            t.reference or "",
+            f"{t.first_name} {t.last_name}" if t.first_name else "",
+            t.transaction_type or "",
+            fmt_amount(t.amount),
+            str(t.balance_after or ""),
+            t.description or "",
+            t.payment_method or "",
+            "completed",
+            fmt_date(t.created_at, "%Y-%m-%d %H:%M"),
+        ]
+
+
+def loan_export_rows(session, **filters):
+    from models.tenant import LoanApplication, Member, LoanProduct
+
+    query = session.query(
+        LoanApplication.application_number, LoanApplication.amount, LoanApplication.interest_rate,
+        LoanApplication.term_months, LoanApplication.total_repayment, LoanApplication.amount_repaid,
+        LoanApplication.outstanding_balance, LoanApplication.status, LoanApplication.disbursed_at,
+        LoanApplication.created_at, Member.first_name, Member.last_name, LoanProduct.name.label("product_name"),
+    ).outerjoin(
+        Member, Member.id == LoanApplication.member_id
+    ).outerjoin(
+        LoanProduct, LoanProduct.id == LoanApplication.loan_product_id
+    )
+    query = _apply_filters(query, LoanApplication.created_at, LoanApplication.branch_id, **filters)
+    query = query.order_by(LoanApplication.created_at.desc()).yield_per(EXPORT_BATCH_SIZE)
+
+    for l in query:
+        yield [
+            l.application_number or "",
+            f"{l.first_name} {l.last_name}" if l.first_name else "",
+            l.product_name or "",
+            fmt_amount(l.amount),
+            fmt_amount(l.interest_rate),
+            str(l.term_months or 0),
+            str(l.total_repayment or ""),
+            fmt_amount(l.amount_repaid),
+            str(l.outstanding_balance or ""),
+            l.status or "",
+            fmt_date(l.disbursed_at),
+            fmt_date(l.created_at),
+        ]
+
 
 @router.get("/{org_id}/export/members")
 def export_members_csv(
     org_id: str,
+    gzip: bool = False,
     user=Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
+    require_permission(membership, "members.view", db)
+    return csv_export_response(tenant_ctx, "members_export", MEMBER_EXPORT_HEADER, member_export_rows, gzip=gzip)
+
+
+@router.get("/{org_id}/export/transactions")
+def export_transactions_csv(
+    org_id: str,
+    gzip: bool = False,
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
+    require_permission(membership, "transactions.view", db)
+    return csv_export_response(tenant_ctx, "transactions_export", TRANSACTION_EXPORT_HEADER, transaction_export_rows, gzip=gzip)
+
+
+@router.get("/{org_id}/export/loans")
+def export_loans_csv(
+    org_id: str,
+    gzip: bool = False,
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
+    require_permission(membership, "loans.view", db)
+    return csv_export_response(tenant_ctx, "loans_export", LOAN_EXPORT_HEADER, loan_export_rows, gzip=gzip)
+
+
+# ==================== EXPORT JOBS ====================
+
+def _count_members(session, **filters):
     from models.tenant import Member
+    query = session.query(func.count(Member.id))
+    return _apply_filters(query, Member.created_at, Member.branch_id, **filters).scalar()
+
+
+def _count_transactions(session, **filters):
+    from models.tenant import Transaction
+    query = session.query(func.count(Transaction.id))
+    return _apply_filters(query, Transaction.created_at, Transaction.branch_id, **filters).scalar()
+
+
+def _count_loans(session, **filters):
+    from models.tenant import LoanApplication
+    query = session.query(func.count(LoanApplication.id))
+    return _apply_filters(query, LoanApplication.created_at, LoanApplication.branch_id, **filters).scalar()
+
+
+# export_type -> (permission, header, row function, count function)
+EXPORT_DATASETS = {
+    "members": ("members.view", MEMBER_EXPORT_HEADER, member_export_rows, _count_members),
+    "transactions": ("transactions.view", TRANSACTION_EXPORT_HEADER, transaction_export_rows, _count_transactions),
+    "loans": ("loans.view", LOAN_EXPORT_HEADER, loan_export_rows, _count_loans),
+}
+
+
+def _job_dict(job, org_id: str) -> dict:
+    progress = None
+    if job.total_rows:
+        progress = round(min(100.0, (job.rows_written or 0) * 100.0 / job.total_rows), 1)
+    elif job.status == "completed":
+        progress = 100.0
+    return {
+        "id": job.id,
+        "export_type": job.export_type,
+        "format": job.format,
+        "filters": job.filters or {},
+        "status": job.status,
+        "total_rows": job.total_rows,
+        "rows_written": job.rows_written or 0,
+        "progress": progress,
+        "file_size": job.file_size,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "completed_at": job.completed_at,
+        "expires_at": job.expires_at,
+        "download_url": f"/api/organizations/{org_id}/export/jobs/{job.id}/download" if job.status == "completed" else None,
+    }
+
+
+@router.post("/{org_id}/export/jobs")
+def create_export_job_route(
+    org_id: str,
+    data: ExportJobCreate,
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    dataset = EXPORT_DATASETS.get(data.export_type)
+    if not dataset:
+        raise HTTPException(status_code=400, detail=f"Invalid export_type. Must be one of: {', '.join(EXPORT_DATASETS)}")
+    if data.format not in ("csv", "parquet"):
+        raise HTTPException(status_code=400, detail="Invalid format. Must be csv or parquet")
+    if data.format == "parquet" and not PARQUET_AVAILABLE:
+        raise HTTPException(status_code=400, detail="Parquet export is not available on this server")
 
+    permission, header, row_fn, count_fn = dataset
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
-    require_permission(membership, "members.view", db)
+    require_permission(membership, permission, db)
     tenant_session = tenant_ctx.create_session()
-
     try:
-        members = tenant_session.query(Member).order_by(Member.created_at.desc()).all()
-
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow([
-            "Member Number", "First Name", "Last Name", "Email", "Phone",
-            "ID Number", "Gender", "Date of Birth", "KRA PIN",
-            "Savings Balance", "Shares Balance", "Status", "Join Date"
-        ])
-
-        for m in members:
-            writer.writerow([
-                m.member_number or "",
-                m.first_name or "",
-                m.last_name or "",
-                m.email or "",
-                m.phone or "",
-                m.id_number or "",
-                m.gender or "",
-                m.date_of_birth.isoformat() if m.date_of_birth else "",
-                getattr(m, "kra_pin", "") or "",
-                str(m.savings_balance or 0),
-                str(m.shares_balance or 0),
-                "Active" if m.is_active else "Inactive",
-                m.created_at.strftime("%Y-%m-%d") if m.created_at else "",
-            ])
-
-        output.seek(0)
-        filename = f"members_export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv"
-        return StreamingResponse(
-            iter([output.getvalue()]),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        cleanup_expired_export_jobs(tenant_session)
+
+        filters = {
+            key: value.isoformat() if isinstance(value, date) else value
+            for key, value in (
+                ("start_date", data.start_date),
+                ("end_date", data.end_date),
+                ("branch_id", data.branch_id),
+            ) if value
+        }
+        job, created = create_export_job(
+            tenant_session, data.export_type, data.format, filters, requested_by=str(getattr(user, "id", "") or "")
         )
+        if created:
+            submit_export_job(tenant_ctx, org_id, job.id, header, row_fn, count_fn)
+        return {**_job_dict(job, org_id), "deduplicated": not created}
     finally:
         tenant_session.close()
 
 
-@router.get("/{org_id}/export/transactions")
-def export_transactions_csv(
+@router.get("/{org_id}/export/jobs")
+def list_export_jobs(
     org_id: str,
     user=Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    from models.tenant import Transaction, Member
+    from models.tenant import ExportJob
 
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
-    require_permission(membership, "transactions.view", db)
+    allowed_types = [
+        export_type for export_type, dataset in EXPORT_DATASETS.items()
+        if check_permission(membership, dataset[0], db)
+    ]
     tenant_session = tenant_ctx.create_session()
-
     try:
-        transactions = (
-            tenant_session.query(Transaction)
-            .order_by(Transaction.created_at.desc())
-            .limit(10000)
-            .all()
-        )
+        jobs = tenant_session.query(ExportJob).filter(
+            ExportJob.export_type.in_(allowed_types)
+        ).order_by(ExportJob.created_at.desc()).limit(50).all()
+        return [_job_dict(job, org_id) for job in jobs]
+    finally:
+        tenant_session.close()
+        tenant_ctx.close()
 
-        member_ids = set(t.member_id for t in transactions if t.member_id)
-        members_map = {}
-        if member_ids:
-            members = tenant_session.query(Member).filter(Member.id.in_(member_ids)).all()
-            members_map = {m.id: f"{m.first_name} {m.last_name}" for m in members}
-
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow([
-            "Transaction ID", "Reference", "Member", "Type",
-            "Amount", "Running Balance", "Description", "Method",
-            "Status", "Date"
-        ])
-
-        for t in transactions:
-            writer.writerow([
-                t.id or "",
-                getattr(t, "reference", "") or "",
-                members_map.get(t.member_id, "") if t.member_id else "",
-                t.transaction_type or "",
-                str(t.amount or 0),
-                str(getattr(t, "running_balance", "") or ""),
-                getattr(t, "description", "") or getattr(t, "narration", "") or "",
-                getattr(t, "method", "") or getattr(t, "payment_method", "") or "",
-                getattr(t, "status", "completed") or "",
-                t.created_at.strftime("%Y-%m-%d %H:%M") if t.created_at else "",
-            ])
-
-        output.seek(0)
-        filename = f"transactions_export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv"
-        return StreamingResponse(
-            iter([output.getvalue()]),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
+
+def _get_job_for_user(tenant_session, job_id: str, membership, db):
+    from models.tenant import ExportJob
+
+    job = tenant_session.query(ExportJob).filter(ExportJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    dataset = EXPORT_DATASETS.get(job.export_type)
+    if dataset:
+        require_permission(membership, dataset[0], db)
+    return job
+
+
+@router.get("/{org_id}/export/jobs/{job_id}")
+def get_export_job(
+    org_id: str,
+    job_id: str,
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
+    tenant_session = tenant_ctx.create_session()
+    try:
+        job = _get_job_for_user(tenant_session, job_id, membership, db)
+        return _job_dict(job, org_id)
     finally:
         tenant_session.close()
+        tenant_ctx.close()
 
 
-@router.get("/{org_id}/export/loans")
-def export_loans_csv(
+@router.get("/{org_id}/export/jobs/{job_id}/download")
+def download_export_job(
     org_id: str,
+    job_id: str,
     user=Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    from models.tenant import Loan, Member, LoanProduct
+    import os
 
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
-    require_permission(membership, "loans.view", db)
     tenant_session = tenant_ctx.create_session()
-
     try:
-        loans = tenant_session.query(Loan).order_by(Loan.created_at.desc()).all()
-
-        member_ids = set(l.member_id for l in loans if l.member_id)
-        members_map = {}
-        if member_ids:
-            members = tenant_session.query(Member).filter(Member.id.in_(member_ids)).all()
-            members_map = {m.id: f"{m.first_name} {m.last_name}" for m in members}
-
-        product_ids = set(l.loan_product_id for l in loans if l.loan_product_id)
-        products_map = {}
-        if product_ids:
-            products = tenant_session.query(LoanProduct).filter(LoanProduct.id.in_(product_ids)).all()
-            products_map = {p.id: p.name for p in products}
-
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow([
-            "Loan Number", "Member", "Product", "Principal",
-            "Interest Rate (%)", "Term (months)", "Total Due",
-            "Amount Paid", "Outstanding", "Status", "Disbursed Date", "Created Date"
-        ])
-
-        for l in loans:
-            writer.writerow([
-                l.loan_number or "",
-                members_map.get(l.member_id, "") if l.member_id else "",
-                products_map.get(l.loan_product_id, "") if l.loan_product_id else "",
-                str(l.principal_amount or 0),
-                str(l.interest_rate or 0),
-                str(l.term_months or 0),
-                str(getattr(l, "total_due", "") or ""),
-                str(getattr(l, "amount_paid", 0) or 0),
-                str(getattr(l, "outstanding_balance", "") or ""),
-                l.status or "",
-                l.disbursed_at.strftime("%Y-%m-%d") if getattr(l, "disbursed_at", None) else "",
-                l.created_at.strftime("%Y-%m-%d") if l.created_at else "",
-            ])
-
-        output.seek(0)
-        filename = f"loans_export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv"
-        return StreamingResponse(
-            iter([output.getvalue()]),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        job = _get_job_for_user(tenant_session, job_id, membership, db)
+        if job.status != "completed" or not job.file_path or not os.path.exists(job.file_path):
+            raise HTTPException(status_code=409, detail=f"Export is not ready (status: {job.status})")
+
+        suffix = ".parquet" if job.format == "parquet" else ".csv.gz"
+        stamp = (job.completed_at or datetime.utcnow()).strftime("%Y%m%d_%H%M%S")
+        return FileResponse(
+            job.file_path,
+            media_type="application/vnd.apache.parquet" if job.format == "parquet" else "application/gzip",
+            filename=f"{job.export_type}_export_{stamp}{suffix}",
         )
     finally:
         tenant_session.close()
+        tenant_ctx.close()
@@ -87,7 +87,7 @@ def create_audit_log(tenant_session, staff_id, action, entity_type, entity_id, o
     tenant_session.commit()
 
 @router.get("/{org_id}/fixed-deposit-products")
-async def list_products(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_products(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     if not check_org_feature(org_id, "fixed_deposits", db):
         raise HTTPException(status_code=403, detail="Fixed deposits is not available in your subscription plan")
     
@@ -102,7 +102,7 @@ async def list_products(org_id: str, user=Depends(get_current_user), db: Session
         tenant_ctx.close()
 
 @router.post("/{org_id}/fixed-deposit-products")
-async def create_product(org_id: str, data: FixedDepositProductCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def create_product(org_id: str, data: FixedDepositProductCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     if not check_org_feature(org_id, "fixed_deposits", db):
         raise HTTPException(status_code=403, detail="Fixed deposits is not available in your subscription plan")
     
@@ -143,7 +143,7 @@ async def create_product(org_id: str, data: FixedDepositProductCreate, user=Depe
         tenant_ctx.close()
 
 @router.put("/{org_id}/fixed-deposit-products/{product_id}")
-async def update_product(org_id: str, product_id: str, data: FixedDepositProductUpdate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def update_product(org_id: str, product_id: str, data: FixedDepositProductUpdate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "settings:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -162,7 +162,7 @@ async def update_product(org_id: str, product_id: str, data: FixedDepositProduct
         tenant_ctx.close()
 
 @router.get("/{org_id}/fixed-deposits")
-async def list_deposits(org_id: str, member_id: str = None, status: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_deposits(org_id: str, member_id: str = None, status: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "transactions:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -192,7 +192,7 @@ async def list_deposits(org_id: str, member_id: str = None, status: str = None,
         tenant_ctx.close()
 
 @router.post("/{org_id}/fixed-deposits")
-async def create_deposit(org_id: str, data: MemberFixedDepositCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def create_deposit(org_id: str, data: MemberFixedDepositCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "transactions:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -315,7 +315,7 @@ async def create_deposit(org_id: str, data: MemberFixedDepositCreate, user=Depen
         tenant_ctx.close()
 
 @router.get("/{org_id}/fixed-deposits/maturing-soon")
-async def get_maturing_deposits(org_id: str, days: int = 30, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_maturing_deposits(org_id: str, days: int = 30, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "transactions:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -347,7 +347,7 @@ async def get_maturing_deposits(org_id: str, days: int = 30, user=Depends(get_cu
         tenant_ctx.close()
 
 @router.get("/{org_id}/fixed-deposits/{deposit_id}")
-async def get_deposit(org_id: str, deposit_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_deposit(org_id: str, deposit_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "transactions:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -370,7 +370,7 @@ async def get_deposit(org_id: str, deposit_id: str, user=Depends(get_current_use
         tenant_ctx.close()
 
 @router.post("/{org_id}/fixed-deposits/{deposit_id}/close")
-async def close_deposit(org_id: str, deposit_id: str, data: FixedDepositCloseRequest, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def close_deposit(org_id: str, deposit_id: str, data: FixedDepositCloseRequest, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "transactions:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -478,7 +478,7 @@ async def close_deposit(org_id: str, deposit_id: str, data: FixedDepositCloseReq
         tenant_ctx.close()
 
 @router.post("/{org_id}/fixed-deposits/process-matured")
-async def process_matured_deposits(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def process_matured_deposits(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     """Process all matured fixed deposits - pay out or rollover as configured"""
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "transactions:write", db)
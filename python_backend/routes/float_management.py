@@ -11,6 +11,7 @@ from models.database import get_db
 from routes.auth import get_current_user
 from routes.common import get_tenant_session_context, require_permission
 from services.feature_flags import check_org_feature
+from services.cash_position import cash_position_report, close_day
 
 router = APIRouter()
 
@@ -179,7 +180,7 @@ def get_or_create_today_float(session: Session, staff_id: str, branch_id: str) -
     return teller_float
 
 @router.get("/organizations/{org_id}/floats")
-async def get_all_floats(
+def get_all_floats(
     org_id: str, 
     date_filter: Optional[str] = None,
     user = Depends(get_current_user),
@@ -238,7 +239,7 @@ async def get_all_floats(
         tenant_ctx.close()
 
 @router.get("/organizations/{org_id}/floats/my")
-async def get_my_float(
+def get_my_float(
     org_id: str,
     user = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -280,7 +281,7 @@ async def get_my_float(
         tenant_ctx.close()
 
 @router.get("/organizations/{org_id}/floats/active-counters")
-async def get_active_counters(
+def get_active_counters(
     org_id: str,
     branch_id: str = None,
     user = Depends(get_current_user),
@@ -316,7 +317,7 @@ async def get_active_counters(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/floats/set-counter")
-async def set_counter_number(
+def set_counter_number(
     org_id: str,
     user = Depends(get_current_user),
     db: Session = Depends(get_db),
@@ -365,7 +366,7 @@ async def set_counter_number(
         tenant_ctx.close()
 
 @router.get("/organizations/{org_id}/floats/teller/{staff_id}")
-async def get_teller_float(
+def get_teller_float(
     org_id: str,
     staff_id: str,
     user = Depends(get_current_user),
@@ -407,7 +408,7 @@ async def get_teller_float(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/floats/allocate")
-async def allocate_float(
+def allocate_float(
     org_id: str, 
     request: AllocateFloatRequest,
     user = Depends(get_current_user),
@@ -446,6 +447,16 @@ async def allocate_float(
                 raise HTTPException(status_code=400, detail=f"Insufficient vault balance. Available: {float(vault_balance):,.2f}")
             vault.current_balance = vault_balance - amount
             vault.last_updated = datetime.utcnow()
+            session.add(VaultTransaction(
+                vault_id=vault.id,
+                transaction_type="teller_allocation",
+                amount=-amount,
+                balance_after=vault.current_balance,
+                description=f"Float allocation to {staff.first_name} {staff.last_name}",
+                performed_by_id=allocator.id if allocator else None,
+                related_float=teller_float,
+                status="completed"
+            ))
         
         new_balance = Decimal(str(teller_float.current_balance or 0)) + amount
         
@@ -477,7 +488,7 @@ async def allocate_float(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/floats/{float_id}/replenish")
-async def replenish_float(
+def replenish_float(
     org_id: str, 
     float_id: str, 
     request: ReplenishFloatRequest,
@@ -523,7 +534,7 @@ async def replenish_float(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/floats/{float_id}/reopen")
-async def reopen_float(
+def reopen_float(
     org_id: str, 
     float_id: str, 
     user = Depends(get_current_user),
@@ -609,7 +620,7 @@ async def reopen_float(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/floats/{float_id}/return-to-vault")
-async def return_to_vault(
+def return_to_vault(
     org_id: str, 
     float_id: str, 
     request: ReturnToVaultRequest,
@@ -664,7 +675,7 @@ async def return_to_vault(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/floats/{float_id}/reconcile")
-async def reconcile_float(
+def reconcile_float(
     org_id: str, 
     float_id: str, 
     request: ReconcileFloatRequest,
@@ -790,7 +801,7 @@ async def reconcile_float(
         tenant_ctx.close()
 
 @router.get("/organizations/{org_id}/floats/{float_id}/transactions")
-async def get_float_transactions(
+def get_float_transactions(
     org_id: str, 
     float_id: str,
     user = Depends(get_current_user),
@@ -826,7 +837,7 @@ async def get_float_transactions(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/floats/my/request-replenishment")
-async def request_replenishment(
+def request_replenishment(
     org_id: str, 
     request: ReplenishmentRequestCreate,
     user = Depends(get_current_user),
@@ -860,7 +871,7 @@ async def request_replenishment(
         tenant_ctx.close()
 
 @router.get("/organizations/{org_id}/floats/pending-requests")
-async def get_pending_requests(
+def get_pending_requests(
     org_id: str,
     user = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -897,7 +908,7 @@ async def get_pending_requests(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/floats/requests/{request_id}/approve")
-async def approve_replenishment_request(
+def approve_replenishment_request(
     org_id: str, 
     request_id: str,
     user = Depends(get_current_user),
@@ -974,7 +985,7 @@ async def approve_replenishment_request(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/floats/requests/{request_id}/reject")
-async def reject_replenishment_request(
+def reject_replenishment_request(
     org_id: str, 
     request_id: str,
     user = Depends(get_current_user),
@@ -1004,7 +1015,7 @@ async def reject_replenishment_request(
         tenant_ctx.close()
 
 @router.get("/organizations/{org_id}/shortages/held")
-async def get_all_held_shortages(
+def get_all_held_shortages(
     org_id: str,
     user = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -1053,7 +1064,7 @@ async def get_all_held_shortages(
         tenant_ctx.close()
 
 @router.get("/organizations/{org_id}/shortages/pending/{staff_id}")
-async def get_pending_shortages(
+def get_pending_shortages(
     org_id: str,
     staff_id: str,
     user = Depends(get_current_user),
@@ -1104,7 +1115,7 @@ async def get_pending_shortages(
         tenant_ctx.close()
 
 @router.get("/organizations/{org_id}/shortages/my")
-async def get_my_shortages(
+def get_my_shortages(
     org_id: str,
     user = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -1149,7 +1160,7 @@ async def get_my_shortages(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/shortages/{shortage_id}/approve")
-async def approve_shortage(
+def approve_shortage(
     org_id: str,
     shortage_id: str,
     request: ShortageApprovalRequest,
@@ -1394,7 +1405,7 @@ async def approve_shortage(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/staff/set-approval-pin")
-async def set_approval_pin(
+def set_approval_pin(
     org_id: str,
     request: SetApprovalPinRequest,
     user = Depends(get_current_user),
@@ -1431,7 +1442,7 @@ async def set_approval_pin(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/staff/{staff_id}/set-approval-pin")
-async def set_staff_approval_pin(
+def set_staff_approval_pin(
     org_id: str,
     staff_id: str,
     request: SetApprovalPinRequest,
@@ -1463,7 +1474,7 @@ async def set_staff_approval_pin(
         tenant_ctx.close()
 
 @router.get("/organizations/{org_id}/salary-deductions")
-async def get_salary_deductions(
+def get_salary_deductions(
     org_id: str,
     staff_id: Optional[str] = None,
     status: Optional[str] = None,
@@ -1513,7 +1524,7 @@ async def get_salary_deductions(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/salary-deductions/{deduction_id}/process")
-async def process_salary_deduction(
+def process_salary_deduction(
     org_id: str,
     deduction_id: str,
     user = Depends(get_current_user),
@@ -1550,7 +1561,7 @@ async def process_salary_deduction(
 # ==================== VAULT MANAGEMENT ENDPOINTS ====================
 
 @router.get("/organizations/{org_id}/vaults")
-async def get_all_vaults(
+def get_all_vaults(
     org_id: str,
     user = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -1580,7 +1591,7 @@ async def get_all_vaults(
         tenant_ctx.close()
 
 @router.get("/organizations/{org_id}/vaults/{vault_id}")
-async def get_vault_details(
+def get_vault_details(
     org_id: str,
     vault_id: str,
     user = Depends(get_current_user),
@@ -1627,7 +1638,7 @@ async def get_vault_details(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/vaults/deposit")
-async def deposit_to_vault(
+def deposit_to_vault(
     org_id: str,
     request: VaultDepositRequest,
     user = Depends(get_current_user),
@@ -1684,7 +1695,7 @@ async def deposit_to_vault(
         tenant_ctx.close()
 
 @router.get("/organizations/{org_id}/pending-vault-returns")
-async def get_pending_vault_returns(
+def get_pending_vault_returns(
     org_id: str,
     user = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -1718,7 +1729,7 @@ async def get_pending_vault_returns(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/pending-vault-returns/{return_id}/review")
-async def review_vault_return(
+def review_vault_return(
     org_id: str,
     return_id: str,
     request: VaultReturnReviewRequest,
@@ -1832,7 +1843,7 @@ async def review_vault_return(
 # ==================== SHIFT HANDOVER ENDPOINTS ====================
 
 @router.get("/organizations/{org_id}/shift-handovers")
-async def get_shift_handovers(
+def get_shift_handovers(
     org_id: str,
     status: Optional[str] = None,
     user = Depends(get_current_user),
@@ -1887,7 +1898,7 @@ async def get_shift_handovers(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/shift-handovers")
-async def create_shift_handover(
+def create_shift_handover(
     org_id: str,
     request: ShiftHandoverRequest,
     user = Depends(get_current_user),
@@ -1963,7 +1974,7 @@ async def create_shift_handover(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/shift-handovers/{handover_id}/cancel")
-async def cancel_shift_handover(
+def cancel_shift_handover(
     org_id: str,
     handover_id: str,
     user = Depends(get_current_user),
@@ -2010,7 +2021,7 @@ async def cancel_shift_handover(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/shift-handovers/{handover_id}/acknowledge")
-async def acknowledge_shift_handover(
+def acknowledge_shift_handover(
     org_id: str,
     handover_id: str,
     request: ShiftHandoverAcknowledgeRequest,
@@ -2111,7 +2122,7 @@ async def acknowledge_shift_handover(
 # ==================== DAILY REPORT ENDPOINTS ====================
 
 @router.get("/organizations/{org_id}/daily-cash-position")
-async def get_daily_cash_position(
+def get_daily_cash_position(
     org_id: str,
     report_date: Optional[str] = None,
     user = Depends(get_current_user),
@@ -2124,66 +2135,29 @@ async def get_daily_cash_position(
     
     try:
         target_date = date.fromisoformat(report_date) if report_date else date.today()
-        
-        branches = session.query(Branch).filter(Branch.is_active == True).all()
-        report_data = []
-        
-        totals = {
-            "vault_balance": Decimal("0"),
-            "float_allocated": Decimal("0"),
-            "deposits_received": Decimal("0"),
-            "withdrawals_paid": Decimal("0"),
-            "total_cash_in_hand": Decimal("0")
-        }
-        
-        for branch in branches:
-            vault = session.query(BranchVault).filter(BranchVault.branch_id == branch.id).first()
-            vault_balance = vault.current_balance if vault else Decimal("0")
-            
-            # Get all floats for this branch on target date
-            floats = session.query(TellerFloat).filter(
-                and_(
-                    TellerFloat.branch_id == branch.id,
-                    TellerFloat.date == target_date
-                )
-            ).all()
-            
-            branch_float_total = sum([f.current_balance or Decimal("0") for f in floats])
-            branch_deposits = sum([f.deposits_in or Decimal("0") for f in floats])
-            branch_withdrawals = sum([f.withdrawals_out or Decimal("0") for f in floats])
-            
-            branch_data = {
-                "branch_id": branch.id,
-                "branch_name": branch.name,
-                "vault_balance": float(vault_balance),
-                "float_allocated": float(branch_float_total),
-                "deposits_received": float(branch_deposits),
-                "withdrawals_paid": float(branch_withdrawals),
-                "total_cash_in_hand": float(vault_balance + branch_float_total),
-                "teller_count": len(floats),
-                "tellers": [{
-                    "staff_name": f"{f.staff.first_name} {f.staff.last_name}" if f.staff else "Unknown",
-                    "opening_balance": float(f.opening_balance or 0),
-                    "current_balance": float(f.current_balance or 0),
-                    "deposits": float(f.deposits_in or 0),
-                    "withdrawals": float(f.withdrawals_out or 0),
-                    "status": f.status
-                } for f in floats]
-            }
-            
-            report_data.append(branch_data)
-            
-            totals["vault_balance"] += vault_balance
-            totals["float_allocated"] += branch_float_total
-            totals["deposits_received"] += branch_deposits
-            totals["withdrawals_paid"] += branch_withdrawals
-            totals["total_cash_in_hand"] += (vault_balance + branch_float_total)
-        
-        return {
-            "report_date": target_date.isoformat(),
-            "branches": report_data,
-            "totals": {k: float(v) for k, v in totals.items()}
-        }
+        return cash_position_report(session, target_date)
+    finally:
+        session.close()
+        tenant_ctx.close()
+
+@router.post("/organizations/{org_id}/daily-cash-position/close")
+def close_daily_cash_position(
+    org_id: str,
+    report_date: Optional[str] = None,
+    user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """End-of-day close: freeze the day's branch and teller cash positions for later reports"""
+    tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
+    require_permission(membership, "float_management:write", db)
+    session = tenant_ctx.create_session()
+    
+    try:
+        target_date = date.fromisoformat(report_date) if report_date else date.today()
+        if target_date > date.today():
+            raise HTTPException(status_code=400, detail="Cannot close a future date")
+        branches = close_day(session, target_date)
+        return {"message": f"Cash position for {target_date.isoformat()} closed", "branches": branches}
     finally:
         session.close()
         tenant_ctx.close()
@@ -176,7 +176,7 @@ def get_member_eligibility(tenant_session, member: Member, loan_amount: Decimal
 
 
 @router.get("/{org_id}/loans/{loan_id}/guarantors")
-async def list_loan_guarantors(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_loan_guarantors(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "guarantors:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -234,7 +234,7 @@ async def list_loan_guarantors(org_id: str, loan_id: str, user=Depends(get_curre
 
 
 @router.get("/{org_id}/loans/{loan_id}/eligible-guarantors")
-async def get_eligible_guarantors(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_eligible_guarantors(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     """Get list of members eligible to guarantee a specific loan"""
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "guarantors:read", db)
@@ -278,7 +278,7 @@ async def get_eligible_guarantors(org_id: str, loan_id: str, user=Depends(get_cu
 
 
 @router.get("/{org_id}/members/{member_id}/guarantee-eligibility")
-async def get_member_guarantee_eligibility(org_id: str, member_id: str, loan_amount: float = 0, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_member_guarantee_eligibility(org_id: str, member_id: str, loan_amount: float = 0, user=Depends(get_current_user), db: Session = Depends(get_db)):
     """Get detailed guarantee eligibility for a specific member"""
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "guarantors:read", db)
@@ -296,7 +296,7 @@ async def get_member_guarantee_eligibility(org_id: str, member_id: str, loan_amo
 
 
 @router.post("/{org_id}/loans/{loan_id}/guarantors")
-async def add_guarantor(org_id: str, loan_id: str, data: LoanGuarantorCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def add_guarantor(org_id: str, loan_id: str, data: LoanGuarantorCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "guarantors:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -378,7 +378,7 @@ async def add_guarantor(org_id: str, loan_id: str, data: LoanGuarantorCreate, us
 
 
 @router.put("/{org_id}/guarantors/{guarantor_id}/accept")
-async def accept_guarantee(org_id: str, guarantor_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def accept_guarantee(org_id: str, guarantor_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "guarantors:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -418,7 +418,7 @@ async def accept_guarantee(org_id: str, guarantor_id: str, user=Depends(get_curr
 
 
 @router.put("/{org_id}/guarantors/{guarantor_id}/reject")
-async def reject_guarantee(org_id: str, guarantor_id: str, data: LoanGuarantorReject = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def reject_guarantee(org_id: str, guarantor_id: str, data: LoanGuarantorReject = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "guarantors:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -445,7 +445,7 @@ async def reject_guarantee(org_id: str, guarantor_id: str, data: LoanGuarantorRe
 
 
 @router.delete("/{org_id}/guarantors/{guarantor_id}")
-async def remove_guarantor(org_id: str, guarantor_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def remove_guarantor(org_id: str, guarantor_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "guarantors:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -467,7 +467,7 @@ async def remove_guarantor(org_id: str, guarantor_id: str, user=Depends(get_curr
 
 
 @router.get("/{org_id}/members/{member_id}/guarantees")
-async def get_member_guarantees(org_id: str, member_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_member_guarantees(org_id: str, member_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     """Get all guarantees made by a specific member"""
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "guarantors:read", db)
@@ -34,7 +34,7 @@ from routes.common import get_tenant_session_context, require_permission
 router = APIRouter()
 
 @router.get("/{org_id}/hr/staff")
-async def get_hr_staff_list(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_hr_staff_list(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -71,7 +71,7 @@ async def get_hr_staff_list(org_id: str, user=Depends(get_current_user), db: Ses
         tenant_ctx.close()
 
 @router.get("/{org_id}/hr/staff/{staff_id}")
-async def get_staff_hr_details(org_id: str, staff_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_staff_hr_details(org_id: str, staff_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -120,7 +120,7 @@ async def get_staff_hr_details(org_id: str, staff_id: str, user=Depends(get_curr
         tenant_ctx.close()
 
 @router.get("/{org_id}/hr/performance-reviews")
-async def list_performance_reviews(org_id: str, staff_id: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_performance_reviews(org_id: str, staff_id: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -136,7 +136,7 @@ async def list_performance_reviews(org_id: str, staff_id: str = None, user=Depen
         tenant_ctx.close()
 
 @router.post("/{org_id}/hr/performance-reviews")
-async def create_performance_review(org_id: str, data: PerformanceReviewCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def create_performance_review(org_id: str, data: PerformanceReviewCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -188,7 +188,7 @@ async def create_performance_review(org_id: str, data: PerformanceReviewCreate,
         tenant_ctx.close()
 
 @router.get("/{org_id}/hr/performance-reviews/{review_id}")
-async def get_performance_review(org_id: str, review_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_performance_review(org_id: str, review_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     tenant_session = tenant_ctx.create_session()
     try:
@@ -201,7 +201,7 @@ async def get_performance_review(org_id: str, review_id: str, user=Depends(get_c
         tenant_ctx.close()
 
 @router.put("/{org_id}/hr/staff/{staff_id}/lock", dependencies=[Depends(require_not_demo)])
-async def lock_staff_account(org_id: str, staff_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def lock_staff_account(org_id: str, staff_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -218,7 +218,7 @@ async def lock_staff_account(org_id: str, staff_id: str, user=Depends(get_curren
         tenant_ctx.close()
 
 @router.put("/{org_id}/hr/staff/{staff_id}/unlock")
-async def unlock_staff_account(org_id: str, staff_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def unlock_staff_account(org_id: str, staff_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -235,7 +235,7 @@ async def unlock_staff_account(org_id: str, staff_id: str, user=Depends(get_curr
         tenant_ctx.close()
 
 @router.put("/{org_id}/hr/staff/{staff_id}/deactivate", dependencies=[Depends(require_not_demo)])
-async def deactivate_staff(org_id: str, staff_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def deactivate_staff(org_id: str, staff_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -252,7 +252,7 @@ async def deactivate_staff(org_id: str, staff_id: str, user=Depends(get_current_
         tenant_ctx.close()
 
 @router.put("/{org_id}/hr/staff/{staff_id}/activate")
-async def activate_staff(org_id: str, staff_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def activate_staff(org_id: str, staff_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -272,7 +272,7 @@ class ResetPasswordRequest(BaseModel):
     new_password: str
 
 @router.put("/{org_id}/hr/staff/{staff_id}/reset-password", dependencies=[Depends(require_not_demo)])
-async def reset_staff_password(org_id: str, staff_id: str, request: ResetPasswordRequest, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def reset_staff_password(org_id: str, staff_id: str, request: ResetPasswordRequest, user=Depends(get_current_user), db: Session = Depends(get_db)):
     from services.auth import hash_password
     
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
@@ -319,7 +319,7 @@ def seed_default_leave_types(tenant_session):
     tenant_session.commit()
 
 @router.get("/{org_id}/hr/leave-types")
-async def list_leave_types(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_leave_types(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "leave:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -332,7 +332,7 @@ async def list_leave_types(org_id: str, user=Depends(get_current_user), db: Sess
         tenant_ctx.close()
 
 @router.post("/{org_id}/hr/leave-types")
-async def create_leave_type(org_id: str, data: LeaveTypeCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def create_leave_type(org_id: str, data: LeaveTypeCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -351,7 +351,7 @@ async def create_leave_type(org_id: str, data: LeaveTypeCreate, user=Depends(get
         tenant_ctx.close()
 
 @router.put("/{org_id}/hr/leave-types/{leave_type_id}")
-async def update_leave_type(org_id: str, leave_type_id: str, data: LeaveTypeUpdate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def update_leave_type(org_id: str, leave_type_id: str, data: LeaveTypeUpdate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -371,7 +371,7 @@ async def update_leave_type(org_id: str, leave_type_id: str, data: LeaveTypeUpda
         tenant_ctx.close()
 
 @router.get("/{org_id}/hr/leave-balances")
-async def list_leave_balances(org_id: str, staff_id: str = None, year: int = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_leave_balances(org_id: str, staff_id: str = None, year: int = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "leave:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -399,7 +399,7 @@ async def list_leave_balances(org_id: str, staff_id: str = None, year: int = Non
         tenant_ctx.close()
 
 @router.post("/{org_id}/hr/leave-balances/initialize")
-async def initialize_leave_balances(org_id: str, year: int = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def initialize_leave_balances(org_id: str, year: int = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
     """Initialize leave balances for all staff for a given year"""
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
@@ -439,7 +439,7 @@ async def initialize_leave_balances(org_id: str, year: int = None, user=Depends(
         tenant_ctx.close()
 
 @router.get("/{org_id}/hr/leave-requests")
-async def list_leave_requests(org_id: str, status: str = None, staff_id: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_leave_requests(org_id: str, status: str = None, staff_id: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "leave:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -471,7 +471,7 @@ async def list_leave_requests(org_id: str, status: str = None, staff_id: str = N
         tenant_ctx.close()
 
 @router.post("/{org_id}/hr/leave-requests")
-async def create_leave_request(org_id: str, data: LeaveRequestCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def create_leave_request(org_id: str, data: LeaveRequestCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "leave:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -556,7 +556,7 @@ async def create_leave_request(org_id: str, data: LeaveRequestCreate, user=Depen
         tenant_ctx.close()
 
 @router.put("/{org_id}/hr/leave-requests/{request_id}/approve")
-async def approve_leave_request(org_id: str, request_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def approve_leave_request(org_id: str, request_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "leave:approve", db)
     tenant_session = tenant_ctx.create_session()
@@ -590,7 +590,7 @@ async def approve_leave_request(org_id: str, request_id: str, user=Depends(get_c
         tenant_ctx.close()
 
 @router.put("/{org_id}/hr/leave-requests/{request_id}/reject")
-async def reject_leave_request(org_id: str, request_id: str, data: LeaveRequestUpdate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def reject_leave_request(org_id: str, request_id: str, data: LeaveRequestUpdate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "leave:approve", db)
     tenant_session = tenant_ctx.create_session()
@@ -618,7 +618,7 @@ async def reject_leave_request(org_id: str, request_id: str, data: LeaveRequestU
 # ==================== ATTENDANCE ====================
 
 @router.get("/{org_id}/hr/attendance")
-async def list_attendance(org_id: str, date_from: str = None, date_to: str = None, staff_id: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_attendance(org_id: str, date_from: str = None, date_to: str = None, staff_id: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -648,7 +648,7 @@ async def list_attendance(org_id: str, date_from: str = None, date_to: str = Non
         tenant_ctx.close()
 
 @router.get("/{org_id}/hr/attendance/my-status")
-async def get_my_attendance_status(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_my_attendance_status(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     tenant_session = tenant_ctx.create_session()
     try:
@@ -682,7 +682,7 @@ async def get_my_attendance_status(org_id: str, user=Depends(get_current_user),
         tenant_ctx.close()
 
 @router.post("/{org_id}/hr/attendance/clock-in")
-async def clock_in(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def clock_in(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     tenant_session = tenant_ctx.create_session()
     try:
@@ -722,7 +722,7 @@ async def clock_in(org_id: str, user=Depends(get_current_user), db: Session = De
         tenant_ctx.close()
 
 @router.post("/{org_id}/hr/attendance/clock-out")
-async def clock_out(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def clock_out(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     tenant_session = tenant_ctx.create_session()
     try:
@@ -758,7 +758,7 @@ async def clock_out(org_id: str, user=Depends(get_current_user), db: Session = D
         tenant_ctx.close()
 
 @router.post("/{org_id}/hr/attendance")
-async def create_attendance_record(org_id: str, data: AttendanceCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def create_attendance_record(org_id: str, data: AttendanceCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -791,7 +791,7 @@ async def create_attendance_record(org_id: str, data: AttendanceCreate, user=Dep
 # ==================== PAYROLL ====================
 
 @router.get("/{org_id}/hr/payroll-configs")
-async def list_payroll_configs(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_payroll_configs(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -815,7 +815,7 @@ async def list_payroll_configs(org_id: str, user=Depends(get_current_user), db:
         tenant_ctx.close()
 
 @router.get("/{org_id}/hr/payroll-configs/{staff_id}")
-async def get_payroll_config(org_id: str, staff_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_payroll_config(org_id: str, staff_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -839,7 +839,7 @@ async def get_payroll_config(org_id: str, staff_id: str, user=Depends(get_curren
         tenant_ctx.close()
 
 @router.post("/{org_id}/hr/payroll-configs")
-async def create_payroll_config(org_id: str, data: PayrollConfigCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def create_payroll_config(org_id: str, data: PayrollConfigCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -858,7 +858,7 @@ async def create_payroll_config(org_id: str, data: PayrollConfigCreate, user=Dep
         tenant_ctx.close()
 
 @router.put("/{org_id}/hr/payroll-configs/{staff_id}")
-async def update_payroll_config(org_id: str, staff_id: str, data: PayrollConfigUpdate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def update_payroll_config(org_id: str, staff_id: str, data: PayrollConfigUpdate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -880,7 +880,7 @@ async def update_payroll_config(org_id: str, staff_id: str, data: PayrollConfigU
         tenant_ctx.close()
 
 @router.get("/{org_id}/hr/payslips")
-async def list_payslips(org_id: str, pay_period: str = None, staff_id: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_payslips(org_id: str, pay_period: str = None, staff_id: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -905,7 +905,7 @@ async def list_payslips(org_id: str, pay_period: str = None, staff_id: str = Non
         tenant_ctx.close()
 
 @router.post("/{org_id}/hr/payslips/generate")
-async def generate_payslips(org_id: str, pay_period: str, pay_date: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def generate_payslips(org_id: str, pay_period: str, pay_date: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     """Generate payslips for all active staff for a pay period"""
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
@@ -969,7 +969,7 @@ async def generate_payslips(org_id: str, pay_period: str, pay_date: str, user=De
 # ==================== EMPLOYEE DOCUMENTS ====================
 
 @router.get("/{org_id}/hr/documents")
-async def list_employee_documents(org_id: str, staff_id: str = None, document_type: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_employee_documents(org_id: str, staff_id: str = None, document_type: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -996,7 +996,7 @@ async def list_employee_documents(org_id: str, staff_id: str = None, document_ty
         tenant_ctx.close()
 
 @router.post("/{org_id}/hr/documents")
-async def create_employee_document(org_id: str, data: EmployeeDocumentCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def create_employee_document(org_id: str, data: EmployeeDocumentCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -1011,7 +1011,7 @@ async def create_employee_document(org_id: str, data: EmployeeDocumentCreate, us
         tenant_ctx.close()
 
 @router.put("/{org_id}/hr/documents/{doc_id}/verify")
-async def verify_document(org_id: str, doc_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def verify_document(org_id: str, doc_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -1034,7 +1034,7 @@ async def verify_document(org_id: str, doc_id: str, user=Depends(get_current_use
 # ==================== STAFF PROFILES ====================
 
 @router.get("/{org_id}/hr/profiles")
-async def list_staff_profiles(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_staff_profiles(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -1055,7 +1055,7 @@ async def list_staff_profiles(org_id: str, user=Depends(get_current_user), db: S
         tenant_ctx.close()
 
 @router.get("/{org_id}/hr/profiles/{staff_id}")
-async def get_staff_profile(org_id: str, staff_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_staff_profile(org_id: str, staff_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -1076,7 +1076,7 @@ async def get_staff_profile(org_id: str, staff_id: str, user=Depends(get_current
         tenant_ctx.close()
 
 @router.post("/{org_id}/hr/profiles")
-async def create_staff_profile(org_id: str, data: StaffProfileCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def create_staff_profile(org_id: str, data: StaffProfileCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -1095,7 +1095,7 @@ async def create_staff_profile(org_id: str, data: StaffProfileCreate, user=Depen
         tenant_ctx.close()
 
 @router.put("/{org_id}/hr/profiles/{staff_id}")
-async def update_staff_profile(org_id: str, staff_id: str, data: StaffProfileUpdate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def update_staff_profile(org_id: str, staff_id: str, data: StaffProfileUpdate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -1120,7 +1120,7 @@ async def update_staff_profile(org_id: str, staff_id: str, data: StaffProfileUpd
 # ==================== DISCIPLINARY RECORDS ====================
 
 @router.get("/{org_id}/hr/disciplinary")
-async def list_disciplinary_records(org_id: str, staff_id: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_disciplinary_records(org_id: str, staff_id: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -1147,7 +1147,7 @@ async def list_disciplinary_records(org_id: str, staff_id: str = None, user=Depe
         tenant_ctx.close()
 
 @router.post("/{org_id}/hr/disciplinary")
-async def create_disciplinary_record(org_id: str, data: DisciplinaryRecordCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def create_disciplinary_record(org_id: str, data: DisciplinaryRecordCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -1168,7 +1168,7 @@ async def create_disciplinary_record(org_id: str, data: DisciplinaryRecordCreate
         tenant_ctx.close()
 
 @router.put("/{org_id}/hr/disciplinary/{record_id}")
-async def update_disciplinary_record(org_id: str, record_id: str, data: DisciplinaryRecordUpdate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def update_disciplinary_record(org_id: str, record_id: str, data: DisciplinaryRecordUpdate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -1191,7 +1191,7 @@ async def update_disciplinary_record(org_id: str, record_id: str, data: Discipli
 # ==================== TRAINING RECORDS ====================
 
 @router.get("/{org_id}/hr/training")
-async def list_training_records(org_id: str, staff_id: str = None, status: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_training_records(org_id: str, staff_id: str = None, status: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -1216,7 +1216,7 @@ async def list_training_records(org_id: str, staff_id: str = None, status: str =
         tenant_ctx.close()
 
 @router.post("/{org_id}/hr/training")
-async def create_training_record(org_id: str, data: TrainingRecordCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def create_training_record(org_id: str, data: TrainingRecordCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -1231,7 +1231,7 @@ async def create_training_record(org_id: str, data: TrainingRecordCreate, user=D
         tenant_ctx.close()
 
 @router.put("/{org_id}/hr/training/{record_id}")
-async def update_training_record(org_id: str, record_id: str, data: TrainingRecordUpdate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def update_training_record(org_id: str, record_id: str, data: TrainingRecordUpdate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -1254,7 +1254,7 @@ async def update_training_record(org_id: str, record_id: str, data: TrainingReco
 # ==================== HR REPORTS ====================
 
 @router.get("/{org_id}/hr/reports/summary")
-async def get_hr_summary(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_hr_summary(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -1302,7 +1302,7 @@ async def get_hr_summary(org_id: str, user=Depends(get_current_user), db: Sessio
         tenant_ctx.close()
 
 @router.get("/{org_id}/hr/reports/leave-balances")
-async def get_leave_balance_report(org_id: str, year: int = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_leave_balance_report(org_id: str, year: int = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "leave:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -1347,7 +1347,7 @@ async def get_leave_balance_report(org_id: str, year: int = None, user=Depends(g
         tenant_ctx.close()
 
 @router.get("/{org_id}/hr/reports/attendance")
-async def get_attendance_report(org_id: str, month: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_attendance_report(org_id: str, month: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -1397,7 +1397,7 @@ async def get_attendance_report(org_id: str, month: str = None, user=Depends(get
 # ==================== PAY PERIOD MANAGEMENT ====================
 
 @router.get("/{org_id}/hr/pay-periods")
-async def list_pay_periods(org_id: str, year: int = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_pay_periods(org_id: str, year: int = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -1437,7 +1437,7 @@ async def list_pay_periods(org_id: str, year: int = None, user=Depends(get_curre
         tenant_ctx.close()
 
 @router.post("/{org_id}/hr/pay-periods")
-async def create_pay_period(org_id: str, data: PayPeriodCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def create_pay_period(org_id: str, data: PayPeriodCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -1459,7 +1459,7 @@ async def create_pay_period(org_id: str, data: PayPeriodCreate, user=Depends(get
         tenant_ctx.close()
 
 @router.post("/{org_id}/hr/pay-periods/generate-monthly")
-async def generate_monthly_periods(org_id: str, year: int, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def generate_monthly_periods(org_id: str, year: int, user=Depends(get_current_user), db: Session = Depends(get_db)):
     """Generate all 12 monthly pay periods for a given year"""
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
@@ -1495,7 +1495,7 @@ async def generate_monthly_periods(org_id: str, year: int, user=Depends(get_curr
         tenant_ctx.close()
 
 @router.get("/{org_id}/hr/pay-periods/{period_id}")
-async def get_pay_period(org_id: str, period_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_pay_period(org_id: str, period_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -1704,7 +1704,7 @@ def process_payroll_loan_repayment(tenant_session, member_id: str, amount: Decim
 
 
 @router.post("/{org_id}/hr/pay-periods/{period_id}/run-payroll")
-async def run_payroll(org_id: str, period_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def run_payroll(org_id: str, period_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     """Process payroll for all active staff with payroll configs"""
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
@@ -1834,7 +1834,7 @@ async def run_payroll(org_id: str, period_id: str, user=Depends(get_current_user
         tenant_ctx.close()
 
 @router.post("/{org_id}/hr/pay-periods/{period_id}/approve")
-async def approve_payroll(org_id: str, period_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def approve_payroll(org_id: str, period_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     """Approve payroll for disbursement"""
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
@@ -1868,7 +1868,7 @@ async def approve_payroll(org_id: str, period_id: str, user=Depends(get_current_
         tenant_ctx.close()
 
 @router.post("/{org_id}/hr/pay-periods/{period_id}/disburse")
-async def disburse_payroll(org_id: str, period_id: str, data: DisbursementRequest, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def disburse_payroll(org_id: str, period_id: str, data: DisbursementRequest, user=Depends(get_current_user), db: Session = Depends(get_db)):
     """Disburse salaries to staff accounts"""
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
@@ -1967,7 +1967,7 @@ async def disburse_payroll(org_id: str, period_id: str, data: DisbursementReques
             sd.status = "processed"
             sd.processed_at = datetime.utcnow()
         
-        acct_service = AccountingService(tenant_session)
+        acct_service = AccountingService(tenant_session, deferred=True)
         acct_service.seed_default_accounts()
         
         staff_user = tenant_session.query(Staff).filter(Staff.email == user.email).first()
@@ -1988,6 +1988,7 @@ async def disburse_payroll(org_id: str, period_id: str, data: DisbursementReques
                 disbursement_method=data.method,
                 created_by_id=created_by
             )
+            acct_service.flush()
         except Exception as e:
             print(f"Warning: Payroll accounting entry failed: {e}")
         
@@ -2006,7 +2007,7 @@ async def disburse_payroll(org_id: str, period_id: str, data: DisbursementReques
 # ==================== PAYSLIPS ====================
 
 @router.get("/{org_id}/hr/payslips")
-async def list_payslips(org_id: str, pay_period: str = None, staff_id: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_payslips(org_id: str, pay_period: str = None, staff_id: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -2051,8 +2052,185 @@ async def list_payslips(org_id: str, pay_period: str = None, staff_id: str = Non
         tenant_session.close()
         tenant_ctx.close()
 
+def _payslip_email_data(ps) -> dict:
+    return {
+        "pay_period": ps.pay_period,
+        "pay_date": str(ps.pay_date) if ps.pay_date else "N/A",
+        "basic_salary": float(ps.basic_salary or 0),
+        "house_allowance": float(ps.house_allowance or 0),
+        "transport_allowance": float(ps.transport_allowance or 0),
+        "other_allowances": float(ps.other_allowances or 0),
+        "gross_salary": float(ps.gross_salary or 0),
+        "nhif_deduction": float(ps.nhif_deduction or 0),
+        "nssf_deduction": float(ps.nssf_deduction or 0),
+        "paye_tax": float(ps.paye_tax or 0),
+        "loan_deductions": float(ps.loan_deductions or 0),
+        "advance_deductions": float(ps.advance_deductions or 0),
+        "other_deductions": float(ps.other_deductions or 0),
+        "total_deductions": float(ps.total_deductions or 0),
+        "net_salary": float(ps.net_salary or 0)
+    }
+
+# Queued payslips whose job has not reported for this long (e.g. lost in a restart) can be queued again
+PAYSLIP_EMAIL_STALE = timedelta(minutes=30)
+
+# Running bulk email jobs; the event loop only keeps weak references to tasks
+_payslip_email_tasks = set()
+
+def _set_payslip_email_status(tenant_ctx, payslip_ids: list, values: dict, only_queued: bool = False):
+    tenant_session = tenant_ctx.create_session()
+    try:
+        query = tenant_session.query(Payslip).filter(Payslip.id.in_(payslip_ids))
+        if only_queued:
+            query = query.filter(Payslip.email_status == "queued")
+        query.update(values, synchronize_session=False)
+        tenant_session.commit()
+    finally:
+        tenant_session.close()
+
+async def _run_bulk_payslip_email(tenant_ctx, settings: dict, org_name: str, jobs: list):
+    """Background job: send queued payslips and record the outcome on each row"""
+    from starlette.concurrency import run_in_threadpool
+    from services.email_service import send_bulk_payslip_emails
+    
+    async def on_result(payslip_id, success, error):
+        if success:
+            values = {"email_status": "sent", "email_error": None, "emailed_at": datetime.utcnow()}
+        else:
+            values = {"email_status": "failed", "email_error": (error or "")[:1000]}
+        await run_in_threadpool(_set_payslip_email_status, tenant_ctx, [payslip_id], values)
+    
+    try:
+        summary = await send_bulk_payslip_emails(settings, org_name, jobs, on_result)
+        print(f"[Payslip Email] Bulk run finished: {summary['sent']} sent, {summary['failed']} failed")
+    except Exception as e:
+        print(f"[Payslip Email] Bulk run aborted: {e}")
+        await run_in_threadpool(
+            _set_payslip_email_status, tenant_ctx, [job["payslip_id"] for job in jobs],
+            {"email_status": "failed", "email_error": str(e)[:1000]}, True
+        )
+    finally:
+        tenant_ctx.close()
+
+def _queue_payslip_emails(tenant_session, pay_period: str, resend: bool = False):
+    """Mark a pay period's payslips queued and build their email jobs; commits.
+
+    Payslips already queued are left to their job unless resend is set or the
+    job has gone quiet for PAYSLIP_EMAIL_STALE. Returns (jobs, skipped, in_progress).
+    """
+    query = tenant_session.query(Payslip, Staff, StaffProfile).join(
+        Staff, Staff.id == Payslip.staff_id
+    ).outerjoin(
+        StaffProfile, StaffProfile.staff_id == Payslip.staff_id
+    ).filter(Payslip.pay_period == pay_period)
+    if not resend:
+        query = query.filter(Payslip.emailed_at.is_(None))
+    
+    now = datetime.utcnow()
+    jobs = []
+    skipped = 0
+    in_progress = 0
+    for ps, staff, profile in query.all():
+        if ps.email_status == "queued" and not resend and ps.email_queued_at and now - ps.email_queued_at < PAYSLIP_EMAIL_STALE:
+            in_progress += 1
+            continue
+        national_id = profile.national_id if profile else None
+        if not staff.email or not national_id:
+            ps.email_status = "failed"
+            ps.email_error = "Staff email not found" if not staff.email else "National ID is required for password-protected payslip"
+            skipped += 1
+            continue
+        ps.email_status = "queued"
+        ps.email_error = None
+        ps.email_queued_at = now
+        jobs.append({
+            "payslip_id": ps.id,
+            "staff_email": staff.email,
+            "staff_name": f"{staff.first_name} {staff.last_name}",
+            "cc_email": staff.secondary_email,
+            "national_id": national_id,
+            "payslip_data": _payslip_email_data(ps),
+        })
+    tenant_session.commit()
+    return jobs, skipped, in_progress
+
+def _prepare_bulk_payslip_email(org_id: str, pay_period: str, resend: bool, user, db: Session):
+    from services.email_service import get_email_settings, get_brevo_service
+    
+    tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
+    require_permission(membership, "hr:write", db)
+    tenant_session = tenant_ctx.create_session()
+    try:
+        from models.master import Organization
+        org = db.query(Organization).filter(Organization.id == org_id).first()
+        org_name = org.name if org else "Your Organization"
+        
+        settings = get_email_settings(tenant_session)
+        try:
+            get_brevo_service(settings, org_name)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        jobs, skipped, in_progress = _queue_payslip_emails(tenant_session, pay_period, resend)
+        return tenant_ctx, settings, org_name, jobs, skipped, in_progress
+    finally:
+        tenant_session.close()
+
+@router.post("/{org_id}/hr/payslips/email-bulk")
+async def email_payslips_bulk(org_id: str, pay_period: str, resend: bool = False, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    """Queue every payslip in a pay period for emailing; progress is tracked per payslip"""
+    import asyncio
+    from starlette.concurrency import run_in_threadpool
+    
+    # The database work runs in the threadpool; only the email job runs on the event loop
+    tenant_ctx, settings, org_name, jobs, skipped, in_progress = await run_in_threadpool(
+        _prepare_bulk_payslip_email, org_id, pay_period, resend, user, db
+    )
+    if jobs:
+        task = asyncio.create_task(_run_bulk_payslip_email(tenant_ctx, settings, org_name, jobs))
+        _payslip_email_tasks.add(task)
+        task.add_done_callback(_payslip_email_tasks.discard)
+    else:
+        tenant_ctx.close()
+    
+    return {
+        "message": f"Queued {len(jobs)} payslips for {pay_period}",
+        "queued": len(jobs),
+        "skipped": skipped,
+        "in_progress": in_progress
+    }
+
+@router.get("/{org_id}/hr/payslips/email-status")
+def get_payslip_email_status(org_id: str, pay_period: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
+    require_permission(membership, "hr:read", db)
+    tenant_session = tenant_ctx.create_session()
+    try:
+        rows = tenant_session.query(
+            Payslip.id, Payslip.staff_id, Payslip.email_status, Payslip.email_error, Payslip.emailed_at,
+            Staff.first_name, Staff.last_name
+        ).outerjoin(Staff, Staff.id == Payslip.staff_id).filter(Payslip.pay_period == pay_period).all()
+        
+        counts = {"queued": 0, "sent": 0, "failed": 0, "not_sent": 0}
+        items = []
+        for row in rows:
+            status = row.email_status or ("sent" if row.emailed_at else "not_sent")
+            counts[status] = counts.get(status, 0) + 1
+            items.append({
+                "payslip_id": row.id,
+                "staff_id": row.staff_id,
+                "staff_name": f"{row.first_name} {row.last_name}" if row.first_name else None,
+                "email_status": status,
+                "email_error": row.email_error,
+                "emailed_at": row.emailed_at
+            })
+        return {"pay_period": pay_period, "total": len(items), "counts": counts, "payslips": items}
+    finally:
+        tenant_session.close()
+        tenant_ctx.close()
+
 @router.get("/{org_id}/hr/payslips/{payslip_id}")
-async def get_payslip_detail(org_id: str, payslip_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_payslip_detail(org_id: str, payslip_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -2124,23 +2302,7 @@ async def email_payslip(org_id: str, payslip_id: str, user=Depends(get_current_u
         org = db.query(Organization).filter(Organization.id == org_id).first()
         org_name = org.name if org else "Your Organization"
         
-        payslip_data = {
-            "pay_period": ps.pay_period,
-            "pay_date": str(ps.pay_date) if ps.pay_date else "N/A",
-            "basic_salary": float(ps.basic_salary or 0),
-            "house_allowance": float(ps.house_allowance or 0),
-            "transport_allowance": float(ps.transport_allowance or 0),
-            "other_allowances": float(ps.other_allowances or 0),
-            "gross_salary": float(ps.gross_salary or 0),
-            "nhif_deduction": float(ps.nhif_deduction or 0),
-            "nssf_deduction": float(ps.nssf_deduction or 0),
-            "paye_tax": float(ps.paye_tax or 0),
-            "loan_deductions": float(ps.loan_deductions or 0),
-            "advance_deductions": float(ps.advance_deductions or 0),
-            "other_deductions": float(ps.other_deductions or 0),
-            "total_deductions": float(ps.total_deductions or 0),
-            "net_salary": float(ps.net_salary or 0)
-        }
+        payslip_data = _payslip_email_data(ps)
         
         staff_name = f"{staff.first_name} {staff.last_name}"
         
@@ -2156,6 +2318,8 @@ async def email_payslip(org_id: str, payslip_id: str, user=Depends(get_current_u
             )
             
             ps.emailed_at = datetime.utcnow()
+            ps.email_status = "sent"
+            ps.email_error = None
             tenant_session.commit()
             
             cc_msg = f" (CC: {staff.secondary_email})" if staff.secondary_email else ""
@@ -2171,7 +2335,7 @@ async def email_payslip(org_id: str, payslip_id: str, user=Depends(get_current_u
 # ==================== SALARY ADVANCES ====================
 
 @router.get("/{org_id}/hr/salary-advances")
-async def list_salary_advances(org_id: str, status: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_salary_advances(org_id: str, status: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -2206,7 +2370,7 @@ async def list_salary_advances(org_id: str, status: str = None, user=Depends(get
         tenant_ctx.close()
 
 @router.post("/{org_id}/hr/salary-advances")
-async def request_salary_advance(org_id: str, data: SalaryAdvanceCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def request_salary_advance(org_id: str, data: SalaryAdvanceCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -2233,7 +2397,7 @@ async def request_salary_advance(org_id: str, data: SalaryAdvanceCreate, user=De
         tenant_ctx.close()
 
 @router.put("/{org_id}/hr/salary-advances/{advance_id}/approve")
-async def approve_salary_advance(org_id: str, advance_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def approve_salary_advance(org_id: str, advance_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -2255,7 +2419,7 @@ async def approve_salary_advance(org_id: str, advance_id: str, user=Depends(get_
         tenant_ctx.close()
 
 @router.put("/{org_id}/hr/salary-advances/{advance_id}/disburse")
-async def disburse_salary_advance(org_id: str, advance_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def disburse_salary_advance(org_id: str, advance_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "hr:write", db)
     tenant_session = tenant_ctx.create_session()
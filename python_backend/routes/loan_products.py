@@ -11,7 +11,7 @@ from sqlalchemy import func
 router = APIRouter()
 
 @router.get("/{org_id}/loan-products")
-async def get_loan_products(
+def get_loan_products(
     org_id: str,
     user = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -27,7 +27,7 @@ async def get_loan_products(
         tenant_ctx.close()
 
 @router.post("/{org_id}/loan-products")
-async def create_loan_product(
+def create_loan_product(
     org_id: str,
     data: LoanProductCreate,
     user = Depends(get_current_user),
@@ -53,7 +53,7 @@ async def create_loan_product(
         tenant_ctx.close()
 
 @router.patch("/{org_id}/loan-products/{product_id}")
-async def update_loan_product(
+def update_loan_product(
     org_id: str,
     product_id: str,
     data: LoanProductUpdate,
@@ -82,7 +82,7 @@ async def update_loan_product(
         tenant_ctx.close()
 
 @router.delete("/{org_id}/loan-products/{product_id}", dependencies=[Depends(require_not_demo)])
-async def delete_loan_product(
+def delete_loan_product(
     org_id: str,
     product_id: str,
     user = Depends(get_current_user),
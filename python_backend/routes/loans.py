@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import func, or_
 from typing import List, Optional
@@ -10,8 +10,15 @@ from models.tenant import LoanApplication, LoanProduct, Member, LoanGuarantor, L
 from schemas.tenant import LoanApplicationCreate, LoanApplicationUpdate, LoanApplicationResponse, LoanApplicationAction, LoanDisbursement, LoanGuarantorCreate
 from routes.auth import get_current_user
 from middleware.demo_guard import require_not_demo
-from routes.common import get_tenant_session_context, require_permission, require_any_permission, require_role
+from routes.common import get_tenant_session_context, require_permission, require_any_permission, require_role, run_async
 from services.code_generator import generate_txn_code
+from services.sequences import allocate
+from services.pagination import COUNT_MODE_PATTERN, count_rows, cursor_page_meta, keyset_page
+from services.branch_scope import effective_branch_id, matching_members_subquery, scope_to_branch
+from services.amortization import (
+    get_periodic_rate, instalments_to_term_months, loan_totals, preview_schedule, product_terms,
+    term_months_to_instalments,
+)
 
 def try_send_sms(tenant_session, template_type: str, phone: str, name: str, context: dict, member_id=None, loan_id=None):
     """Try to send SMS, fail silently if SMS not configured"""
@@ -56,77 +63,34 @@ def post_disbursement_to_gl(tenant_session, loan, member, disbursement_method: s
 
 router = APIRouter()
 
-def get_periodic_rate(interest_rate: Decimal, interest_rate_period: str, repayment_frequency: str) -> Decimal:
-    periods_per_year = {"daily": 365, "weekly": 52, "bi_weekly": 26, "monthly": 12}
-    rate_as_decimal = interest_rate / Decimal("100")
-    
-    freq_periods = periods_per_year.get(repayment_frequency, 12)
-    rate_periods = periods_per_year.get(interest_rate_period, 12)
-    
-    if interest_rate_period == "annual":
-        return rate_as_decimal / Decimal(str(freq_periods))
-    elif rate_periods == freq_periods:
-        return rate_as_decimal
-    else:
-        annual_rate = rate_as_decimal * Decimal(str(rate_periods))
-        return annual_rate / Decimal(str(freq_periods))
-
-def term_months_to_instalments(term_months: int, repayment_frequency: str) -> int:
-    periods_per_year = {"daily": 365, "weekly": 52, "bi_weekly": 26, "monthly": 12}
-    ppy = periods_per_year.get(repayment_frequency, 12)
-    return max(round(term_months * ppy / 12), 1)
-
-def instalments_to_term_months(num_instalments: int, repayment_frequency: str) -> int:
-    periods_per_year = {"daily": 365, "weekly": 52, "bi_weekly": 26, "monthly": 12}
-    ppy = periods_per_year.get(repayment_frequency, 12)
-    return max(round(num_instalments * 12 / ppy), 1)
-
 def calculate_loan(amount: Decimal, term_months: int, interest_rate: Decimal, interest_type: str = "reducing_balance", repayment_frequency: str = "monthly", interest_rate_period: str = "monthly"):
     periodic_rate = get_periodic_rate(interest_rate, interest_rate_period, repayment_frequency)
     num_instalments = term_months_to_instalments(term_months, repayment_frequency)
-
-    n = num_instalments
-    if interest_type == "flat":
-        total_interest = amount * periodic_rate * n
-        total_repayment = amount + total_interest
-        periodic_payment = total_repayment / n if n > 0 else Decimal("0")
-    else:
-        if periodic_rate > 0:
-            periodic_payment = amount * (periodic_rate * (1 + periodic_rate) ** n) / ((1 + periodic_rate) ** n - 1)
-        else:
-            periodic_payment = amount / n if n > 0 else Decimal("0")
-        total_repayment = periodic_payment * n
-        total_interest = total_repayment - amount
-
-    return {
-        "total_interest": round(total_interest, 2),
-        "total_repayment": round(total_repayment, 2),
-        "monthly_repayment": round(periodic_payment, 2),
-        "num_instalments": n
-    }
+    return loan_totals(amount, num_instalments, periodic_rate, interest_type)
 
 def generate_code(db: Session, prefix: str):
-    count = db.query(func.count(LoanApplication.id)).scalar() or 0
-    return f"{prefix}{count + 1:04d}"
+    seed = lambda: db.query(func.count(LoanApplication.id)).scalar() or 0
+    number = allocate(db, f"code:loan_applications.application_number:{prefix}", seed=seed)
+    return f"{prefix}{number:04d}"
+
+def _filter_loan_search(tenant_session, query, search: str):
+    """Match loans by application number or by the borrower's name/number/phone"""
+    return query.filter(
+        or_(
+            LoanApplication.application_number.ilike(f"%{search.strip()}%"),
+            LoanApplication.member_id.in_(matching_members_subquery(tenant_session, search)),
+        )
+    )
 
 @router.get("/{org_id}/loans")
-async def list_loans(org_id: str, status: str = None, statuses: str = None, member_id: str = None, branch_id: str = None, page: int = 1, page_size: int = 20, search: str = None, product_id: str = None, date_from: str = None, date_to: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
-    from routes.common import get_branch_filter
-    
+def list_loans(org_id: str, status: str = None, statuses: str = None, member_id: str = None, branch_id: str = None, page: int = 1, page_size: int = 20, search: str = None, product_id: str = None, date_from: str = None, date_to: str = None, cursor: str = None, count: str = Query(None, pattern=COUNT_MODE_PATTERN), user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "loans:read", db)
     tenant_session = tenant_ctx.create_session()
     try:
         query = tenant_session.query(LoanApplication)
         
-        staff_branch_id = get_branch_filter(user)
-        
-        if staff_branch_id:
-            branch_member_ids = [m.id for m in tenant_session.query(Member).filter(Member.branch_id == staff_branch_id).all()]
-            query = query.filter(LoanApplication.member_id.in_(branch_member_ids))
-        elif branch_id:
-            branch_member_ids = [m.id for m in tenant_session.query(Member).filter(Member.branch_id == branch_id).all()]
-            query = query.filter(LoanApplication.member_id.in_(branch_member_ids))
+        query = scope_to_branch(query, LoanApplication, effective_branch_id(user, branch_id))
         
         if statuses:
             status_list = [s.strip() for s in statuses.split(",") if s.strip()]
@@ -150,23 +114,8 @@ async def list_loans(org_id: str, status: str = None, statuses: str = None, memb
             except ValueError:
                 pass
         
-        if search:
-            search_term = f"%{search.strip()}%"
-            matching_member_ids = [m.id for m in tenant_session.query(Member).filter(
-                or_(
-                    Member.first_name.ilike(search_term),
-                    Member.last_name.ilike(search_term),
-                    Member.member_number.ilike(search_term),
-                )
-            ).all()]
-            query = query.filter(
-                or_(
-                    LoanApplication.application_number.ilike(search_term),
-                    LoanApplication.member_id.in_(matching_member_ids) if matching_member_ids else False,
-                )
-            )
-        
-        total = query.count()
+        if search and search.strip():
+            query = _filter_loan_search(tenant_session, query, search)
         
         if page < 1:
             page = 1
@@ -175,7 +124,21 @@ async def list_loans(org_id: str, status: str = None, statuses: str = None, memb
         if page_size > 100:
             page_size = 100
         
-        loans = query.order_by(LoanApplication.created_at.desc()).offset((page - 1) * page_size).limit(page_size).all()
+        if cursor is not None:
+            loans, next_cursor = keyset_page(query, LoanApplication.created_at, LoanApplication.id, cursor, page_size)
+            pagination = {
+                "page_size": page_size,
+                **cursor_page_meta(tenant_session, query, cursor, next_cursor, count),
+            }
+        else:
+            total, _ = count_rows(tenant_session, query, count or "exact")
+            loans = query.order_by(LoanApplication.created_at.desc(), LoanApplication.id.desc()).offset((page - 1) * page_size).limit(page_size).all()
+            pagination = {
+                "page": page,
+                "page_size": page_size,
+                "total": total,
+                "total_pages": (total + page_size - 1) // page_size if total is not None else None,
+            }
         
         member_ids = list(set(l.member_id for l in loans if l.member_id))
         product_ids = list(set(l.loan_product_id for l in loans if l.loan_product_id))
@@ -216,23 +179,16 @@ async def list_loans(org_id: str, status: str = None, statuses: str = None, memb
             loan_dict["reviewed_by_name"] = f"{reviewed_by.first_name} {reviewed_by.last_name}" if reviewed_by else None
             result.append(loan_dict)
         
-        total_pages = (total + page_size - 1) // page_size
-        
         return {
             "data": result,
-            "pagination": {
-                "page": page,
-                "page_size": page_size,
-                "total": total,
-                "total_pages": total_pages,
-            }
+            "pagination": pagination,
         }
     finally:
         tenant_session.close()
         tenant_ctx.close()
 
 @router.post("/{org_id}/loans")
-async def create_loan(org_id: str, data: LoanApplicationCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def create_loan(org_id: str, data: LoanApplicationCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "loans:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -383,13 +339,12 @@ async def create_loan(org_id: str, data: LoanApplicationCreate, user=Depends(get
         tenant_ctx.close()
 
 @router.get("/{org_id}/loans/export")
-async def export_loans(org_id: str, export_type: str = "all", status: str = None, product_id: str = None, branch_id: str = None, date_from: str = None, date_to: str = None, search: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def export_loans(org_id: str, export_type: str = "all", status: str = None, product_id: str = None, branch_id: str = None, date_from: str = None, date_to: str = None, search: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
     from fastapi.responses import StreamingResponse
     from openpyxl import Workbook
     from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
     from io import BytesIO
     from datetime import date
-    from routes.common import get_branch_filter
     
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "loans:read", db)
@@ -445,13 +400,7 @@ async def export_loans(org_id: str, export_type: str = "all", status: str = None
                 query = query.filter(LoanApplication.status.in_(active_statuses))
             title = f"Loan Applications Export - {today.strftime('%d %b %Y')}"
         
-        staff_branch_id = get_branch_filter(user)
-        if staff_branch_id:
-            branch_member_ids = [m.id for m in tenant_session.query(Member).filter(Member.branch_id == staff_branch_id).all()]
-            query = query.filter(LoanApplication.member_id.in_(branch_member_ids))
-        elif branch_id:
-            branch_member_ids = [m.id for m in tenant_session.query(Member).filter(Member.branch_id == branch_id).all()]
-            query = query.filter(LoanApplication.member_id.in_(branch_member_ids))
+        query = scope_to_branch(query, LoanApplication, effective_branch_id(user, branch_id))
         
         if product_id:
             query = query.filter(LoanApplication.loan_product_id == product_id)
@@ -465,17 +414,8 @@ async def export_loans(org_id: str, export_type: str = "all", status: str = None
                 query = query.filter(LoanApplication.created_at < datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1))
             except ValueError:
                 pass
-        if search:
-            search_term = f"%{search.strip()}%"
-            matching_ids = [m.id for m in tenant_session.query(Member).filter(
-                or_(Member.first_name.ilike(search_term), Member.last_name.ilike(search_term), Member.member_number.ilike(search_term))
-            ).all()]
-            query = query.filter(
-                or_(
-                    LoanApplication.application_number.ilike(search_term),
-                    LoanApplication.member_id.in_(matching_ids) if matching_ids else False,
-                )
-            )
+        if search and search.strip():
+            query = _filter_loan_search(tenant_session, query, search)
         
         loans = query.order_by(LoanApplication.created_at.desc()).all()
         
@@ -611,7 +551,7 @@ async def export_loans(org_id: str, export_type: str = "all", status: str = None
         tenant_ctx.close()
 
 @router.post("/{org_id}/loans/eligibility-check")
-async def check_loan_eligibility(
+def check_loan_eligibility(
     org_id: str,
     payload: dict,
     user=Depends(get_current_user),
@@ -826,15 +766,17 @@ async def check_loan_eligibility(
             })
             all_passed = False
 
-        # Calculate estimated monthly payment (reducing balance)
-        monthly_rate = float(product.interest_rate) / 100.0
-        if product.interest_rate_period == "annual":
-            monthly_rate = monthly_rate / 12.0
+        # Estimated instalment and total repayable, from the same engine that builds schedules
         estimated_payment = 0.0
-        if monthly_rate > 0 and term_months > 0:
-            estimated_payment = float(amount) * (monthly_rate * (1 + monthly_rate) ** term_months) / ((1 + monthly_rate) ** term_months - 1)
-        elif term_months > 0:
-            estimated_payment = float(amount) / term_months
+        estimated_total = 0.0
+        if term_months > 0:
+            totals, _ = preview_schedule(
+                amount, product.interest_rate, term_months,
+                getattr(product, 'repayment_frequency', None) or 'monthly',
+                product_terms(product, deduct_upfront=False), datetime.utcnow().date(),
+            )
+            estimated_payment = float(totals["monthly_repayment"])
+            estimated_total = float(totals["total_repayment"])
 
         # Fee estimates
         processing_fee = float(amount) * float(product.processing_fee or 0) / 100.0
@@ -880,7 +822,7 @@ async def check_loan_eligibility(
                 "insurance_fee": round(insurance_fee, 2),
                 "appraisal_fee": round(appraisal_fee, 2),
                 "total_fees": round(total_fees, 2),
-                "total_repayable": round(estimated_payment * term_months, 2),
+                "total_repayable": round(estimated_total, 2),
             },
             "max_eligible_amount": max_eligible,
         }
@@ -889,7 +831,7 @@ async def check_loan_eligibility(
         tenant_ctx.close()
 
 @router.get("/{org_id}/loans/{loan_id}")
-async def get_loan(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_loan(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "loans:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -921,7 +863,7 @@ async def get_loan(org_id: str, loan_id: str, user=Depends(get_current_user), db
         tenant_ctx.close()
 
 @router.put("/{org_id}/loans/{loan_id}/action")
-async def process_loan_action(org_id: str, loan_id: str, data: LoanApplicationAction, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def process_loan_action(org_id: str, loan_id: str, data: LoanApplicationAction, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     if data.action == "approve":
         require_permission(membership, "loans:approve")
@@ -1052,7 +994,7 @@ async def process_loan_action(org_id: str, loan_id: str, data: LoanApplicationAc
         tenant_ctx.close()
 
 @router.post("/{org_id}/loans/{loan_id}/disburse")
-async def disburse_loan(org_id: str, loan_id: str, data: LoanDisbursement, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def disburse_loan(org_id: str, loan_id: str, data: LoanDisbursement, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "loans:process")
     tenant_session = tenant_ctx.create_session()
@@ -1245,12 +1187,17 @@ async def disburse_loan(org_id: str, loan_id: str, data: LoanDisbursement, user=
                 if phone.startswith("0"):
                     phone = "254" + phone[1:]
 
-                from routes.mpesa import initiate_b2c_disbursement
-                mpesa_b2c_result = initiate_b2c_disbursement(
-                    tenant_session, phone, net_amount,
-                    remarks=f"Loan disbursement {loan.application_number}",
-                    occasion=loan.application_number
-                )
+                from routes.mpesa import b2c_disbursement_request, send_b2c_disbursement
+                try:
+                    creds, payload = b2c_disbursement_request(
+                        tenant_session, phone, net_amount,
+                        remarks=f"Loan disbursement {loan.application_number}",
+                        occasion=loan.application_number
+                    )
+                except ValueError as e:
+                    mpesa_b2c_result = {"success": False, "error": str(e)}
+                else:
+                    mpesa_b2c_result = run_async(send_b2c_disbursement, creds, payload)
                 if mpesa_b2c_result and mpesa_b2c_result.get("success"):
                     loan.status = "disbursed"
                     loan.disbursed_at = datetime.utcnow()
@@ -1341,7 +1288,7 @@ async def disburse_loan(org_id: str, loan_id: str, data: LoanDisbursement, user=
         tenant_ctx.close()
 
 @router.get("/{org_id}/loans/{loan_id}/summary")
-async def get_loan_summary(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_loan_summary(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "loans:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -1403,7 +1350,7 @@ async def get_loan_summary(org_id: str, loan_id: str, user=Depends(get_current_u
         tenant_ctx.close()
 
 @router.get("/{org_id}/loans/{loan_id}/instalments")
-async def get_loan_instalments(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_loan_instalments(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "loans:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -1439,7 +1386,7 @@ async def get_loan_instalments(org_id: str, loan_id: str, user=Depends(get_curre
         tenant_ctx.close()
 
 @router.delete("/{org_id}/loans/{loan_id}", dependencies=[Depends(require_not_demo)])
-async def delete_loan(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_loan(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_role(membership, ["owner", "admin"])
     tenant_session = tenant_ctx.create_session()
@@ -1460,7 +1407,7 @@ async def delete_loan(org_id: str, loan_id: str, user=Depends(get_current_user),
         tenant_ctx.close()
 
 @router.put("/{org_id}/loans/{loan_id}")
-async def update_loan(org_id: str, loan_id: str, data: LoanApplicationUpdate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def update_loan(org_id: str, loan_id: str, data: LoanApplicationUpdate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "loans:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -1536,7 +1483,7 @@ async def update_loan(org_id: str, loan_id: str, data: LoanApplicationUpdate, us
         tenant_ctx.close()
 
 @router.put("/{org_id}/loans/{loan_id}/cancel")
-async def cancel_loan(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def cancel_loan(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "loans:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -1558,36 +1505,36 @@ async def cancel_loan(org_id: str, loan_id: str, user=Depends(get_current_user),
 
 # Alias routes for frontend compatibility - loan-applications maps to loans
 @router.get("/{org_id}/loan-applications")
-async def list_loan_applications(org_id: str, status: str = None, statuses: str = None, member_id: str = None, branch_id: str = None, page: int = 1, page_size: int = 20, search: str = None, product_id: str = None, date_from: str = None, date_to: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
-    return await list_loans(org_id, status=status, statuses=statuses, member_id=member_id, branch_id=branch_id, page=page, page_size=page_size, search=search, product_id=product_id, date_from=date_from, date_to=date_to, user=user, db=db)
+def list_loan_applications(org_id: str, status: str = None, statuses: str = None, member_id: str = None, branch_id: str = None, page: int = 1, page_size: int = 20, search: str = None, product_id: str = None, date_from: str = None, date_to: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    return list_loans(org_id, status=status, statuses=statuses, member_id=member_id, branch_id=branch_id, page=page, page_size=page_size, search=search, product_id=product_id, date_from=date_from, date_to=date_to, user=user, db=db)
 
 @router.post("/{org_id}/loan-applications")
-async def create_loan_application(org_id: str, data: LoanApplicationCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
-    return await create_loan(org_id, data, user, db)
+def create_loan_application(org_id: str, data: LoanApplicationCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    return create_loan(org_id, data, user, db)
 
 @router.get("/{org_id}/loan-applications/{loan_id}")
-async def get_loan_application(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
-    return await get_loan(org_id, loan_id, user, db)
+def get_loan_application(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    return get_loan(org_id, loan_id, user, db)
 
 @router.post("/{org_id}/loan-applications/{loan_id}/approve")
-async def approve_loan_application(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
-    return await process_loan_action(org_id, loan_id, LoanApplicationAction(action="approve"), user, db)
+def approve_loan_application(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    return process_loan_action(org_id, loan_id, LoanApplicationAction(action="approve"), user, db)
 
 @router.post("/{org_id}/loan-applications/{loan_id}/reject")
-async def reject_loan_application(org_id: str, loan_id: str, data: dict = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def reject_loan_application(org_id: str, loan_id: str, data: dict = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
     reason = data.get("reason", "") if data else ""
-    return await process_loan_action(org_id, loan_id, LoanApplicationAction(action="reject", reason=reason), user, db)
+    return process_loan_action(org_id, loan_id, LoanApplicationAction(action="reject", reason=reason), user, db)
 
 @router.post("/{org_id}/loan-applications/{loan_id}/disburse")
-async def disburse_loan_application(org_id: str, loan_id: str, data: Optional[LoanDisbursement] = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def disburse_loan_application(org_id: str, loan_id: str, data: Optional[LoanDisbursement] = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
     if data is None:
         data = LoanDisbursement(disbursement_method="cash")
-    return await disburse_loan(org_id, loan_id, data, user, db)
+    return disburse_loan(org_id, loan_id, data, user, db)
 
 @router.put("/{org_id}/loan-applications/{loan_id}")
-async def update_loan_application(org_id: str, loan_id: str, data: LoanApplicationUpdate, user=Depends(get_current_user), db: Session = Depends(get_db)):
-    return await update_loan(org_id, loan_id, data, user, db)
+def update_loan_application(org_id: str, loan_id: str, data: LoanApplicationUpdate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    return update_loan(org_id, loan_id, data, user, db)
 
 @router.put("/{org_id}/loan-applications/{loan_id}/cancel")
-async def cancel_loan_application(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
-    return await cancel_loan(org_id, loan_id, user, db)
+def cancel_loan_application(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    return cancel_loan(org_id, loan_id, user, db)
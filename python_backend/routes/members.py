@@ -1,12 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, func
 from decimal import Decimal
 from models.database import get_db
 from models.tenant import Member, Transaction, OrganizationSettings, LoanApplication, LoanGuarantor, AuditLog, Staff, SMSNotification
 from schemas.tenant import MemberCreate, MemberUpdate, MemberResponse
 from routes.auth import get_current_user
 from routes.common import generate_code, generate_account_number, get_tenant_session_context, require_permission
+from services.member_search import apply_member_search, search_members
+from services.pagination import COUNT_MODE_PATTERN, count_rows, cursor_page_meta, keyset_page
 from middleware.demo_guard import require_not_demo
 
 def try_send_sms(tenant_session, template_type: str, phone: str, name: str, context: dict, member_id=None, loan_id=None):
@@ -53,12 +54,14 @@ def get_org_setting(tenant_session, key: str, default=None):
     return default
 
 @router.get("/{org_id}/members")
-async def get_members(
+def get_members(
     org_id: str,
     branch_id: str = None,
     search: str = Query(None, description="Search by name, member number, phone, ID, or email"),
     page: int = Query(None, ge=1, description="Page number (enables paginated response)"),
     per_page: int = Query(20, ge=1, le=100, description="Items per page"),
+    cursor: str = Query(None, description="Keyset cursor (empty for the first page); enables cursor pagination"),
+    count: str = Query(None, pattern=COUNT_MODE_PATTERN, description="exact, estimate or none"),
     user = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -77,31 +80,31 @@ async def get_members(
         elif branch_id:
             query = query.filter(Member.branch_id == branch_id)
         
-        if search and search.strip():
-            term = f"%{search.strip()}%"
-            query = query.filter(
-                or_(
-                    func.lower(Member.first_name).like(func.lower(term)),
-                    func.lower(Member.last_name).like(func.lower(term)),
-                    func.lower(Member.member_number).like(func.lower(term)),
-                    func.lower(Member.phone).like(func.lower(term)),
-                    func.lower(Member.id_number).like(func.lower(term)),
-                    func.lower(Member.email).like(func.lower(term)),
-                    func.lower(
-                        Member.first_name + " " + Member.last_name
-                    ).like(func.lower(term)),
-                )
-            )
+        searching = bool(search and search.strip())
+        if cursor is not None:
+            if searching:
+                query = apply_member_search(tenant_session, query, search, ranked=False)
+            members, next_cursor = keyset_page(query, Member.created_at, Member.id, cursor, per_page)
+            return {
+                "items": [MemberResponse.model_validate(m) for m in members],
+                "per_page": per_page,
+                **cursor_page_meta(tenant_session, query, cursor, next_cursor, count),
+            }
+        
+        if searching:
+            query = apply_member_search(tenant_session, query, search)
         
         if page is not None:
-            total = query.count()
-            members = query.order_by(Member.created_at.desc()).offset((page - 1) * per_page).limit(per_page).all()
+            total, _ = count_rows(tenant_session, query, count or "exact")
+            if not searching:
+                query = query.order_by(Member.created_at.desc(), Member.id.desc())
+            members = query.offset((page - 1) * per_page).limit(per_page).all()
             return {
                 "items": [MemberResponse.model_validate(m) for m in members],
                 "total": total,
                 "page": page,
                 "per_page": per_page,
-                "total_pages": (total + per_page - 1) // per_page,
+                "total_pages": (total + per_page - 1) // per_page if total is not None else None,
             }
         else:
             members = query.all()
@@ -110,8 +113,36 @@ async def get_members(
         tenant_session.close()
         tenant_ctx.close()
 
+@router.get("/{org_id}/members/typeahead")
+def members_typeahead(
+    org_id: str,
+    q: str = Query(..., min_length=1, description="Name, member number, phone, ID or email fragment"),
+    limit: int = Query(10, ge=1, le=50),
+    user = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Ranked lookup for pickers; returns only id, name and member number"""
+    from routes.common import get_branch_filter
+    
+    tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
+    require_permission(membership, "members:read", db)
+    tenant_session = tenant_ctx.create_session()
+    try:
+        rows = search_members(tenant_session, q, limit=limit, branch_id=get_branch_filter(user))
+        return [
+            {
+                "id": r.id,
+                "name": f"{r.first_name} {r.last_name}",
+                "member_number": r.member_number,
+            }
+            for r in rows
+        ]
+    finally:
+        tenant_session.close()
+        tenant_ctx.close()
+
 @router.get("/{org_id}/members/check-id/{id_number}")
-async def check_id_number(
+def check_id_number(
     org_id: str,
     id_number: str,
     user = Depends(get_current_user),
@@ -146,7 +177,7 @@ async def check_id_number(
         tenant_ctx.close()
 
 @router.post("/{org_id}/members")
-async def create_member(
+def create_member(
     org_id: str,
     data: MemberCreate,
     user = Depends(get_current_user),
@@ -235,7 +266,7 @@ async def create_member(
         tenant_ctx.close()
 
 @router.patch("/{org_id}/members/{member_id}")
-async def update_member(
+def update_member(
     org_id: str,
     member_id: str,
     data: MemberUpdate,
@@ -291,7 +322,7 @@ async def update_member(
         tenant_ctx.close()
 
 @router.get("/{org_id}/members/{member_id}")
-async def get_member(
+def get_member(
     org_id: str,
     member_id: str,
     user = Depends(get_current_user),
@@ -310,7 +341,7 @@ async def get_member(
         tenant_ctx.close()
 
 @router.put("/{org_id}/members/{member_id}/activate")
-async def activate_member(
+def activate_member(
     org_id: str,
     member_id: str,
     user = Depends(get_current_user),
@@ -363,7 +394,7 @@ async def activate_member(
         tenant_ctx.close()
 
 @router.put("/{org_id}/members/{member_id}/suspend")
-async def suspend_member(
+def suspend_member(
     org_id: str,
     member_id: str,
     user = Depends(get_current_user),
@@ -400,7 +431,7 @@ async def suspend_member(
         tenant_ctx.close()
 
 @router.delete("/{org_id}/members/{member_id}", dependencies=[Depends(require_not_demo)])
-async def delete_member(
+def delete_member(
     org_id: str,
     member_id: str,
     user = Depends(get_current_user),
@@ -31,7 +31,7 @@ def _generate_activation_code() -> str:
 
 
 @router.post("/{org_id}/members/{member_id}/activate")
-async def staff_activate_mobile(
+def staff_activate_mobile(
     org_id: str,
     member_id: str,
     request: Request,
@@ -117,7 +117,7 @@ async def staff_activate_mobile(
 
 
 @router.get("/{org_id}/members/{member_id}/activity")
-async def get_member_mobile_activity(
+def get_member_mobile_activity(
     org_id: str,
     member_id: str,
     request: Request,
@@ -170,7 +170,7 @@ async def get_member_mobile_activity(
 
 
 @router.delete("/{org_id}/members/{member_id}/deactivate-mobile")
-async def staff_deactivate_mobile(
+def staff_deactivate_mobile(
     org_id: str,
     member_id: str,
     request: Request,
@@ -223,7 +223,7 @@ class ResendOtpRequest(BaseModel):
 
 
 @router.post("/activate/init")
-async def activate_init(data: ActivateInitRequest, request: Request, db: Session = Depends(get_db)):
+def activate_init(data: ActivateInitRequest, request: Request, db: Session = Depends(get_db)):
     """
     Step 1 of activation:
     Member enters id_number + staff one-time activation code + device_id.
@@ -281,7 +281,7 @@ async def activate_init(data: ActivateInitRequest, request: Request, db: Session
 
 
 @router.post("/activate/complete")
-async def activate_complete(
+def activate_complete(
     data: ActivateCompleteRequest,
     request: Request,
     response: Response,
@@ -390,7 +390,7 @@ async def activate_complete(
 
 
 @router.post("/login")
-async def mobile_login(data: LoginRequest, request: Request, db: Session = Depends(get_db)):
+def mobile_login(data: LoginRequest, request: Request, db: Session = Depends(get_db)):
     """
     Member logs in with device_id + 6-digit password.
     Sends OTP to the member's registered phone.
@@ -446,7 +446,7 @@ async def mobile_login(data: LoginRequest, request: Request, db: Session = Depen
 
 
 @router.post("/login/verify")
-async def mobile_login_verify(
+def mobile_login_verify(
     data: LoginVerifyRequest,
     request: Request,
     response: Response,
@@ -533,7 +533,7 @@ async def mobile_login_verify(
 
 
 @router.post("/resend-otp")
-async def resend_otp(data: ResendOtpRequest, db: Session = Depends(get_db)):
+def resend_otp(data: ResendOtpRequest, db: Session = Depends(get_db)):
     """
     Resend OTP for an in-progress activation or login.
     Activation flow: provide account_number.
@@ -590,7 +590,7 @@ async def resend_otp(data: ResendOtpRequest, db: Session = Depends(get_db)):
 
 
 @router.post("/logout")
-async def mobile_logout(request: Request, response: Response, db: Session = Depends(get_db)):
+def mobile_logout(request: Request, response: Response, db: Session = Depends(get_db)):
     """Invalidate the current mobile session. Supports both Bearer token and cookie."""
     from models.tenant import MobileSession
     from models.master import Organization
@@ -662,7 +662,7 @@ async def mobile_logout(request: Request, response: Response, db: Session = Depe
 
 
 @router.get("/demo-status")
-async def demo_status():
+def demo_status():
     from middleware.demo_guard import is_demo_mode
     return {"demo": is_demo_mode()}
 
@@ -671,7 +671,7 @@ DEMO_MEMBER_ID_NUMBER = "DEMO000001"
 
 
 @router.post("/demo-login")
-async def demo_login(request: Request, response: Response, db: Session = Depends(get_db)):
+def demo_login(request: Request, response: Response, db: Session = Depends(get_db)):
     """
     Instant demo login. Only works when platform demo mode is on.
     Finds the seeded demo member (created by demo data populate/reset),
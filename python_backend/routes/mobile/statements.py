@@ -6,13 +6,19 @@ GET  /api/mobile/me/statements/{statement_id}/download
 GET  /api/mobile/me/statements/history
 """
 
-import io
 import json
 import base64
+import asyncio
 from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import StreamingResponse
-from sqlalchemy import desc
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models.database import get_db
+from services.statement_renderer import (
+    cached_statement_path, claim_cached_statement, get_last_transaction_id, submit_statement_render,
+)
 from .deps import get_current_member
 
 router = APIRouter()
@@ -29,103 +35,20 @@ def _decode_statement_id(statement_id: str) -> dict:
         raise HTTPException(status_code=400, detail="Invalid statement ID")
 
 
-def _get_transactions(ts, member_id: str, start_date: datetime, end_date: datetime):
-    from models.tenant import Transaction
-    return (
-        ts.query(Transaction)
-        .filter(
-            Transaction.member_id == member_id,
-            Transaction.created_at >= start_date,
-            Transaction.created_at <= end_date,
-        )
-        .order_by(desc(Transaction.created_at))
-        .all()
-    )
+def _member_name(member) -> str:
+    return f"{getattr(member, 'first_name', '') or ''} {getattr(member, 'last_name', '') or ''}".strip()
 
 
-def _generate_pdf(member, transactions: list, start_date: datetime, end_date: datetime, account_type: str) -> bytes:
-    try:
-        from reportlab.lib.pagesizes import A4
-        from reportlab.lib import colors
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.units import cm
-
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, topMargin=2*cm, bottomMargin=2*cm)
-        styles = getSampleStyleSheet()
-        story = []
-
-        title_style = ParagraphStyle("Title", parent=styles["Heading1"], fontSize=16, spaceAfter=6)
-        sub_style = ParagraphStyle("Sub", parent=styles["Normal"], fontSize=10, textColor=colors.grey)
-        normal = styles["Normal"]
-
-        story.append(Paragraph("Account Statement", title_style))
-        story.append(Paragraph(f"Member: {getattr(member, 'full_name', '') or getattr(member, 'first_name', '')} {getattr(member, 'last_name', '')}", sub_style))
-        story.append(Paragraph(f"Account Type: {account_type.replace('_', ' ').title()}", sub_style))
-        story.append(Paragraph(f"Period: {start_date.strftime('%d %b %Y')} — {end_date.strftime('%d %b %Y')}", sub_style))
-        story.append(Paragraph(f"Generated: {datetime.utcnow().strftime('%d %b %Y %H:%M UTC')}", sub_style))
-        story.append(Spacer(1, 0.5*cm))
-
-        headers = ["Date", "Description", "Type", "Amount", "Balance"]
-        data = [headers]
-
-        running_balance = 0.0
-        for txn in reversed(transactions):
-            amount = float(getattr(txn, "amount", 0) or 0)
-            txn_type = getattr(txn, "transaction_type", "") or ""
-            if txn_type.lower() in ("credit", "deposit", "loan_disbursement"):
-                running_balance += amount
-            else:
-                running_balance -= amount
-            data.append([
-                txn.created_at.strftime("%d/%m/%Y") if txn.created_at else "",
-                (getattr(txn, "description", "") or "")[:50],
-                txn_type.replace("_", " ").title(),
-                f"{amount:,.2f}",
-                f"{running_balance:,.2f}",
-            ])
-
-        if len(data) == 1:
-            data.append(["No transactions found in this period", "", "", "", ""])
-
-        table = Table(data, colWidths=[3*cm, 7*cm, 4*cm, 3*cm, 3*cm])
-        table.setStyle(TableStyle([
-            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#1a56db")),
-            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-            ("FONTSIZE", (0, 0), (-1, 0), 9),
-            ("FONTSIZE", (0, 1), (-1, -1), 8),
-            ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#f9fafb")]),
-            ("GRID", (0, 0), (-1, -1), 0.25, colors.HexColor("#e5e7eb")),
-            ("ALIGN", (3, 0), (-1, -1), "RIGHT"),
-            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-            ("TOPPADDING", (0, 0), (-1, -1), 4),
-            ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
-        ]))
-        story.append(table)
-
-        doc.build(story)
-        return buffer.getvalue()
-
-    except ImportError:
-        # Fallback: plain-text PDF-like content
-        lines = [
-            "ACCOUNT STATEMENT",
-            f"Period: {start_date.strftime('%d %b %Y')} - {end_date.strftime('%d %b %Y')}",
-            f"Account Type: {account_type}",
-            "",
-            "Date       | Description                | Type       | Amount",
-            "-" * 60,
-        ]
-        for txn in transactions:
-            lines.append(
-                f"{txn.created_at.strftime('%d/%m/%Y') if txn.created_at else 'N/A':10} | "
-                f"{(getattr(txn, 'description', '') or '')[:26]:26} | "
-                f"{(getattr(txn, 'transaction_type', '') or ''):10} | "
-                f"{float(getattr(txn, 'amount', 0) or 0):>10.2f}"
-            )
-        return "\n".join(lines).encode()
+def _count_transactions(ts, member_id: str, account_type: str, start_date: datetime, end_date: datetime) -> int:
+    from models.tenant import Transaction
+    query = ts.query(func.count(Transaction.id)).filter(
+        Transaction.member_id == member_id,
+        Transaction.created_at >= start_date,
+        Transaction.created_at <= end_date,
+    )
+    if account_type != "all":
+        query = query.filter(Transaction.account_type == account_type)
+    return query.scalar() or 0
 
 
 @router.get("/me/statements/available")
@@ -152,8 +75,9 @@ def get_available_statements(ctx: dict = Depends(get_current_member)):
 def request_statement(
     body: dict,
     ctx: dict = Depends(get_current_member),
+    db: Session = Depends(get_db),
 ):
-    """Generate a statement for the requested period and return a downloadable token."""
+    """Queue a statement render for the requested period and return a downloadable token."""
     member = ctx["member"]
     ts = ctx["session"]
 
@@ -173,11 +97,16 @@ def request_statement(
         raise HTTPException(status_code=400, detail="Date range cannot exceed one year")
 
     try:
-        transactions = _get_transactions(ts, member.id, start_date, end_date)
-        txn_count = len(transactions)
+        txn_count = _count_transactions(ts, member.id, account_type, start_date, end_date)
     finally:
         ts.close()
 
+    from services.tenant_context import get_tenant_context_simple
+    tenant_ctx = get_tenant_context_simple(ctx["org_id"], db)
+    if tenant_ctx:
+        # Warm the cache so the download that usually follows is a file read
+        submit_statement_render(tenant_ctx, ctx["org_id"], member.id, _member_name(member), account_type, start_date, end_date)
+
     statement_params = {
         "member_id": member.id,
         "account_type": account_type,
@@ -210,14 +139,39 @@ def get_statement_history(
     return {"items": [], "total": 0, "page": page, "limit": limit}
 
 
+def _cached_statement_or_context(ctx: dict, db: Session, account_type: str, start_date: datetime, end_date: datetime):
+    """(path, None) when the period's current statement is cached, else (None, tenant context to render it)"""
+    member = ctx["member"]
+    ts = ctx["session"]
+    org_id = ctx["org_id"]
+    try:
+        last_txn_id = get_last_transaction_id(ts, member.id, account_type, start_date, end_date)
+    finally:
+        ts.close()
+
+    pdf_path = cached_statement_path(org_id, member.id, account_type, start_date, end_date, last_txn_id)
+    if claim_cached_statement(pdf_path):
+        return pdf_path, None
+
+    from services.tenant_context import get_tenant_context_simple
+    tenant_ctx = get_tenant_context_simple(org_id, db)
+    if not tenant_ctx:
+        raise HTTPException(status_code=404, detail="Organization not found")
+    return None, tenant_ctx
+
+
 @router.get("/me/statements/{statement_id}/download")
-def download_statement(
+async def download_statement(
     statement_id: str,
     ctx: dict = Depends(get_current_member),
+    db: Session = Depends(get_db),
 ):
-    """Generate and stream a PDF statement for the given statement token."""
+    """Stream the PDF statement for the given token, rendering it first if the cache is stale.
+
+    Served as a file response, so clients can resume with HTTP Range requests.
+    The render runs on the statement pool and is awaited, holding no worker thread.
+    """
     member = ctx["member"]
-    ts = ctx["session"]
 
     params = _decode_statement_id(statement_id)
 
@@ -232,15 +186,19 @@ def download_statement(
 
     account_type = params.get("account_type", "all")
 
-    try:
-        transactions = _get_transactions(ts, member.id, start_date, end_date)
-        pdf_bytes = _generate_pdf(member, transactions, start_date, end_date, account_type)
-    finally:
-        ts.close()
+    pdf_path, tenant_ctx = await run_in_threadpool(
+        _cached_statement_or_context, ctx, db, account_type, start_date, end_date
+    )
+    if pdf_path is None:
+        # Renders finish by writing the file, which eviction then spares for its grace period
+        pdf_path = await asyncio.wrap_future(submit_statement_render(
+            tenant_ctx, ctx["org_id"], member.id, _member_name(member), account_type, start_date, end_date
+        ))
 
     filename = f"statement_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.pdf"
-    return StreamingResponse(
-        io.BytesIO(pdf_bytes),
+    return FileResponse(
+        pdf_path,
         media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename={filename}"},
+        filename=filename,
+        content_disposition_type="attachment",
     )
@@ -202,11 +202,11 @@ class WithdrawRequest(BaseModel):
 
 
 @router.post("/me/deposit")
-async def initiate_deposit(data: DepositRequest, ctx: dict = Depends(get_current_member)):
+def initiate_deposit(data: DepositRequest, ctx: dict = Depends(get_current_member)):
     """Initiate a deposit via M-Pesa STK push to savings or shares."""
-    import asyncio
     from models.tenant import Transaction, MpesaPayment
-    from routes.mpesa import initiate_stk_push, simulate_sandbox_callback
+    from routes.common import run_async
+    from routes.mpesa import stk_push_request, send_stk_push, track_stk_push_result, schedule_sandbox_callback
     from middleware.demo_guard import is_demo_mode
     from services.code_generator import generate_txn_code
     import uuid as _uuid
@@ -237,7 +237,7 @@ async def initiate_deposit(data: DepositRequest, ctx: dict = Depends(get_current
     account_label = ACCOUNT_LABELS.get(data.account_type, data.account_type.title())
 
     try:
-        result = initiate_stk_push(
+        creds, payload = stk_push_request(
             tenant_session=ts,
             phone=phone,
             amount=amount,
@@ -245,6 +245,8 @@ async def initiate_deposit(data: DepositRequest, ctx: dict = Depends(get_current
             description=data.description or f"{account_label} Deposit",
             org_id=org.id,
         )
+        result = run_async(send_stk_push, creds, payload)
+        track_stk_push_result(org.id, result)
 
         checkout_request_id = result.get("CheckoutRequestID")
         merchant_request_id = result.get("MerchantRequestID")
@@ -272,12 +274,12 @@ async def initiate_deposit(data: DepositRequest, ctx: dict = Depends(get_current
         ts.commit()
 
         if is_demo_mode():
-            asyncio.create_task(simulate_sandbox_callback(
+            schedule_sandbox_callback(
                 org.id,
                 checkout_request_id or "",
                 merchant_request_id or "",
                 float(amount)
-            ))
+            )
 
         return {
             "success": True,
@@ -386,10 +388,10 @@ class MpesaPayRequest(BaseModel):
 
 
 @router.post("/me/mpesa-pay")
-async def mobile_mpesa_pay(data: MpesaPayRequest, ctx: dict = Depends(get_current_member)):
+def mobile_mpesa_pay(data: MpesaPayRequest, ctx: dict = Depends(get_current_member)):
     """Initiate M-Pesa STK push for loan repayment from the mobile app."""
-    import asyncio
-    from routes.mpesa import initiate_stk_push, simulate_sandbox_callback
+    from routes.common import run_async
+    from routes.mpesa import stk_push_request, send_stk_push, track_stk_push_result, schedule_sandbox_callback
     from middleware.demo_guard import is_demo_mode
     from models.tenant import LoanApplication, MpesaPayment
     import uuid as _uuid
@@ -428,7 +430,7 @@ async def mobile_mpesa_pay(data: MpesaPayRequest, ctx: dict = Depends(get_curren
     description = data.description or "Loan Repayment"
 
     try:
-        result = initiate_stk_push(
+        creds, payload = stk_push_request(
             tenant_session=ts,
             phone=data.phone_number,
             amount=amount,
@@ -436,6 +438,8 @@ async def mobile_mpesa_pay(data: MpesaPayRequest, ctx: dict = Depends(get_curren
             description=description,
             org_id=org.id,
         )
+        result = run_async(send_stk_push, creds, payload)
+        track_stk_push_result(org.id, result)
 
         checkout_request_id = result.get("CheckoutRequestID")
         merchant_request_id = result.get("MerchantRequestID")
@@ -471,12 +475,12 @@ async def mobile_mpesa_pay(data: MpesaPayRequest, ctx: dict = Depends(get_curren
         ts.commit()
 
         if is_demo_mode():
-            asyncio.create_task(simulate_sandbox_callback(
+            schedule_sandbox_callback(
                 org.id,
                 checkout_request_id or "",
                 merchant_request_id or "",
                 float(amount)
-            ))
+            )
 
         return {
             "success": True,
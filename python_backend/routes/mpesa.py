@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import desc
+from starlette.concurrency import run_in_threadpool
 from decimal import Decimal
 from datetime import datetime
 import httpx
@@ -14,13 +15,19 @@ import string
 from models.database import get_db
 from models.tenant import Member, Transaction, OrganizationSettings, MpesaPayment, Staff, LoanApplication
 from middleware.demo_guard import require_not_demo, is_demo_mode
-from models.master import Organization
+from models.master import Organization, MpesaCallback
 from services.tenant_context import TenantContext
 from routes.auth import get_current_user
-from routes.common import get_tenant_session_context, require_permission
+from routes.common import get_tenant_session_context, require_permission, run_async
 from services.feature_flags import check_org_feature
-from services.mpesa_loan_service import apply_mpesa_payment_to_loan, find_loan_from_reference
+from services.mpesa_loan_service import apply_mpesa_payment_to_loan
+from services.payment_reference import member_by_phone, member_by_reference, resolve_payer
+from services.mpesa_inbox import CALLBACK_C2B, CALLBACK_STK, record_callback, replay_callback
+from services.stk_reconciler import register_stk_push
 from services.code_generator import generate_txn_code
+from services.daraja import (
+    DarajaAuthError, DarajaCredentials, DarajaError, gateway as daraja, resolve_base_url, stk_password,
+)
 
 
 def validate_phone_number(phone: str) -> bool:
@@ -94,211 +101,199 @@ async def mpesa_validation(org_id: str, request: Request, db: Session = Depends(
     """
     try:
         data = await request.json()
+        return await run_in_threadpool(validate_c2b_payment, db, org_id, data)
+    except Exception as e:
+        return {"ResultCode": "C2B00012", "ResultDesc": str(e)}
+
+def validate_c2b_payment(db, org_id: str, data: dict) -> dict:
+    """The validation answer for a C2B payment (sync; the callback runs it in the threadpool)"""
+    org = db.query(Organization).filter(Organization.id == org_id).first()
+    if not org or not org.connection_string:
+        return {"ResultCode": "C2B00012", "ResultDesc": "Invalid organization"}
+    
+    tenant_ctx = TenantContext(org.connection_string)
+    tenant_session = tenant_ctx.create_session()
+    
+    try:
+        mpesa_enabled = get_org_setting(tenant_session, "mpesa_enabled", False)
+        if not mpesa_enabled:
+            return {"ResultCode": "C2B00012", "ResultDesc": "M-Pesa not enabled"}
         
-        org = db.query(Organization).filter(Organization.id == org_id).first()
-        if not org or not org.connection_string:
-            return {"ResultCode": "C2B00012", "ResultDesc": "Invalid organization"}
+        account_reference = data.get("BillRefNumber", "").strip().upper()
         
-        tenant_ctx = TenantContext(org.connection_string)
-        tenant_session = tenant_ctx.create_session()
+        member = member_by_reference(tenant_session, account_reference)
         
-        try:
-            mpesa_enabled = get_org_setting(tenant_session, "mpesa_enabled", False)
-            if not mpesa_enabled:
-                return {"ResultCode": "C2B00012", "ResultDesc": "M-Pesa not enabled"}
-            
-            account_reference = data.get("BillRefNumber", "").strip().upper()
-            
-            member = tenant_session.query(Member).filter(
-                func.upper(Member.member_number) == account_reference
-            ).first()
-            
-            if not member:
-                return {"ResultCode": "C2B00011", "ResultDesc": "Invalid account number"}
-            
-            if member.status == "suspended":
-                return {"ResultCode": "C2B00012", "ResultDesc": "Account suspended"}
-            
-            return {"ResultCode": "0", "ResultDesc": "Accepted"}
-        finally:
-            tenant_session.close()
-            tenant_ctx.close()
-            
+        if not member:
+            return {"ResultCode": "C2B00011", "ResultDesc": "Invalid account number"}
+        
+        if member.status == "suspended":
+            return {"ResultCode": "C2B00012", "ResultDesc": "Account suspended"}
+        
+        return {"ResultCode": "0", "ResultDesc": "Accepted"}
+    finally:
+        tenant_session.close()
+        tenant_ctx.close()
+
+def process_c2b_confirmation(tenant_session, data: dict) -> str:
+    """Apply a queued C2B confirmation to the tenant; returns the outcome, raises to have it retried"""
+    mpesa_enabled = get_org_setting(tenant_session, "mpesa_enabled", False)
+
+    transaction_type = data.get("TransactionType", "")
+    trans_id = data.get("TransID", "")
+    trans_time = data.get("TransTime", "")
+    amount = Decimal(str(data.get("TransAmount", 0)))
+    account_reference = data.get("BillRefNumber", "").strip().upper()
+    phone = data.get("MSISDN", "")
+    first_name = data.get("FirstName", "")
+    middle_name = data.get("MiddleName", "")
+    last_name = data.get("LastName", "")
+    org_balance = data.get("OrgAccountBalance")
+
+    # Always log the M-Pesa payment first
+    existing_mpesa = tenant_session.query(MpesaPayment).filter(
+        MpesaPayment.trans_id == trans_id
+    ).with_for_update(skip_locked=True).first()
+
+    if existing_mpesa:
+        return "Duplicate transaction"
+
+    member, loan_for_repayment = resolve_payer(tenant_session, account_reference, phone)
+
+    mpesa_payment = MpesaPayment(
+        trans_id=trans_id,
+        trans_time=trans_time,
+        amount=amount,
+        phone_number=phone,
+        bill_ref_number=data.get("BillRefNumber", ""),
+        first_name=first_name,
+        middle_name=middle_name,
+        last_name=last_name,
+        org_account_balance=Decimal(str(org_balance)) if org_balance else None,
+        transaction_type=transaction_type,
+        member_id=member.id if member else None,
+        status="credited" if member and mpesa_enabled else ("unmatched" if not member else "pending"),
+        raw_payload=data
+    )
+    tenant_session.add(mpesa_payment)
+
+    if not mpesa_enabled:
+        tenant_session.commit()
+        return "Accepted - M-Pesa disabled"
+
+    if not member:
+        mpesa_payment.status = "unmatched"
+        mpesa_payment.notes = f"No member found for account reference: {account_reference}"
+        tenant_session.commit()
+        return "Accepted but member not found"
+
+    loan = loan_for_repayment
+
+    if loan and loan.member_id == member.id:
+        member = tenant_session.query(Member).filter(Member.id == member.id).with_for_update().first()
+        repayment, error = apply_mpesa_payment_to_loan(
+            tenant_session, loan, member, amount, trans_id, "Daraja"
+        )
+        if error:
+            mpesa_payment.notes = f"Loan repayment failed: {error}"
+            mpesa_payment.status = "pending"
+            tenant_session.commit()
+            return f"Payment logged: {error}"
+
+        mpesa_payment.status = "credited"
+        mpesa_payment.credited_at = datetime.utcnow()
+        mpesa_payment.notes = f"Applied to loan {loan.application_number}"
+        tenant_session.commit()
+        return "Accepted - loan repayment"
+
+    member = tenant_session.query(Member).filter(Member.id == member.id).with_for_update().first()
+    current_balance = member.savings_balance or Decimal("0")
+    new_balance = current_balance + amount
+
+    code = generate_txn_code()
+
+    transaction = Transaction(
+        transaction_number=code,
+        member_id=member.id,
+        transaction_type="deposit",
+        account_type="savings",
+        amount=amount,
+        balance_before=current_balance,
+        balance_after=new_balance,
+        payment_method="mpesa",
+        reference=trans_id,
+        description=f"M-Pesa deposit from {phone} ({first_name})"
+    )
+
+    member.savings_balance = new_balance
+
+    if member.status == "pending":
+        auto_activate = get_org_setting(tenant_session, "auto_activate_on_deposit", True)
+        require_opening_deposit = get_org_setting(tenant_session, "require_opening_deposit", False)
+        min_opening_deposit = get_org_setting(tenant_session, "minimum_opening_deposit", Decimal("0"))
+
+        if auto_activate:
+            total_deposits = (member.savings_balance or Decimal("0")) + \
+                           (member.shares_balance or Decimal("0")) + \
+                           (member.deposits_balance or Decimal("0"))
+
+            if not require_opening_deposit or total_deposits >= min_opening_deposit:
+                member.status = "active"
+
+    tenant_session.add(transaction)
+    tenant_session.flush()
+
+    mpesa_payment.transaction_id = transaction.id
+    mpesa_payment.status = "credited"
+    mpesa_payment.credited_at = datetime.utcnow()
+
+    tenant_session.commit()
+
+    post_mpesa_deposit_to_gl(tenant_session, member, amount, trans_id)
+
+    try:
+        from routes.sms import send_sms_with_template
+        if member.phone:
+            send_sms_with_template(
+                tenant_session,
+                "deposit_received",
+                member.phone,
+                f"{member.first_name} {member.last_name}",
+                {
+                    "name": member.first_name,
+                    "amount": str(amount),
+                    "balance": str(new_balance)
+                },
+                member_id=member.id
+            )
     except Exception as e:
-        return {"ResultCode": "C2B00012", "ResultDesc": str(e)}
+        print(f"[SMS] Failed to send deposit notification: {e}")
+
+    return "Accepted"
+
 
 @router.post("/mpesa/c2b/confirmation/{org_id}")
 async def mpesa_confirmation(org_id: str, request: Request, db: Session = Depends(get_db)):
     """
     M-Pesa C2B Confirmation URL
-    Called by Safaricom after a successful transaction
+    Called by Safaricom after a successful transaction. The payload is stored
+    durably and acknowledged at once; process_c2b_confirmation applies it
+    from the callback worker pool.
     """
     try:
         data = await request.json()
-        
-        org = db.query(Organization).filter(Organization.id == org_id).first()
-        if not org or not org.connection_string:
-            return {"ResultCode": "C2B00012", "ResultDesc": "Invalid organization"}
-        
-        tenant_ctx = TenantContext(org.connection_string)
-        tenant_session = tenant_ctx.create_session()
-        
-        try:
-            mpesa_enabled = get_org_setting(tenant_session, "mpesa_enabled", False)
-            
-            transaction_type = data.get("TransactionType", "")
-            trans_id = data.get("TransID", "")
-            trans_time = data.get("TransTime", "")
-            amount = Decimal(str(data.get("TransAmount", 0)))
-            account_reference = data.get("BillRefNumber", "").strip().upper()
-            phone = data.get("MSISDN", "")
-            first_name = data.get("FirstName", "")
-            middle_name = data.get("MiddleName", "")
-            last_name = data.get("LastName", "")
-            org_balance = data.get("OrgAccountBalance")
-            
-            # Always log the M-Pesa payment first
-            existing_mpesa = tenant_session.query(MpesaPayment).filter(
-                MpesaPayment.trans_id == trans_id
-            ).with_for_update(skip_locked=True).first()
-            
-            if existing_mpesa:
-                return {"ResultCode": "0", "ResultDesc": "Duplicate transaction"}
-            
-            member = tenant_session.query(Member).filter(
-                func.upper(Member.member_number) == account_reference
-            ).first()
-            
-            loan_for_repayment = find_loan_from_reference(tenant_session, account_reference)
-            if not member and loan_for_repayment:
-                member = tenant_session.query(Member).filter(
-                    Member.id == loan_for_repayment.member_id
-                ).first()
-            
-            if not member and phone:
-                member = tenant_session.query(Member).filter(
-                    Member.phone_number.like(f"%{phone[-9:]}")
-                ).first()
-            
-            mpesa_payment = MpesaPayment(
-                trans_id=trans_id,
-                trans_time=trans_time,
-                amount=amount,
-                phone_number=phone,
-                bill_ref_number=data.get("BillRefNumber", ""),
-                first_name=first_name,
-                middle_name=middle_name,
-                last_name=last_name,
-                org_account_balance=Decimal(str(org_balance)) if org_balance else None,
-                transaction_type=transaction_type,
-                member_id=member.id if member else None,
-                status="credited" if member and mpesa_enabled else ("unmatched" if not member else "pending"),
-                raw_payload=data
-            )
-            tenant_session.add(mpesa_payment)
-            
-            if not mpesa_enabled:
-                tenant_session.commit()
-                return {"ResultCode": "0", "ResultDesc": "Accepted - M-Pesa disabled"}
-            
-            if not member:
-                mpesa_payment.status = "unmatched"
-                mpesa_payment.notes = f"No member found for account reference: {account_reference}"
-                tenant_session.commit()
-                return {"ResultCode": "0", "ResultDesc": "Accepted but member not found"}
-            
-            loan = loan_for_repayment or find_loan_from_reference(tenant_session, account_reference)
-
-            if loan and loan.member_id == member.id:
-                member = tenant_session.query(Member).filter(Member.id == member.id).with_for_update().first()
-                repayment, error = apply_mpesa_payment_to_loan(
-                    tenant_session, loan, member, amount, trans_id, "Daraja"
-                )
-                if error:
-                    mpesa_payment.notes = f"Loan repayment failed: {error}"
-                    mpesa_payment.status = "pending"
-                    tenant_session.commit()
-                    return {"ResultCode": "0", "ResultDesc": f"Payment logged: {error}"}
+    except Exception:
+        return {"ResultCode": "C2B00012", "ResultDesc": "Invalid payload"}
+    return await run_in_threadpool(_record_c2b_confirmation, db, org_id, data)
 
-                mpesa_payment.status = "credited"
-                mpesa_payment.credited_at = datetime.utcnow()
-                mpesa_payment.notes = f"Applied to loan {loan.application_number}"
-                tenant_session.commit()
-                return {"ResultCode": "0", "ResultDesc": "Accepted - loan repayment"}
+def _record_c2b_confirmation(db, org_id: str, data: dict) -> dict:
+    if not db.query(Organization.id).filter(Organization.id == org_id).first():
+        return {"ResultCode": "C2B00012", "ResultDesc": "Invalid organization"}
 
-            member = tenant_session.query(Member).filter(Member.id == member.id).with_for_update().first()
-            current_balance = member.savings_balance or Decimal("0")
-            new_balance = current_balance + amount
-            
-            code = generate_txn_code()
-            
-            transaction = Transaction(
-                transaction_number=code,
-                member_id=member.id,
-                transaction_type="deposit",
-                account_type="savings",
-                amount=amount,
-                balance_before=current_balance,
-                balance_after=new_balance,
-                payment_method="mpesa",
-                reference=trans_id,
-                description=f"M-Pesa deposit from {phone} ({first_name})"
-            )
-            
-            member.savings_balance = new_balance
-            
-            if member.status == "pending":
-                auto_activate = get_org_setting(tenant_session, "auto_activate_on_deposit", True)
-                require_opening_deposit = get_org_setting(tenant_session, "require_opening_deposit", False)
-                min_opening_deposit = get_org_setting(tenant_session, "minimum_opening_deposit", Decimal("0"))
-                
-                if auto_activate:
-                    total_deposits = (member.savings_balance or Decimal("0")) + \
-                                   (member.shares_balance or Decimal("0")) + \
-                                   (member.deposits_balance or Decimal("0"))
-                    
-                    if not require_opening_deposit or total_deposits >= min_opening_deposit:
-                        member.status = "active"
-            
-            tenant_session.add(transaction)
-            tenant_session.flush()
-            
-            mpesa_payment.transaction_id = transaction.id
-            mpesa_payment.status = "credited"
-            mpesa_payment.credited_at = datetime.utcnow()
-            
-            tenant_session.commit()
-            
-            post_mpesa_deposit_to_gl(tenant_session, member, amount, trans_id)
-            
-            try:
-                from routes.sms import send_sms_with_template
-                if member.phone:
-                    send_sms_with_template(
-                        tenant_session,
-                        "deposit_received",
-                        member.phone,
-                        f"{member.first_name} {member.last_name}",
-                        {
-                            "name": member.first_name,
-                            "amount": str(amount),
-                            "balance": str(new_balance)
-                        },
-                        member_id=member.id
-                    )
-            except Exception as e:
-                print(f"[SMS] Failed to send deposit notification: {e}")
-            
-            return {"ResultCode": "0", "ResultDesc": "Accepted"}
-        finally:
-            tenant_session.close()
-            tenant_ctx.close()
-            
-    except Exception as e:
-        return {"ResultCode": "0", "ResultDesc": str(e)}
+    _, created = record_callback(db, org_id, CALLBACK_C2B, data)
+    return {"ResultCode": "0", "ResultDesc": "Accepted" if created else "Duplicate transaction"}
 
 @router.get("/mpesa/register-urls/{org_id}")
-async def get_mpesa_urls(org_id: str, request: Request):
+def get_mpesa_urls(org_id: str, request: Request):
     """
     Returns the M-Pesa callback URLs to register with Safaricom
     """
@@ -390,7 +385,7 @@ async def simulate_mpesa_deposit(
 
 # M-Pesa Payment Log Endpoints
 @router.get("/organizations/{org_id}/mpesa-payments")
-async def list_mpesa_payments(
+def list_mpesa_payments(
     org_id: str, 
     status: str = None,
     search: str = None,
@@ -453,8 +448,67 @@ async def list_mpesa_payments(
         tenant_session.close()
         tenant_ctx.close()
 
+@router.get("/organizations/{org_id}/mpesa-callbacks")
+def list_mpesa_callbacks(
+    org_id: str,
+    status: str = None,
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Callbacks received from Safaricom and their processing state (queued, processing, done, dead)"""
+    tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
+    try:
+        require_permission(membership, "transactions:read", db)
+
+        query = db.query(MpesaCallback).filter(MpesaCallback.organization_id == org_id)
+        if status:
+            query = query.filter(MpesaCallback.status == status)
+        callbacks = query.order_by(desc(MpesaCallback.received_at)).limit(200).all()
+        return [
+            {
+                "id": c.id,
+                "kind": c.kind,
+                "reference": c.dedupe_key,
+                "status": c.status,
+                "attempts": c.attempts,
+                "last_error": c.last_error,
+                "result": c.result,
+                "received_at": c.received_at.isoformat() if c.received_at else None,
+                "processed_at": c.processed_at.isoformat() if c.processed_at else None,
+            }
+            for c in callbacks
+        ]
+    finally:
+        tenant_ctx.close()
+
+@router.post("/organizations/{org_id}/mpesa-callbacks/{callback_id}/replay")
+def replay_mpesa_callback(
+    org_id: str,
+    callback_id: str,
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Queue a dead-lettered (or already processed) callback again; applying it twice is a no-op"""
+    tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
+    try:
+        require_permission(membership, "transactions:write", db)
+
+        callback = db.query(MpesaCallback).filter(
+            MpesaCallback.id == callback_id,
+            MpesaCallback.organization_id == org_id
+        ).with_for_update().first()
+        if not callback:
+            raise HTTPException(status_code=404, detail="Callback not found")
+        if callback.status in ("queued", "processing"):
+            raise HTTPException(status_code=400, detail=f"Callback is already {callback.status}")
+
+        replay_callback(db, callback)
+        return {"id": callback.id, "status": callback.status}
+    finally:
+        tenant_ctx.close()
+
 @router.post("/organizations/{org_id}/mpesa-payments/{payment_id}/credit")
-async def credit_mpesa_payment(
+def credit_mpesa_payment(
     org_id: str,
     payment_id: str,
     member_id: str,
@@ -521,45 +575,49 @@ async def credit_mpesa_payment(
         tenant_session.close()
         tenant_ctx.close()
 
-def get_mpesa_access_token(tenant_session) -> str:
-    """Get M-Pesa OAuth access token. In demo mode, uses platform sandbox credentials."""
+def daraja_credentials(tenant_session) -> DarajaCredentials:
+    """Daraja API credentials for a tenant. In demo mode, uses platform sandbox credentials."""
     if is_demo_mode():
         consumer_key, consumer_secret = get_sandbox_consumer_credentials()
         if not consumer_key or not consumer_secret:
             raise HTTPException(status_code=400, detail="Sandbox M-Pesa credentials not configured (set MPESA_SANDBOX_CONSUMER_KEY and MPESA_SANDBOX_CONSUMER_SECRET)")
-        base_url = SANDBOX_BASE_URL
-    else:
-        consumer_key = get_org_setting(tenant_session, "mpesa_consumer_key", "")
-        consumer_secret = get_org_setting(tenant_session, "mpesa_consumer_secret", "")
-        if not consumer_key or not consumer_secret:
-            raise HTTPException(status_code=400, detail="M-Pesa credentials not configured")
-        environment = get_org_setting(tenant_session, "mpesa_environment", "sandbox")
-        base_url = "https://api.safaricom.co.ke" if environment == "production" else "https://sandbox.safaricom.co.ke"
+        return DarajaCredentials(resolve_base_url("sandbox"), consumer_key, consumer_secret)
 
-    credentials = base64.b64encode(f"{consumer_key}:{consumer_secret}".encode()).decode()
+    consumer_key = get_org_setting(tenant_session, "mpesa_consumer_key", "")
+    consumer_secret = get_org_setting(tenant_session, "mpesa_consumer_secret", "")
+    if not consumer_key or not consumer_secret:
+        raise HTTPException(status_code=400, detail="M-Pesa credentials not configured")
+    environment = get_org_setting(tenant_session, "mpesa_environment", "sandbox")
+    return DarajaCredentials(resolve_base_url(environment), consumer_key, consumer_secret)
 
-    with httpx.Client(timeout=30.0) as client:
-        response = client.get(
-            f"{base_url}/oauth/v1/generate?grant_type=client_credentials",
-            headers={"Authorization": f"Basic {credentials}"}
-        )
-        if response.status_code != 200:
-            raise HTTPException(status_code=500, detail="Failed to get M-Pesa access token")
-        return response.json().get("access_token")
 
-def initiate_b2c_disbursement(tenant_session, phone: str, amount: Decimal, remarks: str = "", occasion: str = "") -> dict:
-    """Initiate M-Pesa B2C payment for loan disbursement via Daraja"""
-    access_token = get_mpesa_access_token(tenant_session)
+async def get_mpesa_access_token(tenant_session) -> str:
+    """Get M-Pesa OAuth access token (cached per credentials until it expires)"""
+    return await daraja_request(daraja.access_token, daraja_credentials(tenant_session))
+
+
+async def daraja_request(call, *args):
+    try:
+        return await call(*args)
+    except DarajaAuthError:
+        raise HTTPException(status_code=500, detail="Failed to get M-Pesa access token")
+
+
+def b2c_disbursement_request(tenant_session, phone: str, amount: Decimal, remarks: str = "", occasion: str = ""):
+    """Credentials and Daraja payload for a B2C loan disbursement, from the tenant's settings.
+
+    Reads the database, so sync handlers call it on their own thread and only
+    hand the result to send_b2c_disbursement. Raises ValueError when the
+    shortcode is not configured.
+    """
+    creds = daraja_credentials(tenant_session)
 
     shortcode = get_org_setting(tenant_session, "mpesa_paybill", "") or get_org_setting(tenant_session, "mpesa_shortcode", "")
     initiator_name = get_org_setting(tenant_session, "mpesa_initiator_name", "")
     security_credential = get_org_setting(tenant_session, "mpesa_security_credential", "")
 
     if not shortcode:
-        return {"success": False, "error": "M-Pesa shortcode/paybill not configured"}
-
-    environment = get_org_setting(tenant_session, "mpesa_environment", "sandbox")
-    base_url = "https://api.safaricom.co.ke" if environment == "production" else "https://sandbox.safaricom.co.ke"
+        raise ValueError("M-Pesa shortcode/paybill not configured")
 
     payload = {
         "InitiatorName": initiator_name or "testapi",
@@ -573,17 +631,18 @@ def initiate_b2c_disbursement(tenant_session, phone: str, amount: Decimal, remar
         "ResultURL": "",
         "Occasion": occasion or ""
     }
+    return creds, payload
 
-    with httpx.Client(timeout=30.0) as client:
-        response = client.post(
-            f"{base_url}/mpesa/b2c/v3/paymentrequest",
-            json=payload,
-            headers={"Authorization": f"Bearer {access_token}"}
-        )
-        result = response.json()
-        if result.get("ResponseCode") == "0":
-            return {"success": True, **result}
-        return {"success": False, **result}
+
+async def send_b2c_disbursement(creds: DarajaCredentials, payload: dict) -> dict:
+    """Send a prepared B2C payment to Daraja (no database access)"""
+    try:
+        result = await daraja_request(daraja.b2c_payment, creds, payload)
+    except DarajaError as e:
+        return {"success": False, "error": str(e)}
+    if result.get("ResponseCode") == "0":
+        return {"success": True, **result}
+    return {"success": False, **result}
 
 
 async def simulate_sandbox_callback(org_id: str, checkout_request_id: str, merchant_request_id: str, amount: float):
@@ -623,14 +682,18 @@ async def simulate_sandbox_callback(org_id: str, checkout_request_id: str, merch
             print(f"[Sandbox Simulation] Error: {e}")
 
 
-def initiate_stk_push(tenant_session, phone: str, amount: Decimal, account_reference: str, description: str, org_id: str = "", base_url_override: str = "") -> dict:
-    """Initiate M-Pesa STK Push. In demo mode uses sandbox credentials automatically."""
-    access_token = get_mpesa_access_token(tenant_session)
+def stk_push_request(tenant_session, phone: str, amount: Decimal, account_reference: str, description: str, org_id: str = "", base_url_override: str = ""):
+    """Credentials and Daraja payload for an STK push, from the tenant's settings (sandbox ones in demo mode).
+
+    Reads the database, so sync handlers call it on their own thread and only
+    hand the result to send_stk_push.
+    """
+    creds = daraja_credentials(tenant_session)
 
     if is_demo_mode():
+        sandbox = True
         shortcode = SANDBOX_SHORTCODE
         passkey = SANDBOX_PASSKEY
-        base_url = SANDBOX_BASE_URL
         public_domain = os.environ.get("REPLIT_DEV_DOMAIN", "") or os.environ.get("REPLIT_DOMAINS", "")
         if public_domain and org_id:
             callback_url = f"https://{public_domain}/api/mpesa/stk-callback/{org_id}"
@@ -651,17 +714,15 @@ def initiate_stk_push(tenant_session, phone: str, amount: Decimal, account_refer
                 callback_url = f"{base_url_override.rstrip('/')}/api/mpesa/stk-callback/{org_id}"
         if not shortcode or not passkey:
             raise HTTPException(status_code=400, detail="M-Pesa STK Push not configured")
-        environment = get_org_setting(tenant_session, "mpesa_environment", "sandbox")
-        base_url = "https://api.safaricom.co.ke" if environment == "production" else "https://sandbox.safaricom.co.ke"
+        sandbox = get_org_setting(tenant_session, "mpesa_environment", "sandbox") != "production"
 
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    password = base64.b64encode(f"{shortcode}{passkey}{timestamp}".encode()).decode()
+    password, timestamp = stk_password(shortcode, passkey)
 
     phone = phone.replace("+", "").replace(" ", "")
     if phone.startswith("0"):
         phone = "254" + phone[1:]
 
-    if "sandbox" in base_url:
+    if sandbox:
         phone = "254708374149"
         print(f"[STK Push] Sandbox mode — phone overridden to test number {phone}")
 
@@ -678,21 +739,49 @@ def initiate_stk_push(tenant_session, phone: str, amount: Decimal, account_refer
         "AccountReference": account_reference,
         "TransactionDesc": description
     }
-    
-    with httpx.Client(timeout=30.0) as client:
-        response = client.post(
-            f"{base_url}/mpesa/stkpush/v1/processrequest",
-            json=payload,
-            headers={"Authorization": f"Bearer {access_token}"}
-        )
-        result = response.json()
-        print(f"[STK Push] Response ({response.status_code}): {result}")
-        return result
+    return creds, payload
+
+
+async def send_stk_push(creds: DarajaCredentials, payload: dict) -> dict:
+    """Send a prepared STK push to Daraja (no database access; see track_stk_push_result)"""
+    result = await daraja_request(daraja.stk_push, creds, payload)
+    print(f"[STK Push] Response: {result}")
+    return result
+
+
+def track_stk_push_result(org_id: str, result: dict) -> None:
+    """Hand an accepted STK push to the reconciler"""
+    if org_id and result.get("ResponseCode") == "0" and result.get("CheckoutRequestID"):
+        register_stk_push(org_id, result["CheckoutRequestID"])
+
+
+_sandbox_tasks = set()
+
+
+async def _start_sandbox_callback(*args):
+    task = asyncio.create_task(simulate_sandbox_callback(*args))
+    _sandbox_tasks.add(task)
+    task.add_done_callback(_sandbox_tasks.discard)
+
+
+def schedule_sandbox_callback(org_id: str, checkout_request_id: str, merchant_request_id: str, amount: float) -> None:
+    """Start simulate_sandbox_callback on the event loop from a sync handler, without waiting for it"""
+    run_async(_start_sandbox_callback, org_id, checkout_request_id, merchant_request_id, amount)
+
+
+async def initiate_stk_push(tenant_session, phone: str, amount: Decimal, account_reference: str, description: str, org_id: str = "", base_url_override: str = "") -> dict:
+    """Initiate M-Pesa STK Push from an async handler. In demo mode uses sandbox credentials automatically."""
+    creds, payload = stk_push_request(
+        tenant_session, phone, amount, account_reference, description, org_id=org_id, base_url_override=base_url_override
+    )
+    result = await send_stk_push(creds, payload)
+    track_stk_push_result(org_id, result)
+    return result
 
 
-def query_stk_push_status(tenant_session, checkout_request_id: str) -> dict:
+async def query_stk_push_status(tenant_session, checkout_request_id: str) -> dict:
     """Query M-Pesa STK Push transaction status using Safaricom's Query API"""
-    access_token = get_mpesa_access_token(tenant_session)
+    creds = daraja_credentials(tenant_session)
     
     shortcode = get_org_setting(tenant_session, "mpesa_paybill", "") or get_org_setting(tenant_session, "mpesa_shortcode", "")
     passkey = get_org_setting(tenant_session, "mpesa_passkey", "")
@@ -700,11 +789,7 @@ def query_stk_push_status(tenant_session, checkout_request_id: str) -> dict:
     if not shortcode or not passkey:
         return {"error": "M-Pesa STK Push not configured"}
     
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    password = base64.b64encode(f"{shortcode}{passkey}{timestamp}".encode()).decode()
-    
-    environment = get_org_setting(tenant_session, "mpesa_environment", "sandbox")
-    base_url = "https://api.safaricom.co.ke" if environment == "production" else "https://sandbox.safaricom.co.ke"
+    password, timestamp = stk_password(shortcode, passkey)
     
     payload = {
         "BusinessShortCode": shortcode,
@@ -713,192 +798,209 @@ def query_stk_push_status(tenant_session, checkout_request_id: str) -> dict:
         "CheckoutRequestID": checkout_request_id
     }
     
-    with httpx.Client(timeout=30.0) as client:
-        response = client.post(
-            f"{base_url}/mpesa/stkpushquery/v1/query",
-            json=payload,
-            headers={"Authorization": f"Bearer {access_token}"}
-        )
-        return response.json()
+    return await daraja_request(daraja.stk_query, creds, payload)
+
+
+def apply_stk_query_result(tenant_session, checkout_request_id: str, result: dict) -> dict:
+    """Apply a Daraja STK query result to its pending mpesa_payments record.
+
+    Safe to call repeatedly and alongside the STK callback: only a record that
+    is still pending (locked FOR UPDATE) is changed. Does not commit when the
+    result is not final.
+    """
+    pending_record = tenant_session.query(MpesaPayment).filter(
+        MpesaPayment.bill_ref_number == checkout_request_id
+    ).with_for_update().first()
+
+    if not pending_record:
+        return {"status": "not_found", "message": "No STK Push record found for this checkout request"}
+
+    if pending_record.status == "credited":
+        return {"status": "already_credited", "message": "Payment already credited"}
+
+    if pending_record.status != "pending":
+        return {"status": pending_record.status, "message": f"Payment {pending_record.status}"}
+
+    result_code = result.get("ResultCode")
+    
+    if result_code is None:
+        error = result.get("errorMessage", result.get("errorCode", "Unknown error"))
+        return {"status": "pending", "message": f"Query error: {error}"}
+    
+    result_code = str(result_code)
+    
+    if result_code == "1032":
+        pending_record.status = "cancelled"
+        pending_record.notes = (pending_record.notes or "") + " | Cancelled by user"
+        tenant_session.commit()
+        return {"status": "cancelled", "message": "Payment was cancelled by user"}
+    
+    if result_code == "1037":
+        return {"status": "pending", "message": "Waiting for payment - phone may be unreachable, retrying..."}
+    
+    if result_code == "4999":
+        return {"status": "pending", "message": "Payment is being processed by M-Pesa..."}
+    
+    if result_code != "0":
+        pending_record.status = "failed"
+        pending_record.notes = (pending_record.notes or "") + f" | {result.get('ResultDesc', 'Failed')}"
+        tenant_session.commit()
+        return {"status": "failed", "message": result.get("ResultDesc", "Payment failed")}
+    
+    amount = pending_record.amount
+    member_id = pending_record.member_id
+    notes_str = pending_record.notes or ""
+    payment_type = "deposit"
+    account_type = "savings"
+    loan_id = None
+    if "payment_type:loan_repayment" in notes_str:
+        payment_type = "loan_repayment"
+    if "loan_id:" in notes_str:
+        loan_id = notes_str.split("loan_id:")[1].split("|")[0].strip()
+    if "account_type:" in notes_str:
+        account_type = notes_str.split("account_type:")[1].split("|")[0].strip()
+    
+    if not member_id:
+        return {"status": "completed", "message": "Payment completed but no member linked"}
+    
+    member = tenant_session.query(Member).filter(Member.id == member_id).with_for_update().first()
+    if not member:
+        return {"status": "completed", "message": "Payment completed but member not found"}
+    
+    mpesa_receipt = result.get("MpesaReceiptNumber") or result.get("mpesaReceiptNumber") or ""
+    ref = mpesa_receipt if mpesa_receipt else generate_txn_code()
+
+    if payment_type == "loan_repayment" and loan_id:
+        from services.mpesa_loan_service import apply_mpesa_payment_to_loan
+        loan = tenant_session.query(LoanApplication).filter(
+            LoanApplication.id == loan_id,
+            LoanApplication.member_id == member.id,
+            LoanApplication.status.in_(["disbursed", "active"])
+        ).first()
+        if loan:
+            repayment, error = apply_mpesa_payment_to_loan(tenant_session, loan, member, amount, ref)
+            if error:
+                print(f"[STK Query] Loan repayment error: {error}")
+                return {"status": "failed", "message": error}
+
+            pending_record.status = "credited"
+            pending_record.credited_at = datetime.utcnow()
+            pending_record.raw_payload = result
+            pending_record.first_name = "STK Push (Query Verified)"
+            if mpesa_receipt:
+                pending_record.trans_id = mpesa_receipt
+
+            tenant_session.commit()
+            print(f"[STK Query] Loan repayment {amount} applied to loan {loan.application_number}")
+            return {
+                "status": "credited",
+                "message": f"Loan repayment of {amount} applied to {loan.application_number}",
+                "outstanding_balance": str(loan.outstanding_balance or 0)
+            }
+        else:
+            return {"status": "completed", "message": "Loan not found or not active"}
+
+    if account_type == "savings":
+        current_balance = member.savings_balance or Decimal("0")
+    elif account_type == "shares":
+        current_balance = member.shares_balance or Decimal("0")
+    else:
+        current_balance = member.savings_balance or Decimal("0")
+    
+    new_balance = current_balance + amount
+    code = generate_txn_code()
+    
+    transaction = Transaction(
+        transaction_number=code,
+        member_id=member.id,
+        transaction_type="deposit",
+        account_type=account_type,
+        amount=amount,
+        balance_before=current_balance,
+        balance_after=new_balance,
+        payment_method="mpesa",
+        reference=ref,
+        description=f"M-Pesa STK Push deposit"
+    )
+    
+    if account_type == "savings":
+        member.savings_balance = new_balance
+    elif account_type == "shares":
+        member.shares_balance = new_balance
+    
+    tenant_session.add(transaction)
+    tenant_session.flush()
+    
+    pending_record.status = "credited"
+    pending_record.transaction_id = transaction.id
+    pending_record.credited_at = datetime.utcnow()
+    pending_record.raw_payload = result
+    pending_record.first_name = "STK Push (Query Verified)"
+    if mpesa_receipt:
+        pending_record.trans_id = mpesa_receipt
+    
+    post_mpesa_deposit_to_gl(tenant_session, member, amount, ref)
+    
+    tenant_session.commit()
+    print(f"[STK Query] Credited {amount} to member {member.member_number} ({account_type})")
+    
+    return {
+        "status": "credited",
+        "message": f"Payment of {amount} credited to {account_type} account",
+        "transaction_number": code,
+        "new_balance": str(new_balance)
+    }
 
 
 @router.post("/organizations/{org_id}/mpesa/stk-query")
 async def check_stk_push_status(org_id: str, request: Request, user=Depends(get_current_user), db: Session = Depends(get_db)):
-    """Query STK Push status and auto-credit member account if payment succeeded"""
+    """STK Push status as last recorded; the reconciler and the STK callback keep it current"""
+    data = await request.json()
+    checkout_request_id = data.get("checkout_request_id", "")
+    if not checkout_request_id:
+        raise HTTPException(status_code=400, detail="Missing checkout_request_id")
+    return await run_in_threadpool(get_stk_push_status, org_id, checkout_request_id, user, db)
+
+
+@router.get("/organizations/{org_id}/mpesa/stk-status/{checkout_request_id}")
+def get_stk_push_status(org_id: str, checkout_request_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+    """Read the status of an STK Push from the database (never calls Safaricom)"""
     org = db.query(Organization).filter(Organization.id == org_id).first()
     require_kes_currency(org)
-    
+
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     tenant_session = tenant_ctx.create_session()
     try:
-        mpesa_enabled = get_org_setting(tenant_session, "mpesa_enabled", False)
-        if not mpesa_enabled:
+        if not get_org_setting(tenant_session, "mpesa_enabled", False):
             raise HTTPException(status_code=400, detail="M-Pesa is not enabled for this organization")
 
-        data = await request.json()
-        checkout_request_id = data.get("checkout_request_id", "")
-        
-        if not checkout_request_id:
-            raise HTTPException(status_code=400, detail="Missing checkout_request_id")
-        
-        pending_record = tenant_session.query(MpesaPayment).filter(
+        record = tenant_session.query(MpesaPayment).filter(
             MpesaPayment.bill_ref_number == checkout_request_id
-        ).with_for_update().first()
-        
-        if not pending_record:
+        ).first()
+        if not record:
             raise HTTPException(status_code=404, detail="No STK Push record found for this checkout request")
-        
-        if pending_record.status == "credited":
-            return {"status": "already_credited", "message": "Payment already credited"}
-        
-        if pending_record.status in ("failed", "cancelled"):
-            return {"status": pending_record.status, "message": f"Payment {pending_record.status}"}
-        
-        result = query_stk_push_status(tenant_session, checkout_request_id)
-        print(f"[STK Query] Result for {checkout_request_id}: {result}")
-        
-        result_code = result.get("ResultCode")
-        
-        if result_code is None:
-            error = result.get("errorMessage", result.get("errorCode", "Unknown error"))
-            return {"status": "pending", "message": f"Query error: {error}"}
-        
-        result_code = str(result_code)
-        
-        if result_code == "1032":
-            pending_record.status = "cancelled"
-            pending_record.notes = (pending_record.notes or "") + " | Cancelled by user"
-            tenant_session.commit()
-            return {"status": "cancelled", "message": "Payment was cancelled by user"}
-        
-        if result_code == "1037":
-            return {"status": "pending", "message": "Waiting for payment - phone may be unreachable, retrying..."}
-        
-        if result_code == "4999":
-            return {"status": "pending", "message": "Payment is being processed by M-Pesa..."}
-        
-        if result_code != "0":
-            pending_record.status = "failed"
-            pending_record.notes = (pending_record.notes or "") + f" | {result.get('ResultDesc', 'Failed')}"
-            tenant_session.commit()
-            return {"status": "failed", "message": result.get("ResultDesc", "Payment failed")}
-        
-        amount = pending_record.amount
-        member_id = pending_record.member_id
-        notes_str = pending_record.notes or ""
-        payment_type = "deposit"
-        account_type = "savings"
-        loan_id = None
-        if "payment_type:loan_repayment" in notes_str:
-            payment_type = "loan_repayment"
-        if "loan_id:" in notes_str:
-            loan_id = notes_str.split("loan_id:")[1].split("|")[0].strip()
-        if "account_type:" in notes_str:
-            account_type = notes_str.split("account_type:")[1].split("|")[0].strip()
-        
-        if not member_id:
-            return {"status": "completed", "message": "Payment completed but no member linked"}
-        
-        member = tenant_session.query(Member).filter(Member.id == member_id).with_for_update().first()
-        if not member:
-            return {"status": "completed", "message": "Payment completed but member not found"}
-        
-        mpesa_receipt = result.get("MpesaReceiptNumber") or result.get("mpesaReceiptNumber") or ""
-        ref = mpesa_receipt if mpesa_receipt else generate_txn_code()
 
-        if payment_type == "loan_repayment" and loan_id:
-            from services.mpesa_loan_service import apply_mpesa_payment_to_loan
-            loan = tenant_session.query(LoanApplication).filter(
-                LoanApplication.id == loan_id,
-                LoanApplication.member_id == member.id,
-                LoanApplication.status.in_(["disbursed", "active"])
-            ).first()
-            if loan:
-                repayment, error = apply_mpesa_payment_to_loan(tenant_session, loan, member, amount, ref)
-                if error:
-                    print(f"[STK Query] Loan repayment error: {error}")
-                    return {"status": "failed", "message": error}
-
-                pending_record.status = "credited"
-                pending_record.credited_at = datetime.utcnow()
-                pending_record.raw_payload = result
-                pending_record.first_name = "STK Push (Query Verified)"
-                if mpesa_receipt:
-                    pending_record.trans_id = mpesa_receipt
-
-                tenant_session.commit()
-                print(f"[STK Query] Loan repayment {amount} applied to loan {loan.application_number}")
-                return {
-                    "status": "credited",
-                    "message": f"Loan repayment of {amount} applied to {loan.application_number}",
-                    "outstanding_balance": str(loan.outstanding_balance or 0)
-                }
-            else:
-                return {"status": "completed", "message": "Loan not found or not active"}
-
-        if account_type == "savings":
-            current_balance = member.savings_balance or Decimal("0")
-        elif account_type == "shares":
-            current_balance = member.shares_balance or Decimal("0")
-        else:
-            current_balance = member.savings_balance or Decimal("0")
-        
-        new_balance = current_balance + amount
-        code = generate_txn_code()
-        
-        transaction = Transaction(
-            transaction_number=code,
-            member_id=member.id,
-            transaction_type="deposit",
-            account_type=account_type,
-            amount=amount,
-            balance_before=current_balance,
-            balance_after=new_balance,
-            payment_method="mpesa",
-            reference=ref,
-            description=f"M-Pesa STK Push deposit"
-        )
-        
-        if account_type == "savings":
-            member.savings_balance = new_balance
-        elif account_type == "shares":
-            member.shares_balance = new_balance
-        
-        tenant_session.add(transaction)
-        tenant_session.flush()
-        
-        pending_record.status = "credited"
-        pending_record.transaction_id = transaction.id
-        pending_record.credited_at = datetime.utcnow()
-        pending_record.raw_payload = result
-        pending_record.first_name = "STK Push (Query Verified)"
-        if mpesa_receipt:
-            pending_record.trans_id = mpesa_receipt
-        
-        post_mpesa_deposit_to_gl(tenant_session, member, amount, ref)
-        
-        tenant_session.commit()
-        print(f"[STK Query] Credited {amount} to member {member.member_number} ({account_type})")
-        
-        return {
-            "status": "credited",
-            "message": f"Payment of {amount} credited to {account_type} account",
-            "transaction_number": code,
-            "new_balance": str(new_balance)
-        }
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"[STK Query] Error: {e}")
-        tenant_session.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
+        if record.status == "credited":
+            response = {"status": "credited", "message": f"Payment of {record.amount} credited"}
+            if record.transaction_id:
+                txn = tenant_session.query(Transaction).filter(Transaction.id == record.transaction_id).first()
+                if txn:
+                    response["transaction_number"] = txn.transaction_number
+                    response["new_balance"] = str(txn.balance_after)
+            return response
+        if record.status in ("failed", "cancelled"):
+            note = (record.notes or "").rsplit("|", 1)[-1].strip()
+            return {"status": record.status, "message": note or f"Payment {record.status}"}
+        if record.status == "pending":
+            return {"status": "pending", "message": "Waiting for M-Pesa confirmation..."}
+        return {"status": "completed", "message": f"Payment received ({record.status})"}
     finally:
         tenant_session.close()
         tenant_ctx.close()
 
 
 @router.post("/organizations/{org_id}/mpesa/stk-push")
-async def trigger_stk_push(org_id: str, request: Request, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def trigger_stk_push(org_id: str, request: Request, user=Depends(get_current_user), db: Session = Depends(get_db)):
     """Trigger M-Pesa STK Push for payment"""
     if not check_org_feature(org_id, "mpesa_integration", db):
         raise HTTPException(status_code=403, detail="M-Pesa integration is not available in your subscription plan")
@@ -910,7 +1012,7 @@ async def trigger_stk_push(org_id: str, request: Request, user=Depends(get_curre
     require_permission(membership, "repayments:write", db)
     tenant_session = tenant_ctx.create_session()
     try:
-        data = await request.json()
+        data = run_async(request.json)
         phone = data.get("phone")
         amount = Decimal(str(data.get("amount", 0)))
         account_reference = data.get("account_reference", "Payment")
@@ -946,7 +1048,9 @@ async def trigger_stk_push(org_id: str, request: Request, user=Depends(get_curre
             phone = "254" + phone[1:]
 
         request_base = str(request.base_url).rstrip("/")
-        result = initiate_stk_push(tenant_session, phone, amount, account_reference, description, org_id=org_id, base_url_override=request_base)
+        creds, payload = stk_push_request(tenant_session, phone, amount, account_reference, description, org_id=org_id, base_url_override=request_base)
+        result = run_async(send_stk_push, creds, payload)
+        track_stk_push_result(org_id, result)
         
         if result.get("ResponseCode") == "0":
             checkout_id = result.get("CheckoutRequestID", "")
@@ -962,10 +1066,7 @@ async def trigger_stk_push(org_id: str, request: Request, user=Depends(get_curre
 
             member = None
             if phone:
-                phone_search = phone[-9:] if len(phone) > 9 else phone
-                member = tenant_session.query(Member).filter(
-                    Member.phone.like(f"%{phone_search}")
-                ).first()
+                member = member_by_phone(tenant_session, phone)
 
             pending_payment = MpesaPayment(
                 trans_id=f"PENDING-{checkout_id}",
@@ -983,12 +1084,7 @@ async def trigger_stk_push(org_id: str, request: Request, user=Depends(get_curre
             tenant_session.commit()
 
             if demo:
-                asyncio.create_task(simulate_sandbox_callback(
-                    org_id,
-                    checkout_id,
-                    merchant_id,
-                    float(amount)
-                ))
+                schedule_sandbox_callback(org_id, checkout_id, merchant_id, float(amount))
             return {
                 "success": True,
                 "message": "STK push sent successfully. Please check your phone.",
@@ -1011,222 +1107,209 @@ async def trigger_stk_push(org_id: str, request: Request, user=Depends(get_curre
         tenant_ctx.close()
 
 
-@router.post("/mpesa/stk-callback/{org_id}")
-async def mpesa_stk_callback(org_id: str, request: Request, db: Session = Depends(get_db)):
-    """
-    M-Pesa STK Push Callback URL
-    Called by Safaricom after STK Push payment is completed or cancelled
-    """
-    try:
-        data = await request.json()
-        print(f"[STK Callback] Received for org {org_id}: {json.dumps(data, default=str)}")
+def _record_stk_callback(db, org_id: str, data: dict) -> None:
+    body = data.get("Body", {}).get("stkCallback", {})
+    if body.get("ResultCode") != 0 and is_demo_mode():
+        print(f"[STK Callback] Demo mode — ignoring sandbox failure, simulated success will follow")
+        return
 
-        body = data.get("Body", {}).get("stkCallback", {})
-        result_code = body.get("ResultCode")
-        result_desc = body.get("ResultDesc", "")
-        checkout_request_id = body.get("CheckoutRequestID", "")
-        merchant_request_id = body.get("MerchantRequestID", "")
-
-        if result_code != 0:
-            print(f"[STK Callback] Payment failed/cancelled: {result_desc}")
-            if is_demo_mode():
-                print(f"[STK Callback] Demo mode — ignoring sandbox failure, simulated success will follow")
-                return {"ResultCode": 0, "ResultDesc": "Accepted"}
-            if checkout_request_id:
-                org = db.query(Organization).filter(Organization.id == org_id).first()
-                if org and org.connection_string:
-                    tc = TenantContext(org.connection_string)
-                    ts = tc.create_session()
-                    try:
-                        pr = ts.query(MpesaPayment).filter(
-                            MpesaPayment.bill_ref_number == checkout_request_id,
-                            MpesaPayment.status == "pending"
-                        ).first()
-                        if pr:
-                            pr.status = "cancelled" if result_code == 1032 else "failed"
-                            pr.notes = (pr.notes or "") + f" | Callback: {result_desc}"
-                            ts.commit()
-                    finally:
-                        ts.close()
-                        tc.close()
-            return {"ResultCode": 0, "ResultDesc": "Accepted"}
-
-        metadata = body.get("CallbackMetadata", {}).get("Item", [])
-        amount = None
-        mpesa_receipt = None
-        phone = None
-        for item in metadata:
-            name = item.get("Name", "")
-            value = item.get("Value")
-            if name == "Amount":
-                amount = Decimal(str(value))
-            elif name == "MpesaReceiptNumber":
-                mpesa_receipt = str(value)
-            elif name == "PhoneNumber":
-                phone = str(value)
-
-        if not amount or not mpesa_receipt:
-            print(f"[STK Callback] Missing amount or receipt in metadata")
-            return {"ResultCode": 0, "ResultDesc": "Accepted"}
-
-        org = db.query(Organization).filter(Organization.id == org_id).first()
-        if not org or not org.connection_string:
-            print(f"[STK Callback] Organization not found: {org_id}")
-            return {"ResultCode": 0, "ResultDesc": "Accepted"}
-
-        tenant_ctx = TenantContext(org.connection_string)
-        tenant_session = tenant_ctx.create_session()
+    if not db.query(Organization.id).filter(Organization.id == org_id).first():
+        print(f"[STK Callback] Organization not found: {org_id}")
+        return
 
-        try:
-            existing = tenant_session.query(MpesaPayment).filter(
-                MpesaPayment.trans_id == mpesa_receipt
-            ).with_for_update(skip_locked=True).first()
-            if existing:
-                print(f"[STK Callback] Duplicate receipt: {mpesa_receipt}")
-                return {"ResultCode": 0, "ResultDesc": "Accepted"}
-
-            pending_record = tenant_session.query(MpesaPayment).filter(
-                MpesaPayment.bill_ref_number == checkout_request_id,
-                MpesaPayment.status == "credited"
-            ).with_for_update().first()
-            if pending_record:
-                print(f"[STK Callback] Already credited via query for {checkout_request_id}")
-                return {"ResultCode": 0, "ResultDesc": "Accepted"}
+    record_callback(db, org_id, CALLBACK_STK, data)
 
-            member = None
-            if phone:
-                phone_search = phone[-9:] if len(phone) > 9 else phone
-                member = tenant_session.query(Member).filter(
-                    Member.phone.like(f"%{phone_search}")
-                ).first()
-
-            pending_stk = tenant_session.query(MpesaPayment).filter(
-                MpesaPayment.bill_ref_number == checkout_request_id,
-                MpesaPayment.status == "pending"
-            ).with_for_update().first()
-
-            if pending_stk:
-                pending_stk.trans_id = mpesa_receipt
-                pending_stk.amount = amount
-                pending_stk.phone_number = phone or ""
-                pending_stk.first_name = "STK Push (Callback)"
-                pending_stk.raw_payload = data
-                mpesa_payment = pending_stk
-                member = tenant_session.query(Member).filter(Member.id == pending_stk.member_id).first() if pending_stk.member_id else None
-                notes_str = pending_stk.notes or ""
-                payment_type = "deposit"
-                account_type = "savings"
-                loan_id = None
-                if "payment_type:loan_repayment" in notes_str:
-                    payment_type = "loan_repayment"
-                if "loan_id:" in notes_str:
-                    loan_id = notes_str.split("loan_id:")[1].split("|")[0].strip()
-                if "account_type:" in notes_str:
-                    account_type = notes_str.split("account_type:")[1].split("|")[0].strip()
-            else:
-                mpesa_payment = MpesaPayment(
-                    trans_id=mpesa_receipt,
-                    trans_time=datetime.utcnow().strftime("%Y%m%d%H%M%S"),
-                    amount=amount,
-                    phone_number=phone or "",
-                    bill_ref_number=checkout_request_id,
-                    first_name="STK Push",
-                    transaction_type="STK",
-                    member_id=member.id if member else None,
-                    status="credited" if member else "unmatched",
-                    raw_payload=data
-                )
-                tenant_session.add(mpesa_payment)
-                payment_type = "deposit"
-                account_type = "savings"
-                loan_id = None
-
-            if not member and phone:
-                phone_search = phone[-9:] if len(phone) > 9 else phone
-                member = tenant_session.query(Member).filter(
-                    Member.phone.like(f"%{phone_search}")
-                ).first()
-
-            if member:
-                member = tenant_session.query(Member).filter(Member.id == member.id).with_for_update().first()
-
-            if member and payment_type == "loan_repayment" and loan_id:
-                from models.tenant import LoanApplication
-                from services.mpesa_loan_service import apply_mpesa_payment_to_loan
-                loan = tenant_session.query(LoanApplication).filter(
-                    LoanApplication.id == loan_id,
-                    LoanApplication.member_id == member.id,
-                    LoanApplication.status.in_(["disbursed", "active"])
-                ).first()
-
-                if loan:
-                    repayment, error = apply_mpesa_payment_to_loan(
-                        tenant_session, loan, member, amount, mpesa_receipt, "STK Push"
-                    )
-                    if error:
-                        mpesa_payment.status = "unmatched"
-                        mpesa_payment.notes = (mpesa_payment.notes or "") + f" | Loan repayment error: {error}"
-                        print(f"[STK Callback] Loan repayment error: {error}")
-                    else:
-                        mpesa_payment.status = "credited"
-                        mpesa_payment.member_id = member.id
-                        mpesa_payment.credited_at = datetime.utcnow()
-                        print(f"[STK Callback] Loan repayment {amount} applied to loan {loan.application_number} for member {member.member_number}")
-                else:
-                    mpesa_payment.status = "unmatched"
-                    mpesa_payment.notes = (mpesa_payment.notes or "") + f" | Loan {loan_id} not found or not active"
-                    print(f"[STK Callback] Loan {loan_id} not found/active for member {member.member_number}")
-
-            elif member:
-                if account_type == "savings":
-                    current_balance = member.savings_balance or Decimal("0")
-                elif account_type == "shares":
-                    current_balance = member.shares_balance or Decimal("0")
-                else:
-                    current_balance = member.savings_balance or Decimal("0")
-                new_balance = current_balance + amount
-                code = generate_txn_code()
-
-                transaction = Transaction(
-                    transaction_number=code,
-                    member_id=member.id,
-                    transaction_type="deposit",
-                    account_type=account_type,
-                    amount=amount,
-                    balance_before=current_balance,
-                    balance_after=new_balance,
-                    payment_method="mpesa",
-                    reference=mpesa_receipt,
-                    description=f"M-Pesa STK Push deposit from {phone}"
-                )
-                if account_type == "savings":
-                    member.savings_balance = new_balance
-                elif account_type == "shares":
-                    member.shares_balance = new_balance
-                tenant_session.add(transaction)
-                tenant_session.flush()
 
+def process_stk_callback(tenant_session, data: dict) -> str:
+    """Apply a queued STK Push result to the tenant; returns the outcome, raises to have it retried"""
+    body = data.get("Body", {}).get("stkCallback", {})
+    result_code = body.get("ResultCode")
+    result_desc = body.get("ResultDesc", "")
+    checkout_request_id = body.get("CheckoutRequestID", "")
+
+    if result_code != 0:
+        print(f"[STK Callback] Payment failed/cancelled: {result_desc}")
+        pr = tenant_session.query(MpesaPayment).filter(
+            MpesaPayment.bill_ref_number == checkout_request_id,
+            MpesaPayment.status == "pending"
+        ).first() if checkout_request_id else None
+        if pr:
+            pr.status = "cancelled" if result_code == 1032 else "failed"
+            pr.notes = (pr.notes or "") + f" | Callback: {result_desc}"
+            tenant_session.commit()
+        return f"Payment not completed: {result_desc}"
+
+    metadata = body.get("CallbackMetadata", {}).get("Item", [])
+    amount = None
+    mpesa_receipt = None
+    phone = None
+    for item in metadata:
+        name = item.get("Name", "")
+        value = item.get("Value")
+        if name == "Amount":
+            amount = Decimal(str(value))
+        elif name == "MpesaReceiptNumber":
+            mpesa_receipt = str(value)
+        elif name == "PhoneNumber":
+            phone = str(value)
+
+    if not amount or not mpesa_receipt:
+        print(f"[STK Callback] Missing amount or receipt in metadata")
+        return "Missing amount or receipt"
+
+    existing = tenant_session.query(MpesaPayment).filter(
+        MpesaPayment.trans_id == mpesa_receipt
+    ).with_for_update(skip_locked=True).first()
+    if existing:
+        print(f"[STK Callback] Duplicate receipt: {mpesa_receipt}")
+        return "Duplicate receipt"
+
+    pending_record = tenant_session.query(MpesaPayment).filter(
+        MpesaPayment.bill_ref_number == checkout_request_id,
+        MpesaPayment.status == "credited"
+    ).with_for_update().first()
+    if pending_record:
+        print(f"[STK Callback] Already credited via query for {checkout_request_id}")
+        return "Already credited"
+
+    member = None
+    if phone:
+        member = member_by_phone(tenant_session, phone)
+
+    pending_stk = tenant_session.query(MpesaPayment).filter(
+        MpesaPayment.bill_ref_number == checkout_request_id,
+        MpesaPayment.status == "pending"
+    ).with_for_update().first()
+
+    if pending_stk:
+        pending_stk.trans_id = mpesa_receipt
+        pending_stk.amount = amount
+        pending_stk.phone_number = phone or ""
+        pending_stk.first_name = "STK Push (Callback)"
+        pending_stk.raw_payload = data
+        mpesa_payment = pending_stk
+        member = tenant_session.query(Member).filter(Member.id == pending_stk.member_id).first() if pending_stk.member_id else None
+        notes_str = pending_stk.notes or ""
+        payment_type = "deposit"
+        account_type = "savings"
+        loan_id = None
+        if "payment_type:loan_repayment" in notes_str:
+            payment_type = "loan_repayment"
+        if "loan_id:" in notes_str:
+            loan_id = notes_str.split("loan_id:")[1].split("|")[0].strip()
+        if "account_type:" in notes_str:
+            account_type = notes_str.split("account_type:")[1].split("|")[0].strip()
+    else:
+        mpesa_payment = MpesaPayment(
+            trans_id=mpesa_receipt,
+            trans_time=datetime.utcnow().strftime("%Y%m%d%H%M%S"),
+            amount=amount,
+            phone_number=phone or "",
+            bill_ref_number=checkout_request_id,
+            first_name="STK Push",
+            transaction_type="STK",
+            member_id=member.id if member else None,
+            status="credited" if member else "unmatched",
+            raw_payload=data
+        )
+        tenant_session.add(mpesa_payment)
+        payment_type = "deposit"
+        account_type = "savings"
+        loan_id = None
+
+    if not member and phone:
+        member = member_by_phone(tenant_session, phone)
+
+    if member:
+        member = tenant_session.query(Member).filter(Member.id == member.id).with_for_update().first()
+
+    if member and payment_type == "loan_repayment" and loan_id:
+        from models.tenant import LoanApplication
+        from services.mpesa_loan_service import apply_mpesa_payment_to_loan
+        loan = tenant_session.query(LoanApplication).filter(
+            LoanApplication.id == loan_id,
+            LoanApplication.member_id == member.id,
+            LoanApplication.status.in_(["disbursed", "active"])
+        ).first()
+
+        if loan:
+            repayment, error = apply_mpesa_payment_to_loan(
+                tenant_session, loan, member, amount, mpesa_receipt, "STK Push"
+            )
+            if error:
+                mpesa_payment.status = "unmatched"
+                mpesa_payment.notes = (mpesa_payment.notes or "") + f" | Loan repayment error: {error}"
+                print(f"[STK Callback] Loan repayment error: {error}")
+            else:
                 mpesa_payment.status = "credited"
                 mpesa_payment.member_id = member.id
-                mpesa_payment.transaction_id = transaction.id
                 mpesa_payment.credited_at = datetime.utcnow()
+                print(f"[STK Callback] Loan repayment {amount} applied to loan {loan.application_number} for member {member.member_number}")
+        else:
+            mpesa_payment.status = "unmatched"
+            mpesa_payment.notes = (mpesa_payment.notes or "") + f" | Loan {loan_id} not found or not active"
+            print(f"[STK Callback] Loan {loan_id} not found/active for member {member.member_number}")
 
-                post_mpesa_deposit_to_gl(tenant_session, member, amount, mpesa_receipt)
+    elif member:
+        if account_type == "savings":
+            current_balance = member.savings_balance or Decimal("0")
+        elif account_type == "shares":
+            current_balance = member.shares_balance or Decimal("0")
+        else:
+            current_balance = member.savings_balance or Decimal("0")
+        new_balance = current_balance + amount
+        code = generate_txn_code()
 
-                print(f"[STK Callback] Credited {amount} to member {member.member_number} ({account_type})")
-            else:
-                mpesa_payment.status = "unmatched"
-                mpesa_payment.notes = (mpesa_payment.notes or "") + f" | STK Push payment - no member matched for phone {phone}"
-                print(f"[STK Callback] Unmatched payment from {phone}")
+        transaction = Transaction(
+            transaction_number=code,
+            member_id=member.id,
+            transaction_type="deposit",
+            account_type=account_type,
+            amount=amount,
+            balance_before=current_balance,
+            balance_after=new_balance,
+            payment_method="mpesa",
+            reference=mpesa_receipt,
+            description=f"M-Pesa STK Push deposit from {phone}"
+        )
+        if account_type == "savings":
+            member.savings_balance = new_balance
+        elif account_type == "shares":
+            member.shares_balance = new_balance
+        tenant_session.add(transaction)
+        tenant_session.flush()
+
+        mpesa_payment.status = "credited"
+        mpesa_payment.member_id = member.id
+        mpesa_payment.transaction_id = transaction.id
+        mpesa_payment.credited_at = datetime.utcnow()
+
+        post_mpesa_deposit_to_gl(tenant_session, member, amount, mpesa_receipt)
+
+        print(f"[STK Callback] Credited {amount} to member {member.member_number} ({account_type})")
+    else:
+        mpesa_payment.status = "unmatched"
+        mpesa_payment.notes = (mpesa_payment.notes or "") + f" | STK Push payment - no member matched for phone {phone}"
+        print(f"[STK Callback] Unmatched payment from {phone}")
+
+    tenant_session.commit()
+    return mpesa_payment.status
 
-            tenant_session.commit()
-            return {"ResultCode": 0, "ResultDesc": "Accepted"}
-        finally:
-            tenant_session.close()
-            tenant_ctx.close()
 
+@router.post("/mpesa/stk-callback/{org_id}")
+async def mpesa_stk_callback(org_id: str, request: Request, db: Session = Depends(get_db)):
+    """
+    M-Pesa STK Push Callback URL
+    Called by Safaricom after STK Push payment is completed or cancelled. The
+    payload is stored durably and acknowledged at once; process_stk_callback
+    applies it from the callback worker pool.
+    """
+    try:
+        data = await request.json()
+        print(f"[STK Callback] Received for org {org_id}: {json.dumps(data, default=str)}")
+        await run_in_threadpool(_record_stk_callback, db, org_id, data)
     except Exception as e:
         import traceback
         print(f"[STK Callback] CRITICAL ERROR: {e}")
         traceback.print_exc()
-        return {"ResultCode": 0, "ResultDesc": "Accepted"}
+    return {"ResultCode": 0, "ResultDesc": "Accepted"}
@@ -139,7 +139,7 @@ async def create_organization(data: OrganizationCreate, user = Depends(get_curre
     return sanitize_org(org)
 
 @router.get("")
-async def list_organizations(user = Depends(get_current_user), db: Session = Depends(get_db)):
+def list_organizations(user = Depends(get_current_user), db: Session = Depends(get_db)):
     memberships = db.query(OrganizationMember).filter(
         OrganizationMember.user_id == user.id
     ).all()
@@ -153,7 +153,7 @@ async def list_organizations(user = Depends(get_current_user), db: Session = Dep
     return result
 
 @router.get("/my")
-async def get_my_organizations(auth = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_my_organizations(auth = Depends(get_current_user), db: Session = Depends(get_db)):
     from routes.auth import AuthContext
     
     # If staff user, return their organization directly
@@ -193,7 +193,7 @@ async def get_my_organizations(auth = Depends(get_current_user), db: Session = D
     return result
 
 @router.get("/{org_id}")
-async def get_organization(org_id: str, user = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_organization(org_id: str, user = Depends(get_current_user), db: Session = Depends(get_db)):
     membership = db.query(OrganizationMember).filter(
         OrganizationMember.organization_id == org_id,
         OrganizationMember.user_id == user.id
@@ -216,7 +216,7 @@ async def get_organization(org_id: str, user = Depends(get_current_user), db: Se
     }
 
 @router.patch("/{org_id}")
-async def update_organization(org_id: str, data: OrganizationUpdate, user = Depends(get_current_user), db: Session = Depends(get_db)):
+def update_organization(org_id: str, data: OrganizationUpdate, user = Depends(get_current_user), db: Session = Depends(get_db)):
     membership = db.query(OrganizationMember).filter(
         OrganizationMember.organization_id == org_id,
         OrganizationMember.user_id == user.id,
@@ -301,7 +301,7 @@ async def delete_organization(org_id: str, user = Depends(get_current_user), db:
     return {"message": "Organization deleted successfully"}
 
 @router.get("/{org_id}/team")
-async def get_organization_team(org_id: str, user = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_organization_team(org_id: str, user = Depends(get_current_user), db: Session = Depends(get_db)):
     membership = db.query(OrganizationMember).filter(
         OrganizationMember.organization_id == org_id,
         OrganizationMember.user_id == user.id,
@@ -16,13 +16,14 @@ gl_logger = logging.getLogger("accounting.gl")
 
 router = APIRouter()
 
-def post_repayment_to_gl(tenant_session, repayment, loan, member):
-    """Post a loan repayment to the General Ledger"""
+def post_repayment_to_gl(tenant_session, repayment, loan, member, svc=None):
+    """Post a loan repayment to the General Ledger (queued instead if svc is a deferred AccountingService)"""
     try:
         from accounting.service import AccountingService, post_loan_repayment
         
-        svc = AccountingService(tenant_session)
-        svc.seed_default_accounts()
+        if svc is None:
+            svc = AccountingService(tenant_session)
+            svc.seed_default_accounts()
         
         member_name = f"{member.first_name} {member.last_name}"
         
@@ -89,7 +90,7 @@ def calculate_payment_allocation(loan: LoanApplication, amount: Decimal, tenant_
     return principal_portion, interest_portion, penalty_portion
 
 @router.get("/{org_id}/repayments")
-async def list_repayments(org_id: str, loan_id: str = None, start_date: str = None, end_date: str = None, page: int = 1, page_size: int = 20, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_repayments(org_id: str, loan_id: str = None, start_date: str = None, end_date: str = None, page: int = 1, page_size: int = 20, user=Depends(get_current_user), db: Session = Depends(get_db)):
     from datetime import date as date_type
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "repayments:read", db)
@@ -130,7 +131,7 @@ async def list_repayments(org_id: str, loan_id: str = None, start_date: str = No
         tenant_ctx.close()
 
 @router.post("/{org_id}/repayments")
-async def create_repayment(org_id: str, data: LoanRepaymentCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def create_repayment(org_id: str, data: LoanRepaymentCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "repayments:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -274,7 +275,7 @@ async def create_repayment(org_id: str, data: LoanRepaymentCreate, user=Depends(
         tenant_ctx.close()
 
 @router.get("/{org_id}/repayments/{repayment_id}")
-async def get_repayment(org_id: str, repayment_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_repayment(org_id: str, repayment_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "repayments:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -288,7 +289,7 @@ async def get_repayment(org_id: str, repayment_id: str, user=Depends(get_current
         tenant_ctx.close()
 
 @router.get("/{org_id}/loans/{loan_id}/schedule")
-async def get_loan_schedule(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_loan_schedule(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "repayments:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -1,12 +1,9 @@
-import csv
-import io
 import math
 from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_, case
+from sqlalchemy import func, case
 from decimal import Decimal
-from datetime import date, timedelta
+from datetime import date, datetime, time, timedelta
 from models.database import get_db
 from models.tenant import (
     Member, LoanApplication, LoanRepayment, Transaction,
@@ -15,8 +12,13 @@ from models.tenant import (
 )
 from routes.auth import get_current_user
 from routes.common import get_tenant_session_context, require_permission
+from services.export_engine import EXPORT_BATCH_SIZE, csv_export_response
+from services.member_search import search_members as member_search
+from services.branch_scope import effective_branch_id
+from services.balance_snapshots import MEMBER_ACCOUNTS, balance_at
+from services.partitioning import date_bounds
+from services.portfolio_snapshot import ACTIVE_LOAN_STATUSES, aging_summary, loan_bucket_select, par_ratios, portfolio_trend
 
-ACTIVE_LOAN_STATUSES = ["disbursed", "defaulted", "restructured"]
 EVER_APPROVED_STATUSES = ["approved", "disbursed", "paid", "defaulted", "completed", "restructured", "written_off"]
 EVER_DISBURSED_STATUSES = ["disbursed", "paid", "defaulted", "completed", "restructured", "written_off"]
 
@@ -71,7 +73,7 @@ def _apply_branch_filter(query, branch_id, model=Member):
 
 
 @router.get("/{org_id}/reports/member-search")
-async def search_members(
+def search_members(
     org_id: str,
     query: str = "",
     limit: int = 20,
@@ -84,19 +86,7 @@ async def search_members(
     try:
         if not query or len(query.strip()) == 0:
             return []
-        search_term = f"%{query.strip()}%"
-        results = tenant_session.query(
-            Member.id,
-            Member.member_number,
-            Member.first_name,
-            Member.last_name,
-        ).filter(
-            or_(
-                Member.member_number.ilike(search_term),
-                Member.first_name.ilike(search_term),
-                Member.last_name.ilike(search_term),
-            )
-        ).limit(limit).all()
+        results = member_search(tenant_session, query, limit=limit)
         return [
             {"id": r.id, "member_number": r.member_number, "first_name": r.first_name, "last_name": r.last_name}
             for r in results
@@ -107,7 +97,7 @@ async def search_members(
 
 
 @router.get("/{org_id}/reports/member-statement/{member_id}")
-async def get_member_statement(
+def get_member_statement(
     org_id: str,
     member_id: str,
     start_date: date = None,
@@ -128,11 +118,16 @@ async def get_member_statement(
         if not end_date:
             end_date = date.today()
 
+        period_start = datetime.combine(start_date, time.min)
         transactions = tenant_session.query(Transaction).filter(
             Transaction.member_id == member_id,
-            func.date(Transaction.created_at) >= start_date,
-            func.date(Transaction.created_at) <= end_date,
+            Transaction.created_at >= period_start,
+            Transaction.created_at < datetime.combine(end_date + timedelta(days=1), time.min),
         ).order_by(Transaction.created_at).all()
+        opening_balances = {
+            account: _dec(balance_at(tenant_session, member_id, account, period_start))
+            for account in MEMBER_ACCOUNTS
+        }
 
         loans = tenant_session.query(LoanApplication).filter(
             LoanApplication.member_id == member_id
@@ -166,6 +161,7 @@ async def get_member_statement(
                 "deposits": _dec(member.deposits_balance),
                 "total_loan_outstanding": _dec(sum(l.outstanding_balance or Decimal("0") for l in active_loans)),
             },
+            "opening_balances": opening_balances,
             "transactions": [
                 {
                     "date": t.created_at.isoformat(),
@@ -197,7 +193,7 @@ async def get_member_statement(
 
 
 @router.get("/{org_id}/reports/fixed-deposits")
-async def get_fixed_deposits_report(
+def get_fixed_deposits_report(
     org_id: str,
     status: str = None,
     user=Depends(get_current_user),
@@ -267,7 +263,7 @@ async def get_fixed_deposits_report(
 
 
 @router.get("/{org_id}/reports/loans")
-async def get_loan_report(
+def get_loan_report(
     org_id: str,
     start_date: date = None,
     end_date: date = None,
@@ -343,7 +339,7 @@ async def get_loan_report(
 
 
 @router.get("/{org_id}/reports/financial-summary")
-async def get_financial_summary(
+def get_financial_summary(
     org_id: str,
     start_date: date = None,
     end_date: date = None,
@@ -386,10 +382,7 @@ async def get_financial_summary(
         txn_agg = tenant_session.query(
             func.coalesce(func.sum(case((Transaction.transaction_type == "deposit", Transaction.amount), else_=0)), 0),
             func.coalesce(func.sum(case((Transaction.transaction_type == "withdrawal", Transaction.amount), else_=0)), 0),
-        ).filter(
-            func.date(Transaction.created_at) >= start_date,
-            func.date(Transaction.created_at) <= end_date,
-        ).first()
+        ).filter(*date_bounds(Transaction.created_at, start_date, end_date)).first()
         total_deposits_period, total_withdrawals_period = txn_agg
 
         repayment_agg = tenant_session.query(
@@ -443,7 +436,7 @@ async def get_financial_summary(
 
 
 @router.get("/{org_id}/reports/profit-loss")
-async def get_profit_loss_report(
+def get_profit_loss_report(
     org_id: str,
     start_date: date = None,
     end_date: date = None,
@@ -532,7 +525,7 @@ async def get_profit_loss_report(
 
 
 @router.get("/{org_id}/reports/aging")
-async def get_aging_report(
+def get_aging_report(
     org_id: str,
     user=Depends(get_current_user),
     db: Session = Depends(get_db),
@@ -542,163 +535,191 @@ async def get_aging_report(
     tenant_session = tenant_ctx.create_session()
     try:
         today = date.today()
-
-        loans = tenant_session.query(LoanApplication).filter(
-            LoanApplication.status.in_(ACTIVE_LOAN_STATUSES),
-            LoanApplication.outstanding_balance > 0,
-        ).all()
-
-        loan_ids = [l.id for l in loans]
-        earliest_overdue = {}
-        if loan_ids:
-            overdue_rows = tenant_session.query(
-                LoanInstalment.loan_id,
-                func.min(LoanInstalment.due_date).label("earliest_due"),
-            ).filter(
-                LoanInstalment.loan_id.in_(loan_ids),
-                LoanInstalment.status.in_(["pending", "partial"]),
-                LoanInstalment.due_date < today,
-            ).group_by(LoanInstalment.loan_id).all()
-            earliest_overdue = {row.loan_id: row.earliest_due for row in overdue_rows}
-
-        aging_buckets = {
-            "current": [],
-            "1_30_days": [],
-            "31_60_days": [],
-            "61_90_days": [],
-            "over_90_days": [],
-        }
-
-        for loan in loans:
-            overdue_date = earliest_overdue.get(loan.id) or loan.next_payment_date
-            if not overdue_date or overdue_date >= today:
-                aging_buckets["current"].append(loan)
-            else:
-                days_overdue = (today - overdue_date).days
-                if days_overdue <= 30:
-                    aging_buckets["1_30_days"].append(loan)
-                elif days_overdue <= 60:
-                    aging_buckets["31_60_days"].append(loan)
-                elif days_overdue <= 90:
-                    aging_buckets["61_90_days"].append(loan)
-                else:
-                    aging_buckets["over_90_days"].append(loan)
+        aging = aging_summary(tenant_session, today)
+        buckets = aging["buckets"]
 
         return {
             "as_of_date": _iso(today),
+            "source": aging["source"],
+            "snapshot_at": _iso(aging["snapshot_at"]),
             "summary": {
                 bucket: {
-                    "count": len(loans_list),
-                    "total_outstanding": _dec(sum(l.outstanding_balance or Decimal("0") for l in loans_list)),
+                    "count": values["count"],
+                    "total_outstanding": _dec(values["amount"]),
                 }
-                for bucket, loans_list in aging_buckets.items()
+                for bucket, values in buckets.items()
             },
             "total_portfolio": {
-                "count": len(loans),
-                "total_outstanding": _dec(sum(l.outstanding_balance or Decimal("0") for l in loans)),
+                "count": sum(v["count"] for v in buckets.values()),
+                "total_outstanding": _dec(sum(v["amount"] for v in buckets.values())),
             },
+            "par": par_ratios(buckets),
         }
     finally:
         tenant_session.close()
         tenant_ctx.close()
 
 
-@router.get("/{org_id}/reports/export")
-async def export_report(
+@router.get("/{org_id}/reports/portfolio-trend")
+def get_portfolio_trend(
     org_id: str,
-    report_type: str = Query(..., description="One of: loans, aging, summary, pnl, members"),
-    start_date: date = None,
-    end_date: date = None,
+    days: int = Query(90, ge=1, le=730),
     branch_id: str = None,
-    status: str = None,
+    product_id: str = None,
     user=Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
+    """Outstanding portfolio and PAR1/PAR30/PAR90 per day, read from the nightly snapshots"""
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "reports:read", db)
     tenant_session = tenant_ctx.create_session()
     try:
-        output = io.StringIO()
-        writer = csv.writer(output)
-        filename = f"{report_type}_report.csv"
-
-        if report_type == "loans":
-            writer.writerow(["Application Number", "Member Name", "Amount", "Status", "Applied At", "Disbursed At", "Outstanding"])
-            loan_query = tenant_session.query(LoanApplication)
-            if start_date:
-                loan_query = loan_query.filter(func.date(LoanApplication.applied_at) >= start_date)
-            if end_date:
-                loan_query = loan_query.filter(func.date(LoanApplication.applied_at) <= end_date)
-            if status:
-                loan_query = loan_query.filter(LoanApplication.status == status)
-            if branch_id:
-                loan_query = loan_query.join(Member).filter(Member.branch_id == branch_id)
-            loans = loan_query.all()
-            for l in loans:
-                member_name = f"{l.member.first_name} {l.member.last_name}" if l.member else ""
-                writer.writerow([l.application_number, member_name, _dec(l.amount), l.status, _iso(l.applied_at), _iso(l.disbursed_at), _dec(l.outstanding_balance)])
-
-        elif report_type == "aging":
-            writer.writerow(["Application Number", "Member Name", "Outstanding Balance", "Status", "Next Payment Date"])
-            loans = tenant_session.query(LoanApplication).filter(
-                LoanApplication.status.in_(ACTIVE_LOAN_STATUSES),
-                LoanApplication.outstanding_balance > 0,
-            ).all()
-            for l in loans:
-                member_name = f"{l.member.first_name} {l.member.last_name}" if l.member else ""
-                writer.writerow([l.application_number, member_name, _dec(l.outstanding_balance), l.status, _iso(l.next_payment_date)])
-
-        elif report_type == "summary":
-            writer.writerow(["Metric", "Value"])
-            agg = tenant_session.query(
-                func.coalesce(func.sum(Member.savings_balance), 0),
-                func.coalesce(func.sum(Member.shares_balance), 0),
-                func.coalesce(func.sum(Member.deposits_balance), 0),
-                func.count(Member.id),
-            ).first()
-            writer.writerow(["Total Members", int(agg[3])])
-            writer.writerow(["Total Savings", _dec(agg[0])])
-            writer.writerow(["Total Shares", _dec(agg[1])])
-            writer.writerow(["Total Deposits", _dec(agg[2])])
-
-        elif report_type == "pnl":
-            writer.writerow(["Category", "Amount"])
-            today = date.today()
-            period_start = today.replace(day=1)
-            repayment_agg = tenant_session.query(
-                func.coalesce(func.sum(LoanRepayment.interest_amount), 0),
-                func.coalesce(func.sum(LoanRepayment.penalty_amount), 0),
-            ).filter(
-                func.date(LoanRepayment.payment_date) >= period_start,
-                func.date(LoanRepayment.payment_date) <= today,
-            ).first()
-            writer.writerow(["Interest Income", _dec(repayment_agg[0])])
-            writer.writerow(["Penalty Income", _dec(repayment_agg[1])])
-            expense_total = tenant_session.query(
-                func.coalesce(func.sum(Expense.amount), 0)
-            ).filter(
-                Expense.expense_date >= period_start,
-                Expense.expense_date <= today,
-                Expense.status == "approved",
-            ).scalar()
-            writer.writerow(["Total Expenses", _dec(expense_total)])
-            writer.writerow(["Net Profit", _dec(repayment_agg[0]) + _dec(repayment_agg[1]) - _dec(expense_total)])
-
-        elif report_type == "members":
-            writer.writerow(["Member Number", "First Name", "Last Name", "Phone", "Email", "Savings", "Shares", "Deposits", "Status"])
-            members = tenant_session.query(Member).order_by(Member.member_number).all()
-            for m in members:
-                writer.writerow([m.member_number, m.first_name, m.last_name, m.phone, m.email, _dec(m.savings_balance), _dec(m.shares_balance), _dec(m.deposits_balance), m.status])
-
-        else:
-            raise HTTPException(status_code=400, detail=f"Invalid report_type: {report_type}. Must be one of: loans, aging, summary, pnl, members")
-
-        output.seek(0)
-        return StreamingResponse(
-            iter([output.getvalue()]),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={filename}"},
-        )
+        end = date.today()
+        start = end - timedelta(days=days - 1)
+        points = portfolio_trend(tenant_session, start, end, effective_branch_id(user, branch_id), product_id)
+        return {
+            "start_date": _iso(start),
+            "end_date": _iso(end),
+            "points": [
+                {
+                    "date": _iso(p["date"]),
+                    "loan_count": p["loan_count"],
+                    "total_outstanding": _dec(p["total_outstanding"]),
+                    "par1": p["par1"],
+                    "par30": p["par30"],
+                    "par90": p["par90"],
+                    "buckets": {
+                        bucket: {"count": v["count"], "total_outstanding": _dec(v["amount"])}
+                        for bucket, v in p["buckets"].items()
+                    },
+                }
+                for p in points
+            ],
+        }
     finally:
         tenant_session.close()
         tenant_ctx.close()
+
+
+EXPORT_REPORT_TYPES = ("loans", "aging", "summary", "pnl", "members")
+
+
+def _member_name_column():
+    return (Member.first_name + " " + Member.last_name).label("member_name")
+
+
+def _loans_report_rows(start_date, end_date, branch_id, status):
+    def rows(session):
+        loan_query = session.query(
+            LoanApplication.application_number, _member_name_column(), LoanApplication.amount,
+            LoanApplication.status, LoanApplication.applied_at, LoanApplication.disbursed_at,
+            LoanApplication.outstanding_balance,
+        ).outerjoin(Member, Member.id == LoanApplication.member_id)
+        if start_date:
+            loan_query = loan_query.filter(func.date(LoanApplication.applied_at) >= start_date)
+        if end_date:
+            loan_query = loan_query.filter(func.date(LoanApplication.applied_at) <= end_date)
+        if status:
+            loan_query = loan_query.filter(LoanApplication.status == status)
+        if branch_id:
+            loan_query = loan_query.filter(Member.branch_id == branch_id)
+        for l in loan_query.yield_per(EXPORT_BATCH_SIZE):
+            yield [l.application_number, l.member_name or "", _dec(l.amount), l.status, _iso(l.applied_at), _iso(l.disbursed_at), _dec(l.outstanding_balance)]
+    return rows
+
+
+def _aging_report_rows(branch_id):
+    def rows(session):
+        criteria = [LoanApplication.branch_id == branch_id] if branch_id else []
+        buckets = loan_bucket_select(date.today(), *criteria).subquery()
+        loans = session.query(
+            LoanApplication.application_number, _member_name_column(), LoanApplication.outstanding_balance,
+            LoanApplication.status, LoanApplication.next_payment_date, buckets.c.bucket,
+        ).join(buckets, buckets.c.loan_id == LoanApplication.id).outerjoin(
+            Member, Member.id == LoanApplication.member_id
+        ).yield_per(EXPORT_BATCH_SIZE)
+        for l in loans:
+            yield [l.application_number, l.member_name or "", _dec(l.outstanding_balance), l.status, _iso(l.next_payment_date), l.bucket]
+    return rows
+
+
+def _summary_report_rows(session):
+    agg = session.query(
+        func.coalesce(func.sum(Member.savings_balance), 0),
+        func.coalesce(func.sum(Member.shares_balance), 0),
+        func.coalesce(func.sum(Member.deposits_balance), 0),
+        func.count(Member.id),
+    ).first()
+    yield ["Total Members", int(agg[3])]
+    yield ["Total Savings", _dec(agg[0])]
+    yield ["Total Shares", _dec(agg[1])]
+    yield ["Total Deposits", _dec(agg[2])]
+
+
+def _pnl_report_rows(session):
+    today = date.today()
+    period_start = today.replace(day=1)
+    repayment_agg = session.query(
+        func.coalesce(func.sum(LoanRepayment.interest_amount), 0),
+        func.coalesce(func.sum(LoanRepayment.penalty_amount), 0),
+    ).filter(
+        func.date(LoanRepayment.payment_date) >= period_start,
+        func.date(LoanRepayment.payment_date) <= today,
+    ).first()
+    yield ["Interest Income", _dec(repayment_agg[0])]
+    yield ["Penalty Income", _dec(repayment_agg[1])]
+    expense_total = session.query(
+        func.coalesce(func.sum(Expense.amount), 0)
+    ).filter(
+        Expense.expense_date >= period_start,
+        Expense.expense_date <= today,
+        Expense.status == "approved",
+    ).scalar()
+    yield ["Total Expenses", _dec(expense_total)]
+    yield ["Net Profit", _dec(repayment_agg[0]) + _dec(repayment_agg[1]) - _dec(expense_total)]
+
+
+def _members_report_rows(session):
+    members = session.query(
+        Member.member_number, Member.first_name, Member.last_name, Member.phone, Member.email,
+        Member.savings_balance, Member.shares_balance, Member.deposits_balance, Member.status,
+    ).order_by(Member.member_number).yield_per(EXPORT_BATCH_SIZE)
+    for m in members:
+        yield [m.member_number, m.first_name, m.last_name, m.phone, m.email, _dec(m.savings_balance), _dec(m.shares_balance), _dec(m.deposits_balance), m.status]
+
+
+@router.get("/{org_id}/reports/export")
+def export_report(
+    org_id: str,
+    report_type: str = Query(..., description="One of: loans, aging, summary, pnl, members"),
+    start_date: date = None,
+    end_date: date = None,
+    branch_id: str = None,
+    status: str = None,
+    gzip: bool = False,
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
+    require_permission(membership, "reports:read", db)
+
+    if report_type not in EXPORT_REPORT_TYPES:
+        raise HTTPException(status_code=400, detail=f"Invalid report_type: {report_type}. Must be one of: loans, aging, summary, pnl, members")
+
+    if report_type == "loans":
+        header = ["Application Number", "Member Name", "Amount", "Status", "Applied At", "Disbursed At", "Outstanding"]
+        row_fn = _loans_report_rows(start_date, end_date, branch_id, status)
+    elif report_type == "aging":
+        header = ["Application Number", "Member Name", "Outstanding Balance", "Status", "Next Payment Date", "Aging Bucket"]
+        row_fn = _aging_report_rows(branch_id)
+    elif report_type == "summary":
+        header = ["Metric", "Value"]
+        row_fn = _summary_report_rows
+    elif report_type == "pnl":
+        header = ["Category", "Amount"]
+        row_fn = _pnl_report_rows
+    else:
+        header = ["Member Number", "First Name", "Last Name", "Phone", "Email", "Savings", "Shares", "Deposits", "Status"]
+        row_fn = _members_report_rows
+
+    return csv_export_response(tenant_ctx, f"{report_type}_report", header, row_fn, gzip=gzip, timestamp=False)
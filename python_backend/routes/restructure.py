@@ -11,7 +11,8 @@ from schemas.tenant import LoanRestructureCreate, LoanRestructureResponse
 from routes.auth import get_current_user
 from routes.common import get_tenant_session_context, require_permission
 from services.instalment_service import regenerate_instalments_after_restructure
-from routes.loans import calculate_loan, term_months_to_instalments, instalments_to_term_months
+from routes.loans import calculate_loan
+from services.amortization import get_periodic_rate, instalments_to_term_months, loan_totals, term_months_to_instalments
 
 router = APIRouter()
 
@@ -61,43 +62,14 @@ def recalculate_loan_by_instalments(remaining_principal: Decimal, product: LoanP
     """Recalculate loan based on remaining principal using number of remaining instalments directly."""
     rate = new_rate if new_rate is not None else loan.interest_rate
     interest_deducted_upfront = bool(getattr(loan, 'interest_deducted_upfront', False))
-    n = remaining_instalments
-
-    if interest_deducted_upfront:
-        periodic_payment = remaining_principal / n if n > 0 else Decimal("0")
-        return {
-            "monthly_repayment": round(periodic_payment, 2),
-            "total_repayment": round(remaining_principal, 2),
-            "total_interest": Decimal("0"),
-            "num_instalments": n
-        }
-
     interest_type = getattr(product, 'interest_type', 'reducing_balance') if product else 'reducing_balance'
     freq = getattr(product, 'repayment_frequency', 'monthly') if product else 'monthly'
-    from routes.loans import get_periodic_rate
     periodic_rate = get_periodic_rate(rate, freq, freq)
-
-    if interest_type == "flat":
-        total_interest = remaining_principal * periodic_rate * n
-        total_repayment = remaining_principal + total_interest
-        periodic_payment = total_repayment / n if n > 0 else Decimal("0")
-    else:
-        if periodic_rate > 0:
-            periodic_payment = remaining_principal * (periodic_rate * (1 + periodic_rate) ** n) / ((1 + periodic_rate) ** n - 1)
-        else:
-            periodic_payment = remaining_principal / n if n > 0 else Decimal("0")
-        total_repayment = periodic_payment * n
-        total_interest = total_repayment - remaining_principal
-
-    return {
-        "total_interest": round(total_interest, 2),
-        "total_repayment": round(total_repayment, 2),
-        "monthly_repayment": round(periodic_payment, 2),
-        "num_instalments": n
-    }
+    return loan_totals(remaining_principal, remaining_instalments, periodic_rate, interest_type,
+                       upfront=interest_deducted_upfront)
 
 @router.get("/{org_id}/loans/{loan_id}/restructures")
-async def list_loan_restructures(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_loan_restructures(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "restructure:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -113,7 +85,7 @@ async def list_loan_restructures(org_id: str, loan_id: str, user=Depends(get_cur
         tenant_ctx.close()
 
 @router.post("/{org_id}/loans/{loan_id}/restructure")
-async def restructure_loan(org_id: str, loan_id: str, data: LoanRestructureCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def restructure_loan(org_id: str, loan_id: str, data: LoanRestructureCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "restructure:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -242,7 +214,7 @@ async def restructure_loan(org_id: str, loan_id: str, data: LoanRestructureCreat
         tenant_ctx.close()
 
 @router.get("/{org_id}/loans/{loan_id}/restructure/preview")
-async def preview_restructure(
+def preview_restructure(
     org_id: str, 
     loan_id: str, 
     restructure_type: str,
@@ -6,6 +6,7 @@ from schemas.tenant import RoleCreate, RoleUpdate, RoleResponse
 from routes.auth import get_current_user
 from routes.common import get_tenant_session_context, require_role, invalidate_permissions_cache
 from middleware.demo_guard import require_not_demo
+from services.event_bus import emit
 
 router = APIRouter()
 
@@ -199,11 +200,11 @@ def seed_default_roles(tenant_session):
     tenant_session.commit()
 
 @router.get("/permissions/available")
-async def get_available_permissions():
+def get_available_permissions():
     return AVAILABLE_PERMISSIONS
 
 @router.get("/{org_id}/roles")
-async def get_roles(
+def get_roles(
     org_id: str,
     user = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -232,7 +233,7 @@ async def get_roles(
         tenant_ctx.close()
 
 @router.post("/{org_id}/roles")
-async def create_role(
+def create_role(
     org_id: str,
     data: RoleCreate,
     user = Depends(get_current_user),
@@ -275,7 +276,7 @@ async def create_role(
         tenant_ctx.close()
 
 @router.patch("/{org_id}/roles/{role_id}")
-async def update_role(
+def update_role(
     org_id: str,
     role_id: str,
     data: RoleUpdate,
@@ -299,6 +300,7 @@ async def update_role(
         
         if data.permissions is not None:
             tenant_session.query(RolePermission).filter(RolePermission.role_id == role_id).delete()
+            emit(tenant_session, "role", role_id=role.id)
             for perm in data.permissions:
                 role_perm = RolePermission(role_id=role.id, permission=perm)
                 tenant_session.add(role_perm)
@@ -323,7 +325,7 @@ async def update_role(
         tenant_ctx.close()
 
 @router.delete("/{org_id}/roles/{role_id}", dependencies=[Depends(require_not_demo)])
-async def delete_role(
+def delete_role(
     org_id: str,
     role_id: str,
     user = Depends(get_current_user),
@@ -352,7 +354,7 @@ async def delete_role(
         tenant_ctx.close()
 
 @router.post("/{org_id}/roles/{role_id}/reset")
-async def reset_role_to_default(
+def reset_role_to_default(
     org_id: str,
     role_id: str,
     user = Depends(get_current_user),
@@ -374,6 +376,7 @@ async def reset_role_to_default(
             raise HTTPException(status_code=404, detail="Default role definition not found")
         
         tenant_session.query(RolePermission).filter(RolePermission.role_id == role_id).delete()
+        emit(tenant_session, "role", role_id=role.id)
         
         for perm in default_role["permissions"]:
             role_perm = RolePermission(role_id=role.id, permission=perm)
@@ -390,7 +393,7 @@ async def reset_role_to_default(
         tenant_ctx.close()
 
 @router.get("/{org_id}/roles/{role_name}/permissions")
-async def get_role_permissions(
+def get_role_permissions(
     org_id: str,
     role_name: str,
     user = Depends(get_current_user),
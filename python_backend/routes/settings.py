@@ -10,6 +10,7 @@ from routes.auth import get_current_user
 from routes.common import get_tenant_session_context, require_role
 from middleware.demo_guard import block_critical_settings, mask_if_demo, SENSITIVE_KEYS
 from models.master import Organization
+from accounting.balances import record_balance_mode
 
 router = APIRouter()
 
@@ -51,6 +52,8 @@ DEFAULT_SETTINGS = [
     {"key": "brevo_api_key", "value": "", "type": "string", "description": "Brevo API key"},
     {"key": "email_from_name", "value": "", "type": "string", "description": "Email sender name"},
     {"key": "email_from_address", "value": "", "type": "string", "description": "Email sender address"},
+    {"key": "gl_balance_mode", "value": "direct", "type": "string", "description": "GL account balance updates (direct/delta)"},
+    {"key": "audit_retention_months", "value": "0", "type": "number", "description": "Months of audit logs kept live before archiving (0 keeps all)"},
 ]
 
 def initialize_settings(tenant_session):
@@ -96,7 +99,7 @@ def initialize_working_hours(tenant_session):
         tenant_session.commit()
 
 @router.get("/{org_id}/settings")
-async def list_settings(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_settings(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     from models.master import Organization
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     tenant_session = tenant_ctx.create_session()
@@ -154,7 +157,7 @@ async def list_settings(org_id: str, user=Depends(get_current_user), db: Session
         tenant_ctx.close()
 
 @router.put("/{org_id}/settings")
-async def update_settings_bulk(org_id: str, updates: dict, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def update_settings_bulk(org_id: str, updates: dict, user=Depends(get_current_user), db: Session = Depends(get_db)):
     from models.master import Organization
     block_critical_settings(updates)
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
@@ -194,6 +197,8 @@ async def update_settings_bulk(org_id: str, updates: dict, user=Depends(get_curr
                 else:
                     setattr(org, snake_key, value)
             else:
+                if snake_key == "gl_balance_mode":
+                    record_balance_mode(db, org_id, str(value))
                 setting = tenant_session.query(OrganizationSettings).filter(
                     OrganizationSettings.setting_key == snake_key
                 ).first()
@@ -216,7 +221,7 @@ async def update_settings_bulk(org_id: str, updates: dict, user=Depends(get_curr
         tenant_ctx.close()
 
 @router.get("/{org_id}/settings/{key}")
-async def get_setting(org_id: str, key: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_setting(org_id: str, key: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     tenant_session = tenant_ctx.create_session()
     try:
@@ -229,7 +234,7 @@ async def get_setting(org_id: str, key: str, user=Depends(get_current_user), db:
         tenant_ctx.close()
 
 @router.put("/{org_id}/settings/{key}")
-async def update_setting(org_id: str, key: str, data: OrganizationSettingCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def update_setting(org_id: str, key: str, data: OrganizationSettingCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_role(membership, ["owner", "admin"])
     tenant_session = tenant_ctx.create_session()
@@ -251,6 +256,9 @@ async def update_setting(org_id: str, key: str, data: OrganizationSettingCreate,
                 setting.description = data.description
             setting.updated_at = datetime.utcnow()
         
+        if key == "gl_balance_mode":
+            record_balance_mode(db, org_id, data.setting_value)
+            db.commit()
         tenant_session.commit()
         tenant_session.refresh(setting)
         return OrganizationSettingResponse.model_validate(setting)
@@ -259,7 +267,7 @@ async def update_setting(org_id: str, key: str, data: OrganizationSettingCreate,
         tenant_ctx.close()
 
 @router.post("/{org_id}/settings/batch")
-async def update_settings_batch(org_id: str, settings: List[OrganizationSettingCreate], user=Depends(get_current_user), db: Session = Depends(get_db)):
+def update_settings_batch(org_id: str, settings: List[OrganizationSettingCreate], user=Depends(get_current_user), db: Session = Depends(get_db)):
     block_critical_settings({s.setting_key: s.setting_value for s in settings})
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_role(membership, ["owner", "admin"])
@@ -284,7 +292,10 @@ async def update_settings_batch(org_id: str, settings: List[OrganizationSettingC
                 tenant_session.add(setting)
             
             updated.append(data.setting_key)
+            if data.setting_key == "gl_balance_mode":
+                record_balance_mode(db, org_id, data.setting_value)
         
+        db.commit()
         tenant_session.commit()
         return {"message": f"Updated {len(updated)} settings", "keys": updated}
     finally:
@@ -292,7 +303,7 @@ async def update_settings_batch(org_id: str, settings: List[OrganizationSettingC
         tenant_ctx.close()
 
 @router.get("/{org_id}/working-hours")
-async def list_working_hours(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_working_hours(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     tenant_session = tenant_ctx.create_session()
     try:
@@ -304,7 +315,7 @@ async def list_working_hours(org_id: str, user=Depends(get_current_user), db: Se
         tenant_ctx.close()
 
 @router.put("/{org_id}/working-hours/{day_of_week}")
-async def update_working_hours(org_id: str, day_of_week: int, data: WorkingHoursCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def update_working_hours(org_id: str, day_of_week: int, data: WorkingHoursCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_role(membership, ["owner", "admin"])
     tenant_session = tenant_ctx.create_session()
@@ -329,7 +340,7 @@ async def update_working_hours(org_id: str, day_of_week: int, data: WorkingHours
         tenant_ctx.close()
 
 @router.get("/{org_id}/working-hours/check")
-async def check_working_hours(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def check_working_hours(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     tenant_session = tenant_ctx.create_session()
     try:
@@ -384,7 +395,7 @@ async def check_working_hours(org_id: str, user=Depends(get_current_user), db: S
         tenant_ctx.close()
 
 @router.get("/{org_id}/settings/auto-logout")
-async def get_auto_logout_settings(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_auto_logout_settings(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     tenant_session = tenant_ctx.create_session()
     try:
@@ -404,7 +415,7 @@ async def get_auto_logout_settings(org_id: str, user=Depends(get_current_user),
 
 
 @router.post("/{org_id}/trigger-auto-deduction")
-async def trigger_auto_deduction(
+def trigger_auto_deduction(
     org_id: str,
     user=Depends(get_current_user),
     db: Session = Depends(get_db),
@@ -82,7 +82,7 @@ def process_template(template: str, context: dict) -> str:
     return result
 
 @router.get("/{org_id}/sms")
-async def list_sms_notifications(org_id: str, status: str = None, notification_type: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_sms_notifications(org_id: str, status: str = None, notification_type: str = None, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "sms:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -99,7 +99,7 @@ async def list_sms_notifications(org_id: str, status: str = None, notification_t
         tenant_ctx.close()
 
 @router.post("/{org_id}/sms", dependencies=[Depends(require_not_demo)])
-async def send_sms_notification(org_id: str, data: SMSNotificationCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def send_sms_notification(org_id: str, data: SMSNotificationCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "sms:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -140,7 +140,7 @@ async def send_sms_notification(org_id: str, data: SMSNotificationCreate, user=D
         tenant_ctx.close()
 
 @router.post("/{org_id}/sms/bulk", dependencies=[Depends(require_not_demo)])
-async def send_bulk_sms(org_id: str, data: BulkSMSCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def send_bulk_sms(org_id: str, data: BulkSMSCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     if not check_org_feature(org_id, "bulk_sms", db):
         raise HTTPException(status_code=403, detail="Bulk SMS is not available in your subscription plan")
     
@@ -252,7 +252,7 @@ async def send_bulk_sms(org_id: str, data: BulkSMSCreate, user=Depends(get_curre
         tenant_ctx.close()
 
 @router.get("/{org_id}/sms/templates")
-async def list_sms_templates(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_sms_templates(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "sms:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -264,7 +264,7 @@ async def list_sms_templates(org_id: str, user=Depends(get_current_user), db: Se
         tenant_ctx.close()
 
 @router.post("/{org_id}/sms/templates")
-async def create_sms_template(org_id: str, data: SMSTemplateCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def create_sms_template(org_id: str, data: SMSTemplateCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "sms:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -284,7 +284,7 @@ async def create_sms_template(org_id: str, data: SMSTemplateCreate, user=Depends
         tenant_ctx.close()
 
 @router.put("/{org_id}/sms/templates/{template_id}")
-async def update_sms_template(org_id: str, template_id: str, data: SMSTemplateCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def update_sms_template(org_id: str, template_id: str, data: SMSTemplateCreate, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "sms:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -305,7 +305,7 @@ async def update_sms_template(org_id: str, template_id: str, data: SMSTemplateCr
         tenant_ctx.close()
 
 @router.delete("/{org_id}/sms/templates/{template_id}", dependencies=[Depends(require_not_demo)])
-async def delete_sms_template(org_id: str, template_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_sms_template(org_id: str, template_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "sms:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -375,7 +375,7 @@ DEFAULT_SMS_TEMPLATES = [
 ]
 
 @router.post("/{org_id}/sms/templates/seed-defaults")
-async def seed_default_templates(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def seed_default_templates(org_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     """Create default SMS templates if they don't exist"""
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "sms:write", db)
@@ -454,7 +454,7 @@ def send_sms_with_template(tenant_session, template_type: str, recipient_phone:
     return result
 
 @router.post("/{org_id}/loans/{loan_id}/send-reminder")
-async def send_payment_reminder(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def send_payment_reminder(org_id: str, loan_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "sms:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -36,7 +36,7 @@ def ensure_staff_has_member_account(tenant_session: Session, staff: Staff) -> Me
     return member
 
 @router.get("/{org_id}/staff")
-async def get_staff(
+def get_staff(
     org_id: str,
     branch_id: str = None,
     search: str = None,
@@ -134,7 +134,7 @@ async def get_staff(
         tenant_ctx.close()
 
 @router.get("/{org_id}/staff/tellers")
-async def get_tellers(
+def get_tellers(
     org_id: str,
     user = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -164,7 +164,7 @@ async def get_tellers(
         tenant_ctx.close()
 
 @router.get("/{org_id}/staff/me")
-async def get_my_staff_info(
+def get_my_staff_info(
     org_id: str,
     user = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -197,7 +197,7 @@ async def get_my_staff_info(
         tenant_ctx.close()
 
 @router.patch("/{org_id}/staff/me")
-async def update_my_profile(
+def update_my_profile(
     org_id: str,
     data: dict,
     user = Depends(get_current_user),
@@ -244,7 +244,7 @@ async def update_my_profile(
         tenant_ctx.close()
 
 @router.put("/{org_id}/staff/me/password", dependencies=[Depends(require_not_demo)])
-async def change_my_password(
+def change_my_password(
     org_id: str,
     data: dict,
     user = Depends(get_current_user),
@@ -295,7 +295,7 @@ def sanitize_org_name_for_domain(name: str) -> str:
     return sanitized or 'org'
 
 @router.post("/{org_id}/staff")
-async def create_staff(
+def create_staff(
     org_id: str,
     data: StaffCreate,
     user = Depends(get_current_user),
@@ -387,7 +387,7 @@ async def create_staff(
         tenant_ctx.close()
 
 @router.patch("/{org_id}/staff/{staff_id}")
-async def update_staff(
+def update_staff(
     org_id: str,
     staff_id: str,
     data: StaffUpdate,
@@ -464,7 +464,7 @@ async def update_staff(
         tenant_ctx.close()
 
 @router.delete("/{org_id}/staff/{staff_id}", dependencies=[Depends(require_not_demo)])
-async def delete_staff(
+def delete_staff(
     org_id: str,
     staff_id: str,
     user = Depends(get_current_user),
@@ -519,7 +519,7 @@ class CreateMemberAccountData(BaseModel):
 
 
 @router.post("/{org_id}/staff/{staff_id}/create-member-account")
-async def create_member_account_for_staff(
+def create_member_account_for_staff(
     org_id: str,
     staff_id: str,
     data: CreateMemberAccountData,
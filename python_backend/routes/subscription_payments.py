@@ -548,7 +548,7 @@ async def initiate_paystack_payment(organization_id: str, data: dict, auth=Depen
 
 
 @router.get("/{organization_id}/subscription/stripe-key")
-async def get_stripe_publishable_key(organization_id: str, auth=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_stripe_publishable_key(organization_id: str, auth=Depends(get_current_user), db: Session = Depends(get_db)):
     try:
         from services.stripe_service import get_stripe_credentials_from_db
         creds = get_stripe_credentials_from_db(db)
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc, and_
 from decimal import Decimal
@@ -14,6 +15,7 @@ from routes.auth import get_current_user
 from routes.common import get_tenant_session_context, require_permission
 from services.feature_flags import check_org_feature
 from services.code_generator import generate_txn_code
+from services.queue_state import QUEUE_CATEGORIES, queue_state
 
 router = APIRouter()
 
@@ -58,7 +60,7 @@ class QueueTicketCreate(BaseModel):
 
 # Cheque Deposit Endpoints
 @router.get("/organizations/{org_id}/cheque-deposits")
-async def list_cheque_deposits(
+def list_cheque_deposits(
     org_id: str,
     status: str = None,
     user=Depends(get_current_user),
@@ -101,7 +103,7 @@ async def list_cheque_deposits(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/cheque-deposits")
-async def create_cheque_deposit(
+def create_cheque_deposit(
     org_id: str,
     data: ChequeDepositCreate,
     user=Depends(get_current_user),
@@ -148,7 +150,7 @@ async def create_cheque_deposit(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/cheque-deposits/{cheque_id}/action")
-async def cheque_deposit_action(
+def cheque_deposit_action(
     org_id: str,
     cheque_id: str,
     data: ChequeActionRequest,
@@ -238,7 +240,7 @@ async def cheque_deposit_action(
 
 # Bank Transfer Endpoints
 @router.get("/organizations/{org_id}/bank-transfers")
-async def list_bank_transfers(
+def list_bank_transfers(
     org_id: str,
     status: str = None,
     transfer_type: str = None,
@@ -287,7 +289,7 @@ async def list_bank_transfers(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/bank-transfers")
-async def create_bank_transfer(
+def create_bank_transfer(
     org_id: str,
     data: BankTransferCreate,
     user=Depends(get_current_user),
@@ -320,7 +322,7 @@ async def create_bank_transfer(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/bank-transfers/{transfer_id}/action")
-async def bank_transfer_action(
+def bank_transfer_action(
     org_id: str,
     transfer_id: str,
     data: BankTransferAction,
@@ -410,7 +412,7 @@ async def bank_transfer_action(
 
 # Queue Ticket Endpoints
 @router.get("/organizations/{org_id}/queue-tickets")
-async def list_queue_tickets(
+def list_queue_tickets(
     org_id: str,
     branch_id: str = None,
     status: str = None,
@@ -468,7 +470,7 @@ async def list_queue_tickets(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/queue-tickets")
-async def create_queue_ticket(
+def create_queue_ticket(
     org_id: str,
     data: QueueTicketCreate,
     user=Depends(get_current_user),
@@ -504,6 +506,7 @@ async def create_queue_ticket(
         )
         tenant_session.add(ticket)
         tenant_session.commit()
+        queue_state.apply(org_id, ticket.branch_id, ticket)
         
         # Count people ahead
         ahead = tenant_session.query(func.count(QueueTicket.id)).filter(
@@ -524,7 +527,7 @@ async def create_queue_ticket(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/queue-tickets/call-next")
-async def call_next_ticket(
+def call_next_ticket(
     org_id: str,
     branch_id: str,
     counter_number: str = None,
@@ -562,10 +565,11 @@ async def call_next_ticket(
             query = query.filter(QueueTicket.service_category.in_(assigned_services))
         # If no assignments, teller can call any waiting ticket (default behavior)
         
+        # Tickets another teller is claiming right now are skipped, not waited on
         ticket = query.order_by(
             QueueTicket.priority.desc(),
             QueueTicket.created_at
-        ).first()
+        ).with_for_update(skip_locked=True).first()
         
         if not ticket:
             return {"success": False, "message": "No waiting tickets in queue"}
@@ -583,6 +587,7 @@ async def call_next_ticket(
             ticket.wait_time_seconds = int(wait_delta.total_seconds())
         
         tenant_session.commit()
+        queue_state.apply(org_id, ticket.branch_id, ticket)
         
         return {
             "success": True,
@@ -601,7 +606,7 @@ async def call_next_ticket(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/queue-tickets/{ticket_id}/complete")
-async def complete_ticket(
+def complete_ticket(
     org_id: str,
     ticket_id: str,
     notes: str = None,
@@ -625,13 +630,14 @@ async def complete_ticket(
             ticket.service_time_seconds = int(service_delta.total_seconds())
         
         tenant_session.commit()
+        queue_state.apply(org_id, ticket.branch_id, ticket)
         return {"success": True, "message": "Ticket completed"}
     finally:
         tenant_session.close()
         tenant_ctx.close()
 
 @router.get("/organizations/{org_id}/queue-stats")
-async def get_queue_stats(
+def get_queue_stats(
     org_id: str,
     branch_id: str,
     user=Depends(get_current_user),
@@ -639,81 +645,52 @@ async def get_queue_stats(
 ):
     """Get queue statistics for the kiosk"""
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
-    tenant_session = tenant_ctx.create_session()
     try:
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        waiting_counts = {}
-        for category in ["transactions", "loans", "account_opening", "inquiries"]:
-            count = tenant_session.query(func.count(QueueTicket.id)).filter(
-                QueueTicket.branch_id == branch_id,
-                QueueTicket.service_category == category,
-                QueueTicket.status == "waiting",
-                QueueTicket.created_at >= today_start
-            ).scalar() or 0
-            waiting_counts[category] = count
-        
-        return {"waiting_counts": waiting_counts}
+        counts = queue_state.snapshot(org_id, branch_id, tenant_ctx.create_session)["waiting_counts"]
+        return {"waiting_counts": {category: counts.get(category, 0) for category in QUEUE_CATEGORIES}}
     finally:
-        tenant_session.close()
         tenant_ctx.close()
 
 @router.get("/organizations/{org_id}/queue-display")
-async def get_queue_display(
+def get_queue_display(
     org_id: str,
     branch_id: str,
     db: Session = Depends(get_db)
 ):
-    """Public endpoint for queue display screen"""
+    """Public endpoint for queue display screen (served from the in-memory queue state)"""
+    tenant_ctx = _display_tenant(org_id, db)
+    try:
+        return queue_state.snapshot(org_id, branch_id, tenant_ctx.create_session)
+    finally:
+        tenant_ctx.close()
+
+@router.get("/organizations/{org_id}/queue-display/stream")
+def stream_queue_display(
+    org_id: str,
+    branch_id: str,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """Server-Sent Events feed of the queue display: the board on connect and after every change"""
+    tenant_ctx = _display_tenant(org_id, db)
+    db.close()  # the stream outlives the request's master DB work
+    return StreamingResponse(
+        queue_state.stream(org_id, branch_id, tenant_ctx.create_session, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _display_tenant(org_id: str, db: Session):
     from models.master import Organization
     
     org = db.query(Organization).filter(Organization.id == org_id).first()
     if not org or not org.connection_string:
         raise HTTPException(status_code=404, detail="Organization not found")
-    
-    tenant_ctx = TenantContext(org.connection_string)
-    tenant_session = tenant_ctx.create_session()
-    try:
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        # Currently serving
-        serving = tenant_session.query(QueueTicket).filter(
-            QueueTicket.branch_id == branch_id,
-            QueueTicket.status == "serving",
-            QueueTicket.created_at >= today_start
-        ).all()
-        
-        # Waiting tickets
-        waiting = tenant_session.query(QueueTicket).filter(
-            QueueTicket.branch_id == branch_id,
-            QueueTicket.status == "waiting",
-            QueueTicket.created_at >= today_start
-        ).order_by(QueueTicket.priority.desc(), QueueTicket.created_at).limit(10).all()
-        
-        return {
-            "serving": [
-                {
-                    "ticket_number": t.ticket_number,
-                    "counter_number": t.counter_number,
-                    "service_category": t.service_category
-                }
-                for t in serving
-            ],
-            "waiting": [
-                {
-                    "ticket_number": t.ticket_number,
-                    "service_category": t.service_category
-                }
-                for t in waiting
-            ]
-        }
-    finally:
-        tenant_session.close()
-        tenant_ctx.close()
+    return TenantContext(org.connection_string)
 
 # Receipt Endpoints
 @router.post("/organizations/{org_id}/transactions/{transaction_id}/receipt")
-async def generate_receipt(
+def generate_receipt(
     org_id: str,
     transaction_id: str,
     send_sms: bool = False,
@@ -804,7 +781,7 @@ class TellerServiceAssignmentRequest(BaseModel):
     service_types: list[str]  # List of service types: deposits, withdrawals, loans, inquiries, account_opening
 
 @router.get("/organizations/{org_id}/teller-service-assignments")
-async def list_teller_service_assignments(
+def list_teller_service_assignments(
     org_id: str,
     staff_id: str = None,
     user=Depends(get_current_user),
@@ -841,7 +818,7 @@ async def list_teller_service_assignments(
         tenant_ctx.close()
 
 @router.post("/organizations/{org_id}/teller-service-assignments")
-async def update_teller_service_assignments(
+def update_teller_service_assignments(
     org_id: str,
     data: TellerServiceAssignmentRequest,
     user=Depends(get_current_user),
@@ -872,68 +849,5 @@ async def update_teller_service_assignments(
         tenant_session.close()
         tenant_ctx.close()
 
-# Display Board Endpoint
-@router.get("/organizations/{org_id}/queue-display")
-async def get_queue_display(
-    org_id: str,
-    branch_id: str,
-    user=Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Get display board data - currently called tickets"""
-    tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
-    tenant_session = tenant_ctx.create_session()
-    try:
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        # Get currently serving tickets
-        serving = tenant_session.query(QueueTicket).filter(
-            QueueTicket.branch_id == branch_id,
-            QueueTicket.status == "serving",
-            QueueTicket.created_at >= today_start
-        ).order_by(desc(QueueTicket.called_at)).limit(10).all()
-        
-        # Get waiting counts by category
-        waiting_counts = tenant_session.query(
-            QueueTicket.service_category,
-            func.count(QueueTicket.id)
-        ).filter(
-            QueueTicket.branch_id == branch_id,
-            QueueTicket.status == "waiting",
-            QueueTicket.created_at >= today_start
-        ).group_by(QueueTicket.service_category).all()
-        
-        # Get recently called (last 5 completed)
-        recent = tenant_session.query(QueueTicket).filter(
-            QueueTicket.branch_id == branch_id,
-            QueueTicket.status == "completed",
-            QueueTicket.created_at >= today_start
-        ).order_by(desc(QueueTicket.completed_at)).limit(5).all()
-        
-        serving_data = []
-        for t in serving:
-            teller = tenant_session.query(Staff).filter(Staff.id == t.teller_id).first() if t.teller_id else None
-            serving_data.append({
-                "ticket_number": t.ticket_number,
-                "service_category": t.service_category,
-                "counter_number": t.counter_number,
-                "teller_name": f"{teller.first_name} {teller.last_name}" if teller else None,
-                "teller_number": teller.staff_number if teller else t.counter_number,
-                "called_at": t.called_at.isoformat() if t.called_at else None
-            })
-        
-        return {
-            "serving": serving_data,
-            "waiting_counts": {cat: count for cat, count in waiting_counts},
-            "recent_completed": [
-                {"ticket_number": t.ticket_number, "service_category": t.service_category}
-                for t in recent
-            ],
-            "timestamp": datetime.now().isoformat()
-        }
-    finally:
-        tenant_session.close()
-        tenant_ctx.close()
-
 # Import TenantContext for queue display
 from services.tenant_context import TenantContext
@@ -9,8 +9,11 @@ from models.database import get_db
 from models.tenant import Member, Transaction, OrganizationSettings, Staff, AuditLog, TellerFloat, FloatTransaction
 from schemas.tenant import TransactionCreate, TransactionResponse
 from routes.auth import get_current_user
-from routes.common import get_tenant_session_context, require_permission
+from routes.common import get_tenant_session_context, require_permission, run_async
 from services.code_generator import generate_txn_code
+from services.pagination import COUNT_MODE_PATTERN, count_rows, cursor_page_meta, keyset_page
+from services.branch_scope import effective_branch_id, scope_to_branch
+from services.partitioning import date_bounds
 import logging
 import io
 
@@ -163,10 +166,8 @@ def get_org_setting(tenant_session, key: str, default=None):
     return default
 
 @router.get("/{org_id}/transactions")
-async def list_transactions(org_id: str, member_id: str = None, account_type: str = None, today: bool = False, teller_id: str = None, branch_id: str = None, start_date: str = None, end_date: str = None, page: int = 1, page_size: int = 20, user=Depends(get_current_user), db: Session = Depends(get_db)):
-    from routes.common import get_branch_filter
+def list_transactions(org_id: str, member_id: str = None, account_type: str = None, today: bool = False, teller_id: str = None, branch_id: str = None, start_date: str = None, end_date: str = None, page: int = 1, page_size: int = 20, cursor: str = None, count: str = Query(None, pattern=COUNT_MODE_PATTERN), user=Depends(get_current_user), db: Session = Depends(get_db)):
     from datetime import datetime, date as date_type
-    from sqlalchemy import func as sqlfunc
     
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "transactions:read", db)
@@ -174,14 +175,7 @@ async def list_transactions(org_id: str, member_id: str = None, account_type: st
     try:
         query = tenant_session.query(Transaction)
         
-        staff_branch_id = get_branch_filter(user)
-        
-        if staff_branch_id:
-            branch_member_ids = [m.id for m in tenant_session.query(Member).filter(Member.branch_id == staff_branch_id).all()]
-            query = query.filter(Transaction.member_id.in_(branch_member_ids))
-        elif branch_id:
-            branch_member_ids = [m.id for m in tenant_session.query(Member).filter(Member.branch_id == branch_id).all()]
-            query = query.filter(Transaction.member_id.in_(branch_member_ids))
+        query = scope_to_branch(query, Transaction, effective_branch_id(user, branch_id))
         
         if member_id:
             query = query.filter(Transaction.member_id == member_id)
@@ -191,13 +185,13 @@ async def list_transactions(org_id: str, member_id: str = None, account_type: st
         if start_date:
             try:
                 sd = date_type.fromisoformat(start_date)
-                query = query.filter(sqlfunc.date(Transaction.created_at) >= sd)
+                query = query.filter(*date_bounds(Transaction.created_at, start=sd))
             except ValueError:
                 pass
         if end_date:
             try:
                 ed = date_type.fromisoformat(end_date)
-                query = query.filter(sqlfunc.date(Transaction.created_at) <= ed)
+                query = query.filter(*date_bounds(Transaction.created_at, end=ed))
             except ValueError:
                 pass
         
@@ -210,13 +204,22 @@ async def list_transactions(org_id: str, member_id: str = None, account_type: st
         elif teller_id:
             query = query.filter(Transaction.processed_by_id == teller_id)
         
-        total = query.count()
-        page = max(1, page)
         page_size = min(max(1, page_size), 100)
-        total_pages = max(1, (total + page_size - 1) // page_size)
+        
+        if cursor is not None:
+            transactions, next_cursor = keyset_page(query, Transaction.created_at, Transaction.id, cursor, page_size)
+            return {
+                "items": [TransactionResponse.model_validate(t) for t in transactions],
+                "page_size": page_size,
+                **cursor_page_meta(tenant_session, query, cursor, next_cursor, count),
+            }
+        
+        total, _ = count_rows(tenant_session, query, count or "exact")
+        page = max(1, page)
+        total_pages = max(1, (total + page_size - 1) // page_size) if total is not None else None
         offset = (page - 1) * page_size
         
-        transactions = query.order_by(Transaction.created_at.desc()).offset(offset).limit(page_size).all()
+        transactions = query.order_by(Transaction.created_at.desc(), Transaction.id.desc()).offset(offset).limit(page_size).all()
         return {
             "items": [TransactionResponse.model_validate(t) for t in transactions],
             "total": total,
@@ -229,7 +232,7 @@ async def list_transactions(org_id: str, member_id: str = None, account_type: st
         tenant_ctx.close()
 
 @router.post("/{org_id}/transactions")
-async def create_transaction(org_id: str, data: TransactionCreate, request: Request, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def create_transaction(org_id: str, data: TransactionCreate, request: Request, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "transactions:write", db)
     tenant_session = tenant_ctx.create_session()
@@ -279,9 +282,11 @@ async def create_transaction(org_id: str, data: TransactionCreate, request: Requ
             print(f"[M-Pesa Deposit] Phone: {phone}, Amount: {data.amount}, Base URL: {request_base}")
             
             try:
-                from routes.mpesa import initiate_stk_push
+                from routes.mpesa import send_stk_push, stk_push_request, track_stk_push_result
                 print(f"[M-Pesa Deposit] Daraja callback base: {request_base}")
-                result = initiate_stk_push(tenant_session, phone, data.amount, account_ref, description, org_id=org_id, base_url_override=request_base)
+                creds, payload = stk_push_request(tenant_session, phone, data.amount, account_ref, description, org_id=org_id, base_url_override=request_base)
+                result = run_async(send_stk_push, creds, payload)
+                track_stk_push_result(org_id, result)
                 print(f"[M-Pesa Deposit] Daraja result: {result}")
                 success = result.get("ResponseCode") == "0"
                 message = "STK Push sent successfully. Please check member's phone to complete payment."
@@ -496,7 +501,7 @@ async def create_transaction(org_id: str, data: TransactionCreate, request: Requ
         tenant_ctx.close()
 
 @router.get("/{org_id}/transactions/{transaction_id}")
-async def get_transaction(org_id: str, transaction_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_transaction(org_id: str, transaction_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "transactions:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -510,7 +515,7 @@ async def get_transaction(org_id: str, transaction_id: str, user=Depends(get_cur
         tenant_ctx.close()
 
 @router.get("/{org_id}/members/{member_id}/statement")
-async def get_member_statement(org_id: str, member_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
+def get_member_statement(org_id: str, member_id: str, user=Depends(get_current_user), db: Session = Depends(get_db)):
     tenant_ctx, membership = get_tenant_session_context(org_id, user, db)
     require_permission(membership, "transactions:read", db)
     tenant_session = tenant_ctx.create_session()
@@ -540,7 +545,7 @@ async def get_member_statement(org_id: str, member_id: str, user=Depends(get_cur
 
 
 @router.get("/{org_id}/members/{member_id}/statement/pdf")
-async def get_member_statement_pdf(
+def get_member_statement_pdf(
     org_id: str,
     member_id: str,
     account_type: Optional[str] = Query(None),
@@ -560,10 +565,11 @@ async def get_member_statement_pdf(
         query = tenant_session.query(Transaction).filter(Transaction.member_id == member_id)
         if account_type and account_type != "all":
             query = query.filter(Transaction.account_type == account_type)
-        if start_date:
-            query = query.filter(Transaction.created_at >= datetime.strptime(start_date, "%Y-%m-%d"))
-        if end_date:
-            query = query.filter(Transaction.created_at <= datetime.strptime(end_date + " 23:59:59", "%Y-%m-%d %H:%M:%S"))
+        query = query.filter(*date_bounds(
+            Transaction.created_at,
+            start=date.fromisoformat(start_date) if start_date else None,
+            end=date.fromisoformat(end_date) if end_date else None,
+        ))
 
         transactions = query.order_by(Transaction.created_at.desc()).all()
 
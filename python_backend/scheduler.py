@@ -9,6 +9,12 @@ Jobs:
 - Loan notifications (due today): daily at ~7 AM
 - Loan notifications (overdue): daily at ~6 PM
 - Recurring expenses: every 6 hours
+- Portfolio snapshot: hourly check, written once per day
+- Delinquency engine (overdue instalments, penalties, defaults): hourly, incremental
+- Member balance snapshots: hourly check, rebuilds each month once it closes
+- Partition maintenance: daily, creates upcoming monthly partitions
+- Audit log maintenance: daily rollup, archives months past each tenant's retention
+- Cash position close: hourly check, freezes each day's cash positions once it ends
 """
 
 import os
@@ -59,6 +65,36 @@ JOBS = {
         "interval_hours": 12,
         "description": "Send subscription renewal reminders",
     },
+    "portfolio_snapshot": {
+        "module": "cron_portfolio_snapshot",
+        "interval_hours": 1,
+        "description": "Write daily loan portfolio aging snapshot",
+    },
+    "delinquency": {
+        "module": "cron_delinquency",
+        "interval_hours": 1,
+        "description": "Update overdue instalments, penalties and loan defaults",
+    },
+    "member_balance_snapshots": {
+        "module": "cron_member_balance_snapshots",
+        "interval_hours": 1,
+        "description": "Build month-end member balance snapshots",
+    },
+    "partitions": {
+        "module": "cron_partitions",
+        "interval_hours": 24,
+        "description": "Create upcoming monthly table partitions",
+    },
+    "audit_logs": {
+        "module": "cron_audit_logs",
+        "interval_hours": 24,
+        "description": "Roll up and archive audit logs",
+    },
+    "cash_position": {
+        "module": "cron_cash_position",
+        "interval_hours": 1,
+        "description": "Close daily branch and teller cash positions",
+    },
 }
 
 shutdown_requested = False
@@ -1178,6 +1178,9 @@ class PayslipResponse(BaseModel):
     overtime_pay: Decimal
     status: str
     staff_name: Optional[str] = None
+    emailed_at: Optional[datetime] = None
+    email_status: Optional[str] = None
+    email_error: Optional[str] = None
     created_at: datetime
     
     class Config:
@@ -1510,3 +1513,11 @@ class PayslipDetailResponse(BaseModel):
 class DisbursementRequest(BaseModel):
     method: str  # savings_account, mpesa, bank_transfer
     notes: Optional[str] = None
+
+# Export job schemas
+class ExportJobCreate(BaseModel):
+    export_type: str  # members, transactions, loans
+    format: str = "csv"  # csv (gzip-compressed), parquet
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    branch_id: Optional[str] = None
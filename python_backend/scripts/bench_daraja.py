@@ -0,0 +1,105 @@
+"""
+Benchmark Daraja calls: the old per-call token + new synchronous
+httpx.Client pattern against the pooled DarajaGateway with cached tokens.
+
+Starts scripts/fake_daraja.py on a local port with simulated network
+latency, then issues a burst of concurrent STK pushes from async handlers
+both ways, reporting throughput, latency percentiles and how many OAuth
+requests each approach made.
+
+    python3 python_backend/scripts/bench_daraja.py --requests 200 --concurrency 50 --latency 0.05
+"""
+import argparse
+import asyncio
+import base64
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import uvicorn
+
+from scripts.fake_daraja import create_app
+from services.daraja import DarajaCredentials, DarajaGateway, STK_PUSH_PATH, TOKEN_PATH
+
+
+def start_server(app) -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="error"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def legacy_stk_push(creds: DarajaCredentials, payload: dict) -> dict:
+    basic = base64.b64encode(f"{creds.consumer_key}:{creds.consumer_secret}".encode()).decode()
+    with httpx.Client(timeout=30.0) as client:
+        token = client.get(f"{creds.base_url}{TOKEN_PATH}", headers={"Authorization": f"Basic {basic}"}).json()["access_token"]
+    with httpx.Client(timeout=30.0) as client:
+        return client.post(f"{creds.base_url}{STK_PUSH_PATH}", json=payload, headers={"Authorization": f"Bearer {token}"}).json()
+
+
+async def run(call, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def one(i):
+        async with semaphore:
+            t0 = time.perf_counter()
+            result = await call({"BusinessShortCode": "174379", "Amount": 1 + i % 100, "PhoneNumber": "254708374149"})
+            timings.append((time.perf_counter() - t0) * 1000)
+            return result
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*[one(i) for i in range(requests)])
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    return {
+        "requests_per_sec": round(requests / elapsed, 1),
+        "p50_ms": round(statistics.median(timings), 1),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 1),
+        "accepted": sum(r.get("ResponseCode") == "0" for r in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated Daraja latency per request (s)")
+    args = parser.parse_args()
+
+    app = create_app(latency=args.latency)
+    creds = DarajaCredentials(start_server(app), "bench-key", "bench-secret")
+    print(f"{args.requests} STK pushes, concurrency {args.concurrency}, {args.latency * 1000:.0f} ms Daraja latency")
+
+    async def legacy(payload):
+        return legacy_stk_push(creds, payload)
+
+    app.state.counts.clear()
+    result = asyncio.run(run(legacy, args.requests, args.concurrency))
+    print(f"  sync client + token per call: {result}, token requests: {app.state.counts['token']}")
+
+    gateway = DarajaGateway()
+
+    async def pooled():
+        try:
+            return await run(lambda payload: gateway.stk_push(creds, payload), args.requests, args.concurrency)
+        finally:
+            await gateway.aclose()
+
+    app.state.counts.clear()
+    result = asyncio.run(pooled())
+    print(f"  pooled gateway:               {result}, token requests: {app.state.counts['token']}")
+
+
+if __name__ == "__main__":
+    main()
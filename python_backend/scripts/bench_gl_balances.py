@@ -0,0 +1,177 @@
+"""
+Benchmark concurrent GL postings in direct and delta balance mode.
+
+Simulates --tellers tellers posting deposits at the same time against one
+tenant database. Every deposit debits Cash on Hand and credits Member
+Savings, the two control accounts every teller touches, and holds its
+transaction open for --work-ms to stand in for the rest of the request
+(member balance, transaction row, audit log). In direct mode each posting
+updates both account rows, so the tellers serialize on them; in delta mode
+postings only insert into gl_balance_deltas while a compactor folds them
+in every second. Reports postings per second, latency percentiles and
+checks that both modes end on the same balances.
+
+Needs a scratch Postgres database (SQLite locks the whole file per write,
+so it cannot show the difference):
+
+    python3 python_backend/scripts/bench_gl_balances.py --database-url postgresql://localhost/bench_gl --tellers 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from accounting.balances import compact_balances, get_account_balances
+from accounting.models import AccountBalanceDelta, ChartOfAccounts, JournalEntry, JournalLine
+from accounting.service import AccountingService, BALANCE_MODE_SETTING, invalidate_chart_cache
+from models.tenant import OrganizationSettings, TenantBase
+
+
+def set_mode(Session, mode: str):
+    session = Session()
+    try:
+        setting = session.query(OrganizationSettings).filter(OrganizationSettings.setting_key == BALANCE_MODE_SETTING).first()
+        if setting is None:
+            setting = OrganizationSettings(setting_key=BALANCE_MODE_SETTING)
+            session.add(setting)
+        setting.setting_value = mode
+        session.commit()
+    finally:
+        session.close()
+    invalidate_chart_cache()
+
+
+def teller(Session, postings: int, work: float, timings: list, errors: list):
+    session = Session()
+    svc = AccountingService(session)
+    try:
+        for i in range(postings):
+            amount = Decimal(100 + i % 50)
+            t0 = time.perf_counter()
+            try:
+                svc.post_batch([{
+                    "entry_date": date.today(),
+                    "description": "Bench teller deposit",
+                    "lines": [
+                        {"account_code": "1000", "debit": amount, "credit": 0},
+                        {"account_code": "2000", "debit": 0, "credit": amount},
+                    ],
+                    "source_type": "bench",
+                }])
+                if work:
+                    time.sleep(work)
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                errors.append(e)
+                continue
+            timings.append((time.perf_counter() - t0) * 1000)
+    finally:
+        session.close()
+
+
+def run(Session, mode: str, tellers: int, postings: int, work: float) -> dict:
+    set_mode(Session, mode)
+    stop = threading.Event()
+
+    def compactor():
+        session = Session()
+        try:
+            while not stop.wait(1.0):
+                compact_balances(session)
+        finally:
+            session.close()
+
+    if mode == "delta":
+        threading.Thread(target=compactor, daemon=True).start()
+
+    timings, errors = [], []
+    threads = [threading.Thread(target=teller, args=(Session, postings, work, timings, errors)) for _ in range(tellers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+
+    timings.sort()
+    return {
+        "postings_per_sec": round(len(timings) / elapsed, 1),
+        "p50_ms": round(statistics.median(timings), 1) if timings else None,
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 1) if timings else None,
+        "errors": len(errors),
+    }
+
+
+def balances(Session) -> dict:
+    session = Session()
+    try:
+        while compact_balances(session):
+            pass
+        ids = dict(session.query(ChartOfAccounts.code, ChartOfAccounts.id).filter(ChartOfAccounts.code.in_(["1000", "2000"])).all())
+        current = get_account_balances(session, ids.values())
+        return {code: current[account_id] for code, account_id in ids.items()}
+    finally:
+        session.close()
+
+
+def reset(Session):
+    session = Session()
+    try:
+        bench_entries = session.query(JournalEntry.id).filter(JournalEntry.source_type == "bench")
+        session.query(JournalLine).filter(JournalLine.journal_entry_id.in_(bench_entries.scalar_subquery())).delete(synchronize_session=False)
+        session.query(JournalEntry).filter(JournalEntry.source_type == "bench").delete(synchronize_session=False)
+        session.query(AccountBalanceDelta).delete(synchronize_session=False)
+        session.query(ChartOfAccounts).filter(ChartOfAccounts.code.in_(["1000", "2000"])).update(
+            {"current_balance": 0}, synchronize_session=False
+        )
+        session.commit()
+    finally:
+        session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--database-url", default=os.environ.get("BENCH_DATABASE_URL"), help="Scratch tenant database (its GL is reset)")
+    parser.add_argument("--tellers", type=int, default=50)
+    parser.add_argument("--postings", type=int, default=40, help="Postings per teller")
+    parser.add_argument("--work-ms", type=float, default=5.0, help="Time each posting's transaction stays open (ms)")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("--database-url (or BENCH_DATABASE_URL) is required")
+
+    engine = create_engine(args.database_url, pool_size=args.tellers + 2, max_overflow=0)
+    TenantBase.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    seed = Session()
+    AccountingService(seed).seed_default_accounts()
+    seed.close()
+
+    print(f"{args.tellers} tellers x {args.postings} deposits, {args.work_ms:.0f} ms per transaction")
+    results = {}
+    for mode in ("direct", "delta"):
+        reset(Session)
+        result = run(Session, mode, args.tellers, args.postings, args.work_ms / 1000)
+        results[mode] = balances(Session)
+        print(f"  {mode:<6} {result}, final balances: {results[mode]}")
+    if results["direct"] != results["delta"]:
+        print("  balances differ between modes!")
+        sys.exit(1)
+
+    set_mode(Session, "direct")
+    reset(Session)
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
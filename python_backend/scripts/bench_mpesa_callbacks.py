@@ -0,0 +1,135 @@
+"""
+Benchmark M-Pesa callback payer resolution: the payment_references point
+lookups against the previous upper()/LIKE scans.
+
+Seeds a throwaway tenant database with members and loans, then resolves a
+burst of callbacks (a mix of member numbers, loan numbers in varying case
+and unknown references that fall back to the phone) both ways, reporting
+throughput and latency percentiles.
+
+    python3 python_backend/scripts/bench_mpesa_callbacks.py \
+        --url postgresql://localhost/bench_tenant --members 50000 --callbacks 1000
+
+Never point --url at a live tenant: the tables are created and filled.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import Session
+
+from models.tenant import TenantBase, Branch, LoanApplication, LoanProduct, Member, generate_uuid
+from services.payment_reference import rebuild_payment_references, resolve_payer
+
+
+def seed(engine, members: int, loans: int):
+    rows_m, rows_l = [], []
+    with Session(engine) as s:
+        branch = Branch(name="Bench", code="BN")
+        product = LoanProduct(name="Bench", code="BNP", interest_rate=2, min_amount=1, max_amount=10**7,
+                              min_term_months=1, max_term_months=60)
+        s.add_all([branch, product])
+        s.flush()
+        for i in range(members):
+            rows_m.append({
+                "id": generate_uuid(), "member_number": f"MEM{i:07d}", "first_name": "Bench", "last_name": str(i),
+                "phone": f"07{i:08d}", "phone_normalized": f"7{i:08d}", "branch_id": branch.id, "status": "active",
+            })
+        s.execute(Member.__table__.insert(), rows_m)
+        for i in range(loans):
+            rows_l.append({
+                "id": generate_uuid(), "application_number": f"LN{i:07d}", "member_id": rows_m[i % members]["id"],
+                "branch_id": branch.id, "loan_product_id": product.id, "amount": Decimal("10000"), "term_months": 12,
+                "interest_rate": Decimal("2"), "status": "disbursed",
+            })
+        s.execute(LoanApplication.__table__.insert(), rows_l)
+        s.commit()
+    with engine.begin() as conn:
+        rebuild_payment_references(conn)
+    return rows_m, rows_l
+
+
+def legacy_resolve(session, account_ref: str, phone: str):
+    ref = account_ref.strip().upper()
+    member = session.query(Member).filter(func.upper(Member.member_number) == ref).first()
+    loan = session.query(LoanApplication).filter(
+        func.upper(LoanApplication.application_number) == ref,
+        LoanApplication.status.in_(["disbursed", "active"])
+    ).first()
+    if not member and loan:
+        member = session.get(Member, loan.member_id)
+    if not member and phone:
+        member = session.query(Member).filter(Member.phone.like(f"%{phone[-9:]}")).first()
+    return member, loan
+
+
+def make_callbacks(members, loans, count: int):
+    rng = random.Random(7)
+    callbacks = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.5:
+            m = rng.choice(members)
+            callbacks.append((m["member_number"].lower(), "254" + m["phone"][1:]))
+        elif roll < 0.9 and loans:
+            loan = rng.choice(loans)
+            callbacks.append((f" {loan['application_number']} ", "254700000000"))
+        else:
+            m = rng.choice(members)
+            callbacks.append(("UNKNOWN", "254" + m["phone"][1:]))
+    return callbacks
+
+
+def run(engine, resolver, callbacks):
+    timings = []
+    matched = 0
+    started = time.perf_counter()
+    with Session(engine) as session:
+        for ref, phone in callbacks:
+            t0 = time.perf_counter()
+            member, _ = resolver(session, ref, phone)
+            timings.append((time.perf_counter() - t0) * 1000)
+            matched += member is not None
+            session.expunge_all()
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    return {
+        "callbacks_per_sec": round(len(callbacks) / elapsed, 1),
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 3),
+        "matched": matched,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="sqlite:///bench_mpesa_callbacks.db")
+    parser.add_argument("--members", type=int, default=20000)
+    parser.add_argument("--loans", type=int, default=10000)
+    parser.add_argument("--callbacks", type=int, default=1000)
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    TenantBase.metadata.drop_all(engine)
+    TenantBase.metadata.create_all(engine)
+    members, loans = seed(engine, args.members, args.loans)
+    callbacks = make_callbacks(members, loans, args.callbacks)
+
+    print(f"{args.members} members, {args.loans} loans, {args.callbacks} callbacks")
+    legacy = run(engine, legacy_resolve, callbacks)
+    indexed = run(engine, resolve_payer, callbacks)
+    print(f"  legacy scans:       {legacy}")
+    print(f"  payment_references: {indexed}")
+    if legacy["matched"] != indexed["matched"]:
+        print("  WARNING: resolvers disagree on matched callbacks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Benchmark transaction queries before and after monthly partitioning.
+
+Builds a synthetic tenant in a scratch Postgres database: --members members
+and --rows transactions spread evenly over the last --months months,
+generated server side. It then times the queries the teller and report
+screens run, converts transactions with partition_table() and times them
+again:
+
+- teller view: today's transactions, newest first, first page;
+- member statement: one member's transactions for last month;
+- weekly count: transactions of the last 7 days (SMS audiences, dashboards);
+- month summary: deposit and withdrawal totals for last month, once with
+  date_bounds() and once with the old func.date(created_at) filter, which
+  the planner cannot use to skip partitions.
+
+Each query runs --repeat times and the median is reported, together with
+the migration time. Everything in the database's public schema is dropped
+first:
+
+    python3 python_backend/scripts/bench_partitions.py --database-url postgresql://localhost/bench_partitions --rows 10000000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import case, create_engine, func, text
+from sqlalchemy.orm import sessionmaker
+
+from models.tenant import Transaction, TenantBase
+from services.partitioning import add_months, date_bounds, month_start, partition_table
+
+FILL_CHUNK = 1_000_000
+
+
+def build(engine, members: int, rows: int, months: int):
+    with engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
+    TenantBase.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX idx_transactions_member_account_created ON transactions (member_id, account_type, created_at)"))
+        conn.execute(text("CREATE INDEX idx_transactions_created ON transactions (created_at)"))
+        conn.execute(text("""
+            INSERT INTO members (id, member_number, first_name, last_name)
+            SELECT 'bench-m' || g, 'M' || g, 'Bench', 'Member ' || g FROM generate_series(0, :members - 1) g
+        """), {"members": members})
+
+    span = months * 30 * 86400
+    for first in range(1, rows + 1, FILL_CHUNK):
+        last = min(first + FILL_CHUNK - 1, rows)
+        with engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO transactions (id, transaction_number, member_id, transaction_type, account_type,
+                                          amount, balance_before, balance_after, payment_method, created_at)
+                SELECT md5(g::text), 'TXN' || g, 'bench-m' || (g % :members),
+                       CASE WHEN g % 3 = 0 THEN 'withdrawal' ELSE 'deposit' END,
+                       (ARRAY['savings', 'shares', 'deposits'])[g % 3 + 1],
+                       100 + g % 5000, g % 100000, g % 100000 + 100, 'cash',
+                       now() - make_interval(secs => :span - (g::float8 / :rows) * :span)
+                FROM generate_series(:first, :last) g
+            """), {"members": members, "rows": rows, "span": span, "first": first, "last": last})
+        print(f"  filled {last:,} / {rows:,}")
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+
+def queries(Session):
+    today = date.today()
+    last_month = add_months(month_start(today), -1)
+    month_end = add_months(last_month, 1) - timedelta(days=1)
+    totals = (
+        func.coalesce(func.sum(case((Transaction.transaction_type == "deposit", Transaction.amount), else_=0)), 0),
+        func.coalesce(func.sum(case((Transaction.transaction_type == "withdrawal", Transaction.amount), else_=0)), 0),
+    )
+    return {
+        "teller view": lambda s: s.query(Transaction).filter(
+            Transaction.created_at >= datetime.combine(today, datetime.min.time())
+        ).order_by(Transaction.created_at.desc()).limit(20).all(),
+        "member statement": lambda s: s.query(Transaction).filter(
+            Transaction.member_id == "bench-m42", *date_bounds(Transaction.created_at, last_month, month_end)
+        ).order_by(Transaction.created_at.desc()).all(),
+        "weekly count": lambda s: s.query(func.count(Transaction.id)).filter(
+            *date_bounds(Transaction.created_at, today - timedelta(days=7), today)
+        ).scalar(),
+        "month summary": lambda s: s.query(*totals).filter(
+            *date_bounds(Transaction.created_at, last_month, month_end)
+        ).first(),
+        "month summary (func.date)": lambda s: s.query(*totals).filter(
+            func.date(Transaction.created_at) >= last_month, func.date(Transaction.created_at) <= month_end,
+        ).first(),
+    }
+
+
+def measure(Session, repeat: int) -> dict:
+    results = {}
+    for name, query in queries(Session).items():
+        timings = []
+        for _ in range(repeat):
+            session = Session()
+            try:
+                t0 = time.perf_counter()
+                query(session)
+                timings.append((time.perf_counter() - t0) * 1000)
+            finally:
+                session.close()
+        results[name] = statistics.median(timings)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--database-url", default=os.environ.get("BENCH_DATABASE_URL"), help="Scratch Postgres database (its public schema is dropped)")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--members", type=int, default=50_000)
+    parser.add_argument("--months", type=int, default=36, help="History the rows are spread over")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("--database-url (or BENCH_DATABASE_URL) is required")
+
+    engine = create_engine(args.database_url)
+    if engine.dialect.name != "postgresql":
+        parser.error("partitioning needs a PostgreSQL database")
+    Session = sessionmaker(bind=engine)
+
+    print(f"Building {args.rows:,} transactions for {args.members:,} members over {args.months} months")
+    started = time.perf_counter()
+    build(engine, args.members, args.rows, args.months)
+    print(f"  built in {time.perf_counter() - started:.0f}s")
+
+    before = measure(Session, args.repeat)
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        stats = partition_table(conn, "transactions")
+    print(f"Partitioned {stats['rows']:,} rows into {stats['partitions']} partitions in {time.perf_counter() - started:.0f}s")
+
+    after = measure(Session, args.repeat)
+
+    print(f"\n{'query':<28}{'plain ms':>12}{'partitioned ms':>16}")
+    for name in before:
+        print(f"{name:<28}{before[name]:>12.1f}{after[name]:>16.1f}")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
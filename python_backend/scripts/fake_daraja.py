@@ -0,0 +1,131 @@
+"""
+Offline stand-in for the Safaricom Daraja API.
+
+Implements the OAuth, STK push, STK query and B2C endpoints closely enough
+for services.daraja to be exercised without network access: tokens expire
+after --token-ttl seconds and unknown or expired tokens get a 401, every
+request can be delayed by --latency seconds, and the next N requests can be
+made to fail with a 503 (app.state.fail_next) to test retries.
+
+    python3 python_backend/scripts/fake_daraja.py --port 8089 --latency 0.05
+    MPESA_API_BASE_URL=http://127.0.0.1:8089 python3 python_backend/main.py
+
+app.state.counts records how many requests each endpoint received.
+"""
+import argparse
+import asyncio
+import base64
+import time
+import uuid
+from collections import Counter
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def create_app(latency: float = 0.0, token_ttl: int = 3599) -> FastAPI:
+    app = FastAPI(title="Fake Daraja")
+    app.state.counts = Counter()
+    app.state.tokens = {}
+    app.state.pushes = {}
+    app.state.fail_next = 0
+
+    async def handle(request: Request, name: str):
+        app.state.counts[name] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if app.state.fail_next > 0:
+            app.state.fail_next -= 1
+            return JSONResponse({"errorCode": "503.001.01", "errorMessage": "Service unavailable"}, status_code=503)
+        return None
+
+    def authorized(request: Request) -> bool:
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        expires_at = app.state.tokens.get(token)
+        return expires_at is not None and expires_at > time.monotonic()
+
+    def unauthorized():
+        return JSONResponse({"errorCode": "404.001.03", "errorMessage": "Invalid Access Token"}, status_code=401)
+
+    @app.get("/oauth/v1/generate")
+    async def generate_token(request: Request):
+        failed = await handle(request, "token")
+        if failed:
+            return failed
+        try:
+            key, secret = base64.b64decode(request.headers.get("Authorization", "").removeprefix("Basic ")).decode().split(":", 1)
+        except ValueError:
+            key = secret = ""
+        if not key or not secret:
+            return JSONResponse({"errorCode": "400.008.01", "errorMessage": "Invalid Authentication passed"}, status_code=400)
+        token = uuid.uuid4().hex
+        app.state.tokens[token] = time.monotonic() + token_ttl
+        return {"access_token": token, "expires_in": str(token_ttl)}
+
+    @app.post("/mpesa/stkpush/v1/processrequest")
+    async def stk_push(request: Request):
+        failed = await handle(request, "stk_push")
+        if failed:
+            return failed
+        if not authorized(request):
+            return unauthorized()
+        body = await request.json()
+        checkout_id = f"ws_CO_{uuid.uuid4().hex[:20]}"
+        app.state.pushes[checkout_id] = body
+        return {
+            "MerchantRequestID": uuid.uuid4().hex[:12],
+            "CheckoutRequestID": checkout_id,
+            "ResponseCode": "0",
+            "ResponseDescription": "Success. Request accepted for processing",
+            "CustomerMessage": "Success. Request accepted for processing",
+        }
+
+    @app.post("/mpesa/stkpushquery/v1/query")
+    async def stk_query(request: Request):
+        failed = await handle(request, "stk_query")
+        if failed:
+            return failed
+        if not authorized(request):
+            return unauthorized()
+        body = await request.json()
+        if body.get("CheckoutRequestID") not in app.state.pushes:
+            return JSONResponse({"errorCode": "400.002.02", "errorMessage": "Bad Request - Invalid CheckoutRequestID"}, status_code=400)
+        return {
+            "ResponseCode": "0",
+            "ResponseDescription": "The service request has been accepted successsfully",
+            "CheckoutRequestID": body["CheckoutRequestID"],
+            "ResultCode": "0",
+            "ResultDesc": "The service request is processed successfully.",
+        }
+
+    @app.post("/mpesa/b2c/v3/paymentrequest")
+    async def b2c(request: Request):
+        failed = await handle(request, "b2c")
+        if failed:
+            return failed
+        if not authorized(request):
+            return unauthorized()
+        return {
+            "ConversationID": f"AG_{uuid.uuid4().hex[:16]}",
+            "OriginatorConversationID": uuid.uuid4().hex[:16],
+            "ResponseCode": "0",
+            "ResponseDescription": "Accept the service request successfully.",
+        }
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--token-ttl", type=int, default=3599)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency, args.token_ttl), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
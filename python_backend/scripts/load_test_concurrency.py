@@ -0,0 +1,118 @@
+"""
+Load test: throughput and latency of an endpoint at rising concurrency.
+
+Sends --requests requests at each --concurrency level and prints requests
+per second and median/95th percentile latency. A handler that blocks the
+event loop stays at the same throughput however many clients wait; a
+threadpool (`def`) handler scales until the threadpool or the database
+pool is saturated. Against a running API, with a staff session cookie:
+
+    python3 python_backend/scripts/load_test_concurrency.py --url http://localhost:8000/api/organizations/<org id>/members --cookie 'session_token=tenant:<org id>:<token>'
+
+--demo starts an in-process server instead, with the same simulated 20 ms
+database call behind an `async def` handler (blocking the loop) and behind
+a `def` handler, and measures both:
+
+    python3 python_backend/scripts/load_test_concurrency.py --demo
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+DEMO_PORT = 8765
+DEMO_QUERY_SECONDS = 0.02
+
+
+async def measure(url: str, concurrency: int, requests: int, headers: dict) -> dict:
+    latencies = []
+    remaining = iter(range(requests))
+    errors = 0
+
+    async def client_loop(client):
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            response = await client.get(url, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "errors": errors,
+    }
+
+
+def report(name: str, url: str, levels, requests: int, headers: dict):
+    print(f"\n{name}: {url}")
+    print(f"{'concurrency':>12}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}")
+    for concurrency in levels:
+        result = asyncio.run(measure(url, concurrency, requests, headers))
+        print(f"{concurrency:>12}{result['rps']:>10.1f}{result['p50']:>10.1f}{result['p95']:>10.1f}{result['errors']:>8}")
+
+
+def start_demo_server():
+    import uvicorn
+    from fastapi import FastAPI
+
+    app = FastAPI()
+
+    @app.get("/async-blocking")
+    async def async_blocking():
+        time.sleep(DEMO_QUERY_SECONDS)  # a synchronous SQLAlchemy query in an async handler
+        return {"ok": True}
+
+    @app.get("/threadpool")
+    def threadpool():
+        time.sleep(DEMO_QUERY_SECONDS)
+        return {"ok": True}
+
+    server = uvicorn.Server(uvicorn.Config(app, port=DEMO_PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", help="Endpoint to load (GET)")
+    parser.add_argument("--cookie", help="Cookie header, e.g. the staff session_token")
+    parser.add_argument("--concurrency", default="1,4,16,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per level")
+    parser.add_argument("--demo", action="store_true", help="Compare async-blocking and threadpool handlers in-process")
+    args = parser.parse_args()
+    levels = [int(c) for c in args.concurrency.split(",")]
+    headers = {"Cookie": args.cookie} if args.cookie else {}
+
+    if args.demo:
+        server = start_demo_server()
+        base = f"http://127.0.0.1:{DEMO_PORT}"
+        report("async def + blocking call", f"{base}/async-blocking", levels, args.requests, {})
+        report("def (threadpool)", f"{base}/threadpool", levels, args.requests, {})
+        server.should_exit = True
+        return
+    if not args.url:
+        parser.error("--url is required (or use --demo)")
+    report("endpoint", args.url, levels, args.requests, headers)
+
+
+if __name__ == "__main__":
+    main()
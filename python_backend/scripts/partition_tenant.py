@@ -0,0 +1,54 @@
+"""
+Convert a tenant's transactions and float_transactions to monthly partitions.
+
+Each table is rewritten in its own transaction (see
+services/partitioning.partition_table), holding an exclusive lock on it
+for the whole copy, so run it in a maintenance window. Tables that are
+already partitioned are skipped, so the script can be re-run. Afterwards
+cron_partitions.py keeps future months created.
+
+    DATABASE_URL=postgresql://... python3 python_backend/scripts/partition_tenant.py --org-id <org id>
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import SessionLocal
+from models.master import Organization
+from services.tenant_context import TenantContext
+from services.partitioning import FUTURE_MONTHS, PARTITIONED_TABLES, partition_table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--org-id", required=True)
+    parser.add_argument("--table", choices=PARTITIONED_TABLES, action="append", help="Only this table (repeatable)")
+    parser.add_argument("--months-ahead", type=int, default=FUTURE_MONTHS)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        org = db.query(Organization).filter(Organization.id == args.org_id).first()
+    finally:
+        db.close()
+    if not org or not org.connection_string:
+        parser.error(f"organization {args.org_id} not found or has no database")
+
+    tenant_ctx = TenantContext(org.connection_string)
+    for table in args.table or PARTITIONED_TABLES:
+        started = time.perf_counter()
+        with tenant_ctx.engine.begin() as conn:
+            stats = partition_table(conn, table, months_ahead=args.months_ahead)
+        if stats.get("skipped"):
+            print(f"{table}: already partitioned")
+            continue
+        print(f"{table}: {stats['rows']} rows into {stats['partitions']} partitions in {time.perf_counter() - started:.1f}s")
+        for constraint in stats["dropped_foreign_keys"]:
+            print(f"  dropped foreign key {constraint}")
+
+
+if __name__ == "__main__":
+    main()
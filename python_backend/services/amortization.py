@@ -0,0 +1,324 @@
+"""
+Loan amortization engine.
+
+All schedule math lives here: periodic rates, term conversions, loan totals
+(annuity or flat) and full instalment schedules for the three repayment
+methods (reducing balance, flat, interest deducted upfront) with optional
+credit life insurance on the running balance.
+
+Schedules are computed as columns (due dates, principal, interest,
+insurance) rather than as ORM objects, so callers decide how to persist
+them: one loan at a time through the session, or many loans with a single
+multi-row INSERT (insert_schedules). Money stays Decimal throughout and
+every amount is rounded to cents with ROUND_HALF_EVEN, the same as
+round(x, 2) on a Decimal, so schedules match what was generated before the
+engine existed to the cent.
+
+Previews (loan calculators, eligibility, restructure preview) go through
+loan_totals / preview_schedule, which are memoised on their inputs.
+"""
+
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from decimal import Decimal
+from functools import lru_cache
+from itertools import accumulate, repeat
+from operator import sub
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+FREQ_DAYS = {"daily": 1, "weekly": 7, "bi_weekly": 14, "monthly": 30}
+PERIODS_PER_YEAR = {"daily": 365, "weekly": 52, "bi_weekly": 26, "monthly": 12}
+
+METHOD_REDUCING = "reducing_balance"
+METHOD_FLAT = "flat"
+METHOD_UPFRONT = "upfront"
+
+ZERO = Decimal("0")
+
+
+def get_periodic_rate(interest_rate: Decimal, interest_rate_period: str, repayment_frequency: str) -> Decimal:
+    rate_as_decimal = interest_rate / Decimal("100")
+
+    freq_periods = PERIODS_PER_YEAR.get(repayment_frequency, 12)
+    rate_periods = PERIODS_PER_YEAR.get(interest_rate_period, 12)
+
+    if interest_rate_period == "annual":
+        return rate_as_decimal / Decimal(str(freq_periods))
+    elif rate_periods == freq_periods:
+        return rate_as_decimal
+    else:
+        annual_rate = rate_as_decimal * Decimal(str(rate_periods))
+        return annual_rate / Decimal(str(freq_periods))
+
+
+def term_months_to_instalments(term_months: int, repayment_frequency: str) -> int:
+    ppy = PERIODS_PER_YEAR.get(repayment_frequency, 12)
+    return max(round(term_months * ppy / 12), 1)
+
+
+def instalments_to_term_months(num_instalments: int, repayment_frequency: str) -> int:
+    ppy = PERIODS_PER_YEAR.get(repayment_frequency, 12)
+    return max(round(num_instalments * 12 / ppy), 1)
+
+
+@lru_cache(maxsize=4096)
+def _loan_totals(amount: Decimal, n: int, periodic_rate: Decimal, interest_type: str, upfront: bool):
+    if upfront:
+        periodic_payment = amount / n if n > 0 else ZERO
+        return round(periodic_payment, 2), round(amount, 2), ZERO
+    if interest_type == "flat":
+        total_interest = amount * periodic_rate * n
+        total_repayment = amount + total_interest
+        periodic_payment = total_repayment / n if n > 0 else ZERO
+    else:
+        if periodic_rate > 0:
+            periodic_payment = amount * (periodic_rate * (1 + periodic_rate) ** n) / ((1 + periodic_rate) ** n - 1)
+        else:
+            periodic_payment = amount / n if n > 0 else ZERO
+        total_repayment = periodic_payment * n
+        total_interest = total_repayment - amount
+    return round(periodic_payment, 2), round(total_repayment, 2), round(total_interest, 2)
+
+
+def loan_totals(amount: Decimal, n: int, periodic_rate: Decimal, interest_type: str = METHOD_REDUCING,
+                upfront: bool = False) -> dict:
+    """Periodic payment and totals for n instalments (annuity for reducing balance, simple for flat)"""
+    payment, total_repayment, total_interest = _loan_totals(
+        Decimal(str(amount)), int(n), Decimal(str(periodic_rate)), interest_type or METHOD_REDUCING, bool(upfront)
+    )
+    return {
+        "total_interest": total_interest,
+        "total_repayment": total_repayment,
+        "monthly_repayment": payment,
+        "num_instalments": n,
+    }
+
+
+def period_insurance(balance: Decimal, cli_rate, cli_freq: str, frequency: str) -> Decimal:
+    """Credit life insurance charged for one period on the opening balance"""
+    if not cli_rate or cli_rate <= 0:
+        return ZERO
+    rate = Decimal(str(cli_rate)) / Decimal("100")
+    if cli_freq == "annual":
+        periods_yr = PERIODS_PER_YEAR.get(frequency, 12)
+        return round(balance * rate / Decimal(str(periods_yr)), 2)
+    else:
+        return round(balance * rate, 2)
+
+
+@dataclass(frozen=True)
+class ScheduleInput:
+    """Everything needed to lay out one schedule.
+
+    principal and total_interest are what the schedule must add up to;
+    periodic_payment is the instalment amount for reducing balance loans
+    (0 means principal / n). restructure=True reproduces the rules used when
+    the unpaid tail of a restructured loan is regenerated: the final
+    reducing-balance instalment keeps its computed interest and the interest
+    true-up only applies while interest remains.
+    """
+    principal: Decimal
+    n: int
+    start_date: date
+    method: str = METHOD_REDUCING
+    periodic_rate: Decimal = ZERO
+    total_interest: Decimal = ZERO
+    periodic_payment: Decimal = ZERO
+    frequency: str = "monthly"
+    cli_rate: Decimal = ZERO
+    cli_freq: str = "annual"
+    first_number: int = 1
+    restructure: bool = False
+    loan_id: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Schedule:
+    numbers: Tuple[int, ...]
+    due_dates: Tuple[date, ...]
+    principal: Tuple[Decimal, ...]
+    interest: Tuple[Decimal, ...]
+    insurance: Tuple[Decimal, ...]
+    loan_id: Optional[str] = None
+    total_insurance: Decimal = field(default=ZERO)
+
+    def __len__(self):
+        return len(self.numbers)
+
+    @property
+    def total_principal(self) -> Decimal:
+        return sum(self.principal, ZERO)
+
+    @property
+    def total_interest(self) -> Decimal:
+        return sum(self.interest, ZERO)
+
+    def rows(self) -> List[dict]:
+        return [
+            {
+                "instalment_number": num,
+                "due_date": due,
+                "expected_principal": principal,
+                "expected_interest": interest,
+                "expected_insurance": insurance,
+            }
+            for num, due, principal, interest, insurance in zip(
+                self.numbers, self.due_dates, self.principal, self.interest, self.insurance
+            )
+        ]
+
+
+def _straight_line(spec: ScheduleInput, n: int):
+    principal_per_period = spec.principal / n
+    balances = list(accumulate(repeat(principal_per_period, n - 1), sub, initial=spec.principal))
+    principal = [round(principal_per_period, 2)] * n
+    if spec.method == METHOD_UPFRONT:
+        interest = [ZERO] * n
+    else:
+        interest = [round(spec.total_interest / n, 2)] * n
+    return balances, principal, interest
+
+
+def _reducing(spec: ScheduleInput, n: int):
+    rate = spec.periodic_rate
+    payment = spec.periodic_payment if spec.periodic_payment > 0 else spec.principal / n
+    balances, principal, interest = [], [], []
+    balance = spec.principal
+    for i in range(n):
+        balances.append(balance)
+        interest_portion = round(balance * rate, 2)
+        if i == n - 1:
+            principal_portion = balance
+            if not spec.restructure:
+                interest_portion = max(payment - balance, ZERO)
+        else:
+            principal_portion = payment - interest_portion
+            if principal_portion > balance:
+                principal_portion = balance
+                interest_portion = payment - principal_portion
+        principal.append(round(max(principal_portion, ZERO), 2))
+        interest.append(round(max(interest_portion, ZERO), 2))
+        balance -= principal_portion
+    return balances, principal, interest
+
+
+def build_schedule(spec: ScheduleInput) -> Schedule:
+    n = int(spec.n)
+    if n <= 0:
+        return Schedule((), (), (), (), (), loan_id=spec.loan_id)
+
+    if spec.method in (METHOD_UPFRONT, METHOD_FLAT):
+        balances, principal, interest = _straight_line(spec, n)
+    else:
+        balances, principal, interest = _reducing(spec, n)
+
+    insurance = [period_insurance(bal, spec.cli_rate, spec.cli_freq, spec.frequency) for bal in balances]
+
+    principal_diff = spec.principal - sum(principal, ZERO)
+    if principal_diff != 0:
+        principal[-1] += principal_diff
+
+    if spec.method != METHOD_UPFRONT:
+        last_interest = interest[-1]
+        if not spec.restructure:
+            interest_diff = spec.total_interest - sum(interest, ZERO)
+            if interest_diff != 0 and abs(interest_diff) < last_interest:
+                interest[-1] = last_interest + interest_diff
+        elif spec.total_interest > 0:
+            interest_diff = spec.total_interest - sum(interest, ZERO)
+            if interest_diff != 0 and abs(interest_diff) < abs(last_interest or Decimal("1")):
+                interest[-1] = last_interest + interest_diff
+
+    period_days = FREQ_DAYS.get(spec.frequency, 30)
+    return Schedule(
+        numbers=tuple(range(spec.first_number, spec.first_number + n)),
+        due_dates=tuple(spec.start_date + timedelta(days=period_days * (i + 1)) for i in range(n)),
+        principal=tuple(principal),
+        interest=tuple(interest),
+        insurance=tuple(insurance),
+        loan_id=spec.loan_id,
+        total_insurance=sum(insurance, ZERO),
+    )
+
+
+def build_schedules(specs: Iterable[ScheduleInput]) -> List[Schedule]:
+    """Schedules for many loans in one call (backfills, bulk disbursement)"""
+    return [build_schedule(spec) for spec in specs]
+
+
+def _as_date(value) -> date:
+    return value.date() if hasattr(value, "date") else value
+
+
+def loan_schedule_input(loan, product, start_date: Optional[date] = None) -> ScheduleInput:
+    """ScheduleInput for a freshly disbursed loan, from its stored terms"""
+    freq = getattr(product, 'repayment_frequency', 'monthly') or 'monthly'
+    if bool(getattr(loan, 'interest_deducted_upfront', False)):
+        method = METHOD_UPFRONT
+    elif getattr(product, 'interest_type', METHOD_REDUCING) == METHOD_FLAT:
+        method = METHOD_FLAT
+    else:
+        method = METHOD_REDUCING
+    return ScheduleInput(
+        principal=Decimal(str(loan.amount or 0)),
+        n=term_months_to_instalments(int(loan.term_months), freq),
+        start_date=start_date or _as_date(loan.disbursed_at),
+        method=method,
+        periodic_rate=Decimal(str(loan.interest_rate or 0)) / Decimal("100"),
+        total_interest=Decimal(str(loan.total_interest or 0)),
+        periodic_payment=Decimal(str(loan.monthly_repayment or 0)),
+        frequency=freq,
+        cli_rate=Decimal(str(getattr(loan, 'credit_life_insurance_rate', None) or 0)),
+        cli_freq=getattr(loan, 'credit_life_insurance_freq', None) or "annual",
+        loan_id=str(loan.id) if getattr(loan, 'id', None) else None,
+    )
+
+
+def product_terms(product, deduct_upfront: Optional[bool] = None) -> tuple:
+    """The parts of a loan product that shape a schedule, as a hashable cache key"""
+    return (
+        getattr(product, 'interest_type', None) or METHOD_REDUCING,
+        getattr(product, 'interest_rate_period', None) or 'monthly',
+        bool(getattr(product, 'deduct_interest_upfront', False) if deduct_upfront is None else deduct_upfront),
+        Decimal(str(getattr(product, 'credit_life_insurance_rate', None) or 0)),
+        getattr(product, 'credit_life_insurance_freq', None) or "annual",
+    )
+
+
+@lru_cache(maxsize=2048)
+def preview_schedule(amount: Decimal, interest_rate: Decimal, term_months: int, repayment_frequency: str,
+                     terms: tuple, start_date: date) -> Tuple[dict, Schedule]:
+    """Totals and schedule for a prospective loan; memoised, treat the result as read-only"""
+    interest_type, rate_period, upfront, cli_rate, cli_freq = terms
+    freq = repayment_frequency or 'monthly'
+    rate = get_periodic_rate(Decimal(str(interest_rate)), rate_period, freq)
+    n = term_months_to_instalments(int(term_months), freq)
+    totals = loan_totals(amount, n, rate, interest_type)
+    method = METHOD_UPFRONT if upfront else (METHOD_FLAT if interest_type == METHOD_FLAT else METHOD_REDUCING)
+    schedule = build_schedule(ScheduleInput(
+        principal=Decimal(str(amount)),
+        n=n,
+        start_date=start_date,
+        method=method,
+        periodic_rate=rate,
+        total_interest=totals["total_interest"],
+        periodic_payment=totals["monthly_repayment"],
+        frequency=freq,
+        cli_rate=cli_rate,
+        cli_freq=cli_freq,
+    ))
+    return totals, schedule
+
+
+def insert_schedules(session, schedules: Sequence[Schedule]) -> int:
+    """Persist schedules with one multi-row INSERT; returns the number of instalments written"""
+    from models.tenant import LoanInstalment
+
+    rows = []
+    for schedule in schedules:
+        for row in schedule.rows():
+            row.update(loan_id=schedule.loan_id, status="pending")
+            rows.append(row)
+    if rows:
+        session.execute(LoanInstalment.__table__.insert(), rows)
+    return len(rows)
@@ -0,0 +1,260 @@
+"""
+Audit log rollups and retention.
+
+AuditMiddleware writes an audit_logs row for every successful mutating
+request, so the table only grows. Two things keep it small and its views
+fast:
+
+- audit_log_daily holds the number of logs per day, action, entity type and
+  staff member. run_rollup() rebuilds every closed day since its watermark
+  with one grouped query. audit_summary() reads the rollup for closed days
+  and counts only the days after the watermark (normally just today) live,
+  so it is exact whatever the job's lag and keeps counting archived days.
+- A tenant that sets audit_retention_months = N in organization_settings
+  has every month older than N months written to a gzip-compressed JSONL
+  file under uploads/audit_archive/<org_id>/ and removed from audit_logs.
+  Each file gets a row in audit_log_archives (rows, size, SHA-256, time
+  range) and the directory's manifest.json lists them all, so archives can
+  be found and verified without the database. On a tenant whose
+  audit_logs is partitioned (services/partitioning.py) the month's
+  partition is detached and dropped instead of deleting row by row.
+  0 (the default) keeps everything.
+
+A month is written to its file before its rows are removed, and the rows
+are removed and the manifest row added in one transaction, so a failure
+leaves the logs in place and the next run writes the month again.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import func, select, text
+
+from models.tenant import AuditLog, AuditLogArchive, AuditLogDaily, JobWatermark, OrganizationSettings
+from services.partitioning import add_months, date_bounds, is_partitioned, month_start, partition_name
+
+ROLLUP_JOB = "audit_log_rollup"
+RETENTION_SETTING = "audit_retention_months"
+AUDIT_ARCHIVE_DIR = Path(__file__).parent.parent / "uploads" / "audit_archive"
+ARCHIVE_BATCH = 2000
+
+
+def _as_date(value) -> date:
+    # func.date() comes back as a string on SQLite
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+
+def rollup_days(session, start: date, end: date) -> int:
+    """Recompute audit_log_daily for the days start <= day < end; returns how many rows"""
+    day = func.date(AuditLog.created_at)
+    entity_type = func.coalesce(AuditLog.entity_type, "")
+    staff_id = func.coalesce(AuditLog.staff_id, "")
+    counts = session.execute(
+        select(day, AuditLog.action, entity_type, staff_id, func.count(AuditLog.id))
+        .where(*date_bounds(AuditLog.created_at, start, end - timedelta(days=1)))
+        .group_by(day, AuditLog.action, entity_type, staff_id)
+    ).all()
+    session.query(AuditLogDaily).filter(AuditLogDaily.day >= start, AuditLogDaily.day < end).delete(synchronize_session=False)
+    if counts:
+        session.execute(AuditLogDaily.__table__.insert(), [
+            {"day": _as_date(d), "action": action, "entity_type": entity, "staff_id": staff, "count": n}
+            for d, action, entity, staff, n in counts
+        ])
+    return len(counts)
+
+
+def run_rollup(session, today: Optional[date] = None) -> dict:
+    """Roll up the days closed since the last run (all history on the first run); commits"""
+    today = today or date.today()
+    mark = session.get(JobWatermark, ROLLUP_JOB)
+    if mark is None:
+        mark = JobWatermark(job_name=ROLLUP_JOB)
+        session.add(mark)
+
+    start = mark.watermark_date
+    if start is None:
+        first = session.query(func.min(AuditLog.created_at)).scalar()
+        start = first.date() if first else today
+    stats = {"days": max((today - start).days, 0), "rows": 0}
+    if start < today:
+        stats["rows"] = rollup_days(session, start, today)
+
+    mark.watermark_date = max(start, today)
+    mark.watermark_at = datetime.utcnow()
+    mark.last_run_at = mark.watermark_at
+    mark.last_result = stats
+    session.commit()
+    return stats
+
+
+def audit_summary(session, start_date: date) -> dict:
+    """Log counts since start_date by action, entity type and staff, from the rollup plus live days"""
+    mark = session.get(JobWatermark, ROLLUP_JOB)
+    rolled_until = mark.watermark_date if mark and mark.watermark_date else start_date
+
+    by_action, by_entity, by_staff = {}, {}, {}
+    total = 0
+    if rolled_until > start_date:
+        rows = session.query(
+            AuditLogDaily.action, AuditLogDaily.entity_type, AuditLogDaily.staff_id, func.sum(AuditLogDaily.count)
+        ).filter(
+            AuditLogDaily.day >= start_date, AuditLogDaily.day < rolled_until
+        ).group_by(AuditLogDaily.action, AuditLogDaily.entity_type, AuditLogDaily.staff_id).all()
+    else:
+        rows = []
+    live_start = max(rolled_until, start_date)
+    entity_type = func.coalesce(AuditLog.entity_type, "")
+    staff_id = func.coalesce(AuditLog.staff_id, "")
+    rows += session.query(AuditLog.action, entity_type, staff_id, func.count(AuditLog.id)).filter(
+        *date_bounds(AuditLog.created_at, start=live_start)
+    ).group_by(AuditLog.action, entity_type, staff_id).all()
+
+    for action, entity, staff, count in rows:
+        count = int(count or 0)
+        total += count
+        by_action[action] = by_action.get(action, 0) + count
+        if entity:
+            by_entity[entity] = by_entity.get(entity, 0) + count
+        if staff:
+            by_staff[staff] = by_staff.get(staff, 0) + count
+    return {"total": total, "by_action": by_action, "by_entity": by_entity, "by_staff": by_staff}
+
+
+def retention_months(session) -> int:
+    setting = session.query(OrganizationSettings).filter(OrganizationSettings.setting_key == RETENTION_SETTING).first()
+    try:
+        return max(int(setting.setting_value), 0) if setting and setting.setting_value else 0
+    except ValueError:
+        return 0
+
+
+def _write_archive(session, path: Path, start: datetime, end: datetime) -> dict:
+    table = AuditLog.__table__
+    rows = session.execute(
+        select(table).where(table.c.created_at >= start, table.c.created_at < end)
+        .order_by(table.c.created_at, table.c.id)
+        .execution_options(yield_per=ARCHIVE_BATCH)
+    )
+    info = {"row_count": 0, "first_at": None, "last_at": None}
+    tmp = path.with_suffix(".tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8") as out:
+        for row in rows:
+            record = dict(row._mapping)
+            out.write(json.dumps(record, default=str, separators=(",", ":")) + "\n")
+            info["row_count"] += 1
+            info["first_at"] = info["first_at"] or record["created_at"]
+            info["last_at"] = record["created_at"]
+
+    digest = hashlib.sha256()
+    with open(tmp, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    os.replace(tmp, path)
+    info["sha256"] = digest.hexdigest()
+    info["file_size"] = path.stat().st_size
+    return info
+
+
+def write_manifest(session, org_id: str) -> Path:
+    """Rewrite uploads/audit_archive/<org_id>/manifest.json from audit_log_archives"""
+    directory = AUDIT_ARCHIVE_DIR / org_id
+    directory.mkdir(parents=True, exist_ok=True)
+    archives = session.query(AuditLogArchive).order_by(AuditLogArchive.month, AuditLogArchive.created_at).all()
+    manifest = {
+        "table": "audit_logs",
+        "format": "jsonl+gzip",
+        "updated_at": datetime.utcnow().isoformat(),
+        "archives": [{
+            "id": a.id,
+            "month": a.month.strftime("%Y-%m"),
+            "file": os.path.basename(a.file_path),
+            "rows": a.row_count,
+            "bytes": a.file_size,
+            "sha256": a.sha256,
+            "first_at": a.first_at.isoformat() if a.first_at else None,
+            "last_at": a.last_at.isoformat() if a.last_at else None,
+        } for a in archives],
+    }
+    path = directory / "manifest.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, path)
+    return path
+
+
+def archive_month(session, org_id: str, month: date) -> Optional[AuditLogArchive]:
+    """Move one month of audit logs into a compressed archive file; commits. None if it had no rows."""
+    start = datetime.combine(month, datetime.min.time())
+    end = datetime.combine(add_months(month, 1), datetime.min.time())
+    directory = AUDIT_ARCHIVE_DIR / org_id
+    directory.mkdir(parents=True, exist_ok=True)
+
+    part = session.query(func.count(AuditLogArchive.id)).filter(AuditLogArchive.month == month).scalar() + 1
+    suffix = f"_part{part}" if part > 1 else ""
+    path = directory / f"audit_logs_{month.strftime('%Y%m')}{suffix}.jsonl.gz"
+    info = _write_archive(session, path, start, end)
+
+    conn = session.connection()
+    partition = partition_name("audit_logs", month)
+    if is_partitioned(conn, "audit_logs") and conn.execute(text("SELECT to_regclass(:name)"), {"name": partition}).scalar():
+        conn.execute(text(f"ALTER TABLE audit_logs DETACH PARTITION {partition}"))
+        conn.execute(text(f"DROP TABLE {partition}"))
+    # Rows outside a monthly partition (unpartitioned tables, the default partition)
+    session.query(AuditLog).filter(AuditLog.created_at >= start, AuditLog.created_at < end).delete(synchronize_session=False)
+
+    archive = None
+    if info["row_count"]:
+        archive = AuditLogArchive(month=month, file_path=str(path), **info)
+        session.add(archive)
+    else:
+        path.unlink(missing_ok=True)
+    session.commit()
+    if archive:
+        write_manifest(session, org_id)
+    return archive
+
+
+def apply_retention(session, org_id: str, today: Optional[date] = None) -> dict:
+    """Archive every month older than the tenant's retention; no-op when it is 0"""
+    months = retention_months(session)
+    stats = {"months": 0, "rows": 0}
+    if not months:
+        return stats
+    cutoff = add_months(month_start(today or date.today()), -months)
+
+    candidates = set()
+    oldest = session.query(func.min(AuditLog.created_at)).filter(
+        AuditLog.created_at < datetime.combine(cutoff, datetime.min.time())
+    ).scalar()
+    if oldest:
+        month = month_start(oldest)
+        while month < cutoff:
+            candidates.add(month)
+            month = add_months(month, 1)
+    conn = session.connection()
+    if is_partitioned(conn, "audit_logs"):
+        # Empty partitions below the cutoff are dropped as well
+        for (name,) in conn.execute(text("""
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'audit_logs'::regclass AND c.relname LIKE 'audit_logs_p%'
+        """)).all():
+            month = datetime.strptime(name[len("audit_logs_p"):], "%Y%m").date()
+            if month < cutoff:
+                candidates.add(month)
+
+    for month in sorted(candidates):
+        archive = archive_month(session, org_id, month)
+        stats["months"] += 1
+        stats["rows"] += archive.row_count if archive else 0
+    return stats
+
+
+def maintain_audit_logs(session, org_id: str, today: Optional[date] = None) -> dict:
+    """Roll up closed days, then archive what the retention setting no longer keeps"""
+    rollup = run_rollup(session, today)
+    return {"rollup": rollup, "archived": apply_retention(session, org_id, today)}
@@ -0,0 +1,243 @@
+"""
+Month-end member balance snapshots.
+
+A member's savings, shares or deposits balance at any moment is the
+balance_after of their last transaction on that account before it. Finding
+that transaction for a past date (statement opening balances, dividends on
+shares as of the effective date) used to mean scanning the member's whole
+transaction history, and the mobile statement renderer rebuilt a running
+balance from zero.
+
+member_balance_snapshots holds one row per member, account and month with
+the balance after the month's last transaction:
+
+- The current month's row is upserted by an after_insert event on
+  Transaction, in the same database transaction, so it is never ahead of
+  committed data. A row only moves forward in time, so a late flush of an
+  older transaction cannot overwrite a newer balance.
+- cron_member_balance_snapshots rebuilds every month from its watermark up
+  to the last closed month with one windowed query per month (the first
+  run backfills all history), repairing rows that missed the event (bulk
+  inserts, imports).
+
+balance_at() then reads at most one month of transactions plus one
+snapshot: the last transaction between the start of the month and the
+given time, else the newest snapshot of an earlier month.
+"""
+
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models.tenant import JobWatermark, MemberBalanceSnapshot, Transaction
+
+SNAPSHOT_JOB = "member_balance_snapshots"
+MEMBER_ACCOUNTS = ("savings", "shares", "deposits")
+
+_dialect_inserts = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def next_month(value: date) -> date:
+    return date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def _upsert(connection, rows):
+    table = MemberBalanceSnapshot.__table__
+    insert = _dialect_inserts[connection.dialect.name](table).values(rows)
+    connection.execute(insert.on_conflict_do_update(
+        index_elements=[table.c.member_id, table.c.account_type, table.c.month],
+        set_={
+            "balance": insert.excluded.balance,
+            "last_transaction_id": insert.excluded.last_transaction_id,
+            "last_transaction_at": insert.excluded.last_transaction_at,
+            "updated_at": insert.excluded.updated_at,
+        },
+        where=table.c.last_transaction_at <= insert.excluded.last_transaction_at,
+    ))
+
+
+def record_transaction(connection, txn):
+    """Move the member's snapshot for the transaction's month up to it (Transaction after_insert)"""
+    if txn.account_type not in MEMBER_ACCOUNTS or txn.balance_after is None or not txn.member_id:
+        return
+    created_at = txn.created_at or datetime.utcnow()
+    _upsert(connection, [{
+        "member_id": txn.member_id,
+        "account_type": txn.account_type,
+        "month": month_start(created_at),
+        "balance": txn.balance_after,
+        "last_transaction_id": txn.id,
+        "last_transaction_at": created_at,
+        "updated_at": datetime.utcnow(),
+    }])
+
+
+def rebuild_month(session, month: date) -> int:
+    """Recompute every snapshot of one month from its transactions; returns how many rows"""
+    start = datetime.combine(month, time.min)
+    end = datetime.combine(next_month(month), time.min)
+    ranked = select(
+        Transaction.member_id,
+        Transaction.account_type,
+        Transaction.balance_after,
+        Transaction.id,
+        Transaction.created_at,
+        func.row_number().over(
+            partition_by=(Transaction.member_id, Transaction.account_type),
+            order_by=(Transaction.created_at.desc(), Transaction.id.desc()),
+        ).label("rank"),
+    ).where(
+        Transaction.created_at >= start,
+        Transaction.created_at < end,
+        Transaction.account_type.in_(MEMBER_ACCOUNTS),
+        Transaction.balance_after.isnot(None),
+    ).subquery()
+    latest = session.execute(select(ranked).where(ranked.c.rank == 1)).all()
+    if not latest:
+        return 0
+    now = datetime.utcnow()
+    rows = [{
+        "member_id": row.member_id,
+        "account_type": row.account_type,
+        "month": month,
+        "balance": row.balance_after,
+        "last_transaction_id": row.id,
+        "last_transaction_at": row.created_at,
+        "updated_at": now,
+    } for row in latest]
+    connection = session.connection()
+    for i in range(0, len(rows), 1000):
+        _upsert(connection, rows[i:i + 1000])
+    return len(rows)
+
+
+def run_snapshots(session, today: Optional[date] = None, full: bool = False) -> dict:
+    """Rebuild the months closed since the last run (all history on the first run); commits"""
+    current = month_start(today or date.today())
+    mark = session.get(JobWatermark, SNAPSHOT_JOB)
+    if mark is None:
+        mark = JobWatermark(job_name=SNAPSHOT_JOB)
+        session.add(mark)
+
+    if full or mark.watermark_date is None:
+        first = session.query(func.min(Transaction.created_at)).scalar()
+        month = month_start(first) if first else current
+    else:
+        month = mark.watermark_date
+
+    stats = {"months": 0, "rows": 0}
+    while month < current:
+        stats["rows"] += rebuild_month(session, month)
+        stats["months"] += 1
+        month = next_month(month)
+
+    mark.watermark_date = current
+    mark.watermark_at = datetime.utcnow()
+    mark.last_run_at = mark.watermark_at
+    mark.last_result = stats
+    session.commit()
+    return stats
+
+
+def snapshots_ready(session) -> bool:
+    """True once the job has built the snapshots of every closed month"""
+    mark = session.get(JobWatermark, SNAPSHOT_JOB)
+    return mark is not None and mark.watermark_date is not None
+
+
+def balance_at(session, member_id: str, account_type: str, at: datetime) -> Optional[Decimal]:
+    """Balance of one member account just before `at`; None if the account had no transactions by then"""
+    period_start = datetime.combine(month_start(at), time.min)
+    in_month = session.query(Transaction.balance_after).filter(
+        Transaction.member_id == member_id,
+        Transaction.account_type == account_type,
+        Transaction.created_at >= period_start,
+        Transaction.created_at < at,
+        Transaction.balance_after.isnot(None),
+    ).order_by(Transaction.created_at.desc(), Transaction.id.desc()).first()
+    if in_month:
+        return in_month[0]
+
+    snapshot = session.query(MemberBalanceSnapshot.balance).filter(
+        MemberBalanceSnapshot.member_id == member_id,
+        MemberBalanceSnapshot.account_type == account_type,
+        MemberBalanceSnapshot.month < month_start(at),
+    ).order_by(MemberBalanceSnapshot.month.desc()).first()
+    if snapshot:
+        return snapshot[0]
+    if snapshots_ready(session):
+        return None
+
+    # Closed months not built yet: one seek on the member's transactions instead
+    earlier = session.query(Transaction.balance_after).filter(
+        Transaction.member_id == member_id,
+        Transaction.account_type == account_type,
+        Transaction.created_at < period_start,
+        Transaction.balance_after.isnot(None),
+    ).order_by(Transaction.created_at.desc(), Transaction.id.desc()).first()
+    return earlier[0] if earlier else None
+
+
+def balances_at(session, account_type: str, at: datetime, member_ids: Optional[Iterable[str]] = None) -> Dict[str, Decimal]:
+    """balance_at() for many members in two queries (members without history before `at` are left out).
+
+    Needs snapshots_ready(): without built snapshots members whose last
+    transaction is in an earlier month are missing.
+    """
+    period_start = datetime.combine(month_start(at), time.min)
+    if member_ids is not None:
+        member_ids = list(member_ids)
+
+    snap = MemberBalanceSnapshot
+    latest_month = select(snap.member_id, func.max(snap.month).label("month")).where(
+        snap.account_type == account_type,
+        snap.month < month_start(at),
+    )
+    if member_ids is not None:
+        latest_month = latest_month.where(snap.member_id.in_(member_ids))
+    latest_month = latest_month.group_by(snap.member_id).subquery()
+    balances = dict(session.execute(
+        select(snap.member_id, snap.balance).join(latest_month, and_(
+            snap.member_id == latest_month.c.member_id,
+            snap.month == latest_month.c.month,
+        )).where(snap.account_type == account_type)
+    ).all())
+
+    ranked = select(
+        Transaction.member_id,
+        Transaction.balance_after,
+        func.row_number().over(
+            partition_by=Transaction.member_id,
+            order_by=(Transaction.created_at.desc(), Transaction.id.desc()),
+        ).label("rank"),
+    ).where(
+        Transaction.account_type == account_type,
+        Transaction.created_at >= period_start,
+        Transaction.created_at < at,
+        Transaction.balance_after.isnot(None),
+    )
+    if member_ids is not None:
+        ranked = ranked.where(Transaction.member_id.in_(member_ids))
+    ranked = ranked.subquery()
+    for member_id, balance in session.execute(
+        select(ranked.c.member_id, ranked.c.balance_after).where(ranked.c.rank == 1)
+    ).all():
+        balances[member_id] = balance
+    return balances
+
+
+def members_with_history(session, account_type: str, member_ids: Optional[Iterable[str]] = None) -> set:
+    """Members that have ever transacted on the account (any snapshot row)"""
+    query = session.query(MemberBalanceSnapshot.member_id).filter(
+        MemberBalanceSnapshot.account_type == account_type
+    )
+    if member_ids is not None:
+        query = query.filter(MemberBalanceSnapshot.member_id.in_(list(member_ids)))
+    return {row[0] for row in query.distinct().all()}
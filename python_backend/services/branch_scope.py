@@ -0,0 +1,68 @@
+"""
+Branch scoping for tenant queries.
+
+Branch staff only see records for their own branch. Loans and transactions
+carry a denormalized branch_id (copied from the member on insert and kept in
+step when a member changes branch, see models.tenant), so scoping them is a
+single indexed equality. Bulk UPDATEs of members.branch_id are refused (see
+models.tenant), since they would bypass that cascade. Other member-owned tables are scoped with a
+members subquery, which the database plans as a semi-join, rather than by
+loading every member id of the branch into Python and sending them back as
+a giant IN list.
+"""
+
+from typing import Optional
+
+from sqlalchemy import select
+
+from models.tenant import LoanApplication, Member, Staff, Transaction
+from services.member_search import member_search_filter
+
+
+def effective_branch_id(user, requested_branch_id: Optional[str] = None) -> Optional[str]:
+    """The branch a query must be limited to: the staff member's own branch, else the requested one"""
+    from routes.common import get_branch_filter
+    return get_branch_filter(user) or requested_branch_id or None
+
+
+def backfill_branch_ids(conn) -> int:
+    """Copy each member's branch onto loans and transactions that have none (tenant migration v40)"""
+    members = Member.__table__
+    updated = 0
+    for table in (LoanApplication.__table__, Transaction.__table__):
+        updated += conn.execute(
+            table.update().where(
+                table.c.member_id == members.c.id,
+                table.c.branch_id.is_(None),
+                members.c.branch_id.isnot(None),
+            ).values(branch_id=members.c.branch_id)
+        ).rowcount
+    return updated
+
+
+def branch_members_subquery(branch_id: str):
+    return select(Member.id).where(Member.branch_id == branch_id)
+
+
+def scope_to_branch(query, model, branch_id: Optional[str]):
+    """Limit query on model to branch_id (no-op when branch_id is None)"""
+    if not branch_id:
+        return query
+    if hasattr(model, "branch_id"):
+        return query.filter(model.branch_id == branch_id)
+    return query.filter(model.member_id.in_(branch_members_subquery(branch_id)))
+
+
+def scope_staff_records(query, staff_column, branch_id: Optional[str]):
+    """Limit records attributed to staff (audit logs, processed_by) to staff of branch_id"""
+    if not branch_id:
+        return query
+    return query.filter(staff_column.in_(select(Staff.id).where(Staff.branch_id == branch_id)))
+
+
+def matching_members_subquery(session, term: str):
+    """Ids of members matching a free-text search, for use inside IN (...)"""
+    clause = member_search_filter(session, term)
+    if clause is None:
+        return None
+    return select(Member.id).where(clause)
@@ -0,0 +1,251 @@
+"""
+Daily cash position per branch and teller, live or from end-of-day snapshots.
+
+The report used to run two queries per branch (vault, floats) plus one Staff
+query per teller, and showed today's vault balance for every date, because
+teller floats and vaults are updated in place as the day goes on.
+
+- live_positions() builds a day from one grouped query over branches,
+  vaults and that day's floats, plus one query for the floats with their
+  staff eager-loaded. For a past day the vault balance is the balance
+  after the vault's last transaction by that day, else the balance its
+  first later transaction started from, else its current balance.
+- close_day() freezes a day into cash_position_snapshots: one row per
+  branch (staff_id "") and one per teller float. The end-of-day close
+  endpoint calls it for today; cron_cash_position.py closes every earlier
+  day nobody closed (the first run backfills all float history).
+- cash_position_report() reads a closed past day from its snapshot rows
+  alone and computes today (and days never closed) live.
+"""
+
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import List, Optional
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import joinedload
+
+from models.tenant import Branch, BranchVault, CashPositionSnapshot, JobWatermark, TellerFloat, VaultTransaction
+
+CLOSE_JOB = "cash_position_close"
+
+TOTAL_KEYS = ("vault_balance", "float_allocated", "deposits_received", "withdrawals_paid", "total_cash_in_hand")
+
+
+def _vault_balance_column(day: date):
+    """Column and outer joins giving each vault's balance at the end of day (current balance for today)"""
+    if day >= date.today():
+        return BranchVault.current_balance, []
+    end = datetime.combine(day + timedelta(days=1), datetime.min.time())
+    completed = VaultTransaction.status == "completed"
+    latest = select(
+        VaultTransaction.vault_id, func.max(VaultTransaction.created_at).label("created_at")
+    ).where(completed, VaultTransaction.created_at < end).group_by(VaultTransaction.vault_id).subquery()
+    balance_at = select(
+        VaultTransaction.vault_id, func.max(VaultTransaction.balance_after).label("balance")
+    ).join(
+        latest, and_(latest.c.vault_id == VaultTransaction.vault_id, latest.c.created_at == VaultTransaction.created_at)
+    ).group_by(VaultTransaction.vault_id).subquery()
+    # A vault with no transaction by then held what its first later transaction started from;
+    # one with no transactions at all (seeded directly) is taken at its current balance
+    first_later = select(
+        VaultTransaction.vault_id, func.min(VaultTransaction.created_at).label("created_at")
+    ).where(completed, VaultTransaction.created_at >= end).group_by(VaultTransaction.vault_id).subquery()
+    opening = select(
+        VaultTransaction.vault_id, func.max(VaultTransaction.balance_after - VaultTransaction.amount).label("balance")
+    ).join(
+        first_later, and_(first_later.c.vault_id == VaultTransaction.vault_id, first_later.c.created_at == VaultTransaction.created_at)
+    ).group_by(VaultTransaction.vault_id).subquery()
+    column = func.coalesce(balance_at.c.balance, opening.c.balance, BranchVault.current_balance)
+    return column, [balance_at, opening]
+
+
+def live_positions(session, day: date) -> List[dict]:
+    """Cash position of every active branch and its tellers on day, from the live tables"""
+    floats = select(
+        TellerFloat.branch_id,
+        func.count(TellerFloat.id).label("teller_count"),
+        func.sum(TellerFloat.current_balance).label("float_allocated"),
+        func.sum(TellerFloat.deposits_in).label("deposits_received"),
+        func.sum(TellerFloat.withdrawals_out).label("withdrawals_paid"),
+    ).where(TellerFloat.date == day).group_by(TellerFloat.branch_id).subquery()
+    vault_balance, vault_joins = _vault_balance_column(day)
+
+    query = session.query(
+        Branch.id, Branch.name, vault_balance,
+        floats.c.teller_count, floats.c.float_allocated, floats.c.deposits_received, floats.c.withdrawals_paid,
+    ).outerjoin(BranchVault, BranchVault.branch_id == Branch.id).outerjoin(floats, floats.c.branch_id == Branch.id)
+    for joined in vault_joins:
+        query = query.outerjoin(joined, joined.c.vault_id == BranchVault.id)
+    rows = query.filter(Branch.is_active == True).order_by(Branch.name).all()
+
+    tellers = {}
+    for f in session.query(TellerFloat).options(joinedload(TellerFloat.staff)).filter(TellerFloat.date == day).all():
+        tellers.setdefault(f.branch_id, []).append({
+            "staff_id": f.staff_id,
+            "staff_name": f"{f.staff.first_name} {f.staff.last_name}" if f.staff else "Unknown",
+            "teller_float_id": f.id,
+            "opening_balance": f.opening_balance or Decimal("0"),
+            "current_balance": f.current_balance or Decimal("0"),
+            "deposits": f.deposits_in or Decimal("0"),
+            "withdrawals": f.withdrawals_out or Decimal("0"),
+            "status": f.status,
+        })
+
+    return [{
+        "branch_id": branch_id,
+        "branch_name": name,
+        "vault_balance": Decimal(str(vault or 0)),
+        "float_allocated": Decimal(str(allocated or 0)),
+        "deposits_received": Decimal(str(deposits or 0)),
+        "withdrawals_paid": Decimal(str(withdrawals or 0)),
+        "teller_count": teller_count or 0,
+        "tellers": tellers.get(branch_id, []),
+    } for branch_id, name, vault, teller_count, allocated, deposits, withdrawals in rows]
+
+
+def snapshot_positions(session, day: date) -> Optional[List[dict]]:
+    """The day's frozen positions, or None if the day was never closed"""
+    rows = session.query(CashPositionSnapshot, Branch.name).outerjoin(
+        Branch, Branch.id == CashPositionSnapshot.branch_id
+    ).filter(CashPositionSnapshot.snapshot_date == day).order_by(
+        Branch.name, CashPositionSnapshot.staff_id
+    ).all()
+    if not rows:
+        return None
+
+    branches = {}
+    for row, name in rows:
+        if row.staff_id == "":
+            branches[row.branch_id] = {
+                "branch_id": row.branch_id,
+                "branch_name": name,
+                "vault_balance": row.vault_balance or Decimal("0"),
+                "float_allocated": row.current_balance or Decimal("0"),
+                "deposits_received": row.deposits or Decimal("0"),
+                "withdrawals_paid": row.withdrawals or Decimal("0"),
+                "teller_count": row.teller_count or 0,
+                "tellers": [],
+                "closed_at": row.created_at,
+            }
+    for row, _ in rows:
+        if row.staff_id != "" and row.branch_id in branches:
+            branches[row.branch_id]["tellers"].append({
+                "staff_id": row.staff_id,
+                "staff_name": row.staff_name,
+                "teller_float_id": row.teller_float_id,
+                "opening_balance": row.opening_balance or Decimal("0"),
+                "current_balance": row.current_balance or Decimal("0"),
+                "deposits": row.deposits or Decimal("0"),
+                "withdrawals": row.withdrawals or Decimal("0"),
+                "status": row.status,
+            })
+    return list(branches.values())
+
+
+def _snapshot_row(day: date, branch_id: str, staff_id: str, **values) -> dict:
+    # Every row of a bulk insert needs the same keys
+    row = {column: None for column in CashPositionSnapshot.__table__.columns.keys()}
+    row.update(snapshot_date=day, branch_id=branch_id, staff_id=staff_id, **values)
+    return row
+
+
+def close_day(session, day: date) -> int:
+    """Freeze the day's cash positions into cash_position_snapshots, replacing an earlier close; commits"""
+    positions = live_positions(session, day)
+    session.query(CashPositionSnapshot).filter(CashPositionSnapshot.snapshot_date == day).delete(synchronize_session=False)
+    now = datetime.utcnow()
+    rows = []
+    for p in positions:
+        rows.append(_snapshot_row(
+            day, p["branch_id"], "", vault_balance=p["vault_balance"], current_balance=p["float_allocated"],
+            deposits=p["deposits_received"], withdrawals=p["withdrawals_paid"], teller_count=p["teller_count"],
+            created_at=now,
+        ))
+        for t in p["tellers"]:
+            rows.append(_snapshot_row(
+                day, p["branch_id"], t["staff_id"], staff_name=t["staff_name"], teller_float_id=t["teller_float_id"],
+                opening_balance=t["opening_balance"], current_balance=t["current_balance"],
+                deposits=t["deposits"], withdrawals=t["withdrawals"], status=t["status"], created_at=now,
+            ))
+    if rows:
+        session.execute(CashPositionSnapshot.__table__.insert(), rows)
+    session.commit()
+    return len(positions)
+
+
+def run_close(session, today: Optional[date] = None) -> dict:
+    """Close every day before today that has no snapshot yet (all float history on the first run); commits"""
+    today = today or date.today()
+    mark = session.get(JobWatermark, CLOSE_JOB)
+    if mark is None:
+        mark = JobWatermark(job_name=CLOSE_JOB)
+        session.add(mark)
+
+    start = mark.watermark_date
+    if start is None:
+        first = session.query(func.min(TellerFloat.date)).scalar()
+        start = first or today
+    closed = {
+        d for (d,) in session.query(CashPositionSnapshot.snapshot_date).filter(
+            CashPositionSnapshot.snapshot_date >= start, CashPositionSnapshot.snapshot_date < today
+        ).distinct()
+    }
+
+    stats = {"days": 0, "branches": 0}
+    day = start
+    while day < today:
+        if day not in closed:
+            stats["branches"] += close_day(session, day)
+            stats["days"] += 1
+        day += timedelta(days=1)
+
+    mark.watermark_date = max(start, today)
+    mark.watermark_at = datetime.utcnow()
+    mark.last_run_at = mark.watermark_at
+    mark.last_result = stats
+    session.commit()
+    return stats
+
+
+def cash_position_report(session, day: date) -> dict:
+    """Daily cash position report: a closed past day from its snapshot, otherwise live"""
+    positions = snapshot_positions(session, day) if day < date.today() else None
+    source = "snapshot" if positions is not None else "live"
+    if positions is None:
+        positions = live_positions(session, day)
+
+    totals = {key: Decimal("0") for key in TOTAL_KEYS}
+    branches = []
+    for p in positions:
+        cash_in_hand = p["vault_balance"] + p["float_allocated"]
+        for key in TOTAL_KEYS[:-1]:
+            totals[key] += p[key]
+        totals["total_cash_in_hand"] += cash_in_hand
+        branches.append({
+            "branch_id": p["branch_id"],
+            "branch_name": p["branch_name"],
+            "vault_balance": float(p["vault_balance"]),
+            "float_allocated": float(p["float_allocated"]),
+            "deposits_received": float(p["deposits_received"]),
+            "withdrawals_paid": float(p["withdrawals_paid"]),
+            "total_cash_in_hand": float(cash_in_hand),
+            "teller_count": p["teller_count"],
+            "tellers": [{
+                "staff_name": t["staff_name"],
+                "opening_balance": float(t["opening_balance"]),
+                "current_balance": float(t["current_balance"]),
+                "deposits": float(t["deposits"]),
+                "withdrawals": float(t["withdrawals"]),
+                "status": t["status"],
+            } for t in p["tellers"]],
+        })
+
+    closed_at = positions[0].get("closed_at") if source == "snapshot" and positions else None
+    return {
+        "report_date": day.isoformat(),
+        "source": source,
+        "closed_at": closed_at.isoformat() if closed_at else None,
+        "branches": branches,
+        "totals": {k: float(v) for k, v in totals.items()},
+    }
@@ -0,0 +1,212 @@
+"""
+Daraja (Safaricom M-Pesa API) gateway client.
+
+Every STK push, STK query and B2C call used to fetch a fresh OAuth token and
+open two new synchronous httpx.Client connections from inside async routes,
+so each call paid two TLS handshakes and blocked the event loop for the
+whole round trip.
+
+DarajaGateway keeps one pooled httpx.AsyncClient per event loop and a token
+cache keyed on (base URL, consumer key, secret digest), so tenants never
+share tokens and a rotated secret gets a new one. Tokens are reused until
+shortly before the expires_in Daraja returned, concurrent callers wait on a
+single refresh, and a 401 drops the cached token and retries once.
+
+Transport errors are retried with backoff. Status queries and token
+requests are also retried on 429/5xx; STK push and B2C requests are only
+retried when the connection failed before the request was sent, so a
+customer is never prompted or paid twice.
+
+MPESA_API_BASE_URL overrides the Safaricom host for every tenant (see
+scripts/fake_daraja.py for an offline stand-in).
+"""
+
+import asyncio
+import base64
+import hashlib
+import os
+import time
+import weakref
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+PRODUCTION_BASE_URL = "https://api.safaricom.co.ke"
+SANDBOX_BASE_URL = "https://sandbox.safaricom.co.ke"
+
+TOKEN_PATH = "/oauth/v1/generate?grant_type=client_credentials"
+STK_PUSH_PATH = "/mpesa/stkpush/v1/processrequest"
+STK_QUERY_PATH = "/mpesa/stkpushquery/v1/query"
+B2C_PATH = "/mpesa/b2c/v3/paymentrequest"
+
+TIMEOUT = httpx.Timeout(15.0, connect=5.0)
+LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60.0)
+MAX_RETRIES = 2
+RETRY_BACKOFF = 0.25
+TOKEN_EXPIRY_MARGIN = 60
+DEFAULT_TOKEN_TTL = 3599
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class DarajaError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class DarajaAuthError(DarajaError):
+    pass
+
+
+@dataclass(frozen=True)
+class DarajaCredentials:
+    base_url: str
+    consumer_key: str
+    consumer_secret: str
+
+    @property
+    def cache_key(self) -> Tuple[str, str, str]:
+        digest = hashlib.sha256(self.consumer_secret.encode()).hexdigest()
+        return (self.base_url, self.consumer_key, digest)
+
+
+def resolve_base_url(environment: str) -> str:
+    override = os.environ.get("MPESA_API_BASE_URL", "").rstrip("/")
+    if override:
+        return override
+    return PRODUCTION_BASE_URL if environment == "production" else SANDBOX_BASE_URL
+
+
+def stk_password(shortcode: str, passkey: str, timestamp: Optional[str] = None) -> Tuple[str, str]:
+    """(password, timestamp) for STK push and query requests"""
+    timestamp = timestamp or datetime.now().strftime("%Y%m%d%H%M%S")
+    password = base64.b64encode(f"{shortcode}{passkey}{timestamp}".encode()).decode()
+    return password, timestamp
+
+
+class TokenCache:
+    """OAuth tokens per credential set, valid until TOKEN_EXPIRY_MARGIN seconds before expiry"""
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._tokens: Dict[tuple, Tuple[str, float]] = {}
+        self._locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[tuple, asyncio.Lock]]" = weakref.WeakKeyDictionary()
+
+    def get(self, key: tuple) -> Optional[str]:
+        cached = self._tokens.get(key)
+        if cached and cached[1] > self._clock():
+            return cached[0]
+        return None
+
+    def put(self, key: tuple, token: str, expires_in: int):
+        ttl = max(int(expires_in) - TOKEN_EXPIRY_MARGIN, 0)
+        self._tokens[key] = (token, self._clock() + ttl)
+
+    def invalidate(self, key: tuple, token: Optional[str] = None):
+        cached = self._tokens.get(key)
+        if cached and (token is None or cached[0] == token):
+            del self._tokens[key]
+
+    def lock(self, key: tuple) -> asyncio.Lock:
+        locks = self._locks.setdefault(asyncio.get_running_loop(), {})
+        if key not in locks:
+            locks[key] = asyncio.Lock()
+        return locks[key]
+
+    def clear(self):
+        self._tokens.clear()
+        self._locks.clear()
+
+
+class DarajaGateway:
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None, tokens: Optional[TokenCache] = None):
+        self._transport = transport
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+        self.tokens = tokens or TokenCache()
+
+    def _client(self) -> httpx.AsyncClient:
+        # httpx connection pools are bound to the loop that opened them
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(timeout=TIMEOUT, limits=LIMITS, transport=self._transport)
+            self._clients[loop] = client
+        return client
+
+    async def _send(self, method: str, url: str, idempotent: bool, **kwargs) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                response = await self._client().request(method, url, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                error = e
+            except httpx.TransportError as e:
+                if not idempotent:
+                    raise DarajaError(f"M-Pesa request failed: {type(e).__name__}") from e
+                error = e
+            else:
+                if not (idempotent and response.status_code in RETRYABLE_STATUSES and attempt < MAX_RETRIES):
+                    return response
+                error = None
+            if attempt >= MAX_RETRIES:
+                raise DarajaError(f"M-Pesa request failed: {type(error).__name__}") from error
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+            attempt += 1
+
+    async def access_token(self, creds: DarajaCredentials) -> str:
+        key = creds.cache_key
+        token = self.tokens.get(key)
+        if token:
+            return token
+        async with self.tokens.lock(key):
+            token = self.tokens.get(key)
+            if token:
+                return token
+            basic = base64.b64encode(f"{creds.consumer_key}:{creds.consumer_secret}".encode()).decode()
+            response = await self._send(
+                "GET", f"{creds.base_url}{TOKEN_PATH}", idempotent=True,
+                headers={"Authorization": f"Basic {basic}"},
+            )
+            if response.status_code != 200:
+                raise DarajaAuthError("Failed to get M-Pesa access token", response.status_code)
+            body = response.json()
+            token = body.get("access_token")
+            if not token:
+                raise DarajaAuthError("Failed to get M-Pesa access token", response.status_code)
+            self.tokens.put(key, token, body.get("expires_in") or DEFAULT_TOKEN_TTL)
+            return token
+
+    async def _call(self, creds: DarajaCredentials, path: str, payload: dict, idempotent: bool) -> dict:
+        for retry_auth in (True, False):
+            token = await self.access_token(creds)
+            response = await self._send(
+                "POST", f"{creds.base_url}{path}", idempotent=idempotent,
+                json=payload, headers={"Authorization": f"Bearer {token}"},
+            )
+            if response.status_code == 401 and retry_auth:
+                self.tokens.invalidate(creds.cache_key, token)
+                continue
+            try:
+                return response.json()
+            except ValueError:
+                return {"errorCode": str(response.status_code), "errorMessage": response.text[:200]}
+
+    async def stk_push(self, creds: DarajaCredentials, payload: dict) -> dict:
+        return await self._call(creds, STK_PUSH_PATH, payload, idempotent=False)
+
+    async def stk_query(self, creds: DarajaCredentials, payload: dict) -> dict:
+        return await self._call(creds, STK_QUERY_PATH, payload, idempotent=True)
+
+    async def b2c_payment(self, creds: DarajaCredentials, payload: dict) -> dict:
+        return await self._call(creds, B2C_PATH, payload, idempotent=False)
+
+    async def aclose(self):
+        """Close the connection pool of the running event loop"""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+gateway = DarajaGateway()
@@ -0,0 +1,295 @@
+"""
+Incremental delinquency engine.
+
+Marks past-due instalments overdue, charges late payment penalties and keeps
+LoanDefault records current. It runs from the scheduler (cron_delinquency.py)
+or an explicit refresh, never from read endpoints.
+
+Each run records a watermark in job_watermarks. The next run only touches:
+  - loans with pending instalments now past due (flipped to overdue with one
+    bulk UPDATE, whatever their due date, so schedules regenerated or
+    backdated since the last run are caught too),
+  - loans with instalments that fell due since the last run,
+  - loans that received repayments or were otherwise updated since then.
+Open defaults that were not touched just age: their days_overdue is
+refreshed from oldest_due_date with one UPDATE per distinct due date.
+The first run (no watermark) processes every active loan.
+
+Penalties bump the loan's updated_at like any other write. The run records
+the updated_at each penalized loan was left with (last_result["own_writes"]),
+and the next run skips a loan whose updated_at is still exactly that value,
+so the job's own writes never make a loan look changed to the next run.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterable, List, Optional
+
+from sqlalchemy import select, union
+from sqlalchemy.orm import joinedload
+
+from models.tenant import (
+    AuditLog, JobWatermark, LoanApplication, LoanDefault, LoanInstalment,
+    LoanRepayment, Member, Transaction,
+)
+from services.code_generator import generate_txn_code
+
+DELINQUENCY_JOB = "delinquency"
+ACTIVE_LOAN_STATUSES = ["disbursed", "defaulted", "restructured"]
+OPEN_DEFAULT_STATUSES = ["overdue", "in_collection"]
+
+
+def _active_loan_ids():
+    return select(LoanApplication.id).where(
+        LoanApplication.status.in_(ACTIVE_LOAN_STATUSES),
+        LoanApplication.outstanding_balance > 0,
+    )
+
+
+def _charge_penalty(tenant_session, ledger, loan, member, last_overdue, new_penalty, penalty_rate, amount_overdue, today):
+    old_penalty = last_overdue.expected_penalty or Decimal("0")
+    last_overdue.expected_penalty = old_penalty + new_penalty
+    old_outstanding = loan.outstanding_balance or Decimal("0")
+    loan.outstanding_balance = old_outstanding + new_penalty
+
+    member_name = f"{member.first_name} {member.last_name}" if member else "Unknown"
+
+    tenant_session.add(AuditLog(
+        staff_id=None,
+        action="late_penalty_charged",
+        entity_type="loan",
+        entity_id=str(loan.id),
+        old_values={
+            "outstanding_balance": str(old_outstanding),
+            "instalment_penalty": str(old_penalty),
+            "instalment_number": last_overdue.instalment_number,
+        },
+        new_values={
+            "penalty_charged": str(new_penalty),
+            "penalty_rate": str(penalty_rate),
+            "amount_overdue": str(amount_overdue),
+            "outstanding_balance": str(loan.outstanding_balance),
+            "instalment_penalty": str(last_overdue.expected_penalty),
+            "loan_number": loan.application_number,
+            "member": member_name,
+            "reason": f"Late payment penalty ({penalty_rate}% on overdue amount {amount_overdue})",
+        }
+    ))
+
+    tenant_session.add(Transaction(
+        transaction_number=generate_txn_code(),
+        member_id=str(member.id) if member else None,
+        transaction_type="penalty_charge",
+        account_type="loan",
+        amount=new_penalty,
+        reference=f"PENALTY-{today.strftime('%Y%m%d')}-{loan.application_number}",
+        description=f"Late payment penalty ({penalty_rate}%) on overdue amount {amount_overdue} for loan {loan.application_number}"
+    ))
+
+    try:
+        lines = [
+            {"account_code": "1100", "debit": new_penalty, "credit": Decimal("0"), "loan_id": str(loan.id), "memo": f"Late penalty on {loan.application_number}"},
+            {"account_code": "4020", "debit": Decimal("0"), "credit": new_penalty, "loan_id": str(loan.id), "memo": f"Penalty income - {loan.application_number}"},
+        ]
+        ledger.create_journal_entry(
+            entry_date=today,
+            description=f"Late payment penalty - {loan.application_number} - {member_name} - {penalty_rate}% on overdue {amount_overdue}",
+            lines=lines,
+            source_type="penalty_charge",
+            reference=f"PENALTY-{today.strftime('%Y%m%d')}-{loan.application_number}"
+        )
+    except Exception as gl_err:
+        print(f"  [GL] Warning: Failed to post penalty GL entry for {loan.application_number}: {gl_err}")
+
+
+def process_loans(tenant_session, today: date, loan_ids: Optional[Iterable[str]] = None,
+                  penalized: Optional[List[LoanApplication]] = None) -> dict:
+    """Recompute overdue amounts, penalties and default records for the given loans (None = all active).
+
+    Loans charged a penalty are appended to penalized when a list is given.
+    """
+    stats = {"loans": 0, "defaults_opened": 0, "defaults_updated": 0, "defaults_resolved": 0, "penalties": 0}
+
+    query = tenant_session.query(LoanApplication).options(
+        joinedload(LoanApplication.loan_product)
+    ).filter(LoanApplication.id.in_(_active_loan_ids()))
+    if loan_ids is not None:
+        loan_ids = list(loan_ids)
+        if not loan_ids:
+            return stats
+        query = query.filter(LoanApplication.id.in_(loan_ids))
+    loans = query.all()
+    stats["loans"] = len(loans)
+    if not loans:
+        return stats
+
+    ids = [str(loan.id) for loan in loans]
+    overdue_insts = tenant_session.query(LoanInstalment).filter(
+        LoanInstalment.loan_id.in_(ids),
+        LoanInstalment.due_date < today,
+        LoanInstalment.status.in_(["overdue", "partial"])
+    ).order_by(LoanInstalment.due_date.asc()).all()
+    insts_by_loan = defaultdict(list)
+    for inst in overdue_insts:
+        insts_by_loan[inst.loan_id].append(inst)
+
+    defaults_by_loan = {
+        d.loan_id: d for d in tenant_session.query(LoanDefault).filter(
+            LoanDefault.loan_id.in_(ids),
+            LoanDefault.status.in_(OPEN_DEFAULT_STATUSES)
+        ).all()
+    }
+    member_ids = {loan.member_id for loan in loans if str(loan.id) in insts_by_loan}
+    # Penalty GL entries are queued and written in one batch at the end of the pass
+    ledger = None
+    members = {
+        m.id: m for m in tenant_session.query(Member).filter(Member.id.in_(member_ids)).all()
+    } if member_ids else {}
+
+    for loan in loans:
+        existing_default = defaults_by_loan.get(loan.id)
+        loan_insts = insts_by_loan.get(str(loan.id), [])
+
+        if not loan_insts:
+            # Caught up since the last run
+            if existing_default:
+                existing_default.status = "resolved"
+                existing_default.resolved_at = datetime.utcnow()
+                stats["defaults_resolved"] += 1
+            continue
+
+        oldest_due = loan_insts[0].due_date
+        days_overdue = (today - oldest_due).days
+        amount_overdue = sum(
+            (i.expected_principal + i.expected_interest + i.expected_penalty) -
+            (i.paid_principal + i.paid_interest + i.paid_penalty)
+            for i in loan_insts
+        )
+
+        if amount_overdue <= 0:
+            if existing_default:
+                existing_default.status = "resolved"
+                existing_default.resolved_at = datetime.utcnow()
+                stats["defaults_resolved"] += 1
+            continue
+
+        penalty_rate = Decimal("0")
+        if loan.loan_product and loan.loan_product.late_payment_penalty:
+            penalty_rate = loan.loan_product.late_payment_penalty
+
+        penalty_amount = amount_overdue * penalty_rate / Decimal("100")
+
+        if penalty_amount > 0:
+            existing_penalty_on_insts = sum(
+                Decimal(str(i.expected_penalty or 0)) for i in loan_insts
+            )
+            new_penalty = penalty_amount - existing_penalty_on_insts
+            if new_penalty > Decimal("0.01"):
+                if ledger is None:
+                    from accounting.service import AccountingService
+                    ledger = AccountingService(tenant_session, deferred=True)
+                    ledger.seed_default_accounts()
+                _charge_penalty(
+                    tenant_session, ledger, loan, members.get(loan.member_id), loan_insts[-1],
+                    new_penalty, penalty_rate, amount_overdue, today,
+                )
+                stats["penalties"] += 1
+                if penalized is not None:
+                    penalized.append(loan)
+
+        if not existing_default:
+            tenant_session.add(LoanDefault(
+                loan_id=loan.id,
+                days_overdue=days_overdue,
+                oldest_due_date=oldest_due,
+                amount_overdue=amount_overdue,
+                penalty_amount=penalty_amount,
+                status="overdue"
+            ))
+            stats["defaults_opened"] += 1
+        else:
+            existing_default.days_overdue = days_overdue
+            existing_default.oldest_due_date = oldest_due
+            existing_default.amount_overdue = amount_overdue
+            existing_default.penalty_amount = penalty_amount
+            stats["defaults_updated"] += 1
+
+    if ledger is not None:
+        ledger.flush()
+    return stats
+
+
+def _age_open_defaults(tenant_session, today: date) -> int:
+    """Bring days_overdue of every open default up to today, one UPDATE per distinct oldest due date"""
+    due_dates = [
+        row[0] for row in tenant_session.query(LoanDefault.oldest_due_date).filter(
+            LoanDefault.status.in_(OPEN_DEFAULT_STATUSES),
+            LoanDefault.oldest_due_date.isnot(None),
+        ).distinct().all()
+    ]
+    updated = 0
+    for due in due_dates:
+        days = (today - due).days
+        updated += tenant_session.query(LoanDefault).filter(
+            LoanDefault.status.in_(OPEN_DEFAULT_STATUSES),
+            LoanDefault.oldest_due_date == due,
+            LoanDefault.days_overdue != days,
+        ).update({"days_overdue": days}, synchronize_session=False)
+    return updated
+
+
+def run_delinquency(tenant_session, today: Optional[date] = None, full: bool = False) -> dict:
+    """One incremental pass; commits and advances the watermark"""
+    today = today or date.today()
+    started_at = datetime.utcnow()
+
+    mark = tenant_session.get(JobWatermark, DELINQUENCY_JOB)
+    if mark is None:
+        mark = JobWatermark(job_name=DELINQUENCY_JOB)
+        tenant_session.add(mark)
+    full = full or mark.watermark_date is None or mark.watermark_at is None
+
+    # No lower due date bound: regenerated or backdated schedules can add past-due pending instalments
+    flip = tenant_session.query(LoanInstalment).filter(
+        LoanInstalment.status == "pending",
+        LoanInstalment.due_date < today,
+        LoanInstalment.loan_id.in_(_active_loan_ids()),
+    )
+    flipped_loan_ids = [] if full else [row[0] for row in flip.with_entities(LoanInstalment.loan_id).distinct().all()]
+    flipped = flip.update({"status": "overdue"}, synchronize_session=False)
+
+    if full:
+        loan_ids = None
+    else:
+        touched = union(
+            select(LoanInstalment.loan_id).where(
+                LoanInstalment.due_date >= mark.watermark_date,
+                LoanInstalment.due_date < today,
+            ),
+            select(LoanRepayment.loan_id).where(LoanRepayment.created_at >= mark.watermark_at),
+        )
+        loan_ids = set(flipped_loan_ids) | {row[0] for row in tenant_session.execute(touched).all()}
+        own_writes = (mark.last_result or {}).get("own_writes") or {}
+        for loan_id, updated_at in tenant_session.query(LoanApplication.id, LoanApplication.updated_at).filter(
+            LoanApplication.updated_at > mark.watermark_at
+        ).all():
+            if own_writes.get(loan_id) != updated_at.isoformat():
+                loan_ids.add(loan_id)
+
+    penalized: List[LoanApplication] = []
+    stats = process_loans(tenant_session, today, loan_ids, penalized=penalized)
+    tenant_session.flush()
+    stats["instalments_marked_overdue"] = flipped
+    stats["defaults_aged"] = _age_open_defaults(tenant_session, today)
+    stats["mode"] = "full" if full else "incremental"
+
+    mark.watermark_date = today
+    mark.watermark_at = started_at
+    mark.last_run_at = datetime.utcnow()
+    mark.last_result = {
+        **stats,
+        "own_writes": {str(loan.id): loan.updated_at.isoformat() for loan in penalized if loan.updated_at},
+    }
+    tenant_session.commit()
+    return stats
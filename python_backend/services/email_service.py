@@ -1,8 +1,12 @@
 import httpx
 import logging
 import base64
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from io import BytesIO
-from typing import Optional, List
+from typing import Awaitable, Callable, Optional, List
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -29,6 +33,94 @@ def encrypt_pdf(pdf_bytes: bytes, password: str) -> bytes:
     return output.getvalue()
 
 
+@lru_cache(maxsize=1)
+def _payslip_template() -> dict:
+    """Build the payslip paragraph and table styles once per process.
+
+    Stylesheets, fonts and TableStyle command lists are immutable after
+    construction, so every payslip rendered by this process reuses them.
+    """
+    styles = getSampleStyleSheet()
+    return {
+        "title": ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=18,
+            textColor=colors.HexColor('#1e40af'),
+            alignment=TA_CENTER,
+            spaceAfter=6
+        ),
+        "subtitle": ParagraphStyle(
+            'Subtitle',
+            parent=styles['Normal'],
+            fontSize=12,
+            textColor=colors.gray,
+            alignment=TA_CENTER,
+            spaceAfter=20
+        ),
+        "section_header": ParagraphStyle(
+            'SectionHeader',
+            parent=styles['Heading2'],
+            fontSize=12,
+            textColor=colors.HexColor('#1e40af'),
+            spaceAfter=10,
+            spaceBefore=15
+        ),
+        "footer": ParagraphStyle(
+            'Footer',
+            parent=styles['Normal'],
+            fontSize=8,
+            textColor=colors.gray,
+            alignment=TA_CENTER
+        ),
+        "employee_table": TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+            ('TEXTCOLOR', (0, 0), (0, -1), colors.gray),
+            ('TEXTCOLOR', (2, 0), (2, -1), colors.gray),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ]),
+        "earnings_table": TableStyle([
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTNAME', (0, 1), (-1, -2), 'Helvetica'),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#dbeafe')),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ]),
+        "deductions_table": TableStyle([
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTNAME', (0, 1), (-1, -2), 'Helvetica'),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#dc2626')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#fef2f2')),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ]),
+        "net_table": TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 14),
+            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#22c55e')),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.white),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+            ('TOPPADDING', (0, 0), (-1, -1), 12),
+        ]),
+    }
+
+
 def generate_payslip_pdf(
     staff_name: str,
     org_name: str,
@@ -47,53 +139,18 @@ def generate_payslip_pdf(
     )
     
     elements = []
-    styles = getSampleStyleSheet()
+    template = _payslip_template()
+    section_header = template["section_header"]
     
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        textColor=colors.HexColor('#1e40af'),
-        alignment=TA_CENTER,
-        spaceAfter=6
-    )
-    
-    subtitle_style = ParagraphStyle(
-        'Subtitle',
-        parent=styles['Normal'],
-        fontSize=12,
-        textColor=colors.gray,
-        alignment=TA_CENTER,
-        spaceAfter=20
-    )
-    
-    section_header = ParagraphStyle(
-        'SectionHeader',
-        parent=styles['Heading2'],
-        fontSize=12,
-        textColor=colors.HexColor('#1e40af'),
-        spaceAfter=10,
-        spaceBefore=15
-    )
-    
-    elements.append(Paragraph(org_name, title_style))
-    elements.append(Paragraph(f"PAYSLIP - {payslip_data['pay_period']}", subtitle_style))
+    elements.append(Paragraph(org_name, template["title"]))
+    elements.append(Paragraph(f"PAYSLIP - {payslip_data['pay_period']}", template["subtitle"]))
     
     employee_data = [
         ['Employee Name:', staff_name, 'Pay Period:', payslip_data['pay_period']],
     ]
     
     employee_table = Table(employee_data, colWidths=[100, 150, 100, 150])
-    employee_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.gray),
-        ('TEXTCOLOR', (2, 0), (2, -1), colors.gray),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-    ]))
+    employee_table.setStyle(template["employee_table"])
     elements.append(employee_table)
     elements.append(Spacer(1, 20))
     
@@ -109,19 +166,7 @@ def generate_payslip_pdf(
     ]
     
     earnings_table = Table(earnings_data, colWidths=[350, 150])
-    earnings_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTNAME', (0, 1), (-1, -2), 'Helvetica'),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#dbeafe')),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-    ]))
+    earnings_table.setStyle(template["earnings_table"])
     elements.append(earnings_table)
     
     elements.append(Paragraph("DEDUCTIONS", section_header))
@@ -137,19 +182,7 @@ def generate_payslip_pdf(
     ]
     
     deductions_table = Table(deductions_data, colWidths=[350, 150])
-    deductions_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTNAME', (0, 1), (-1, -2), 'Helvetica'),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#dc2626')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#fef2f2')),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-    ]))
+    deductions_table.setStyle(template["deductions_table"])
     elements.append(deductions_table)
     
     elements.append(Spacer(1, 20))
@@ -159,29 +192,14 @@ def generate_payslip_pdf(
     ]
     
     net_table = Table(net_data, colWidths=[350, 150])
-    net_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 14),
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#22c55e')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.white),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('TOPPADDING', (0, 0), (-1, -1), 12),
-    ]))
+    net_table.setStyle(template["net_table"])
     elements.append(net_table)
     
     elements.append(Spacer(1, 30))
     
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=8,
-        textColor=colors.gray,
-        alignment=TA_CENTER
-    )
     elements.append(Paragraph(
         f"This is a computer-generated payslip from {org_name}. No signature required.",
-        footer_style
+        template["footer"]
     ))
     
     doc.build(elements)
@@ -200,10 +218,12 @@ class BrevoEmailService:
     
     BASE_URL = "https://api.brevo.com/v3"
     
-    def __init__(self, api_key: str, from_name: str, from_email: str):
+    def __init__(self, api_key: str, from_name: str, from_email: str, client: Optional[httpx.AsyncClient] = None):
         self.api_key = api_key
         self.from_name = from_name
         self.from_email = from_email
+        # Optional shared client so bulk senders reuse one connection pool
+        self.client = client
     
     async def send_email(
         self,
@@ -250,21 +270,29 @@ class BrevoEmailService:
         if attachments:
             payload["attachment"] = attachments
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
+        if self.client is not None:
+            response = await self.client.post(
                 f"{self.BASE_URL}/smtp/email",
                 headers=headers,
                 json=payload,
                 timeout=30.0
             )
-            
-            if response.status_code == 201:
-                logger.info(f"Email sent successfully to {to_email}")
-                return {"success": True, "message_id": response.json().get("messageId")}
-            else:
-                error_msg = response.text
-                logger.error(f"Failed to send email: {response.status_code} - {error_msg}")
-                raise Exception(f"Email send failed: {error_msg}")
+        else:
+            async with httpx.AsyncClient() as client:
+                response = await client.post(
+                    f"{self.BASE_URL}/smtp/email",
+                    headers=headers,
+                    json=payload,
+                    timeout=30.0
+                )
+        
+        if response.status_code == 201:
+            logger.info(f"Email sent successfully to {to_email}")
+            return {"success": True, "message_id": response.json().get("messageId")}
+        else:
+            error_msg = response.text
+            logger.error(f"Failed to send email: {response.status_code} - {error_msg}")
+            raise Exception(f"Email send failed: {error_msg}")
 
 
 def get_email_settings(tenant_session) -> dict:
@@ -284,18 +312,8 @@ def get_email_settings(tenant_session) -> dict:
     return settings
 
 
-async def send_payslip_email(
-    tenant_session,
-    staff_email: str,
-    staff_name: str,
-    org_name: str,
-    payslip_data: dict,
-    cc_email: Optional[str] = None,
-    national_id: Optional[str] = None
-) -> dict:
-    """Send payslip email to staff member with password-protected PDF attachment"""
-    settings = get_email_settings(tenant_session)
-    
+def get_brevo_service(settings: dict, org_name: str, client: Optional[httpx.AsyncClient] = None) -> BrevoEmailService:
+    """Build a Brevo client from tenant email settings, raising ValueError if email is not usable"""
     if settings.get("email_enabled") != "true":
         raise ValueError("Email notifications are not enabled")
     
@@ -306,14 +324,11 @@ async def send_payslip_email(
     if not api_key or not from_email:
         raise ValueError("Email settings not configured. Please configure Brevo API key and sender email in Settings.")
     
-    service = BrevoEmailService(api_key, from_name, from_email)
-    
-    # Password protection is required - fail if national_id not provided
-    if not national_id:
-        raise ValueError("National ID is required for password-protected payslip. Please ensure staff profile has National ID configured.")
-    
-    # Generate PDF with password protection using national_id
-    pdf_bytes = generate_payslip_pdf(staff_name, org_name, payslip_data, password=national_id)
+    return BrevoEmailService(api_key, from_name, from_email, client=client)
+
+
+def build_payslip_email(staff_name: str, org_name: str, payslip_data: dict, pdf_bytes: bytes) -> dict:
+    """Build subject, bodies and PDF attachment for a payslip email"""
     pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
     
     pay_period_safe = payslip_data['pay_period'].replace(' ', '_').replace('/', '-')
@@ -373,14 +388,105 @@ This is an automated message from {org_name}. Please do not reply to this email.
 If you have any questions about your payslip, please contact HR.
     """
     
-    subject = f"Payslip for {payslip_data['pay_period']} - {org_name}"
+    return {
+        "subject": f"Payslip for {payslip_data['pay_period']} - {org_name}",
+        "html_content": html_content,
+        "text_content": text_content,
+        "attachments": attachments,
+    }
+
+
+async def send_payslip_email(
+    tenant_session,
+    staff_email: str,
+    staff_name: str,
+    org_name: str,
+    payslip_data: dict,
+    cc_email: Optional[str] = None,
+    national_id: Optional[str] = None
+) -> dict:
+    """Send payslip email to staff member with password-protected PDF attachment"""
+    settings = get_email_settings(tenant_session)
+    service = get_brevo_service(settings, org_name)
+    
+    # Password protection is required - fail if national_id not provided
+    if not national_id:
+        raise ValueError("National ID is required for password-protected payslip. Please ensure staff profile has National ID configured.")
+    
+    # Generate PDF with password protection using national_id
+    pdf_bytes = generate_payslip_pdf(staff_name, org_name, payslip_data, password=national_id)
+    message = build_payslip_email(staff_name, org_name, payslip_data, pdf_bytes)
     
     return await service.send_email(
         to_email=staff_email,
         to_name=staff_name,
-        subject=subject,
-        html_content=html_content,
-        text_content=text_content,
         cc_email=cc_email,
-        attachments=attachments
+        **message
     )
+
+
+# ==================== BULK PAYSLIP EMAIL ====================
+
+PAYSLIP_RENDER_WORKERS = int(os.environ.get("PAYSLIP_RENDER_WORKERS", min(4, os.cpu_count() or 1)))
+BULK_EMAIL_CONCURRENCY = int(os.environ.get("BULK_EMAIL_CONCURRENCY", "5"))
+
+_render_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    """Lazily start the shared PDF render pool (one per API worker process)"""
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ProcessPoolExecutor(max_workers=PAYSLIP_RENDER_WORKERS)
+    return _render_pool
+
+
+async def send_bulk_payslip_emails(
+    settings: dict,
+    org_name: str,
+    jobs: List[dict],
+    on_result: Callable[[str, bool, Optional[str]], Awaitable[None]],
+    concurrency: int = BULK_EMAIL_CONCURRENCY
+) -> dict:
+    """Render, encrypt and email many payslips.
+
+    Each job is a dict with payslip_id, staff_email, staff_name, cc_email,
+    national_id and payslip_data. PDFs are rendered and encrypted in the
+    process pool while up to ``concurrency`` sends share one Brevo
+    connection pool. ``on_result(payslip_id, success, error)`` is awaited
+    as each payslip finishes.
+    """
+    loop = asyncio.get_running_loop()
+    pool = _get_render_pool()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    summary = {"sent": 0, "failed": 0}
+    
+    limits = httpx.Limits(max_connections=max(1, concurrency), max_keepalive_connections=max(1, concurrency))
+    async with httpx.AsyncClient(limits=limits) as client:
+        service = get_brevo_service(settings, org_name, client=client)
+        
+        async def process(job: dict):
+            try:
+                pdf_bytes = await loop.run_in_executor(
+                    pool, generate_payslip_pdf,
+                    job["staff_name"], org_name, job["payslip_data"], job["national_id"]
+                )
+                message = build_payslip_email(job["staff_name"], org_name, job["payslip_data"], pdf_bytes)
+                async with semaphore:
+                    await service.send_email(
+                        to_email=job["staff_email"],
+                        to_name=job["staff_name"],
+                        cc_email=job.get("cc_email"),
+                        **message
+                    )
+            except Exception as e:
+                logger.error(f"Bulk payslip email failed for {job['payslip_id']}: {e}")
+                summary["failed"] += 1
+                await on_result(job["payslip_id"], False, str(e))
+            else:
+                summary["sent"] += 1
+                await on_result(job["payslip_id"], True, None)
+        
+        await asyncio.gather(*(process(job) for job in jobs))
+    
+    return summary
@@ -0,0 +1,244 @@
+"""
+Tenant event bus over Postgres LISTEN/NOTIFY.
+
+Browsers learned about other people's changes by polling (the teller
+station every 10 seconds, notifications, permissions and the session every
+60), and in-process caches such as routes.common._permissions_cache could
+not learn about changes made in another worker at all.
+
+Writes now emit small events:
+
+- Mapper events on Transaction, FloatTransaction, TellerFloat,
+  InAppNotification, QueueTicket, Role and RolePermission (models/tenant.py)
+  call emit_for(), which queues an event on the session. Code without a
+  model can call emit(session, type, **data).
+- The events are sent when the session commits and dropped when it rolls
+  back, so listeners never hear about changes that did not happen.
+- They are sent with pg_notify on the master database (one channel for all
+  tenants, tagged with the organization id), because every worker reaches
+  the master database while tenants may live on other servers.
+
+Each API worker runs one EventBus listener thread holding a LISTEN
+connection. It hands every event to the handlers registered with on()
+(cache invalidators; they run in the listener thread) and to the
+organization's SSE subscribers (routes/events.py). Events carry the
+sending worker's id so a handler can skip work its own worker already did.
+
+Without a Postgres master database (development, tests) or with
+TENANT_EVENTS=0 no listener runs and events are dispatched in process.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session, object_session
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "tenant_events"
+MAX_PAYLOAD = 7900  # NOTIFY payloads must stay under 8000 bytes
+SUBSCRIBER_QUEUE = 100
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+def emit(session, event_type: str, **data):
+    """Queue an event on a tenant session; it is sent if and when the session commits"""
+    if session is None or not session.info.get("tenant_db"):
+        return
+    session.info.setdefault("tenant_events", []).append((event_type, data))
+
+
+def emit_for(target):
+    """Queue the event describing a change to one of the tracked models (mapper event hook)"""
+    from models.tenant import FloatTransaction, InAppNotification, QueueTicket, Role, RolePermission, TellerFloat, Transaction
+
+    session = object_session(target)
+    if isinstance(target, Transaction):
+        emit(session, "transaction", member_id=target.member_id, branch_id=target.branch_id,
+             account_type=target.account_type, staff_id=target.processed_by_id)
+    elif isinstance(target, FloatTransaction):
+        emit(session, "float", teller_float_id=target.teller_float_id)
+    elif isinstance(target, TellerFloat):
+        emit(session, "float", teller_float_id=target.id, staff_id=target.staff_id)
+    elif isinstance(target, InAppNotification):
+        emit(session, "notification", staff_id=target.staff_id)
+    elif isinstance(target, QueueTicket):
+        emit(session, "queue", branch_id=target.branch_id)
+    elif isinstance(target, (Role, RolePermission)):
+        emit(session, "role", role_id=target.id if isinstance(target, Role) else target.role_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _send_pending(session):
+    events = session.info.pop("tenant_events", None)
+    if events:
+        bus.send(session.info["tenant_db"], events)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session):
+    session.info.pop("tenant_events", None)
+
+
+class EventBus:
+    def __init__(self):
+        self._handlers: List[tuple] = []
+        self._subscribers: Dict[str, set] = {}
+        self._orgs: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def listening(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def remember(self, tenant_db: str, org_id: str):
+        """Record which organization a tenant connection string belongs to"""
+        self._orgs[tenant_db] = org_id
+
+    def org_for(self, tenant_db: str) -> Optional[str]:
+        if tenant_db not in self._orgs:
+            from models.database import SessionLocal
+            from models.master import Organization
+
+            db = SessionLocal()
+            try:
+                row = db.query(Organization.id).filter(Organization.connection_string == tenant_db).first()
+            finally:
+                db.close()
+            self._orgs[tenant_db] = row[0] if row else None
+        return self._orgs[tenant_db]
+
+    def on(self, event_types: Iterable[str], handler: Callable):
+        """Call handler(org_id, event_type, data, local) for every event of these types"""
+        self._handlers.append((tuple(event_types), handler))
+
+    def send(self, tenant_db: str, events: list):
+        try:
+            org_id = self.org_for(tenant_db)
+            if not org_id:
+                return
+            messages = []
+            for event_type, data in events:
+                message = {"o": org_id, "t": event_type, "d": data, "w": WORKER_ID}
+                payload = json.dumps(message, default=str, separators=(",", ":"))
+                if len(payload) > MAX_PAYLOAD:
+                    message["d"] = {}
+                    payload = json.dumps(message, separators=(",", ":"))
+                messages.append((message, payload))
+
+            if not self.listening:
+                for message, _ in messages:
+                    self.dispatch(message)
+                return
+            from models.database import engine
+            with engine.begin() as conn:
+                for _, payload in messages:
+                    conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+        except Exception as e:
+            logger.warning("Tenant event send failed: %s", e)
+
+    def dispatch(self, message: dict):
+        org_id, event_type, data = message.get("o"), message.get("t"), message.get("d") or {}
+        local = message.get("w") == WORKER_ID
+        for event_types, handler in self._handlers:
+            if event_type in event_types:
+                try:
+                    handler(org_id, event_type, data, local)
+                except Exception as e:
+                    logger.warning("Tenant event handler %s failed: %s", getattr(handler, "__name__", handler), e)
+        with self._lock:
+            subscribers = list(self._subscribers.get(org_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_offer, queue, {"type": event_type, **data})
+
+    def subscribe(self, org_id: str):
+        """Register an asyncio queue receiving the organization's events; call from the event loop"""
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(maxsize=SUBSCRIBER_QUEUE))
+        with self._lock:
+            self._subscribers.setdefault(org_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, org_id: str, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(org_id)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[org_id]
+
+    def _listen(self):
+        from models.database import engine
+
+        backoff = 1.0
+        while not self._stop.is_set():
+            raw = None
+            try:
+                raw = engine.raw_connection()
+                raw.detach()
+                conn = raw.driver_connection
+                conn.autocommit = True
+                conn.cursor().execute(f"LISTEN {CHANNEL}")
+                backoff = 1.0
+                while not self._stop.is_set():
+                    if not select.select([conn], [], [], 1.0)[0]:
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            self.dispatch(json.loads(notify.payload))
+                        except ValueError:
+                            continue
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                logger.warning("Tenant event listener error, reconnecting in %.0fs: %s", backoff, e)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, name="tenant-event-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+
+def _offer(queue: asyncio.Queue, item):
+    # A subscriber that stopped reading loses events rather than holding memory
+    try:
+        queue.put_nowait(item)
+    except asyncio.QueueFull:
+        pass
+
+
+bus = EventBus()
+
+
+def start_event_bus() -> Optional[EventBus]:
+    """Start this worker's LISTEN thread (Postgres master database only; TENANT_EVENTS=0 disables it)"""
+    from models.database import engine
+
+    if os.environ.get("TENANT_EVENTS", "1") == "0" or engine.dialect.name != "postgresql":
+        return None
+    bus.start()
+    return bus
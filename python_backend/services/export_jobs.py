@@ -0,0 +1,285 @@
+"""
+Asynchronous export jobs.
+
+A job is an ExportJob row plus an artifact file under
+uploads/exports/<org_id>/. Creating a job with the same type, format and
+filters as one that is still pending or running returns the existing job.
+Jobs run on a small thread pool in the API process, reuse the streaming
+export row functions and update rows_written as they go so clients can poll
+for progress. Finished artifacts expire after EXPORT_JOB_TTL_HOURS and are
+removed by cleanup_expired_export_jobs, which runs whenever a new job is
+created.
+
+While a job is queued or running in a process, a heartbeat thread stamps its
+heartbeat_at every EXPORT_JOB_HEARTBEAT_SECONDS. A job whose heartbeat is
+older than EXPORT_JOB_LEASE_SECONDS was lost (e.g. in a restart): dedupe no
+longer returns it and cleanup marks it failed, however long a live job runs.
+
+CSV artifacts are gzip-compressed. Parquet needs the optional pyarrow
+package; without it only CSV is offered.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from services.export_engine import iter_csv_chunks
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+EXPORT_JOBS_DIR = Path(__file__).parent.parent / "uploads" / "exports"
+EXPORT_JOB_TTL_HOURS = int(os.environ.get("EXPORT_JOB_TTL_HOURS", "24"))
+EXPORT_JOB_WORKERS = int(os.environ.get("EXPORT_JOB_WORKERS", "2"))
+EXPORT_JOB_HEARTBEAT_SECONDS = 30
+EXPORT_JOB_LEASE_SECONDS = 300
+PROGRESS_EVERY_ROWS = 5000
+PARQUET_ROW_GROUP = 50000
+
+IN_FLIGHT_STATUSES = ("pending", "running")
+
+_executor = ThreadPoolExecutor(max_workers=EXPORT_JOB_WORKERS, thread_name_prefix="export-job")
+
+# Jobs queued or running in this process (job id -> tenant context), kept alive by the heartbeat thread
+_live_jobs: dict = {}
+_live_jobs_lock = threading.Lock()
+_heartbeat_thread: Optional[threading.Thread] = None
+
+
+def export_dedupe_key(export_type: str, fmt: str, filters: dict) -> str:
+    raw = json.dumps({"type": export_type, "format": fmt, "filters": filters}, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _lease_cutoff() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=EXPORT_JOB_LEASE_SECONDS)
+
+
+def _last_heartbeat():
+    from sqlalchemy import func
+    from models.tenant import ExportJob
+    return func.coalesce(ExportJob.heartbeat_at, ExportJob.created_at)
+
+
+def find_in_flight_job(session, dedupe_key: str):
+    """The newest identical job that is pending or running and still heartbeating"""
+    from models.tenant import ExportJob
+    return session.query(ExportJob).filter(
+        ExportJob.dedupe_key == dedupe_key,
+        ExportJob.status.in_(IN_FLIGHT_STATUSES),
+        _last_heartbeat() >= _lease_cutoff(),
+    ).order_by(ExportJob.created_at.desc()).first()
+
+
+def create_export_job(session, export_type: str, fmt: str, filters: dict, requested_by: Optional[str]):
+    """Return (job, created). An identical job that is still in flight is reused."""
+    from models.tenant import ExportJob
+
+    key = export_dedupe_key(export_type, fmt, filters)
+    existing = find_in_flight_job(session, key)
+    if existing:
+        return existing, False
+
+    job = ExportJob(
+        export_type=export_type,
+        format=fmt,
+        filters=filters,
+        dedupe_key=key,
+        status="pending",
+        rows_written=0,
+        requested_by=requested_by,
+        heartbeat_at=datetime.utcnow(),
+    )
+    session.add(job)
+    session.commit()
+    return job, True
+
+
+def job_file_path(org_id: str, job_id: str, fmt: str) -> Path:
+    suffix = ".parquet" if fmt == "parquet" else ".csv.gz"
+    return EXPORT_JOBS_DIR / org_id / f"{job_id}{suffix}"
+
+
+def _update_job(session, job_id: str, **values):
+    from models.tenant import ExportJob
+    values.setdefault("heartbeat_at", datetime.utcnow())
+    session.query(ExportJob).filter(ExportJob.id == job_id).update(values, synchronize_session=False)
+    session.commit()
+
+
+def _heartbeat_live_jobs():
+    with _live_jobs_lock:
+        jobs = list(_live_jobs.items())
+    for job_id, tenant_ctx in jobs:
+        session = tenant_ctx.create_session()
+        try:
+            _update_job(session, job_id)
+        except Exception as e:
+            session.rollback()
+            logger.warning(f"Export job {job_id} heartbeat failed: {e}")
+        finally:
+            session.close()
+
+
+def _heartbeat_loop():
+    while True:
+        time.sleep(EXPORT_JOB_HEARTBEAT_SECONDS)
+        _heartbeat_live_jobs()
+
+
+def _track_job(job_id: str, tenant_ctx):
+    global _heartbeat_thread
+    with _live_jobs_lock:
+        _live_jobs[job_id] = tenant_ctx
+        if _heartbeat_thread is None or not _heartbeat_thread.is_alive():
+            _heartbeat_thread = threading.Thread(target=_heartbeat_loop, name="export-job-heartbeat", daemon=True)
+            _heartbeat_thread.start()
+
+
+def _untrack_job(job_id: str):
+    with _live_jobs_lock:
+        _live_jobs.pop(job_id, None)
+
+
+def _write_csv(path: Path, header: List[str], rows, on_progress: Callable[[int], None]):
+    count = 0
+
+    def counted():
+        nonlocal count
+        for row in rows:
+            yield row
+            count += 1
+            if count % PROGRESS_EVERY_ROWS == 0:
+                on_progress(count)
+
+    with open(path, "wb") as f:
+        for chunk in iter_csv_chunks(header, counted(), gzip=True):
+            f.write(chunk)
+    return count
+
+
+def _write_parquet(path: Path, header: List[str], rows, on_progress: Callable[[int], None]):
+    schema = pyarrow.schema([(name, pyarrow.string()) for name in header])
+    count = 0
+    batch = []
+
+    def flush(writer):
+        columns = list(zip(*batch)) if batch else [[] for _ in header]
+        table = pyarrow.Table.from_arrays(
+            [pyarrow.array([None if v is None else str(v) for v in col], type=pyarrow.string()) for col in columns],
+            schema=schema,
+        )
+        writer.write_table(table)
+        batch.clear()
+
+    with pq.ParquetWriter(str(path), schema, compression="snappy") as writer:
+        for row in rows:
+            batch.append(row)
+            count += 1
+            if len(batch) >= PARQUET_ROW_GROUP:
+                flush(writer)
+                on_progress(count)
+        if batch or count == 0:
+            flush(writer)
+    return count
+
+
+def run_export_job(tenant_ctx, org_id: str, job_id: str, header: List[str],
+                   row_fn: Callable, count_fn: Optional[Callable] = None):
+    """Produce the artifact for a job. Runs on the export pool."""
+    from models.tenant import ExportJob
+
+    status_session = tenant_ctx.create_session()
+    data_session = tenant_ctx.create_session()
+    try:
+        job = status_session.query(ExportJob).filter(ExportJob.id == job_id).first()
+        if not job or job.status != "pending":
+            return
+        filters = job.filters or {}
+        fmt = job.format
+        total = count_fn(data_session, **filters) if count_fn else None
+        _update_job(status_session, job_id, status="running", started_at=datetime.utcnow(), total_rows=total)
+
+        path = job_file_path(org_id, job_id, fmt)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+
+        def on_progress(n):
+            _update_job(status_session, job_id, rows_written=n)
+
+        rows = row_fn(data_session, **filters)
+        if fmt == "parquet":
+            count = _write_parquet(tmp_path, header, rows, on_progress)
+        else:
+            count = _write_csv(tmp_path, header, rows, on_progress)
+        os.replace(tmp_path, path)
+
+        now = datetime.utcnow()
+        _update_job(
+            status_session, job_id,
+            status="completed",
+            rows_written=count,
+            total_rows=count,
+            file_path=str(path),
+            file_size=path.stat().st_size,
+            completed_at=now,
+            expires_at=now + timedelta(hours=EXPORT_JOB_TTL_HOURS),
+        )
+    except Exception as e:
+        logger.error(f"Export job {job_id} failed: {e}")
+        status_session.rollback()
+        try:
+            _update_job(status_session, job_id, status="failed", error=str(e)[:1000], completed_at=datetime.utcnow())
+        except Exception:
+            status_session.rollback()
+    finally:
+        _untrack_job(job_id)
+        data_session.close()
+        status_session.close()
+        tenant_ctx.close()
+
+
+def submit_export_job(tenant_ctx, org_id: str, job_id: str, header: List[str],
+                      row_fn: Callable, count_fn: Optional[Callable] = None):
+    _track_job(job_id, tenant_ctx)
+    return _executor.submit(run_export_job, tenant_ctx, org_id, job_id, header, row_fn, count_fn)
+
+
+def cleanup_expired_export_jobs(session) -> int:
+    """Delete expired artifacts and fail jobs whose heartbeat stopped (orphaned by a restart)"""
+    from models.tenant import ExportJob
+
+    now = datetime.utcnow()
+    expired = session.query(ExportJob).filter(
+        ExportJob.status == "completed",
+        ExportJob.expires_at < now,
+    ).all()
+    for job in expired:
+        if job.file_path:
+            try:
+                os.remove(job.file_path)
+            except OSError:
+                pass
+        job.status = "expired"
+        job.file_path = None
+
+    stale = session.query(ExportJob).filter(
+        ExportJob.status.in_(IN_FLIGHT_STATUSES),
+        _last_heartbeat() < _lease_cutoff(),
+    ).update({"status": "failed", "error": "Export job did not finish"}, synchronize_session=False)
+
+    session.commit()
+    return len(expired) + stale
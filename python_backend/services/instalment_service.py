@@ -1,129 +1,25 @@
 from decimal import Decimal
 from datetime import timedelta, date, datetime
 from models.tenant import LoanInstalment, LoanApplication, LoanProduct
+from services.amortization import (
+    FREQ_DAYS, PERIODS_PER_YEAR, ScheduleInput, build_schedule, build_schedules, insert_schedules,
+    loan_schedule_input, period_insurance, term_months_to_instalments,
+)
 
-FREQ_DAYS = {"daily": 1, "weekly": 7, "bi_weekly": 14, "monthly": 30}
-PERIODS_PER_YEAR = {"daily": 365, "weekly": 52, "bi_weekly": 26, "monthly": 12}
+_calc_insurance_for_period = period_insurance
 
-def term_months_to_instalments(term_months: int, repayment_frequency: str) -> int:
-    ppy = PERIODS_PER_YEAR.get(repayment_frequency, 12)
-    return max(round(term_months * ppy / 12), 1)
-
-def _calc_insurance_for_period(balance, cli_rate, cli_freq, freq):
-    if not cli_rate or cli_rate <= 0:
-        return Decimal("0")
-    rate = Decimal(str(cli_rate)) / Decimal("100")
-    if cli_freq == "annual":
-        periods_yr = PERIODS_PER_YEAR.get(freq, 12)
-        return round(balance * rate / Decimal(str(periods_yr)), 2)
-    else:
-        return round(balance * rate, 2)
+def _instalments_from_schedule(schedule):
+    return [
+        LoanInstalment(loan_id=schedule.loan_id, status="pending", **row)
+        for row in schedule.rows()
+    ]
 
 def generate_instalment_schedule(tenant_session, loan: LoanApplication, product: LoanProduct):
-    freq = getattr(product, 'repayment_frequency', 'monthly') or 'monthly'
-    term = term_months_to_instalments(int(loan.term_months), freq)
-    if term <= 0:
-        return []
-    period_days = FREQ_DAYS.get(freq, 30)
-    
-    deduct_upfront = bool(getattr(loan, 'interest_deducted_upfront', False))
-    interest_type = getattr(product, 'interest_type', 'reducing_balance')
-    
-    cli_rate = Decimal(str(getattr(loan, 'credit_life_insurance_rate', None) or 0))
-    cli_freq = getattr(loan, 'credit_life_insurance_freq', None) or "annual"
+    schedule = build_schedule(loan_schedule_input(loan, product))
+    instalments = _instalments_from_schedule(schedule)
     
-    disbursed_date = loan.disbursed_at
-    if hasattr(disbursed_date, 'date'):
-        disbursed_date = disbursed_date.date()
-    
-    loan_amount = Decimal(str(loan.amount or 0))
-    instalments = []
-    total_insurance = Decimal("0")
-    
-    if deduct_upfront:
-        principal_per_period = loan_amount / term
-        balance = loan_amount
-        for i in range(term):
-            due = disbursed_date + timedelta(days=period_days * (i + 1))
-            ins_amount = _calc_insurance_for_period(balance, cli_rate, cli_freq, freq)
-            total_insurance += ins_amount
-            inst = LoanInstalment(
-                loan_id=str(loan.id),
-                instalment_number=i + 1,
-                due_date=due,
-                expected_principal=round(principal_per_period, 2),
-                expected_interest=Decimal("0"),
-                expected_insurance=ins_amount,
-                status="pending"
-            )
-            instalments.append(inst)
-            balance -= principal_per_period
-    elif interest_type == "flat":
-        total_interest = Decimal(str(loan.total_interest or 0))
-        interest_per_period = total_interest / term
-        principal_per_period = loan_amount / term
-        balance = loan_amount
-        for i in range(term):
-            due = disbursed_date + timedelta(days=period_days * (i + 1))
-            ins_amount = _calc_insurance_for_period(balance, cli_rate, cli_freq, freq)
-            total_insurance += ins_amount
-            inst = LoanInstalment(
-                loan_id=str(loan.id),
-                instalment_number=i + 1,
-                due_date=due,
-                expected_principal=round(principal_per_period, 2),
-                expected_interest=round(interest_per_period, 2),
-                expected_insurance=ins_amount,
-                status="pending"
-            )
-            instalments.append(inst)
-            balance -= principal_per_period
-    else:
-        periodic_rate = Decimal(str(loan.interest_rate or 0)) / Decimal("100")
-        balance = loan_amount
-        monthly_repayment = Decimal(str(loan.monthly_repayment or 0))
-        total_payment = monthly_repayment if monthly_repayment > 0 else (loan_amount / term)
-        for i in range(term):
-            due = disbursed_date + timedelta(days=period_days * (i + 1))
-            interest_portion = round(balance * periodic_rate, 2)
-            ins_amount = _calc_insurance_for_period(balance, cli_rate, cli_freq, freq)
-            total_insurance += ins_amount
-            if i == term - 1:
-                principal_portion = balance
-                interest_portion = max(total_payment - balance, Decimal("0"))
-            else:
-                principal_portion = total_payment - interest_portion
-                if principal_portion > balance:
-                    principal_portion = balance
-                    interest_portion = total_payment - principal_portion
-            inst = LoanInstalment(
-                loan_id=str(loan.id),
-                instalment_number=i + 1,
-                due_date=due,
-                expected_principal=round(max(principal_portion, Decimal("0")), 2),
-                expected_interest=round(max(interest_portion, Decimal("0")), 2),
-                expected_insurance=ins_amount,
-                status="pending"
-            )
-            instalments.append(inst)
-            balance -= principal_portion
-    
-    if instalments:
-        total_expected_principal = sum(Decimal(str(i.expected_principal)) for i in instalments)
-        principal_diff = loan_amount - total_expected_principal
-        if principal_diff != 0:
-            instalments[-1].expected_principal = Decimal(str(instalments[-1].expected_principal)) + principal_diff
-        
-        if not deduct_upfront:
-            total_expected_interest = sum(Decimal(str(i.expected_interest)) for i in instalments)
-            expected_total_interest = Decimal(str(loan.total_interest or 0))
-            interest_diff = expected_total_interest - total_expected_interest
-            last_interest = Decimal(str(instalments[-1].expected_interest))
-            if interest_diff != 0 and abs(interest_diff) < last_interest:
-                instalments[-1].expected_interest = last_interest + interest_diff
-    
-    if total_insurance > 0:
-        loan.total_insurance = round(total_insurance, 2)
+    if schedule.total_insurance > 0:
+        loan.total_insurance = round(schedule.total_insurance, 2)
     
     for inst in instalments:
         tenant_session.add(inst)
@@ -131,9 +27,20 @@ def generate_instalment_schedule(tenant_session, loan: LoanApplication, product:
     return instalments
 
 
-def regenerate_instalments_after_restructure(tenant_session, loan: LoanApplication, product: LoanProduct):
-    from sqlalchemy import and_
+def generate_instalment_schedules(tenant_session, loans_and_products) -> int:
+    """Schedules for many freshly disbursed loans, written with one multi-row INSERT.
+
+    Takes (loan, product) pairs; returns the number of instalments written.
+    """
+    pairs = list(loans_and_products)
+    schedules = build_schedules(loan_schedule_input(loan, product) for loan, product in pairs)
+    for (loan, _), schedule in zip(pairs, schedules):
+        if schedule.total_insurance > 0:
+            loan.total_insurance = round(schedule.total_insurance, 2)
+    return insert_schedules(tenant_session, schedules)
 
+
+def regenerate_instalments_after_restructure(tenant_session, loan: LoanApplication, product: LoanProduct):
     completed_instalments = tenant_session.query(LoanInstalment).filter(
         LoanInstalment.loan_id == str(loan.id),
         LoanInstalment.status.in_(["paid", "partial"])
@@ -155,18 +62,6 @@ def regenerate_instalments_after_restructure(tenant_session, loan: LoanApplicati
     if remaining_term <= 0:
         return
 
-    freq = getattr(product, 'repayment_frequency', 'monthly') or 'monthly'
-    period_days = FREQ_DAYS.get(freq, 30)
-    interest_type = getattr(product, 'interest_type', 'reducing_balance')
-    deduct_upfront = bool(getattr(loan, 'interest_deducted_upfront', False))
-
-    cli_rate = Decimal(str(getattr(loan, 'credit_life_insurance_rate', None) or 0))
-    cli_freq = getattr(loan, 'credit_life_insurance_freq', None) or "annual"
-
-    loan_amount = Decimal(str(loan.amount or 0))
-    remaining_principal = loan_amount - preserved_principal
-    remaining_interest = Decimal(str(loan.total_interest or 0)) - preserved_interest
-
     last_due_date = completed_instalments[-1].due_date if completed_instalments else None
     if last_due_date is None:
         disbursed_date = loan.disbursed_at
@@ -174,91 +69,26 @@ def regenerate_instalments_after_restructure(tenant_session, loan: LoanApplicati
             disbursed_date = disbursed_date.date()
         last_due_date = disbursed_date
 
-    new_instalments = []
-    new_insurance_total = Decimal("0")
-
-    if deduct_upfront:
-        principal_per_period = remaining_principal / remaining_term
-        balance = remaining_principal
-        for i in range(remaining_term):
-            due = last_due_date + timedelta(days=period_days * (i + 1))
-            ins_amount = _calc_insurance_for_period(balance, cli_rate, cli_freq, freq)
-            new_insurance_total += ins_amount
-            inst = LoanInstalment(
-                loan_id=str(loan.id),
-                instalment_number=paid_count + i + 1,
-                due_date=due,
-                expected_principal=round(principal_per_period, 2),
-                expected_interest=Decimal("0"),
-                expected_insurance=ins_amount,
-                status="pending"
-            )
-            new_instalments.append(inst)
-            balance -= principal_per_period
-    elif interest_type == "flat":
-        interest_per_period = remaining_interest / remaining_term if remaining_term > 0 else Decimal("0")
-        principal_per_period = remaining_principal / remaining_term if remaining_term > 0 else Decimal("0")
-        balance = remaining_principal
-        for i in range(remaining_term):
-            due = last_due_date + timedelta(days=period_days * (i + 1))
-            ins_amount = _calc_insurance_for_period(balance, cli_rate, cli_freq, freq)
-            new_insurance_total += ins_amount
-            inst = LoanInstalment(
-                loan_id=str(loan.id),
-                instalment_number=paid_count + i + 1,
-                due_date=due,
-                expected_principal=round(principal_per_period, 2),
-                expected_interest=round(interest_per_period, 2),
-                expected_insurance=ins_amount,
-                status="pending"
-            )
-            new_instalments.append(inst)
-            balance -= principal_per_period
-    else:
-        periodic_rate = Decimal(str(loan.interest_rate or 0)) / Decimal("100")
-        balance = remaining_principal
-        monthly_repayment = Decimal(str(loan.monthly_repayment or 0))
-        total_payment = monthly_repayment if monthly_repayment > 0 else (remaining_principal / remaining_term)
-        for i in range(remaining_term):
-            due = last_due_date + timedelta(days=period_days * (i + 1))
-            interest_portion = round(balance * periodic_rate, 2)
-            ins_amount = _calc_insurance_for_period(balance, cli_rate, cli_freq, freq)
-            new_insurance_total += ins_amount
-            if i == remaining_term - 1:
-                principal_portion = balance
-            else:
-                principal_portion = total_payment - interest_portion
-                if principal_portion > balance:
-                    principal_portion = balance
-                    interest_portion = total_payment - principal_portion
-            inst = LoanInstalment(
-                loan_id=str(loan.id),
-                instalment_number=paid_count + i + 1,
-                due_date=due,
-                expected_principal=round(max(principal_portion, Decimal("0")), 2),
-                expected_interest=round(max(interest_portion, Decimal("0")), 2),
-                expected_insurance=ins_amount,
-                status="pending"
-            )
-            new_instalments.append(inst)
-            balance -= principal_portion
+    base = loan_schedule_input(loan, product, start_date=last_due_date)
+    schedule = build_schedule(ScheduleInput(
+        principal=base.principal - preserved_principal,
+        n=remaining_term,
+        start_date=last_due_date,
+        method=base.method,
+        periodic_rate=base.periodic_rate,
+        total_interest=base.total_interest - preserved_interest,
+        periodic_payment=base.periodic_payment,
+        frequency=freq,
+        cli_rate=base.cli_rate,
+        cli_freq=base.cli_freq,
+        first_number=paid_count + 1,
+        restructure=True,
+        loan_id=str(loan.id),
+    ))
 
-    if new_instalments:
-        total_expected_principal = sum(Decimal(str(i.expected_principal)) for i in new_instalments)
-        principal_diff = remaining_principal - total_expected_principal
-        if principal_diff != 0:
-            new_instalments[-1].expected_principal = Decimal(str(new_instalments[-1].expected_principal)) + principal_diff
+    loan.total_insurance = round(preserved_insurance + schedule.total_insurance, 2)
 
-        if not deduct_upfront and remaining_interest > 0:
-            total_expected_interest = sum(Decimal(str(i.expected_interest)) for i in new_instalments)
-            interest_diff = remaining_interest - total_expected_interest
-            last_interest = Decimal(str(new_instalments[-1].expected_interest or 0))
-            if interest_diff != 0 and abs(interest_diff) < abs(last_interest or Decimal("1")):
-                new_instalments[-1].expected_interest = last_interest + interest_diff
-
-    loan.total_insurance = round(preserved_insurance + new_insurance_total, 2)
-
-    for inst in new_instalments:
+    for inst in _instalments_from_schedule(schedule):
         tenant_session.add(inst)
 
     tenant_session.flush()
@@ -388,3 +218,39 @@ def backfill_instalments_for_loan(tenant_session, loan: LoanApplication, product
             inst.status = "overdue"
     
     tenant_session.flush()
+
+
+def backfill_instalments(tenant_session, loans_and_products) -> int:
+    """Backfill schedules for loans that have none.
+
+    Loans without repayments get their schedules from one batch INSERT;
+    the few with repayments go through backfill_instalments_for_loan so the
+    payments are allocated. Returns the number of loans backfilled.
+    """
+    from models.tenant import LoanRepayment
+
+    pairs = list(loans_and_products)
+    if not pairs:
+        return 0
+    ids = [str(loan.id) for loan, _ in pairs]
+    repaid = {
+        row[0] for row in tenant_session.query(LoanRepayment.loan_id).filter(
+            LoanRepayment.loan_id.in_(ids)
+        ).distinct().all()
+    }
+
+    fresh = [(loan, product) for loan, product in pairs if str(loan.id) not in repaid]
+    generate_instalment_schedules(tenant_session, fresh)
+    if fresh:
+        tenant_session.query(LoanInstalment).filter(
+            LoanInstalment.loan_id.in_([str(loan.id) for loan, _ in fresh]),
+            LoanInstalment.status.in_(["pending", "partial"]),
+            LoanInstalment.due_date < date.today(),
+        ).update({"status": "overdue"}, synchronize_session=False)
+
+    for loan, product in pairs:
+        if str(loan.id) in repaid:
+            backfill_instalments_for_loan(tenant_session, loan, product)
+    tenant_session.flush()
+    return len(pairs)
+
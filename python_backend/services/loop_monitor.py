@@ -0,0 +1,160 @@
+"""
+Event loop lag monitor.
+
+An `async def` handler that calls something blocking (a synchronous
+SQLAlchemy query, bcrypt, httpx.Client) holds the worker's event loop until
+it returns, so every other request of that worker waits behind it.
+LoopLagMonitor finds such handlers:
+
+- a heartbeat task on the event loop stamps the time every few
+  milliseconds;
+- a watchdog thread notices when the stamp is older than the threshold and
+  samples the loop thread's stack, naming the handler (the outermost frame
+  under routes/, else the innermost frame of this project) and the line it
+  is blocked on (the innermost frame).
+
+Each stall is logged once, with its duration, when the loop runs again and
+counted per handler in stats(). Every API worker runs it
+(LOOP_LAG_THRESHOLD_MS, default 200; LOOP_LAG_MONITOR=0 disables it). In the
+test suite LOOP_LAG_STRICT=1 fails a test whose requests stalled the loop.
+
+Handlers that only do synchronous work are plain `def` functions, which
+FastAPI runs in its threadpool; async helpers they need are called through
+routes.common.run_async.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+THRESHOLD_MS = float(os.environ.get("LOOP_LAG_THRESHOLD_MS", "200"))
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROUTES_DIR = os.path.join(PROJECT_ROOT, "routes") + os.sep
+RECENT_STALLS = 100
+
+
+def _frame_name(frame) -> str:
+    path = os.path.relpath(frame.f_code.co_filename, PROJECT_ROOT)
+    module = path[:-3].replace(os.sep, ".") if path.endswith(".py") else path
+    return f"{module}.{frame.f_code.co_name}"
+
+
+def _frame_location(frame) -> str:
+    path = frame.f_code.co_filename
+    if path.startswith(PROJECT_ROOT + os.sep):
+        path = os.path.relpath(path, PROJECT_ROOT)
+    return f"{path}:{frame.f_lineno} in {frame.f_code.co_name}"
+
+
+def _in_project(frame) -> bool:
+    path = frame.f_code.co_filename
+    return path.startswith(PROJECT_ROOT + os.sep) and "site-packages" not in path and path != __file__
+
+
+class LoopLagMonitor:
+    def __init__(self, threshold_ms: float = THRESHOLD_MS):
+        self.threshold = threshold_ms / 1000
+        self.interval = min(self.threshold / 4, 0.05)
+        self.counts = Counter()
+        self.recent = deque(maxlen=RECENT_STALLS)
+        self._pending: List[dict] = []
+        self._beat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    async def _heartbeat(self):
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> "LoopLagMonitor":
+        """Start watching the running event loop; call from a coroutine on it (the lifespan)"""
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="loop-lag-monitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._thread:
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    def _sample(self) -> dict:
+        frame = sys._current_frames().get(self._loop_thread)
+        location = _frame_location(frame) if frame else None
+        handler = innermost = None
+        while frame is not None:
+            if frame.f_code.co_filename.startswith(ROUTES_DIR):
+                handler = _frame_name(frame)  # keeps the outermost one
+            elif innermost is None and _in_project(frame):
+                innermost = _frame_name(frame)
+            frame = frame.f_back
+        return {"handler": handler or innermost or "unknown", "location": location}
+
+    def _watch(self):
+        stall = None
+        while not self._stop.wait(self.interval):
+            lag = time.monotonic() - self._beat - self.interval
+            if lag >= self.threshold:
+                if stall is None:
+                    stall = self._sample()
+                stall["lag_ms"] = round(lag * 1000)
+            elif stall is not None:
+                self._record(stall)
+                stall = None
+
+    def _record(self, stall: dict):
+        stall["at"] = time.time()
+        with self._lock:
+            self.counts[stall["handler"]] += 1
+            self.recent.append(stall)
+            self._pending.append(stall)
+        logger.warning(
+            "Event loop blocked for %sms by %s at %s", stall["lag_ms"], stall["handler"], stall["location"]
+        )
+
+    def drain(self) -> List[dict]:
+        """Stalls recorded since the previous drain()"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        return pending
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "threshold_ms": round(self.threshold * 1000),
+                "stalls": sum(self.counts.values()),
+                "by_handler": dict(self.counts.most_common()),
+                "recent": list(self.recent),
+            }
+
+
+loop_monitor = LoopLagMonitor()
+
+
+def start_loop_monitor() -> Optional[LoopLagMonitor]:
+    """Start the worker's monitor from the lifespan (LOOP_LAG_MONITOR=0 disables it)"""
+    if os.environ.get("LOOP_LAG_MONITOR", "1") == "0" or loop_monitor.running:
+        return None
+    return loop_monitor.start()
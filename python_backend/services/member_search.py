@@ -0,0 +1,118 @@
+"""
+Member search backed by the normalized members.search_text column.
+
+On PostgreSQL the column carries a pg_trgm GIN index, so substring matches
+(LIKE '%term%') and fuzzy matches (search_text % term) are index scans rather
+than a sequential scan of members. Member numbers and phones also get
+prefix-only lookups on their own btree indexes (text_pattern_ops), which is
+what tellers type most of the time. On SQLite (tests) or a database where the
+pg_trgm extension could not be created, the same predicates run as plain LIKE.
+
+Results are ranked: exact member number, member number prefix, phone prefix,
+name prefix, then everything else (by trigram similarity where available).
+"""
+
+import re
+
+from sqlalchemy import and_, case, func, literal, or_, text
+
+from models.tenant import Member
+
+_trgm_available: dict = {}
+
+
+def _has_trgm(session) -> bool:
+    bind = session.get_bind()
+    if bind.dialect.name != "postgresql":
+        return False
+    key = str(bind.url)
+    if key not in _trgm_available:
+        try:
+            _trgm_available[key] = bool(session.execute(
+                text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            ).scalar())
+        except Exception:
+            _trgm_available[key] = False
+    return _trgm_available[key]
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _tokens(term: str) -> list:
+    return [t for t in re.split(r"\s+", term.strip().lower()) if t]
+
+
+def _phone_prefix(term: str) -> str:
+    """0712 / 254712 / +254712 all reduce to the start of the 9-digit national number"""
+    if not re.fullmatch(r"[\d+\s-]{4,}", term):
+        return ""
+    digits = re.sub(r"\D", "", term)
+    if digits.startswith("254"):
+        digits = digits[3:]
+    return digits.lstrip("0")[:9]
+
+
+def member_search_filter(session, term: str):
+    """Return a WHERE clause matching members for a free-text search term"""
+    tokens = _tokens(term)
+    if not tokens:
+        return None
+
+    # Every word must appear somewhere ("john kam" finds John Kamau)
+    substring = and_(*[
+        Member.search_text.like(f"%{_escape_like(t)}%", escape="\\") for t in tokens
+    ])
+    clauses = [substring]
+
+    term_lower = " ".join(tokens)
+    clauses.append(func.lower(Member.member_number).like(f"{_escape_like(term_lower)}%", escape="\\"))
+
+    phone_prefix = _phone_prefix(term_lower)
+    if phone_prefix:
+        clauses.append(Member.phone_normalized.like(f"{phone_prefix}%"))
+
+    if _has_trgm(session) and len(term_lower) >= 3:
+        clauses.append(Member.search_text.op("%")(term_lower))
+
+    return or_(*clauses)
+
+
+def member_search_rank(session, term: str):
+    """ORDER BY expressions ranking the best matches first"""
+    term_lower = " ".join(_tokens(term))
+    escaped = _escape_like(term_lower)
+    whens = [
+        (func.lower(Member.member_number) == term_lower, 0),
+        (func.lower(Member.member_number).like(f"{escaped}%", escape="\\"), 1),
+    ]
+    phone_prefix = _phone_prefix(term_lower)
+    if phone_prefix:
+        whens.append((Member.phone_normalized.like(f"{phone_prefix}%"), 2))
+    whens.append((Member.search_text.like(f"{escaped}%", escape="\\"), 3))
+    rank = case(*whens, else_=4)
+    order = [rank]
+    if _has_trgm(session):
+        order.append(func.similarity(Member.search_text, literal(term_lower)).desc())
+    order.append(Member.last_name)
+    return order
+
+
+def apply_member_search(session, query, term: str, ranked: bool = True):
+    """Filter (and optionally order) a Member query by a search term"""
+    clause = member_search_filter(session, term)
+    if clause is None:
+        return query
+    query = query.filter(clause)
+    if ranked:
+        query = query.order_by(*member_search_rank(session, term))
+    return query
+
+
+def search_members(session, term: str, limit: int = 20, branch_id: str = None):
+    """Lightweight ranked lookup returning id, names and member number only"""
+    query = session.query(Member.id, Member.member_number, Member.first_name, Member.last_name)
+    if branch_id:
+        query = query.filter(Member.branch_id == branch_id)
+    return apply_member_search(session, query, term).limit(limit).all()
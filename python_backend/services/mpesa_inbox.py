@@ -0,0 +1,269 @@
+"""
+Fast-ack ingestion of M-Pesa callbacks.
+
+Safaricom expects an answer to a C2B confirmation or STK result within a
+few seconds and retries when it does not get one. The callback endpoints
+therefore only insert the raw payload into the master mpesa_callbacks table
+(models.master.MpesaCallback, unique per organization/kind/TransID or
+CheckoutRequestID, so retries are no-ops) and acknowledge.
+
+A pool of worker threads started with the app applies queued callbacks to
+the tenant databases through routes.mpesa.process_c2b_confirmation /
+process_stk_callback. Only the oldest eligible callback of an organization
+can be claimed, so each tenant's payments are applied in arrival order while
+different tenants proceed in parallel; claims use FOR UPDATE SKIP LOCKED
+and a lease, which the worker renews while it processes, so several app
+processes can share the queue and a slow callback is never claimed twice.
+Failures are retried with exponential backoff; a callback waiting out its
+backoff does not hold back the tenant's later callbacks. After MAX_ATTEMPTS
+it is parked as "dead"; dead callbacks can be replayed from the M-Pesa
+callbacks API.
+"""
+
+import os
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, exists, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+
+from models.master import MpesaCallback, Organization, generate_uuid
+
+CALLBACK_C2B = "c2b"
+CALLBACK_STK = "stk"
+
+OPEN_STATUSES = ("queued", "processing")
+MAX_ATTEMPTS = 6
+LEASE = timedelta(minutes=5)
+LEASE_RENEW_SECONDS = LEASE.total_seconds() / 3
+POLL_SECONDS = 2.0
+
+_wake = threading.Event()
+
+
+def callback_dedupe_key(kind: str, payload: dict) -> Optional[str]:
+    if kind == CALLBACK_C2B:
+        return (payload.get("TransID") or "").strip() or None
+    body = (payload.get("Body") or {}).get("stkCallback") or {}
+    return (body.get("CheckoutRequestID") or "").strip() or None
+
+
+def record_callback(db, org_id: str, kind: str, payload: dict):
+    """Store a callback for processing; returns (row, created). Repeats of the same key are not stored again."""
+    key = callback_dedupe_key(kind, payload) or f"nokey-{generate_uuid()}"
+    row = MpesaCallback(organization_id=org_id, kind=kind, dedupe_key=key, payload=payload)
+    db.add(row)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        existing = db.query(MpesaCallback).filter(
+            MpesaCallback.organization_id == org_id,
+            MpesaCallback.kind == kind,
+            MpesaCallback.dedupe_key == key,
+        ).first()
+        return existing, False
+    _wake.set()
+    return row, True
+
+
+def claim_next(db) -> Optional[MpesaCallback]:
+    """Claim the oldest due callback of an organization that no earlier one is ahead of.
+
+    Earlier callbacks being processed, or due, keep their place; one waiting
+    out a retry backoff lets later callbacks of its organization go first.
+    Nothing is claimed for an organization while one of its callbacks is
+    held under a live lease.
+    """
+    now = datetime.utcnow()
+    earlier = aliased(MpesaCallback)
+    leased = aliased(MpesaCallback)
+    busy = exists().where(
+        leased.organization_id == MpesaCallback.organization_id,
+        leased.status == "processing",
+        leased.locked_until >= now,
+    )
+    blocked = exists().where(
+        earlier.organization_id == MpesaCallback.organization_id,
+        or_(
+            earlier.status == "processing",
+            and_(earlier.status == "queued", earlier.next_attempt_at <= now),
+        ),
+        or_(
+            earlier.received_at < MpesaCallback.received_at,
+            and_(earlier.received_at == MpesaCallback.received_at, earlier.id < MpesaCallback.id),
+        ),
+    )
+    item = db.query(MpesaCallback).filter(
+        or_(
+            and_(MpesaCallback.status == "queued", MpesaCallback.next_attempt_at <= now),
+            and_(MpesaCallback.status == "processing", MpesaCallback.locked_until < now),
+        ),
+        ~blocked,
+        ~busy,
+    ).order_by(MpesaCallback.received_at).with_for_update(skip_locked=True, of=MpesaCallback).first()
+    if item is None:
+        db.rollback()
+        return None
+    item.status = "processing"
+    item.attempts = (item.attempts or 0) + 1
+    item.locked_until = now + LEASE
+    db.commit()
+    return item
+
+
+def renew_lease(db, item_id: str) -> bool:
+    """Push a processing callback's lease out by LEASE; False if it is no longer processing"""
+    renewed = db.query(MpesaCallback).filter(
+        MpesaCallback.id == item_id,
+        MpesaCallback.status == "processing",
+    ).update({"locked_until": datetime.utcnow() + LEASE}, synchronize_session=False)
+    db.commit()
+    return bool(renewed)
+
+
+class _LeaseRenewal:
+    """Renews a claimed callback's lease from a side thread while it is processed (slow Daraja calls)"""
+
+    def __init__(self, db, item_id: str):
+        self.bind = db.get_bind()
+        self.item_id = item_id
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="mpesa-inbox-lease", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(LEASE_RENEW_SECONDS):
+            db = Session(bind=self.bind)
+            try:
+                if not renew_lease(db, self.item_id):
+                    return
+            except Exception as e:
+                print(f"[M-Pesa inbox] Lease renewal failed for {self.item_id}: {e}")
+                db.rollback()
+            finally:
+                db.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _apply(db, item: MpesaCallback) -> str:
+    from services.tenant_context import TenantContext
+    from routes.mpesa import process_c2b_confirmation, process_stk_callback
+
+    processors = {CALLBACK_C2B: process_c2b_confirmation, CALLBACK_STK: process_stk_callback}
+    org = db.query(Organization).filter(Organization.id == item.organization_id).first()
+    if not org or not org.connection_string:
+        raise RuntimeError("Organization has no tenant database")
+
+    tenant_ctx = TenantContext(org.connection_string)
+    tenant_session = tenant_ctx.create_session()
+    try:
+        return processors[item.kind](tenant_session, item.payload or {})
+    except Exception:
+        tenant_session.rollback()
+        raise
+    finally:
+        tenant_session.close()
+        tenant_ctx.close()
+
+
+def process_callback(db, item: MpesaCallback) -> MpesaCallback:
+    """Apply one claimed callback and record the outcome (done, retry later, or dead)"""
+    try:
+        with _LeaseRenewal(db, item.id):
+            result = _apply(db, item)
+        item.status = "done"
+        item.result = (result or "")[:255]
+        item.last_error = None
+        item.processed_at = datetime.utcnow()
+    except Exception as e:
+        traceback.print_exc()
+        item.last_error = f"{type(e).__name__}: {e}"
+        if item.attempts >= MAX_ATTEMPTS:
+            item.status = "dead"
+            print(f"[M-Pesa inbox] {item.kind} {item.dedupe_key} dead-lettered after {item.attempts} attempts: {e}")
+        else:
+            item.status = "queued"
+            item.next_attempt_at = datetime.utcnow() + timedelta(seconds=min(5 * 2 ** item.attempts, 600))
+    item.locked_until = None
+    db.commit()
+    return item
+
+
+def process_pending(db, limit: int = 100) -> int:
+    """Drain up to limit callbacks on the calling thread; returns how many were processed"""
+    processed = 0
+    while processed < limit:
+        item = claim_next(db)
+        if item is None:
+            break
+        process_callback(db, item)
+        processed += 1
+    return processed
+
+
+def replay_callback(db, item: MpesaCallback) -> MpesaCallback:
+    item.status = "queued"
+    item.attempts = 0
+    item.next_attempt_at = datetime.utcnow()
+    item.locked_until = None
+    item.last_error = None
+    db.commit()
+    _wake.set()
+    return item
+
+
+class CallbackWorkerPool:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._stop = threading.Event()
+        self._threads = []
+
+    def _run(self):
+        from models.database import SessionLocal
+
+        while not self._stop.is_set():
+            db = SessionLocal()
+            try:
+                item = claim_next(db)
+                if item is not None:
+                    process_callback(db, item)
+                    continue
+            except Exception as e:
+                print(f"[M-Pesa inbox] Worker error: {e}")
+                db.rollback()
+            finally:
+                db.close()
+            _wake.wait(POLL_SECONDS)
+            _wake.clear()
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"mpesa-inbox-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        _wake.set()
+        for thread in self._threads:
+            thread.join(timeout=POLL_SECONDS * 2)
+
+
+def start_callback_workers() -> Optional[CallbackWorkerPool]:
+    """Start the worker pool (MPESA_CALLBACK_WORKERS threads, default 4; 0 disables it in this process)"""
+    workers = int(os.environ.get("MPESA_CALLBACK_WORKERS", "4"))
+    if workers <= 0:
+        return None
+    pool = CallbackWorkerPool(workers)
+    pool.start()
+    return pool
@@ -1,7 +1,7 @@
 from decimal import Decimal
 from datetime import datetime, timedelta
-from sqlalchemy import func
 from services.code_generator import generate_txn_code, generate_repayment_code
+from services.payment_reference import lookup_references, repayable_loan
 from models.tenant import (
     LoanApplication, LoanRepayment, LoanInstalment, LoanProduct,
     Transaction, Member, LoanDefault
@@ -187,20 +187,14 @@ def find_loan_from_reference(tenant_session, account_ref: str, member=None):
     if not account_ref:
         return None
 
-    ref_upper = account_ref.upper()
-    if ref_upper.startswith("LOAN:"):
-        loan_id = ref_upper[5:]
-        loan = tenant_session.query(LoanApplication).filter(
-            LoanApplication.id == loan_id,
-            LoanApplication.status.in_(["disbursed", "active"])
-        ).first()
+    ref = account_ref.strip()
+    if ref.upper().startswith("LOAN:"):
+        loan = repayable_loan(tenant_session, ref[5:].strip())
         if loan:
             return loan
 
-    loan = tenant_session.query(LoanApplication).filter(
-        func.upper(LoanApplication.application_number) == ref_upper,
-        LoanApplication.status.in_(["disbursed", "active"])
-    ).first()
+    loan_ref = lookup_references(tenant_session, account_ref=ref).get("loan")
+    loan = repayable_loan(tenant_session, loan_ref.loan_id) if loan_ref else None
     if loan:
         return loan
 
@@ -0,0 +1,108 @@
+"""
+Keyset (cursor) pagination for the large list endpoints.
+
+Pages are ordered newest first on (created_at, id) and the next page starts
+strictly after the last row of the previous one, so fetching page 500 costs
+the same as page 1 (an index range scan on (created_at, id)) instead of
+reading and discarding every earlier row as OFFSET does. Cursors are opaque
+url-safe strings; clients just pass back next_cursor. Rows without a
+created_at sort first (as a backward scan of the index returns them) and
+page through by id alone.
+
+Totals are optional. "exact" runs COUNT(*), "estimate" reads the planner's
+row estimate for the filtered query (PostgreSQL only; small estimates and
+other databases fall back to an exact count), "none" skips counting.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, tuple_
+
+COUNT_MODES = ("exact", "estimate", "none")
+COUNT_MODE_PATTERN = "^(exact|estimate|none)$"
+ESTIMATE_EXACT_THRESHOLD = 10000
+
+
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    raw = json.dumps([created_at.isoformat() if created_at else None, row_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Return (created_at, id) for a cursor; raises HTTP 400 if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        return datetime.fromisoformat(created_at) if created_at is not None else None, str(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def estimate_count(session, query) -> Optional[int]:
+    """Planner row estimate for a query, or None when the database can't provide one"""
+    bind = session.get_bind()
+    if bind.dialect.name != "postgresql":
+        return None
+    try:
+        compiled = query.order_by(None).statement.compile(dialect=bind.dialect)
+        # A failed EXPLAIN would abort the request's transaction; the savepoint confines it
+        with session.begin_nested():
+            plan = session.connection().exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {compiled.string}", compiled.params
+            ).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except Exception:
+        return None
+
+
+def count_rows(session, query, mode: str = "exact"):
+    """Return (total, is_estimate) for a filtered query according to the count mode"""
+    if mode == "none":
+        return None, False
+    if mode == "estimate":
+        estimate = estimate_count(session, query)
+        if estimate is not None and estimate > ESTIMATE_EXACT_THRESHOLD:
+            return estimate, True
+    return query.order_by(None).count(), False
+
+
+def keyset_page(query, created_col, id_col, cursor: Optional[str], limit: int):
+    """Fetch one newest-first page after cursor; returns (rows, next_cursor)"""
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        if created_at is None:
+            query = query.filter(or_(created_col.isnot(None), and_(created_col.is_(None), id_col < row_id)))
+        else:
+            query = query.filter(tuple_(created_col, id_col) < tuple_(created_at, row_id))
+
+    rows = query.order_by(created_col.desc().nulls_first(), id_col.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, created_col.key), getattr(last, id_col.key))
+    return rows, next_cursor
+
+
+def cursor_page_meta(session, query, cursor: Optional[str], next_cursor: Optional[str],
+                     count: Optional[str]) -> dict:
+    """Pagination block for a cursor-mode response.
+
+    Unless a count mode is requested explicitly, the total is estimated on
+    the first page only; clients keep it while following next_cursor.
+    """
+    total, is_estimate = (None, False)
+    if count or not cursor:
+        total, is_estimate = count_rows(session, query, count or "estimate")
+    return {
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None,
+        "total": total,
+        "total_is_estimate": is_estimate,
+    }
@@ -0,0 +1,180 @@
+"""
+Opt-in monthly range partitioning of transactions, float_transactions and
+audit_logs.
+
+These tables grow with every teller posting, M-Pesa payment and audited
+request and are nearly always read by created_at range. On Postgres a tenant can be converted with
+scripts/partition_tenant.py. partition_table() then replaces the table,
+inside one transaction, with one PARTITION BY RANGE (created_at) of the
+same columns:
+
+- one partition per month from the oldest row to FUTURE_MONTHS ahead,
+  plus a DEFAULT partition so an insert never fails for want of a month;
+- PRIMARY KEY (id, created_at), because a partitioned table's unique keys
+  must contain the partition key. For the same reason the unique index on
+  transaction_number becomes a plain index (numbers come from the code
+  generator), and foreign keys that other tables had on transactions.id
+  (mpesa_payments, cheque_deposits, bank_transfers, transaction_receipts)
+  are dropped. Their columns and values stay;
+- the old rows are copied, then the primary key, the other indexes and
+  outgoing foreign keys are recreated on the parent, which builds them on
+  every partition.
+
+On audit_logs, retention (services/audit_retention.py) archives a month and
+then detaches and drops its partition.
+
+cron_partitions.py keeps FUTURE_MONTHS of empty partitions ahead of today
+on every partitioned tenant. ensure_partitions() moves any rows that
+reached the default partition into the new month first. Unpartitioned
+tenants (and SQLite) are left alone, and the ORM models are unchanged.
+
+The planner can only skip partitions when a query bounds created_at with
+plain comparisons. date_bounds() turns a date range into such bounds, and
+list endpoints use it instead of func.date(created_at), which hides the
+column from the planner.
+"""
+
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional
+
+from sqlalchemy import text
+
+PARTITIONED_TABLES = ("transactions", "float_transactions", "audit_logs")
+FUTURE_MONTHS = 3
+
+
+def date_bounds(column, start: Optional[date] = None, end: Optional[date] = None) -> list:
+    """Conditions for start <= column's date <= end as a half-open datetime range"""
+    conditions = []
+    if start:
+        conditions.append(column >= datetime.combine(start, time.min))
+    if end:
+        conditions.append(column < datetime.combine(end + timedelta(days=1), time.min))
+    return conditions
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month.strftime('%Y%m')}"
+
+
+def is_partitioned(conn, table: str) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table}
+    ).scalar() == "p"
+
+
+def _existing_partitions(conn, table: str) -> set:
+    rows = conn.execute(text("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:table)
+    """), {"table": table}).all()
+    return {row[0] for row in rows}
+
+
+def _month_range(month: date) -> dict:
+    return {"start": datetime.combine(month, time.min), "end": datetime.combine(add_months(month, 1), time.min)}
+
+
+def ensure_partitions(conn, table: str, through: date) -> List[str]:
+    """Create the monthly partitions of a partitioned table from this month up to through; returns the new ones"""
+    existing = _existing_partitions(conn, table)
+    created = []
+    month = month_start(date.today())
+    while month <= month_start(through):
+        name = partition_name(table, month)
+        if name not in existing:
+            bounds = _month_range(month)
+            # Rows of this month that fell into the default partition move with it
+            conn.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+            conn.execute(text(f"""
+                WITH moved AS (
+                    DELETE FROM {table}_default WHERE created_at >= :start AND created_at < :end RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved
+            """), bounds)
+            conn.execute(text(
+                f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{bounds['start']}') TO ('{bounds['end']}')"
+            ))
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def partition_table(conn, table: str, months_ahead: int = FUTURE_MONTHS) -> dict:
+    """Convert a plain table into a monthly range-partitioned one (caller commits); no-op if already done"""
+    if conn.dialect.name != "postgresql":
+        raise ValueError("Table partitioning needs PostgreSQL")
+    if table not in PARTITIONED_TABLES:
+        raise ValueError(f"{table} is not a partitionable table")
+    if is_partitioned(conn, table):
+        return {"table": table, "partitions": 0, "rows": 0, "skipped": True}
+
+    legacy = f"{table}_unpartitioned"
+    conn.execute(text(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+
+    indexes = conn.execute(text("""
+        SELECT c.relname, pg_get_indexdef(i.indexrelid)
+        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = to_regclass(:legacy) AND NOT i.indisprimary
+    """), {"legacy": legacy}).all()
+    outgoing = conn.execute(text("""
+        SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+        WHERE conrelid = to_regclass(:legacy) AND contype = 'f'
+    """), {"legacy": legacy}).all()
+    incoming = conn.execute(text("""
+        SELECT conrelid::regclass::text, conname FROM pg_constraint
+        WHERE confrelid = to_regclass(:legacy) AND contype = 'f'
+    """), {"legacy": legacy}).all()
+    for referencing, constraint in incoming:
+        conn.execute(text(f'ALTER TABLE {referencing} DROP CONSTRAINT "{constraint}"'))
+
+    conn.execute(text(f"UPDATE {legacy} SET created_at = NOW() WHERE created_at IS NULL"))
+    conn.execute(text(
+        f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE) "
+        f"PARTITION BY RANGE (created_at)"
+    ))
+    conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN created_at SET NOT NULL"))
+    conn.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+
+    oldest = conn.execute(text(f"SELECT MIN(created_at) FROM {legacy}")).scalar()
+    month = month_start(oldest or date.today())
+    last = add_months(month_start(date.today()), months_ahead)
+    partitions = 0
+    while month <= last:
+        bounds = _month_range(month)
+        conn.execute(text(
+            f"CREATE TABLE {partition_name(table, month)} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{bounds['start']}') TO ('{bounds['end']}')"
+        ))
+        partitions += 1
+        month = add_months(month, 1)
+
+    rows = conn.execute(text(f"INSERT INTO {table} SELECT * FROM {legacy}")).rowcount
+    conn.execute(text(f"DROP TABLE {legacy}"))
+
+    # Keys and indexes are built after the copy, under the names the old table used
+    conn.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, created_at)"))
+
+    for name, definition in indexes:
+        definition = definition.replace("CREATE UNIQUE INDEX", "CREATE INDEX").replace(f" ON public.{legacy} ", f" ON {table} ")
+        definition = definition.replace(f" ON {legacy} ", f" ON {table} ")
+        conn.execute(text(definition))
+    for name, definition in outgoing:
+        conn.execute(text(f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}'))
+    conn.execute(text(f"ANALYZE {table}"))
+    return {
+        "table": table, "partitions": partitions, "rows": rows,
+        "dropped_foreign_keys": [f"{ref}.{name}" for ref, name in incoming],
+    }
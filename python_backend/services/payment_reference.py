@@ -0,0 +1,118 @@
+"""
+Payment reference resolution for M-Pesa callbacks.
+
+C2B confirmations and STK callbacks identify the payer by whatever was typed
+as the account number (a member number or a loan number) and by the paying
+phone. Matching those with upper(member_number) = ... or phone LIKE '%...'
+cannot use an index, so every callback scanned members and loans while
+holding a row lock on mpesa_payments.
+
+payment_references holds the normalized keys instead (see
+models.tenant.PaymentReference; rows are kept in sync by mapper events on
+Member and LoanApplication), so resolving a payer is one primary-key range
+lookup for the candidate keys plus a primary-key fetch of the member/loan.
+Bulk UPDATEs that bypass the ORM must call rebuild_payment_references.
+"""
+
+from typing import Optional, Tuple
+
+from sqlalchemy import and_, func, literal, or_, select
+
+from models.tenant import (
+    LoanApplication, Member, PaymentReference, normalize_phone, normalize_reference,
+)
+
+REPAYABLE_LOAN_STATUSES = ["disbursed", "active"]
+KIND_PRIORITY = ("member", "loan", "phone")
+
+
+def lookup_references(session, account_ref: Optional[str] = None, phone: Optional[str] = None) -> dict:
+    """Matching reference rows keyed by kind (member, loan, phone), fetched in one query"""
+    ref_key = normalize_reference(account_ref)
+    phone_key = normalize_phone(phone)
+    clauses = []
+    if ref_key:
+        clauses.append(and_(PaymentReference.kind.in_(["member", "loan"]), PaymentReference.ref_key == ref_key))
+    if phone_key:
+        clauses.append(and_(PaymentReference.kind == "phone", PaymentReference.ref_key == phone_key))
+    if not clauses:
+        return {}
+
+    found = {}
+    rows = session.query(PaymentReference).filter(or_(*clauses)).order_by(
+        PaymentReference.kind, PaymentReference.member_id
+    ).all()
+    for row in rows:
+        found.setdefault(row.kind, row)
+    return found
+
+
+def member_by_reference(session, account_ref: str) -> Optional[Member]:
+    ref = lookup_references(session, account_ref=account_ref).get("member")
+    return session.get(Member, ref.member_id) if ref else None
+
+
+def member_by_phone(session, phone: str) -> Optional[Member]:
+    ref = lookup_references(session, phone=phone).get("phone")
+    return session.get(Member, ref.member_id) if ref else None
+
+
+def repayable_loan(session, loan_id: Optional[str]) -> Optional[LoanApplication]:
+    if not loan_id:
+        return None
+    return session.query(LoanApplication).filter(
+        LoanApplication.id == loan_id,
+        LoanApplication.status.in_(REPAYABLE_LOAN_STATUSES)
+    ).first()
+
+
+def resolve_payer(session, account_ref: str, phone: Optional[str] = None) -> Tuple[Optional[Member], Optional[LoanApplication]]:
+    """Member and repayable loan for a callback.
+
+    The account reference is tried as a member number, then as a loan number
+    (or LOAN:<id>); the loan's borrower is the payer if no member matched,
+    and the paying phone is the last resort.
+    """
+    refs = lookup_references(session, account_ref=account_ref, phone=phone)
+
+    member = session.get(Member, refs["member"].member_id) if "member" in refs else None
+
+    ref = (account_ref or "").strip()
+    if ref.upper().startswith("LOAN:"):
+        loan = repayable_loan(session, ref[5:].strip())
+    else:
+        loan = None
+    if loan is None and "loan" in refs:
+        loan = repayable_loan(session, refs["loan"].loan_id)
+
+    if member is None and loan is not None:
+        member = session.get(Member, loan.member_id)
+    if member is None and "phone" in refs:
+        member = session.get(Member, refs["phone"].member_id)
+    return member, loan
+
+
+def rebuild_payment_references(connection) -> int:
+    """Recreate every reference row from members and loans; returns rows written"""
+    table = PaymentReference.__table__
+    connection.execute(table.delete())
+    now = func.now()
+    sources = [
+        select(
+            literal("member"), func.upper(func.trim(Member.member_number)), Member.id, literal(None), now,
+        ).where(Member.member_number.isnot(None), func.trim(Member.member_number) != ""),
+        select(
+            literal("phone"), Member.phone_normalized, Member.id, literal(None), now,
+        ).where(Member.phone_normalized.isnot(None), Member.phone_normalized != ""),
+        select(
+            literal("loan"), func.upper(func.trim(LoanApplication.application_number)),
+            LoanApplication.member_id, LoanApplication.id, now,
+        ).where(LoanApplication.application_number.isnot(None)),
+    ]
+    written = 0
+    for source in sources:
+        result = connection.execute(table.insert().from_select(
+            ["kind", "ref_key", "member_id", "loan_id", "updated_at"], source
+        ))
+        written += max(result.rowcount or 0, 0)
+    return written
@@ -0,0 +1,270 @@
+"""
+Loan portfolio aging snapshots.
+
+Aging buckets are computed in SQL: each active loan's earliest unpaid overdue
+instalment (falling back to next_payment_date) is classified with a CASE
+expression and the database does the GROUP BY. The nightly job
+(cron_portfolio_snapshot.py) stores one portfolio_snapshots row per branch and
+product, which trend charts read directly, plus each loan's bucket in
+portfolio_snapshot_loans for the latest day only.
+
+The aging report reads today's snapshot and applies an intraday delta: loans
+created or updated since the snapshot was taken have their snapshot bucket
+subtracted and their live bucket added. Without a snapshot for today the
+report falls back to the live aggregate.
+
+snapshot_date is the server's local calendar day while created_at (like
+updated_at) is stored in UTC; a snapshot counts for a day only if it was
+taken within that local day's UTC bounds.
+"""
+
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import case, func, literal, or_, select
+
+from models.tenant import LoanApplication, LoanInstalment, PortfolioSnapshot, PortfolioSnapshotLoan
+
+ACTIVE_LOAN_STATUSES = ["disbursed", "defaulted", "restructured"]
+
+AGING_BUCKETS = ("current", "1_30_days", "31_60_days", "61_90_days", "over_90_days")
+
+# aging bucket -> PortfolioSnapshot column prefix
+SNAPSHOT_COLUMNS = {
+    "current": "current",
+    "1_30_days": "days_1_30",
+    "31_60_days": "days_31_60",
+    "61_90_days": "days_61_90",
+    "over_90_days": "over_90",
+}
+
+PAR30_BUCKETS = ("31_60_days", "61_90_days", "over_90_days")
+PAR90_BUCKETS = ("over_90_days",)
+
+
+def _bucket_expression(overdue_date, as_of: date):
+    return case(
+        (or_(overdue_date.is_(None), overdue_date >= as_of), "current"),
+        (overdue_date >= as_of - timedelta(days=30), "1_30_days"),
+        (overdue_date >= as_of - timedelta(days=60), "31_60_days"),
+        (overdue_date >= as_of - timedelta(days=90), "61_90_days"),
+        else_="over_90_days",
+    )
+
+
+def loan_bucket_select(as_of: date, *criteria):
+    """SELECT loan id, branch, product, aging bucket and outstanding for active loans"""
+    earliest = select(
+        LoanInstalment.loan_id,
+        func.min(LoanInstalment.due_date).label("earliest_due"),
+    ).where(
+        LoanInstalment.status.in_(["pending", "partial"]),
+        LoanInstalment.due_date < as_of,
+    ).group_by(LoanInstalment.loan_id).subquery()
+
+    overdue_date = func.coalesce(earliest.c.earliest_due, LoanApplication.next_payment_date)
+    return select(
+        LoanApplication.id.label("loan_id"),
+        LoanApplication.branch_id,
+        LoanApplication.loan_product_id,
+        _bucket_expression(overdue_date, as_of).label("bucket"),
+        func.coalesce(LoanApplication.outstanding_balance, 0).label("outstanding"),
+    ).select_from(LoanApplication).outerjoin(
+        earliest, earliest.c.loan_id == LoanApplication.id
+    ).where(
+        LoanApplication.status.in_(ACTIVE_LOAN_STATUSES),
+        LoanApplication.outstanding_balance > 0,
+        *criteria,
+    )
+
+
+def _empty_summary() -> dict:
+    return {bucket: {"count": 0, "amount": Decimal("0")} for bucket in AGING_BUCKETS}
+
+
+def _accumulate(summary: dict, rows, sign: int = 1):
+    for row in rows:
+        summary[row.bucket]["count"] += sign * int(row.count or 0)
+        summary[row.bucket]["amount"] += sign * Decimal(str(row.amount or 0))
+
+
+def _grouped(session, source, branch_id: Optional[str]):
+    query = select(
+        source.c.bucket,
+        func.count().label("count"),
+        func.sum(source.c.outstanding).label("amount"),
+    )
+    if branch_id:
+        query = query.where(source.c.branch_id == branch_id)
+    return session.execute(query.group_by(source.c.bucket)).all()
+
+
+def live_aging_summary(session, as_of: date, branch_id: Optional[str] = None, *criteria) -> dict:
+    summary = _empty_summary()
+    _accumulate(summary, _grouped(session, loan_bucket_select(as_of, *criteria).subquery(), branch_id))
+    return summary
+
+
+def local_day_utc_bounds(day: date):
+    """Naive UTC datetimes at which the server's local calendar day starts and ends"""
+    def to_utc(moment: datetime) -> datetime:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return to_utc(datetime.combine(day, time.min)), to_utc(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def local_date(utc_moment: datetime) -> date:
+    """The server's local calendar day of a naive UTC datetime"""
+    return utc_moment.replace(tzinfo=timezone.utc).astimezone().date()
+
+
+def latest_snapshot_time(session, as_of: date) -> Optional[datetime]:
+    """When the snapshot for local day as_of was taken (UTC), if one was taken during that day"""
+    start, end = local_day_utc_bounds(as_of)
+    return session.query(func.max(PortfolioSnapshot.created_at)).filter(
+        PortfolioSnapshot.snapshot_date == as_of,
+        PortfolioSnapshot.created_at >= start,
+        PortfolioSnapshot.created_at < end,
+    ).scalar()
+
+
+def aging_summary(session, as_of: Optional[date] = None, branch_id: Optional[str] = None) -> dict:
+    """Aging buckets from today's snapshot plus loans changed since; live if there is no snapshot"""
+    as_of = as_of or date.today()
+    taken_at = latest_snapshot_time(session, as_of)
+    if taken_at is None:
+        return {"source": "live", "snapshot_at": None, "buckets": live_aging_summary(session, as_of, branch_id)}
+
+    summary = _empty_summary()
+    query = session.query(PortfolioSnapshot).filter(PortfolioSnapshot.snapshot_date == as_of)
+    if branch_id:
+        query = query.filter(PortfolioSnapshot.branch_id == branch_id)
+    for snap in query.all():
+        for bucket, prefix in SNAPSHOT_COLUMNS.items():
+            summary[bucket]["count"] += getattr(snap, f"{prefix}_count") or 0
+            summary[bucket]["amount"] += getattr(snap, f"{prefix}_amount") or Decimal("0")
+
+    touched = select(LoanApplication.id).where(
+        or_(LoanApplication.updated_at >= taken_at, LoanApplication.created_at >= taken_at)
+    )
+    snapshot_rows = select(
+        PortfolioSnapshotLoan.bucket,
+        PortfolioSnapshotLoan.branch_id,
+        PortfolioSnapshotLoan.outstanding,
+    ).where(
+        PortfolioSnapshotLoan.snapshot_date == as_of,
+        PortfolioSnapshotLoan.loan_id.in_(touched),
+    ).subquery()
+    _accumulate(summary, _grouped(session, snapshot_rows, branch_id), sign=-1)
+    live_rows = loan_bucket_select(as_of, LoanApplication.id.in_(touched)).subquery()
+    _accumulate(summary, _grouped(session, live_rows, branch_id))
+
+    return {"source": "snapshot", "snapshot_at": taken_at, "buckets": summary}
+
+
+def par_ratios(buckets: dict) -> dict:
+    total = sum(b["amount"] for b in buckets.values())
+
+    def ratio(names):
+        if total <= 0:
+            return 0.0
+        return round(float(sum(buckets[n]["amount"] for n in names) / total * 100), 2)
+
+    return {
+        "par1": ratio([b for b in AGING_BUCKETS if b != "current"]),
+        "par30": ratio(PAR30_BUCKETS),
+        "par90": ratio(PAR90_BUCKETS),
+    }
+
+
+def take_portfolio_snapshot(session, as_of: Optional[date] = None) -> int:
+    """Write the snapshot for as_of (replacing any earlier one that day); returns rows written"""
+    taken_at = datetime.utcnow()
+    as_of = as_of or local_date(taken_at)
+
+    session.query(PortfolioSnapshot).filter(PortfolioSnapshot.snapshot_date == as_of).delete(synchronize_session=False)
+    session.query(PortfolioSnapshotLoan).delete(synchronize_session=False)
+
+    buckets = loan_bucket_select(as_of).subquery()
+    session.execute(PortfolioSnapshotLoan.__table__.insert().from_select(
+        ["loan_id", "snapshot_date", "branch_id", "loan_product_id", "bucket", "outstanding"],
+        select(
+            buckets.c.loan_id, literal(as_of), buckets.c.branch_id,
+            buckets.c.loan_product_id, buckets.c.bucket, buckets.c.outstanding,
+        ),
+    ))
+
+    grouped = session.query(
+        PortfolioSnapshotLoan.branch_id,
+        PortfolioSnapshotLoan.loan_product_id,
+        PortfolioSnapshotLoan.bucket,
+        func.count().label("count"),
+        func.sum(PortfolioSnapshotLoan.outstanding).label("amount"),
+    ).group_by(
+        PortfolioSnapshotLoan.branch_id, PortfolioSnapshotLoan.loan_product_id, PortfolioSnapshotLoan.bucket
+    ).all()
+
+    snapshots = {}
+    for row in grouped:
+        key = (row.branch_id, row.loan_product_id)
+        snap = snapshots.get(key)
+        if snap is None:
+            snap = snapshots[key] = PortfolioSnapshot(
+                snapshot_date=as_of, branch_id=row.branch_id, loan_product_id=row.loan_product_id,
+                loan_count=0, total_outstanding=Decimal("0"), created_at=taken_at,
+                **{f"{prefix}_{field}": 0 for prefix in SNAPSHOT_COLUMNS.values() for field in ("count", "amount")},
+            )
+        prefix = SNAPSHOT_COLUMNS[row.bucket]
+        amount = Decimal(str(row.amount or 0))
+        setattr(snap, f"{prefix}_count", int(row.count))
+        setattr(snap, f"{prefix}_amount", amount)
+        snap.loan_count += int(row.count)
+        snap.total_outstanding += amount
+
+    if not snapshots:
+        # An empty portfolio still marks the day as snapshotted, with zero totals
+        snapshots[None] = PortfolioSnapshot(
+            snapshot_date=as_of, loan_count=0, total_outstanding=Decimal("0"), created_at=taken_at,
+            **{f"{prefix}_{field}": 0 for prefix in SNAPSHOT_COLUMNS.values() for field in ("count", "amount")},
+        )
+
+    session.add_all(snapshots.values())
+    session.commit()
+    return len(snapshots)
+
+
+def portfolio_trend(session, start: date, end: date, branch_id: Optional[str] = None,
+                    loan_product_id: Optional[str] = None) -> list:
+    """Per-day outstanding and PAR ratios straight from stored snapshots"""
+    columns = [func.sum(PortfolioSnapshot.total_outstanding).label("total_outstanding"),
+               func.sum(PortfolioSnapshot.loan_count).label("loan_count")]
+    for bucket, prefix in SNAPSHOT_COLUMNS.items():
+        columns.append(func.sum(getattr(PortfolioSnapshot, f"{prefix}_count")).label(f"{bucket}_count"))
+        columns.append(func.sum(getattr(PortfolioSnapshot, f"{prefix}_amount")).label(f"{bucket}_amount"))
+
+    query = session.query(PortfolioSnapshot.snapshot_date, *columns).filter(
+        PortfolioSnapshot.snapshot_date >= start,
+        PortfolioSnapshot.snapshot_date <= end,
+    )
+    if branch_id:
+        query = query.filter(PortfolioSnapshot.branch_id == branch_id)
+    if loan_product_id:
+        query = query.filter(PortfolioSnapshot.loan_product_id == loan_product_id)
+
+    points = []
+    for row in query.group_by(PortfolioSnapshot.snapshot_date).order_by(PortfolioSnapshot.snapshot_date).all():
+        buckets = {
+            bucket: {
+                "count": int(getattr(row, f"{bucket}_count") or 0),
+                "amount": Decimal(str(getattr(row, f"{bucket}_amount") or 0)),
+            }
+            for bucket in AGING_BUCKETS
+        }
+        points.append({
+            "date": row.snapshot_date,
+            "loan_count": int(row.loan_count or 0),
+            "total_outstanding": Decimal(str(row.total_outstanding or 0)),
+            "buckets": buckets,
+            **par_ratios(buckets),
+        })
+    return points
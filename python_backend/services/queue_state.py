@@ -0,0 +1,239 @@
+"""
+In-memory queue state per branch for the display board and the kiosk.
+
+Every display screen used to poll /queue-display every 3 seconds, each poll
+running several queue_tickets queries plus one Staff query per ticket being
+served, and /queue-stats ran one COUNT per service category.
+
+QueueStateService keeps, per (organization, branch), today's waiting and
+serving tickets and the last completed ones:
+
+- The first read loads them with two queries (teller names eager-loaded).
+- create, call-next and complete apply their change in memory after they
+  commit and wake the branch's subscribers.
+- Changes committed by another worker process arrive as "queue" events on
+  the tenant event bus (services/event_bus.py) and mark the branch for
+  reload.
+- Readers never see a state older than QUEUE_REFRESH_SECONDS: an older one
+  is reloaded, once per branch. This remains the safety net for events that
+  were missed while a listener reconnected.
+
+snapshot() serves the polling endpoints from memory and stream() is the
+Server-Sent Events feed the display board listens to. Every event carries
+the whole (small) board, so a slow screen only misses intermediate states.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, Tuple
+
+from sqlalchemy.orm import joinedload
+
+from models.tenant import QueueTicket
+from services.event_bus import bus as event_bus
+
+QUEUE_CATEGORIES = ("transactions", "loans", "account_opening", "inquiries")
+REFRESH_SECONDS = float(os.environ.get("QUEUE_REFRESH_SECONDS", "5"))
+KEEPALIVE_SECONDS = 15
+DISPLAY_WAITING = 10
+DISPLAY_SERVING = 10
+RECENT_COMPLETED = 5
+
+
+def _ticket(t: QueueTicket) -> dict:
+    teller = t.teller if t.teller_id else None
+    return {
+        "id": t.id,
+        "ticket_number": t.ticket_number,
+        "service_category": t.service_category,
+        "priority": t.priority or 0,
+        "counter_number": t.counter_number,
+        "teller_name": f"{teller.first_name} {teller.last_name}" if teller else None,
+        "teller_number": teller.staff_number if teller else t.counter_number,
+        "created_at": t.created_at,
+        "called_at": t.called_at,
+    }
+
+
+def _today_start() -> datetime:
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class BranchQueue:
+    def __init__(self):
+        self.waiting: Dict[str, dict] = {}
+        self.serving: Dict[str, dict] = {}
+        self.recent = deque(maxlen=RECENT_COMPLETED)
+        self.loaded_at = 0.0
+        self.version = 0
+        self.subscribers = set()
+        self.loading = threading.Lock()
+
+    def payload(self) -> dict:
+        waiting = sorted(self.waiting.values(), key=lambda t: (-t["priority"], t["created_at"] or datetime.min))
+        serving = sorted(self.serving.values(), key=lambda t: t["called_at"] or datetime.min, reverse=True)
+        counts = {}
+        for t in waiting:
+            counts[t["service_category"]] = counts.get(t["service_category"], 0) + 1
+        return {
+            "serving": [{
+                "ticket_number": t["ticket_number"],
+                "service_category": t["service_category"],
+                "counter_number": t["counter_number"],
+                "teller_name": t["teller_name"],
+                "teller_number": t["teller_number"],
+                "called_at": t["called_at"].isoformat() if t["called_at"] else None,
+            } for t in serving[:DISPLAY_SERVING]],
+            "waiting": [
+                {"ticket_number": t["ticket_number"], "service_category": t["service_category"]}
+                for t in waiting[:DISPLAY_WAITING]
+            ],
+            "waiting_counts": counts,
+            "recent_completed": [
+                {"ticket_number": t["ticket_number"], "service_category": t["service_category"]}
+                for t in self.recent
+            ],
+            "version": self.version,
+            "timestamp": datetime.now().isoformat(),
+        }
+
+
+class QueueStateService:
+    def __init__(self):
+        self._branches: Dict[Tuple[str, str], BranchQueue] = {}
+        self._lock = threading.Lock()
+
+    def _branch(self, org_id: str, branch_id: str) -> BranchQueue:
+        with self._lock:
+            return self._branches.setdefault((org_id, branch_id), BranchQueue())
+
+    def load(self, org_id: str, branch_id: str, tenant_session) -> BranchQueue:
+        """Replace a branch's state with today's tickets from the database"""
+        today_start = _today_start()
+        active = tenant_session.query(QueueTicket).options(joinedload(QueueTicket.teller)).filter(
+            QueueTicket.branch_id == branch_id,
+            QueueTicket.status.in_(("waiting", "serving")),
+            QueueTicket.created_at >= today_start,
+        ).all()
+        recent = tenant_session.query(QueueTicket).options(joinedload(QueueTicket.teller)).filter(
+            QueueTicket.branch_id == branch_id,
+            QueueTicket.status == "completed",
+            QueueTicket.created_at >= today_start,
+        ).order_by(QueueTicket.completed_at.desc()).limit(RECENT_COMPLETED).all()
+
+        branch = self._branch(org_id, branch_id)
+        with self._lock:
+            before = (set(branch.waiting), {k: v["called_at"] for k, v in branch.serving.items()}, [t["id"] for t in branch.recent])
+            branch.waiting = {t.id: _ticket(t) for t in active if t.status == "waiting"}
+            branch.serving = {t.id: _ticket(t) for t in active if t.status == "serving"}
+            branch.recent = deque((_ticket(t) for t in recent), maxlen=RECENT_COMPLETED)
+            branch.loaded_at = time.monotonic()
+            after = (set(branch.waiting), {k: v["called_at"] for k, v in branch.serving.items()}, [t["id"] for t in branch.recent])
+            changed = before != after
+            if changed:
+                branch.version += 1
+        if changed:
+            self._publish(branch)
+        return branch
+
+    def is_stale(self, org_id: str, branch_id: str) -> bool:
+        return time.monotonic() - self._branch(org_id, branch_id).loaded_at >= REFRESH_SECONDS
+
+    def snapshot(self, org_id: str, branch_id: str, open_session: Callable) -> dict:
+        """Display board payload, reloading the branch first if its state is too old"""
+        branch = self._branch(org_id, branch_id)
+        # One reader reloads; the others keep serving the current state meanwhile
+        if self.is_stale(org_id, branch_id) and branch.loading.acquire(blocking=not branch.loaded_at):
+            try:
+                if self.is_stale(org_id, branch_id):
+                    tenant_session = open_session()
+                    try:
+                        self.load(org_id, branch_id, tenant_session)
+                    finally:
+                        tenant_session.close()
+            finally:
+                branch.loading.release()
+        with self._lock:
+            return branch.payload()
+
+    def apply(self, org_id: str, branch_id: str, ticket: QueueTicket):
+        """Apply a committed ticket change (created, called, completed) to a loaded branch"""
+        branch = self._branches.get((org_id, branch_id))
+        if branch is None or not branch.loaded_at:
+            return
+        data = _ticket(ticket)
+        with self._lock:
+            branch.waiting.pop(ticket.id, None)
+            branch.serving.pop(ticket.id, None)
+            if ticket.status == "waiting":
+                branch.waiting[ticket.id] = data
+            elif ticket.status == "serving":
+                branch.serving[ticket.id] = data
+            elif ticket.status == "completed":
+                branch.recent.appendleft(data)
+            branch.version += 1
+        self._publish(branch)
+
+    def invalidate(self, org_id: str, branch_id: str):
+        """Make the next read reload a loaded branch (changed by another worker)"""
+        branch = self._branches.get((org_id, branch_id))
+        if branch is None or not branch.loaded_at:
+            return
+        with self._lock:
+            branch.loaded_at = min(branch.loaded_at, time.monotonic() - REFRESH_SECONDS)
+        self._publish(branch)
+
+    def _publish(self, branch: BranchQueue):
+        with self._lock:
+            subscribers = list(branch.subscribers)
+        for loop, wakeup in subscribers:
+            loop.call_soon_threadsafe(wakeup.set)
+
+    async def stream(self, org_id: str, branch_id: str, open_session: Callable, is_disconnected: Callable):
+        """Server-Sent Events: the board now and after every change, with keepalive comments"""
+        from starlette.concurrency import run_in_threadpool
+
+        branch = self._branch(org_id, branch_id)
+        subscriber = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            branch.subscribers.add(subscriber)
+        try:
+            payload = await run_in_threadpool(self.snapshot, org_id, branch_id, open_session)
+            sent = payload["version"]
+            yield f"event: queue\ndata: {json.dumps(payload)}\n\n"
+            idle = 0.0
+            wakeup = subscriber[1]
+            while not await is_disconnected():
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=REFRESH_SECONDS)
+                except asyncio.TimeoutError:
+                    idle += REFRESH_SECONDS
+                wakeup.clear()
+                payload = await run_in_threadpool(self.snapshot, org_id, branch_id, open_session)
+                if payload["version"] != sent:
+                    sent = payload["version"]
+                    idle = 0.0
+                    yield f"event: queue\ndata: {json.dumps(payload)}\n\n"
+                elif idle >= KEEPALIVE_SECONDS:
+                    idle = 0.0
+                    yield ": keepalive\n\n"
+        finally:
+            with self._lock:
+                branch.subscribers.discard(subscriber)
+
+
+queue_state = QueueStateService()
+
+
+def _on_queue_event(org_id, event_type, data, local):
+    # This worker's own changes were already applied by apply()
+    if not local and data.get("branch_id"):
+        queue_state.invalidate(org_id, data["branch_id"])
+
+
+event_bus.on(("queue",), _on_queue_event)
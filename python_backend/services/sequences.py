@@ -0,0 +1,56 @@
+"""
+Named number sequences backed by the sequence_counters table.
+
+Member numbers used to be found by loading every member number of the
+branch and taking the max, and branch/staff/loan codes by max()/count()
+over their tables: each allocation scanned a growing table, and two
+concurrent requests could compute the same number.
+
+allocate() is one UPDATE ... SET value = value + n RETURNING value on the
+counter row. The row lock is held until the caller's transaction ends, so
+concurrent allocations queue behind each other instead of colliding, and a
+rolled-back allocation releases its numbers again. The first allocation of
+a sequence seeds the counter from the existing data (the old scan, run
+once); if two transactions seed at the same time the insert conflict makes
+the loser fall back to the increment.
+
+Pass count > 1 to reserve a block in one statement (bulk imports).
+"""
+
+from datetime import datetime
+from typing import Callable, Optional
+
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models.tenant import SequenceCounter
+
+_dialect_inserts = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def allocate(session, name: str, count: int = 1, seed: Optional[Callable[[], int]] = None) -> int:
+    """Reserve count numbers of a sequence and return the first.
+
+    seed() gives the last number already in use and is only called when the
+    sequence has no counter yet.
+    """
+    if count < 1:
+        raise ValueError("count must be positive")
+    table = SequenceCounter.__table__
+    last = session.execute(
+        update(table).where(table.c.name == name)
+        .values(value=table.c.value + count, updated_at=datetime.utcnow())
+        .returning(table.c.value)
+    ).scalar()
+    if last is None:
+        start = seed() if seed else 0
+        insert = _dialect_inserts[session.get_bind().dialect.name](table)
+        last = session.execute(
+            insert.values(name=name, value=start + count, updated_at=datetime.utcnow())
+            .on_conflict_do_update(
+                index_elements=[table.c.name],
+                set_={"value": table.c.value + count, "updated_at": datetime.utcnow()},
+            )
+            .returning(table.c.value)
+        ).scalar()
+    return last - count + 1
@@ -0,0 +1,387 @@
+"""
+Background renderer and on-disk cache for mobile member statements.
+
+Rendered PDFs are stored under uploads/statements/<org_id>/<member_id>/ and
+named after a hash of (member, account type, period, last transaction id), so
+a statement whose period has no new activity is served straight from disk.
+
+Next to each PDF we keep a small JSON state file per (member, account type,
+period) holding the opening balance, the rendered rows and the last
+transaction included. When new transactions land in the period, only those
+are read from the database and appended before the PDF is rebuilt.
+
+Savings, shares and deposits opening balances come from the month-end
+member balance snapshots (services/balance_snapshots.py) plus at most one
+month of transactions, and each row moves the balance by its recorded
+balance_before -> balance_after. The "all" statement follows the sum of
+those three accounts; loan rows are listed without moving it.
+
+Eviction runs after renders (throttled) and drops files older than
+STATEMENT_CACHE_MAX_AGE_DAYS, then the least recently used files until the
+cache is below STATEMENT_CACHE_MAX_BYTES. Files claimed for a download
+(claim_cached_statement) or written within the last EVICTION_GRACE_SECONDS
+are never evicted, so a response never loses the file it is serving.
+"""
+
+import io
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import func, case, and_, or_
+
+logger = logging.getLogger(__name__)
+
+STATEMENT_CACHE_DIR = Path(__file__).parent.parent / "uploads" / "statements"
+STATEMENT_CACHE_MAX_AGE_DAYS = int(os.environ.get("STATEMENT_CACHE_MAX_AGE_DAYS", "30"))
+STATEMENT_CACHE_MAX_BYTES = int(os.environ.get("STATEMENT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+STATEMENT_RENDER_WORKERS = int(os.environ.get("STATEMENT_RENDER_WORKERS", "2"))
+EVICTION_INTERVAL_SECONDS = 600
+EVICTION_GRACE_SECONDS = 300
+
+CREDIT_TYPES = ("credit", "deposit", "loan_disbursement")
+STATE_VERSION = 2
+
+_executor = ThreadPoolExecutor(max_workers=STATEMENT_RENDER_WORKERS, thread_name_prefix="statement-render")
+_inflight: dict = {}
+_inflight_lock = threading.Lock()
+_last_eviction = 0.0
+# Held while eviction deletes files and while a download claims one
+_eviction_lock = threading.Lock()
+
+
+def _period_key(member_id: str, account_type: str, start_date: datetime, end_date: datetime) -> str:
+    raw = f"{member_id}|{account_type}|{start_date.isoformat()}|{end_date.isoformat()}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def _content_key(period_key: str, last_txn_id: Optional[str]) -> str:
+    return hashlib.sha256(f"{period_key}|{last_txn_id or 'empty'}|v{STATE_VERSION}".encode()).hexdigest()[:32]
+
+
+def _member_dir(org_id: str, member_id: str) -> Path:
+    return STATEMENT_CACHE_DIR / org_id / member_id
+
+
+def _period_filter(query, member_id: str, account_type: str):
+    from models.tenant import Transaction
+    query = query.filter(Transaction.member_id == member_id)
+    if account_type != "all":
+        query = query.filter(Transaction.account_type == account_type)
+    return query
+
+
+def _signed_amount():
+    from models.tenant import Transaction
+    return case(
+        (func.lower(Transaction.transaction_type).in_(CREDIT_TYPES), Transaction.amount),
+        else_=-Transaction.amount,
+    )
+
+
+def get_last_transaction_id(ts, member_id: str, account_type: str, start_date: datetime, end_date: datetime) -> Optional[str]:
+    """Id of the newest transaction in the period, used as the cache version"""
+    from models.tenant import Transaction
+    row = _period_filter(ts.query(Transaction.id), member_id, account_type).filter(
+        Transaction.created_at >= start_date,
+        Transaction.created_at <= end_date,
+    ).order_by(Transaction.created_at.desc(), Transaction.id.desc()).first()
+    return row[0] if row else None
+
+
+def _opening_balance(ts, member_id: str, account_type: str, start_date: datetime) -> float:
+    from models.tenant import Transaction
+    from services.balance_snapshots import MEMBER_ACCOUNTS, balance_at
+
+    if account_type in MEMBER_ACCOUNTS:
+        return float(balance_at(ts, member_id, account_type, start_date) or 0)
+    if account_type == "all":
+        return float(sum(balance_at(ts, member_id, account, start_date) or 0 for account in MEMBER_ACCOUNTS))
+
+    total = _period_filter(ts.query(func.coalesce(func.sum(_signed_amount()), 0)), member_id, account_type).filter(
+        Transaction.created_at < start_date
+    ).scalar()
+    return float(total or 0)
+
+
+def _balance_change(txn, account_type: str) -> float:
+    from services.balance_snapshots import MEMBER_ACCOUNTS
+
+    if txn.account_type in MEMBER_ACCOUNTS:
+        if txn.balance_after is not None and txn.balance_before is not None:
+            return float(txn.balance_after - txn.balance_before)
+    elif account_type == "all":
+        return 0.0
+    amount = float(txn.amount or 0)
+    return amount if (txn.transaction_type or "").lower() in CREDIT_TYPES else -amount
+
+
+def _row(txn, balance: float) -> list:
+    amount = float(txn.amount or 0)
+    return [
+        txn.created_at.strftime("%d/%m/%Y") if txn.created_at else "",
+        (txn.description or "")[:50],
+        (txn.transaction_type or "").replace("_", " ").title(),
+        f"{amount:,.2f}",
+        f"{balance:,.2f}",
+    ]
+
+
+def _load_state(path: Path) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return state if state.get("version") == STATE_VERSION else None
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _build_state(ts, member_id: str, account_type: str, start_date: datetime, end_date: datetime, state: Optional[dict]) -> dict:
+    """Extend a cached state with transactions newer than its last row, or build it from scratch"""
+    from models.tenant import Transaction
+
+    query = _period_filter(
+        ts.query(Transaction.id, Transaction.created_at, Transaction.description,
+                 Transaction.transaction_type, Transaction.account_type, Transaction.amount,
+                 Transaction.balance_before, Transaction.balance_after),
+        member_id, account_type,
+    ).filter(
+        Transaction.created_at >= start_date,
+        Transaction.created_at <= end_date,
+    )
+
+    if state and state.get("last_created_at"):
+        last_created_at = datetime.fromisoformat(state["last_created_at"])
+        query = query.filter(or_(
+            Transaction.created_at > last_created_at,
+            and_(Transaction.created_at == last_created_at, Transaction.id > state["last_txn_id"]),
+        ))
+    else:
+        opening = _opening_balance(ts, member_id, account_type, start_date)
+        state = {
+            "version": STATE_VERSION,
+            "opening_balance": opening,
+            "closing_balance": opening,
+            "last_txn_id": None,
+            "last_created_at": None,
+            "rows": [],
+        }
+
+    balance = state["closing_balance"]
+    for txn in query.order_by(Transaction.created_at, Transaction.id).yield_per(500):
+        balance += _balance_change(txn, account_type)
+        state["rows"].append(_row(txn, balance))
+        state["last_txn_id"] = txn.id
+        state["last_created_at"] = txn.created_at.isoformat() if txn.created_at else None
+
+    state["closing_balance"] = balance
+    return state
+
+
+def build_statement_pdf(member_name: str, state: dict, start_date: datetime, end_date: datetime, account_type: str) -> bytes:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Table, Paragraph, Spacer
+    from reportlab.lib.units import cm
+
+    styles = _statement_styles()
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, topMargin=2*cm, bottomMargin=2*cm)
+    story = []
+
+    sub_style = styles["sub"]
+    story.append(Paragraph("Account Statement", styles["title"]))
+    story.append(Paragraph(f"Member: {member_name}", sub_style))
+    story.append(Paragraph(f"Account Type: {account_type.replace('_', ' ').title()}", sub_style))
+    story.append(Paragraph(f"Period: {start_date.strftime('%d %b %Y')} — {end_date.strftime('%d %b %Y')}", sub_style))
+    story.append(Paragraph(f"Generated: {datetime.utcnow().strftime('%d %b %Y %H:%M UTC')}", sub_style))
+    story.append(Spacer(1, 0.5*cm))
+
+    data = [["Date", "Description", "Type", "Amount", "Balance"]]
+    data.append(["", "Opening balance", "", "", f"{state['opening_balance']:,.2f}"])
+    data.extend(state["rows"])
+    if not state["rows"]:
+        data.append(["No transactions found in this period", "", "", "", ""])
+
+    table = Table(data, colWidths=[3*cm, 7*cm, 4*cm, 3*cm, 3*cm], repeatRows=1)
+    table.setStyle(styles["table"])
+    story.append(table)
+
+    doc.build(story)
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=1)
+def _statement_styles() -> dict:
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import TableStyle
+
+    base = getSampleStyleSheet()
+    return {
+        "title": ParagraphStyle("Title", parent=base["Heading1"], fontSize=16, spaceAfter=6),
+        "sub": ParagraphStyle("Sub", parent=base["Normal"], fontSize=10, textColor=colors.grey),
+        "table": TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#1a56db")),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("FONTSIZE", (0, 0), (-1, 0), 9),
+            ("FONTSIZE", (0, 1), (-1, -1), 8),
+            ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.white, colors.HexColor("#f9fafb")]),
+            ("GRID", (0, 0), (-1, -1), 0.25, colors.HexColor("#e5e7eb")),
+            ("ALIGN", (3, 0), (-1, -1), "RIGHT"),
+            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+            ("TOPPADDING", (0, 0), (-1, -1), 4),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
+        ]),
+    }
+
+
+def cached_statement_path(org_id: str, member_id: str, account_type: str,
+                          start_date: datetime, end_date: datetime, last_txn_id: Optional[str]) -> Path:
+    period_key = _period_key(member_id, account_type, start_date, end_date)
+    return _member_dir(org_id, member_id) / f"{_content_key(period_key, last_txn_id)}.pdf"
+
+
+def claim_cached_statement(pdf_path: Path) -> bool:
+    """Mark a cached PDF as just used so eviction spares it while it is served; False if it is not cached"""
+    with _eviction_lock:
+        try:
+            os.utime(pdf_path)
+        except OSError:
+            return False
+    return True
+
+
+def render_statement(tenant_ctx, org_id: str, member_id: str, member_name: str, account_type: str,
+                     start_date: datetime, end_date: datetime) -> Path:
+    """Render (or reuse) the statement PDF for the current state of the period and return its path"""
+    ts = tenant_ctx.create_session()
+    try:
+        last_txn_id = get_last_transaction_id(ts, member_id, account_type, start_date, end_date)
+        pdf_path = cached_statement_path(org_id, member_id, account_type, start_date, end_date, last_txn_id)
+        if claim_cached_statement(pdf_path):
+            return pdf_path
+
+        member_dir = _member_dir(org_id, member_id)
+        member_dir.mkdir(parents=True, exist_ok=True)
+        period_key = _period_key(member_id, account_type, start_date, end_date)
+        state_path = member_dir / f"{period_key}.json"
+
+        state = _load_state(state_path)
+        state = _build_state(ts, member_id, account_type, start_date, end_date, state)
+    finally:
+        ts.close()
+
+    # Older renders of this period are superseded by the new one
+    previous = state.get("pdf_file")
+    state["pdf_file"] = pdf_path.name
+
+    pdf_bytes = build_statement_pdf(member_name, state, start_date, end_date, account_type)
+    _write_atomic(pdf_path, pdf_bytes)
+    _write_atomic(state_path, json.dumps(state).encode())
+
+    if previous and previous != pdf_path.name:
+        with _eviction_lock:
+            _unlink_unless_recent(member_dir / previous, time.time() - EVICTION_GRACE_SECONDS)
+
+    _maybe_evict()
+    return pdf_path
+
+
+def submit_statement_render(tenant_ctx, org_id: str, member_id: str, member_name: str, account_type: str,
+                            start_date: datetime, end_date: datetime) -> Future:
+    """Queue a render on the background pool; identical in-flight requests share one future"""
+    key = (org_id, _period_key(member_id, account_type, start_date, end_date))
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is not None and not future.done():
+            return future
+        future = _executor.submit(
+            render_statement, tenant_ctx, org_id, member_id, member_name, account_type, start_date, end_date
+        )
+        _inflight[key] = future
+
+    def _cleanup(f, key=key):
+        with _inflight_lock:
+            if _inflight.get(key) is f:
+                del _inflight[key]
+        if f.exception():
+            logger.error(f"Statement render failed for {key}: {f.exception()}")
+
+    future.add_done_callback(_cleanup)
+    return future
+
+
+def _unlink_unless_recent(path: Path, grace_cutoff: float) -> bool:
+    """Delete path unless it was used after grace_cutoff (it may be being served); call under _eviction_lock"""
+    try:
+        if path.stat().st_mtime >= grace_cutoff:
+            return False
+        path.unlink()
+        return True
+    except OSError:
+        return False
+
+
+def evict_statement_cache(max_age_days: int = STATEMENT_CACHE_MAX_AGE_DAYS,
+                          max_bytes: int = STATEMENT_CACHE_MAX_BYTES) -> int:
+    """Delete expired cache files, then least recently used ones until under the size cap"""
+    if not STATEMENT_CACHE_DIR.exists():
+        return 0
+
+    with _eviction_lock:
+        grace_cutoff = time.time() - EVICTION_GRACE_SECONDS
+        cutoff = time.time() - max_age_days * 86400
+        removed = 0
+        files = []
+        for path in STATEMENT_CACHE_DIR.rglob("*"):
+            if not path.is_file():
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if stat.st_mtime < cutoff:
+                if _unlink_unless_recent(path, grace_cutoff):
+                    removed += 1
+                    continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        if total > max_bytes:
+            for mtime, size, path in sorted(files):
+                if total <= max_bytes:
+                    break
+                if _unlink_unless_recent(path, grace_cutoff):
+                    removed += 1
+                    total -= size
+    return removed
+
+
+def _maybe_evict():
+    global _last_eviction
+    now = time.time()
+    if now - _last_eviction < EVICTION_INTERVAL_SECONDS:
+        return
+    _last_eviction = now
+    try:
+        removed = evict_statement_cache()
+        if removed:
+            logger.info(f"Statement cache eviction removed {removed} file(s)")
+    except Exception as e:
+        logger.error(f"Statement cache eviction failed: {e}")
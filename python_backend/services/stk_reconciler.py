@@ -0,0 +1,258 @@
+"""
+Server-side reconciliation of STK pushes.
+
+Clients used to confirm STK payments by polling the stk-query endpoint,
+which made a Daraja STK Query round trip (and held a tenant session) on
+every poll. Now every accepted push is recorded in the master
+stk_push_requests table (models.master.StkPushRequest) and a background
+reconciler resolves it:
+
+- Due requests are claimed in batches with FOR UPDATE SKIP LOCKED, so
+  several app processes can share the work.
+- A request whose mpesa_payments record is no longer pending (the STK
+  callback got there first) is resolved without calling Safaricom.
+- Otherwise Daraja is queried through services.daraja, globally rate
+  limited to MPESA_STK_QUERY_RATE queries per second, and the result is
+  applied with routes.mpesa.apply_stk_query_result, which only touches a
+  still-pending record and is therefore idempotent.
+- Requests that stay pending are retried on a backoff schedule and expire
+  after EXPIRE_AFTER; the payment record is left pending for manual credit.
+
+Clients read the recorded status with the stk-status endpoint, which is a
+single indexed lookup.
+"""
+
+import asyncio
+import os
+import threading
+import time
+import traceback
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from models.master import Organization, StkPushRequest
+
+FIRST_QUERY_DELAY = 20
+BACKOFF_SECONDS = (15, 30, 60, 120, 300)
+EXPIRE_AFTER = timedelta(minutes=30)
+LEASE = timedelta(minutes=2)
+BATCH_SIZE = 100
+SWEEP_SECONDS = 5.0
+DEFAULT_QUERY_RATE = 5.0
+
+
+@dataclass
+class PendingStk:
+    id: str
+    organization_id: str
+    checkout_request_id: str
+
+
+@dataclass
+class Outcome:
+    id: str
+    resolved: bool
+    result_code: Optional[str] = None
+    error: Optional[str] = None
+
+
+def next_query_delay(attempts: int) -> int:
+    return BACKOFF_SECONDS[min(attempts, len(BACKOFF_SECONDS) - 1)]
+
+
+def track_stk_push(db, org_id: str, checkout_request_id: str) -> bool:
+    """Start reconciling an accepted STK push; returns False if it is already tracked"""
+    db.add(StkPushRequest(
+        organization_id=org_id,
+        checkout_request_id=checkout_request_id,
+        next_query_at=datetime.utcnow() + timedelta(seconds=FIRST_QUERY_DELAY),
+    ))
+    try:
+        db.commit()
+        return True
+    except IntegrityError:
+        db.rollback()
+        return False
+
+
+def register_stk_push(org_id: str, checkout_request_id: str):
+    """track_stk_push on a short-lived master session (for callers without one)"""
+    from models.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        track_stk_push(db, org_id, checkout_request_id)
+    except Exception as e:
+        print(f"[STK Reconciler] Could not track {checkout_request_id}: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def claim_due(db, limit: int = BATCH_SIZE) -> List[PendingStk]:
+    now = datetime.utcnow()
+    rows = db.query(StkPushRequest).filter(
+        StkPushRequest.status == "pending",
+        StkPushRequest.next_query_at <= now,
+    ).order_by(StkPushRequest.next_query_at).limit(limit).with_for_update(skip_locked=True).all()
+    claimed = [PendingStk(r.id, r.organization_id, r.checkout_request_id) for r in rows]
+    for row in rows:
+        row.next_query_at = now + LEASE
+    db.commit()
+    return claimed
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across every coroutine sharing it"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        at = max(now, self._next)
+        self._next = at + self.interval
+        if at > now:
+            await asyncio.sleep(at - now)
+
+
+async def reconcile_org(connection_string: str, items: List[PendingStk], limiter: RateLimiter) -> List[Outcome]:
+    from services.tenant_context import TenantContext
+    from models.tenant import MpesaPayment
+    from routes.mpesa import apply_stk_query_result, query_stk_push_status
+
+    outcomes = []
+    tenant_ctx = TenantContext(connection_string)
+    tenant_session = tenant_ctx.create_session()
+    try:
+        for item in items:
+            record = tenant_session.query(MpesaPayment.status).filter(
+                MpesaPayment.bill_ref_number == item.checkout_request_id
+            ).first()
+            tenant_session.rollback()
+            if record is None:
+                outcomes.append(Outcome(item.id, False, error="No payment record yet"))
+                continue
+            if record.status != "pending":
+                outcomes.append(Outcome(item.id, True, result_code=record.status))
+                continue
+
+            await limiter.wait()
+            try:
+                result = await query_stk_push_status(tenant_session, item.checkout_request_id)
+                applied = apply_stk_query_result(tenant_session, item.checkout_request_id, result)
+                tenant_session.rollback()
+            except Exception as e:
+                tenant_session.rollback()
+                outcomes.append(Outcome(item.id, False, error=f"{type(e).__name__}: {getattr(e, 'detail', e)}"))
+                continue
+            code = result.get("ResultCode", result.get("errorCode"))
+            outcomes.append(Outcome(
+                item.id, applied["status"] != "pending",
+                result_code=str(code) if code is not None else None,
+                error=None if applied["status"] != "pending" else applied.get("message"),
+            ))
+    finally:
+        tenant_session.close()
+        tenant_ctx.close()
+    return outcomes
+
+
+def record_outcomes(db, outcomes: List[Outcome]):
+    now = datetime.utcnow()
+    rows = {r.id: r for r in db.query(StkPushRequest).filter(StkPushRequest.id.in_([o.id for o in outcomes])).all()}
+    for outcome in outcomes:
+        row = rows.get(outcome.id)
+        if row is None or row.status != "pending":
+            continue
+        row.attempts = (row.attempts or 0) + 1
+        row.last_result_code = outcome.result_code
+        row.last_error = (outcome.error or "")[:500] or None
+        if outcome.resolved:
+            row.status = "resolved"
+            row.resolved_at = now
+        elif now - row.created_at >= EXPIRE_AFTER:
+            row.status = "expired"
+            row.resolved_at = now
+        else:
+            row.next_query_at = now + timedelta(seconds=next_query_delay(row.attempts - 1))
+    db.commit()
+
+
+async def sweep(db, limiter: RateLimiter, limit: int = BATCH_SIZE) -> int:
+    """Claim due requests, reconcile them per organization and record the outcomes; returns how many"""
+    claimed = claim_due(db, limit)
+    if not claimed:
+        return 0
+
+    by_org: Dict[str, List[PendingStk]] = defaultdict(list)
+    for item in claimed:
+        by_org[item.organization_id].append(item)
+    orgs = db.query(Organization.id, Organization.connection_string).filter(Organization.id.in_(list(by_org))).all()
+    connection_strings = {org.id: org.connection_string for org in orgs}
+
+    outcomes = []
+    for org_id, items in by_org.items():
+        if not connection_strings.get(org_id):
+            outcomes.extend(Outcome(i.id, False, error="Organization has no tenant database") for i in items)
+            continue
+        try:
+            outcomes.extend(await reconcile_org(connection_strings[org_id], items, limiter))
+        except Exception as e:
+            traceback.print_exc()
+            outcomes.extend(Outcome(i.id, False, error=f"{type(e).__name__}: {e}") for i in items)
+    record_outcomes(db, outcomes)
+    return len(claimed)
+
+
+class StkReconciler:
+    def __init__(self, rate: float):
+        self.limiter = RateLimiter(rate)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        from models.database import SessionLocal
+
+        loop = asyncio.new_event_loop()
+        try:
+            while not self._stop.is_set():
+                db = SessionLocal()
+                processed = 0
+                try:
+                    processed = loop.run_until_complete(sweep(db, self.limiter))
+                except Exception as e:
+                    print(f"[STK Reconciler] Sweep error: {e}")
+                    db.rollback()
+                finally:
+                    db.close()
+                if processed < BATCH_SIZE:
+                    self._stop.wait(SWEEP_SECONDS)
+        finally:
+            from services.daraja import gateway
+            loop.run_until_complete(gateway.aclose())
+            loop.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stk-reconciler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=SWEEP_SECONDS * 2)
+
+
+def start_stk_reconciler() -> Optional[StkReconciler]:
+    """Start the reconciler thread (MPESA_STK_QUERY_RATE queries/second, default 5; 0 disables it in this process)"""
+    rate = float(os.environ.get("MPESA_STK_QUERY_RATE", str(DEFAULT_QUERY_RATE)))
+    if rate <= 0:
+        return None
+    reconciler = StkReconciler(rate)
+    reconciler.start()
+    return reconciler
@@ -1,10 +1,16 @@
+import asyncio
+import threading
+from contextvars import ContextVar
+from typing import Dict, Optional
+
 from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from models.master import Organization, OrganizationMember
 from models.tenant import TenantBase
+from services.event_bus import bus as event_bus
 
 _migrated_tenants = set()
-_migration_version = 35  # Increment to force re-migration
+_migration_version = 51  # Increment to force re-migration
 
 def _get_db_migration_version(engine):
     """Check the migration version stored in the tenant database"""
@@ -963,28 +969,109 @@ def run_tenant_schema_migration(engine):
         # v35 (continued): Soft loan support
         conn.execute(text("ALTER TABLE loan_applications ADD COLUMN IF NOT EXISTS is_soft_loan BOOLEAN DEFAULT FALSE"))
 
+        # v36: Per-payslip status for the bulk payslip email pipeline
+        add_column_if_not_exists(conn, "payslips", "email_status", "VARCHAR(20)")
+        add_column_if_not_exists(conn, "payslips", "email_error", "TEXT")
+
+        # v37: export_jobs table is created by metadata.create_all
+
+        # v38: Normalized member search keys, trigram and prefix indexes
+        add_column_if_not_exists(conn, "members", "search_text", "TEXT")
+        add_column_if_not_exists(conn, "members", "phone_normalized", "VARCHAR(20)")
+        conn.execute(text(r'''
+            UPDATE members SET
+                search_text = lower(concat_ws(' ',
+                    NULLIF(trim(first_name), ''), NULLIF(trim(middle_name), ''), NULLIF(trim(last_name), ''),
+                    NULLIF(trim(member_number), ''), NULLIF(trim(id_number), ''),
+                    NULLIF(trim(email), ''), NULLIF(trim(phone), ''))),
+                phone_normalized = NULLIF(right(regexp_replace(coalesce(phone, ''), '\D', '', 'g'), 9), '')
+            WHERE search_text IS NULL
+        '''))
+        try:
+            conn.execute(text("SAVEPOINT trgm_sp"))
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_members_search_trgm ON members USING gin (search_text gin_trgm_ops)"))
+            conn.execute(text("RELEASE SAVEPOINT trgm_sp"))
+        except Exception as e:
+            conn.execute(text("ROLLBACK TO SAVEPOINT trgm_sp"))
+            print(f"Migration warning: pg_trgm unavailable, member search falls back to LIKE: {e}")
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_members_number_prefix ON members (lower(member_number) text_pattern_ops)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_members_phone_norm ON members (phone_normalized text_pattern_ops)"))
+
+        # v39: (created_at, id) indexes backing keyset pagination on the large lists
+        for table in ("transactions", "members", "loan_applications", "audit_logs"):
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{table}_created_id ON {table} (created_at, id)"))
+
+        # v40: Denormalized member branch on loans and transactions for single-table branch filters
+        from services.branch_scope import backfill_branch_ids
+        for table in ("loan_applications", "transactions"):
+            add_column_if_not_exists(conn, table, "branch_id", "VARCHAR REFERENCES branches(id)")
+        backfill_branch_ids(conn)
+        for table in ("loan_applications", "transactions"):
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{table}_branch_created ON {table} (branch_id, created_at)"))
+
+        # v41: Loan updated_at for intraday portfolio deltas; snapshot tables come from metadata.create_all
+        add_column_if_not_exists(conn, "loan_applications", "updated_at", "TIMESTAMP")
+        conn.execute(text("UPDATE loan_applications SET updated_at = COALESCE(created_at, NOW()) WHERE updated_at IS NULL"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_loan_applications_updated_at ON loan_applications (updated_at)"))
+
+        # v42: Delinquency engine ages open defaults from their oldest due date; job_watermarks via create_all
+        add_column_if_not_exists(conn, "loan_defaults", "oldest_due_date", "DATE")
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_loan_defaults_oldest_due_date ON loan_defaults (oldest_due_date)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_loan_instalments_due_status ON loan_instalments (due_date, status)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_loan_repayments_created ON loan_repayments (created_at)"))
+
+        # v43: payment_references (created by metadata.create_all) rebuilt from members and loans
+        from services.payment_reference import rebuild_payment_references
+        rebuild_payment_references(conn)
+
+        # v44: STK status reads and reconciliation look payments up by CheckoutRequestID
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_mpesa_payments_bill_ref_number ON mpesa_payments (bill_ref_number)"))
+
+        # v45: gl_balance_deltas (delta balance mode) is created by metadata.create_all
+
+        # v46: Balance-as-of reads seek a member account's latest transaction; member_balance_snapshots via create_all
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_transactions_member_account_created ON transactions (member_id, account_type, created_at)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_transactions_created ON transactions (created_at)"))
+
+        # v47: Bounded audit views (staff activity, entity trail); audit_log_daily and audit_log_archives via create_all
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_audit_logs_staff_created ON audit_logs (staff_id, created_at)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_audit_logs_entity ON audit_logs (entity_type, entity_id)"))
+
+        # v48: Queue state loads and call-next scan a branch's open tickets
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_queue_tickets_branch_status ON queue_tickets (branch_id, status, created_at)"))
+
+        # v49: Daily cash position reads a day's floats and each vault's balance at a date; cash_position_snapshots via create_all
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_teller_floats_date_branch ON teller_floats (date, branch_id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_vault_transactions_vault_created ON vault_transactions (vault_id, created_at)"))
+
+        # v50: Bulk payslip email jobs record when each payslip was queued, so stuck ones can be re-queued
+        add_column_if_not_exists(conn, "payslips", "email_queued_at", "TIMESTAMP")
+
+        # v51: Export jobs heartbeat while a worker holds them; dedupe and cleanup go by the heartbeat
+        add_column_if_not_exists(conn, "export_jobs", "heartbeat_at", "TIMESTAMP")
+
         conn.commit()
     
     try:
         from sqlalchemy.orm import Session as OrmSession
-        from models.tenant import LoanApplication, LoanProduct, LoanInstalment
+        from models.tenant import LoanApplication, LoanInstalment
         session = OrmSession(bind=engine)
         
-        disbursed_loans = session.query(LoanApplication).filter(
-            LoanApplication.status.in_(["disbursed", "paid"])
+        from sqlalchemy import select
+        from sqlalchemy.orm import joinedload
+        from services.instalment_service import backfill_instalments
+        
+        loans_without_schedule = session.query(LoanApplication).options(
+            joinedload(LoanApplication.loan_product)
+        ).filter(
+            LoanApplication.status.in_(["disbursed", "paid"]),
+            ~LoanApplication.id.in_(select(LoanInstalment.loan_id))
         ).all()
         
-        for loan in disbursed_loans:
-            existing = session.query(LoanInstalment).filter(
-                LoanInstalment.loan_id == str(loan.id)
-            ).count()
-            if existing == 0:
-                product = session.query(LoanProduct).filter(
-                    LoanProduct.id == loan.loan_product_id
-                ).first()
-                if product:
-                    from services.instalment_service import backfill_instalments_for_loan
-                    backfill_instalments_for_loan(session, loan, product)
+        backfill_instalments(session, [
+            (loan, loan.loan_product) for loan in loans_without_schedule if loan.loan_product
+        ])
         
         session.commit()
         session.close()
@@ -1044,7 +1131,10 @@ def _get_cached_engine(connection_string: str):
 def _get_cached_session_factory(connection_string: str):
     if connection_string not in _session_factory_cache:
         engine = _get_cached_engine(connection_string)
-        _session_factory_cache[connection_string] = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        # tenant_db tells the event bus (services/event_bus.py) which tenant a session's events belong to
+        _session_factory_cache[connection_string] = sessionmaker(
+            autocommit=False, autoflush=False, bind=engine, info={"tenant_db": connection_string}
+        )
     return _session_factory_cache[connection_string]
 
 class TenantContext:
@@ -1100,11 +1190,140 @@ class TenantContext:
             session.close()
     
     def create_session(self):
+        uow = current_unit_of_work()
+        if uow is not None:
+            return uow.lend(self.connection_string)
         return self.SessionLocal()
     
     def close(self):
         pass
 
+
+class RequestSession(Session):
+    """Tenant session a TenantUnitOfWork lends to everything in one request.
+
+    close() from a borrower only ends its borrow; the session really closes
+    (its connection goes back to the pool) when no borrower is left and auth
+    has not pinned it, and in any case when the request ends.
+    """
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self.borrowers = 0
+        self.pinned = False
+
+    def pin(self):
+        """Keep the session open until the request ends (auth's staff object lives in it)"""
+        if self.borrowers:
+            self.borrowers -= 1
+        self.pinned = True
+
+    def close(self):
+        if self.borrowers:
+            self.borrowers -= 1
+        if not self.borrowers and not self.pinned:
+            super().close()
+
+    def end(self):
+        self.borrowers = 0
+        self.pinned = False
+        super().close()
+
+
+class TenantUnitOfWork:
+    """The tenant database work of one API request (see tenant_unit_of_work).
+
+    Resolves each organization's tenant database once and lends one session
+    per tenant to auth, permission checks and the handler, where each used
+    to look the organization up again and open a session of its own.
+    """
+
+    def __init__(self):
+        self.connection_strings: Dict[str, str] = {}  # org_id -> tenant database
+        self.sessions: Dict[str, RequestSession] = {}
+        self.closed = False
+        self._owner = _current_task()
+        self._lock = threading.Lock()
+
+    def lends_here(self) -> bool:
+        # Tasks spawned by the handler inherit the context but outlive the request
+        if self.closed:
+            return False
+        task = _current_task()
+        return task is None or task is self._owner
+
+    def lend(self, connection_string: str) -> RequestSession:
+        with self._lock:
+            session = self.sessions.get(connection_string)
+            if session is None:
+                session = RequestSession(**_get_cached_session_factory(connection_string).kw)
+                self.sessions[connection_string] = session
+            session.borrowers += 1
+            return session
+
+    def close(self):
+        self.closed = True
+        with self._lock:
+            sessions, self.sessions = list(self.sessions.values()), {}
+        for session in sessions:
+            try:
+                session.end()
+            except Exception as e:
+                print(f"Tenant session close error: {e}")
+
+
+_unit_of_work: ContextVar[Optional[TenantUnitOfWork]] = ContextVar("tenant_unit_of_work", default=None)
+
+
+def _current_task():
+    try:
+        return asyncio.current_task()
+    except RuntimeError:
+        return None  # a threadpool thread running a sync handler or dependency
+
+
+def current_unit_of_work() -> Optional[TenantUnitOfWork]:
+    uow = _unit_of_work.get()
+    return uow if uow is not None and uow.lends_here() else None
+
+
+async def tenant_unit_of_work():
+    """App-wide FastAPI dependency: the request's TenantUnitOfWork, closed as soon as the handler returns.
+
+    It is async so the context variable it sets is seen by the sync
+    dependencies and handlers FastAPI runs in the threadpool. Code outside a
+    request (cron jobs, worker threads) keeps opening its own sessions.
+    """
+    from starlette.concurrency import run_in_threadpool
+
+    uow = TenantUnitOfWork()
+    token = _unit_of_work.set(uow)
+    try:
+        yield uow
+    finally:
+        if uow.sessions:
+            await run_in_threadpool(uow.close)
+        else:
+            uow.closed = True
+        try:
+            _unit_of_work.reset(token)
+        except ValueError:
+            pass
+
+
+def _tenant_connection_string(org_id: str, db) -> Optional[str]:
+    uow = current_unit_of_work()
+    if uow is not None and org_id in uow.connection_strings:
+        return uow.connection_strings[org_id]
+    org = db.query(Organization).filter(Organization.id == org_id).first()
+    if not org or not org.connection_string:
+        return None
+    event_bus.remember(org.connection_string, org.id)
+    if uow is not None:
+        uow.connection_strings[org_id] = org.connection_string
+    return org.connection_string
+
+
 def get_tenant_context(org_id: str, user_id: str, db):
     membership = db.query(OrganizationMember).filter(
         OrganizationMember.organization_id == org_id,
@@ -1114,16 +1333,16 @@ def get_tenant_context(org_id: str, user_id: str, db):
     if not membership:
         return None, None
     
-    org = db.query(Organization).filter(Organization.id == org_id).first()
-    if not org or not org.connection_string:
+    connection_string = _tenant_connection_string(org_id, db)
+    if not connection_string:
         return None, None
     
-    return TenantContext(org.connection_string), membership
+    return TenantContext(connection_string), membership
 
 def get_tenant_context_simple(org_id: str, db):
     """Get tenant context without requiring user membership check."""
-    org = db.query(Organization).filter(Organization.id == org_id).first()
-    if not org or not org.connection_string:
+    connection_string = _tenant_connection_string(org_id, db)
+    if not connection_string:
         return None
     
-    return TenantContext(org.connection_string)
+    return TenantContext(connection_string)
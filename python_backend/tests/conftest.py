@@ -316,3 +316,17 @@ def tenant_db(TenantSession):
         yield db
     finally:
         db.close()
+
+
+@pytest.fixture(autouse=True)
+def loop_lag_guard():
+    """With LOOP_LAG_STRICT=1, fail tests whose requests blocked the app's event loop"""
+    from services.loop_monitor import loop_monitor
+
+    loop_monitor.drain()
+    yield
+    stalls = loop_monitor.drain()
+    if stalls and os.environ.get("LOOP_LAG_STRICT") == "1":
+        pytest.fail("Event loop blocked by: " + ", ".join(
+            f"{s['handler']} ({s['lag_ms']}ms at {s['location']})" for s in stalls
+        ))
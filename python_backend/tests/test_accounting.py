@@ -1,3 +1,5 @@
+import pytest
+
 from tests.conftest import TEST_ORG_ID
 
 BASE = f"/api/organizations/{TEST_ORG_ID}/accounting"
@@ -78,3 +80,117 @@ def test_create_journal_entry(auth_client, tenant_db):
     assert resp.status_code == 200
     data = resp.json()
     assert data["description"] == "Test journal entry"
+
+
+def test_post_batch_applies_one_delta_per_account(tenant_db, seed_tenant_data):
+    from datetime import date
+    from decimal import Decimal
+
+    from accounting.models import ChartOfAccounts, JournalLine
+    from accounting.service import AccountingService
+
+    svc = AccountingService(tenant_db, deferred=True)
+    svc.seed_default_accounts()
+    codes = ["1000", "1100"]
+
+    def balances():
+        return dict(tenant_db.query(ChartOfAccounts.code, ChartOfAccounts.current_balance).filter(
+            ChartOfAccounts.code.in_(codes)
+        ).all())
+
+    before = balances()
+    lines_before = tenant_db.query(JournalLine).count()
+    for i in range(1, 6):
+        svc.create_journal_entry(date.today(), f"Repayment {i}", [
+            {"account_code": "1000", "debit": Decimal(i), "credit": 0},
+            {"account_code": "1100", "debit": 0, "credit": Decimal(i)},
+        ])
+    assert tenant_db.query(JournalLine).count() == lines_before
+    assert svc.flush() == 5
+    tenant_db.commit()
+
+    after = balances()
+    assert after["1000"] - (before["1000"] or 0) == Decimal("15")
+    assert after["1100"] - (before["1100"] or 0) == Decimal("-15")
+    assert tenant_db.query(JournalLine).count() == lines_before + 10
+
+    # One unbalanced entry rejects the whole batch before anything is written
+    with pytest.raises(ValueError):
+        svc.post_batch([
+            {"entry_date": date.today(), "description": "ok", "lines": [
+                {"account_code": "1000", "debit": 1, "credit": 0},
+                {"account_code": "2000", "debit": 0, "credit": 1},
+            ]},
+            {"entry_date": date.today(), "description": "bad", "lines": [
+                {"account_code": "1000", "debit": 1, "credit": 0},
+            ]},
+        ])
+    assert tenant_db.query(JournalLine).count() == lines_before + 10
+
+
+def test_delta_balance_mode_defers_account_updates(tenant_db, seed_tenant_data):
+    from datetime import date
+    from decimal import Decimal
+
+    from accounting.balances import compact_balances, get_account_balances
+    from accounting.models import AccountBalanceDelta, ChartOfAccounts
+    from accounting.service import AccountingService
+    from models.tenant import OrganizationSettings
+
+    svc = AccountingService(tenant_db)
+    svc.seed_default_accounts()
+    cash = tenant_db.query(ChartOfAccounts).filter(ChartOfAccounts.code == "1000").one()
+    savings = tenant_db.query(ChartOfAccounts).filter(ChartOfAccounts.code == "2000").one()
+    before = get_account_balances(tenant_db, [cash.id, savings.id])
+
+    mode = OrganizationSettings(setting_key="gl_balance_mode", setting_value="delta")
+    tenant_db.add(mode)
+    tenant_db.commit()
+    try:
+        for amount in (100, 250):
+            svc.create_journal_entry(date.today(), "Teller deposit", [
+                {"account_code": "1000", "debit": Decimal(amount), "credit": 0},
+                {"account_code": "2000", "debit": 0, "credit": Decimal(amount)},
+            ])
+
+        tenant_db.refresh(cash)
+        assert cash.current_balance == before[cash.id]
+        assert tenant_db.query(AccountBalanceDelta).count() == 4
+        assert get_account_balances(tenant_db, [cash.id, savings.id]) == {
+            cash.id: before[cash.id] + 350, savings.id: before[savings.id] + 350,
+        }
+
+        assert compact_balances(tenant_db) == 4
+        assert tenant_db.query(AccountBalanceDelta).count() == 0
+        tenant_db.refresh(cash)
+        assert cash.current_balance == before[cash.id] + 350
+    finally:
+        tenant_db.delete(mode)
+        tenant_db.commit()
+
+
+def test_compactor_sweeps_only_delta_mode_tenants(master_db, seed_master_data):
+    import uuid
+    from datetime import datetime, timedelta
+
+    from accounting.balances import BalanceCompactor, DRAIN_AFTER_DIRECT, record_balance_mode
+    from models.master import Organization
+
+    orgs = {}
+    for name in ("delta", "direct", "drained", "unset"):
+        org = Organization(id=str(uuid.uuid4()), name=name, code=f"GL{uuid.uuid4().hex[:6]}", connection_string="sqlite:///:memory:")
+        master_db.add(org)
+        orgs[name] = org
+    master_db.commit()
+    record_balance_mode(master_db, orgs["delta"].id, "delta")
+    record_balance_mode(master_db, orgs["direct"].id, "delta")
+    record_balance_mode(master_db, orgs["direct"].id, "direct")
+    orgs["drained"].gl_balance_mode = "direct"
+    orgs["drained"].gl_balance_mode_changed_at = datetime.utcnow() - DRAIN_AFTER_DIRECT - timedelta(minutes=1)
+    master_db.commit()
+
+    compactor = BalanceCompactor(5)
+    swept = {org_id for org_id, _ in compactor.targets(master_db)}
+    assert swept >= {orgs["delta"].id, orgs["direct"].id}
+    assert orgs["drained"].id not in swept and orgs["unset"].id not in swept
+    assert {o.id for o in orgs.values()} <= {org_id for org_id, _ in compactor.targets(master_db, full=True)}
@@ -137,3 +137,47 @@ def test_working_hours_check():
 
     result3 = check_working_hours(None, "teller")
     assert result3["allowed"] is True
+
+
+def test_unit_of_work_lends_one_tenant_session_per_request(tenant_engine, monkeypatch):
+    from fastapi import Depends, FastAPI
+    from sqlalchemy import text
+    from sqlalchemy.orm import sessionmaker
+    from services import tenant_context as ctx_mod
+    from services.tenant_context import RequestSession, TenantContext, current_unit_of_work, tenant_unit_of_work
+
+    tenant_db = "sqlite://unit-of-work-test"
+    monkeypatch.setitem(ctx_mod._engine_cache, tenant_db, tenant_engine)
+    monkeypatch.setitem(ctx_mod._session_factory_cache, tenant_db, sessionmaker(bind=tenant_engine, info={"tenant_db": tenant_db}))
+    monkeypatch.setattr(ctx_mod, "_migrated_tenants", {tenant_db})
+
+    app = FastAPI(dependencies=[Depends(tenant_unit_of_work, scope="function")])
+    lent = []
+
+    @app.get("/work")
+    def work():
+        auth = TenantContext(tenant_db).create_session()
+        auth.pin()
+        permissions = TenantContext(tenant_db).create_session()
+        permissions.execute(text("SELECT 1"))
+        permissions.close()
+        handler = TenantContext(tenant_db).create_session()
+        handler.execute(text("SELECT 1"))
+        handler.close()
+        lent.extend([auth, permissions, handler])
+        # Still open for auth's objects after the borrowers closed it
+        return {"in_transaction": handler.in_transaction()}
+
+    resp = TestClient(app).get("/work")
+    assert resp.json() == {"in_transaction": True}
+    assert isinstance(lent[0], RequestSession)
+    assert lent[0] is lent[1] is lent[2]
+    assert not lent[0].in_transaction()  # closed when the handler returned
+
+    # Outside a request every caller gets its own session
+    assert current_unit_of_work() is None
+    session = TenantContext(tenant_db).create_session()
+    try:
+        assert not isinstance(session, RequestSession)
+    finally:
+        session.close()
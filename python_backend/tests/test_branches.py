@@ -97,3 +97,66 @@ def test_create_branch_unauthenticated(app):
             "name": "Should Fail",
         })
         assert resp.status_code == 401
+
+
+def _branch_test_member(tenant_db):
+    import uuid
+    from models.tenant import Branch, Member, Transaction
+
+    other = Branch(id=str(uuid.uuid4()), name=f"Branch {uuid.uuid4().hex[:6]}", code=f"B{uuid.uuid4().hex[:5]}", is_active=True)
+    member = Member(
+        id=str(uuid.uuid4()), member_number=f"BS{uuid.uuid4().hex[:8]}", first_name="Branch", last_name="Mover",
+        branch_id=TEST_BRANCH_ID,
+    )
+    tenant_db.add_all([other, member])
+    tenant_db.flush()
+    txn = Transaction(
+        transaction_number=f"TXB{uuid.uuid4().hex[:8]}", member_id=member.id,
+        transaction_type="deposit", account_type="savings", amount=100,
+    )
+    tenant_db.add(txn)
+    tenant_db.commit()
+    return member, txn, other
+
+
+def test_member_branch_is_copied_and_cascaded(tenant_db, seed_tenant_data):
+    member, txn, other = _branch_test_member(tenant_db)
+    assert txn.branch_id == TEST_BRANCH_ID
+
+    member.branch_id = other.id
+    tenant_db.commit()
+    tenant_db.refresh(txn)
+    assert txn.branch_id == other.id
+
+
+def test_bulk_member_branch_update_is_refused(tenant_db, seed_tenant_data):
+    import pytest
+    from sqlalchemy import update
+    from models.tenant import Member
+
+    member, txn, other = _branch_test_member(tenant_db)
+    with pytest.raises(ValueError):
+        tenant_db.query(Member).filter(Member.id == member.id).update({"branch_id": other.id}, synchronize_session=False)
+    with pytest.raises(ValueError):
+        tenant_db.execute(update(Member), [{"id": member.id, "branch_id": other.id}])
+    tenant_db.rollback()
+
+    # Other bulk member updates, including ones filtering on branch, are unaffected
+    tenant_db.query(Member).filter(Member.id == member.id, Member.branch_id == TEST_BRANCH_ID).update(
+        {"last_name": "Stayed"}, synchronize_session=False
+    )
+    tenant_db.commit()
+
+
+def test_backfill_branch_ids(tenant_db, seed_tenant_data):
+    from models.tenant import Transaction
+    from services.branch_scope import backfill_branch_ids
+
+    member, txn, other = _branch_test_member(tenant_db)
+    tenant_db.execute(Transaction.__table__.update().where(Transaction.id == txn.id).values(branch_id=None))
+    tenant_db.commit()
+
+    assert backfill_branch_ids(tenant_db.connection()) >= 1
+    tenant_db.commit()
+    tenant_db.refresh(txn)
+    assert txn.branch_id == TEST_BRANCH_ID
@@ -0,0 +1,97 @@
+import asyncio
+
+import httpx
+
+from scripts.fake_daraja import create_app
+from services.daraja import DarajaCredentials, DarajaGateway, TokenCache
+
+BASE_URL = "http://daraja.test"
+CREDS = DarajaCredentials(BASE_URL, "key-a", "secret-a")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _gateway(app, clock=None):
+    tokens = TokenCache(clock) if clock else None
+    return DarajaGateway(transport=httpx.ASGITransport(app=app), tokens=tokens)
+
+
+def _push():
+    return {"BusinessShortCode": "174379", "Amount": 10, "PhoneNumber": "254708374149"}
+
+
+def test_token_is_shared_across_concurrent_calls():
+    app = create_app()
+    gateway = _gateway(app)
+
+    async def run():
+        results = await asyncio.gather(*[gateway.stk_push(CREDS, _push()) for _ in range(20)])
+        await gateway.aclose()
+        return results
+
+    results = asyncio.run(run())
+    assert all(r["ResponseCode"] == "0" for r in results)
+    assert app.state.counts["token"] == 1
+    assert app.state.counts["stk_push"] == 20
+
+
+def test_tokens_are_keyed_on_credentials_and_expire():
+    app = create_app(token_ttl=600)
+    clock = Clock()
+    gateway = _gateway(app, clock)
+    other = DarajaCredentials(BASE_URL, "key-a", "rotated-secret")
+
+    async def run():
+        first = await gateway.access_token(CREDS)
+        assert await gateway.access_token(CREDS) == first
+        assert await gateway.access_token(other) != first
+        clock.now += 600 - 61
+        assert await gateway.access_token(CREDS) == first
+        clock.now += 2
+        assert await gateway.access_token(CREDS) != first
+        await gateway.aclose()
+
+    asyncio.run(run())
+    assert app.state.counts["token"] == 3
+
+
+def test_revoked_token_is_refreshed_once():
+    app = create_app()
+    gateway = _gateway(app)
+
+    async def run():
+        await gateway.access_token(CREDS)
+        app.state.tokens.clear()
+        result = await gateway.b2c_payment(CREDS, {"Amount": 100})
+        await gateway.aclose()
+        return result
+
+    assert asyncio.run(run())["ResponseCode"] == "0"
+    assert app.state.counts["token"] == 2
+
+
+def test_only_queries_are_retried_on_server_errors(monkeypatch):
+    monkeypatch.setattr("services.daraja.RETRY_BACKOFF", 0)
+    app = create_app()
+    gateway = _gateway(app)
+
+    async def run():
+        push = await gateway.stk_push(CREDS, _push())
+        app.state.fail_next = 1
+        query = await gateway.stk_query(CREDS, {"CheckoutRequestID": push["CheckoutRequestID"]})
+        app.state.fail_next = 1
+        failed_push = await gateway.stk_push(CREDS, _push())
+        await gateway.aclose()
+        return query, failed_push
+
+    query, failed_push = asyncio.run(run())
+    assert query["ResultCode"] == "0"
+    assert app.state.counts["stk_query"] == 2
+    assert failed_push["errorCode"] == "503.001.01"
+    assert app.state.counts["stk_push"] == 2
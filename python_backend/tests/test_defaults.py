@@ -0,0 +1,109 @@
+from tests.conftest import TEST_ORG_ID
+
+BASE = f"/api/organizations/{TEST_ORG_ID}/defaults"
+
+
+def test_list_defaults_is_read_only(auth_client, tenant_db):
+    from models.tenant import JobWatermark
+
+    before = tenant_db.get(JobWatermark, "delinquency")
+    resp = auth_client.get(BASE)
+    assert resp.status_code == 200
+    assert isinstance(resp.json(), list)
+    tenant_db.expire_all()
+    assert tenant_db.get(JobWatermark, "delinquency") == before
+
+
+def test_refresh_defaults_records_watermark(auth_client):
+    resp = auth_client.post(f"{BASE}/refresh")
+    assert resp.status_code == 200
+    assert resp.json()["mode"] in ("full", "incremental")
+
+    status = auth_client.get(f"{BASE}/status")
+    assert status.status_code == 200
+    assert status.json()["last_run_at"] is not None
+
+    again = auth_client.post(f"{BASE}/refresh")
+    assert again.json()["mode"] == "incremental"
+
+
+def test_penalized_loans_are_not_reprocessed(tenant_db, seed_tenant_data):
+    import uuid
+    from datetime import date, timedelta
+    from decimal import Decimal
+    from models.tenant import LoanApplication, LoanInstalment, LoanProduct
+    from services.delinquency import run_delinquency
+    from tests.conftest import TEST_MEMBER_ID
+
+    product = LoanProduct(
+        id=str(uuid.uuid4()), name="Penalty Test", code=f"PEN{uuid.uuid4().hex[:4]}", interest_rate=Decimal("2"),
+        min_amount=1, max_amount=100000, min_term_months=1, max_term_months=12, late_payment_penalty=Decimal("5"),
+    )
+    tenant_db.add(product)
+    tenant_db.flush()
+    loan = LoanApplication(
+        application_number=f"LNPEN{uuid.uuid4().hex[:6]}", member_id=TEST_MEMBER_ID, loan_product_id=product.id,
+        amount=Decimal("1000"), term_months=1, interest_rate=Decimal("2"), status="disbursed",
+        outstanding_balance=Decimal("1000"),
+    )
+    tenant_db.add(loan)
+    tenant_db.flush()
+    tenant_db.add(LoanInstalment(
+        loan_id=loan.id, instalment_number=1, due_date=date.today() - timedelta(days=10),
+        expected_principal=Decimal("1000"), status="pending",
+    ))
+    tenant_db.commit()
+
+    first = run_delinquency(tenant_db, full=True)
+    assert first["penalties"] >= 1
+    tenant_db.refresh(loan)
+    assert loan.outstanding_balance == Decimal("1050")
+
+    # The penalty bumped the loan, but only the job itself changed it
+    second = run_delinquency(tenant_db)
+    assert second["mode"] == "incremental"
+    assert second["loans"] == 0
+
+    loan.purpose = "changed by staff"
+    tenant_db.commit()
+    assert run_delinquency(tenant_db)["loans"] == 1
+
+
+def test_backdated_instalments_are_flagged(tenant_db, seed_tenant_data):
+    import uuid
+    from datetime import date, timedelta
+    from decimal import Decimal
+    from models.tenant import LoanApplication, LoanDefault, LoanInstalment, LoanProduct
+    from services.delinquency import run_delinquency
+    from tests.conftest import TEST_MEMBER_ID
+
+    product = LoanProduct(
+        id=str(uuid.uuid4()), name="Backdated Test", code=f"BKD{uuid.uuid4().hex[:4]}", interest_rate=Decimal("2"),
+        min_amount=1, max_amount=100000, min_term_months=1, max_term_months=12, late_payment_penalty=Decimal("5"),
+    )
+    tenant_db.add(product)
+    tenant_db.flush()
+    loan = LoanApplication(
+        application_number=f"LNBKD{uuid.uuid4().hex[:6]}", member_id=TEST_MEMBER_ID, loan_product_id=product.id,
+        amount=Decimal("1000"), term_months=1, interest_rate=Decimal("2"), status="disbursed",
+        outstanding_balance=Decimal("1000"),
+    )
+    tenant_db.add(loan)
+    tenant_db.commit()
+    run_delinquency(tenant_db)
+
+    # A regenerated schedule inserts a pending instalment already past due, without touching the loan
+    inst = LoanInstalment(
+        loan_id=loan.id, instalment_number=1, due_date=date.today() - timedelta(days=40),
+        expected_principal=Decimal("1000"), status="pending",
+    )
+    tenant_db.add(inst)
+    tenant_db.commit()
+
+    stats = run_delinquency(tenant_db)
+    assert stats["mode"] == "incremental"
+    tenant_db.refresh(inst)
+    tenant_db.refresh(loan)
+    assert inst.status == "overdue"
+    assert loan.outstanding_balance == Decimal("1050")
+    assert tenant_db.query(LoanDefault).filter(LoanDefault.loan_id == loan.id, LoanDefault.status == "overdue").count() == 1
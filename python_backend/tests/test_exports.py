@@ -0,0 +1,105 @@
+import csv
+import gzip
+import io
+
+from tests.conftest import TEST_ORG_ID
+from services.export_engine import iter_csv_chunks
+
+BASE = f"/api/organizations/{TEST_ORG_ID}/export"
+
+
+def test_export_members_csv(auth_client):
+    resp = auth_client.get(f"{BASE}/members")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(io.StringIO(resp.text)))
+    assert rows[0][0] == "Member Number"
+    assert any(r[0] == "0100000015" for r in rows[1:])
+
+
+def test_export_transactions_csv_gzip(auth_client):
+    resp = auth_client.get(f"{BASE}/transactions", params={"gzip": "true"})
+    assert resp.status_code == 200
+    assert ".csv.gz" in resp.headers["content-disposition"]
+    text = gzip.decompress(resp.content).decode()
+    assert text.startswith("Transaction ID,")
+
+
+def test_export_loans_csv(auth_client):
+    resp = auth_client.get(f"{BASE}/loans")
+    assert resp.status_code == 200
+    assert resp.text.startswith("Loan Number,")
+
+
+def test_csv_chunks_are_bounded():
+    rows = ([i, "x" * 50] for i in range(5000))
+    chunks = list(iter_csv_chunks(["n", "pad"], rows, chunk_bytes=4096))
+    assert len(chunks) > 10
+    assert max(len(c) for c in chunks[:-1]) < 4096 + 200
+    body = b"".join(chunks).decode()
+    assert body.splitlines()[0] == "n,pad"
+    assert len(body.splitlines()) == 5001
+
+
+def test_csv_chunks_gzip_roundtrip():
+    rows = [[i, f"row {i}"] for i in range(1000)]
+    compressed = b"".join(iter_csv_chunks(["n", "label"], iter(rows), gzip=True, chunk_bytes=1024))
+    lines = gzip.decompress(compressed).decode().splitlines()
+    assert lines[0] == "n,label"
+    assert lines[-1] == "999,row 999"
+
+
+def test_export_job_lifecycle(auth_client):
+    import time
+
+    resp = auth_client.post(f"{BASE}/jobs", json={"export_type": "members", "format": "csv"})
+    assert resp.status_code == 200
+    job = resp.json()
+    assert job["status"] in ("pending", "running", "completed")
+
+    for _ in range(50):
+        job = auth_client.get(f"{BASE}/jobs/{job['id']}").json()
+        if job["status"] in ("completed", "failed"):
+            break
+        time.sleep(0.1)
+    assert job["status"] == "completed"
+
+    resp = auth_client.get(f"{BASE}/jobs/{job['id']}/download")
+    assert resp.status_code == 200
+    assert gzip.decompress(resp.content).decode().startswith("Member Number,")
+
+
+def test_export_job_rejects_unknown_type(auth_client):
+    resp = auth_client.post(f"{BASE}/jobs", json={"export_type": "payroll"})
+    assert resp.status_code == 400
+
+
+def test_export_jobs_dedupe_and_reap_by_heartbeat(tenant_db, seed_tenant_data):
+    from datetime import datetime, timedelta
+    from models.tenant import ExportJob
+    from services.export_jobs import EXPORT_JOB_LEASE_SECONDS, cleanup_expired_export_jobs, create_export_job
+
+    filters = {"branch_id": "heartbeat-test"}
+    lost, created = create_export_job(tenant_db, "members", "csv", filters, requested_by=None)
+    assert created
+    assert create_export_job(tenant_db, "members", "csv", filters, requested_by=None) == (lost, False)
+
+    # A long export that still heartbeats is neither replaced nor reaped
+    lost.created_at = datetime.utcnow() - timedelta(days=1)
+    lost.status = "running"
+    tenant_db.commit()
+    assert create_export_job(tenant_db, "members", "csv", filters, requested_by=None) == (lost, False)
+    cleanup_expired_export_jobs(tenant_db)
+    tenant_db.refresh(lost)
+    assert lost.status == "running"
+
+    # Once its heartbeat stops, an identical request gets a new job and the old one is failed
+    lost.heartbeat_at = datetime.utcnow() - timedelta(seconds=EXPORT_JOB_LEASE_SECONDS + 60)
+    tenant_db.commit()
+    job, created = create_export_job(tenant_db, "members", "csv", filters, requested_by=None)
+    assert created and job.id != lost.id
+    cleanup_expired_export_jobs(tenant_db)
+    tenant_db.refresh(lost)
+    assert lost.status == "failed"
+    tenant_db.query(ExportJob).filter(ExportJob.id.in_([lost.id, job.id])).delete(synchronize_session=False)
+    tenant_db.commit()
@@ -24,3 +24,101 @@ def test_clock_out(auth_client):
     if resp.status_code == 400:
         detail = resp.json()["detail"].lower()
         assert "not clocked in" in detail or "already clocked out" in detail
+
+
+def _payslip_with_staff(tenant_db, national_id="12345678"):
+    import uuid
+    from datetime import date
+    from models.tenant import Payslip, Staff, StaffProfile
+    from tests.conftest import TEST_BRANCH_ID
+
+    staff = Staff(
+        id=str(uuid.uuid4()), staff_number=f"PS{uuid.uuid4().hex[:6]}", first_name="Grace", last_name="Njeri",
+        email=f"grace.{uuid.uuid4().hex[:6]}@example.com", role="teller", branch_id=TEST_BRANCH_ID, is_active=True,
+    )
+    tenant_db.add(staff)
+    tenant_db.add(StaffProfile(staff_id=staff.id, national_id=national_id))
+    pay_period = f"2099-{uuid.uuid4().hex[:6]}"
+    payslip = Payslip(staff_id=staff.id, pay_period=pay_period, pay_date=date.today(), net_salary=1000)
+    tenant_db.add(payslip)
+    tenant_db.commit()
+    return payslip
+
+
+def test_bulk_payslip_email_status_transitions(tenant_db, TenantSession, seed_tenant_data):
+    from datetime import datetime, timedelta
+    from routes.hr import PAYSLIP_EMAIL_STALE, _queue_payslip_emails, _set_payslip_email_status
+    from tests.conftest import FakeTenantContext
+
+    payslip = _payslip_with_staff(tenant_db)
+    pay_period = payslip.pay_period
+
+    jobs, skipped, in_progress = _queue_payslip_emails(tenant_db, pay_period)
+    assert [job["payslip_id"] for job in jobs] == [payslip.id] and skipped == 0
+    assert payslip.email_status == "queued" and payslip.email_queued_at is not None
+
+    # A running job keeps its payslips
+    jobs, skipped, in_progress = _queue_payslip_emails(tenant_db, pay_period)
+    assert jobs == [] and in_progress == 1
+
+    # A job that went quiet (e.g. lost in a restart) gives them up
+    payslip.email_queued_at = datetime.utcnow() - PAYSLIP_EMAIL_STALE - timedelta(minutes=1)
+    tenant_db.commit()
+    jobs, _, _ = _queue_payslip_emails(tenant_db, pay_period)
+    assert len(jobs) == 1
+
+    # resend re-queues even a fresh queued payslip
+    jobs, _, _ = _queue_payslip_emails(tenant_db, pay_period, resend=True)
+    assert len(jobs) == 1
+
+    ctx = FakeTenantContext(TenantSession)
+    _set_payslip_email_status(ctx, [payslip.id], {"email_status": "sent", "emailed_at": datetime.utcnow()})
+    # An aborted job only fails the payslips it had not finished
+    _set_payslip_email_status(ctx, [payslip.id], {"email_status": "failed", "email_error": "boom"}, True)
+    tenant_db.expire_all()
+    assert payslip.email_status == "sent" and payslip.email_error is None
+
+    jobs, _, _ = _queue_payslip_emails(tenant_db, pay_period)
+    assert jobs == []
+
+
+def test_bulk_payslip_email_skips_payslips_without_national_id(tenant_db, seed_tenant_data):
+    from routes.hr import _queue_payslip_emails
+
+    payslip = _payslip_with_staff(tenant_db, national_id=None)
+    jobs, skipped, _ = _queue_payslip_emails(tenant_db, payslip.pay_period)
+    assert jobs == [] and skipped == 1
+    assert payslip.email_status == "failed" and "National ID" in payslip.email_error
+
+
+def test_email_payslips_bulk_queues_and_tracks_job(auth_client, TenantSession, monkeypatch):
+    import routes.hr as hr_routes
+    import services.email_service as email_service
+
+    db = TenantSession()
+    try:
+        payslip = _payslip_with_staff(db)
+        pay_period = payslip.pay_period
+    finally:
+        db.close()
+
+    started = []
+
+    async def fake_job(tenant_ctx, settings, org_name, jobs):
+        started.append([job["payslip_id"] for job in jobs])
+
+    monkeypatch.setattr(email_service, "get_brevo_service", lambda settings, org_name, client=None: None)
+    monkeypatch.setattr(hr_routes, "_run_bulk_payslip_email", fake_job)
+
+    resp = auth_client.post(f"{BASE}/payslips/email-bulk", params={"pay_period": pay_period})
+    assert resp.status_code == 200
+    assert resp.json()["queued"] == 1
+    assert started == [[payslip.id]]
+    assert not hr_routes._payslip_email_tasks
+
+    resp = auth_client.post(f"{BASE}/payslips/email-bulk", params={"pay_period": pay_period})
+    assert resp.json()["queued"] == 0 and resp.json()["in_progress"] == 1
+
+    resp = auth_client.get(f"{BASE}/payslips/email-status", params={"pay_period": pay_period})
+    assert resp.status_code == 200
+    assert resp.json()["counts"]["queued"] == 1
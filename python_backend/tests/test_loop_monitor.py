@@ -0,0 +1,48 @@
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+
+def _app(monitor):
+    from contextlib import asynccontextmanager
+
+    @asynccontextmanager
+    async def lifespan(app):
+        monitor.start()
+        yield
+        monitor.stop()
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.get("/blocking")
+    async def blocking_handler():
+        time.sleep(0.3)  # a synchronous query inside an async handler
+        return {}
+
+    @app.get("/threadpool")
+    def threadpool_handler():
+        time.sleep(0.3)
+        return {}
+
+    return app
+
+
+def test_loop_monitor_flags_blocking_async_handlers():
+    from services.loop_monitor import LoopLagMonitor
+
+    monitor = LoopLagMonitor(threshold_ms=100)
+    with TestClient(_app(monitor)) as client:
+        client.get("/threadpool")
+        time.sleep(0.1)
+        assert monitor.drain() == []
+
+        client.get("/blocking")
+        time.sleep(0.1)
+        stalls = monitor.drain()
+
+    assert len(stalls) == 1
+    assert stalls[0]["handler"].endswith("test_loop_monitor.blocking_handler")
+    assert "test_loop_monitor.py" in stalls[0]["location"]
+    assert stalls[0]["lag_ms"] >= 100
+    assert monitor.stats()["by_handler"] == {stalls[0]["handler"]: 1}
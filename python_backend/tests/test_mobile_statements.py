@@ -0,0 +1,71 @@
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+from tests.conftest import TEST_MEMBER_ID, TEST_ORG_ID
+import services.statement_renderer as renderer
+
+
+@pytest.fixture
+def statement_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(renderer, "STATEMENT_CACHE_DIR", tmp_path)
+    return tmp_path
+
+
+def _age(path, seconds):
+    old = time.time() - seconds
+    os.utime(path, (old, old))
+
+
+def test_eviction_spares_claimed_statements(statement_cache):
+    member_dir = statement_cache / TEST_ORG_ID / TEST_MEMBER_ID
+    member_dir.mkdir(parents=True)
+    served, stale = member_dir / "served.pdf", member_dir / "stale.pdf"
+    for path in (served, stale):
+        path.write_bytes(b"%PDF")
+        _age(path, 40 * 86400)
+
+    assert renderer.claim_cached_statement(served)
+    assert not renderer.claim_cached_statement(member_dir / "missing.pdf")
+
+    assert renderer.evict_statement_cache(max_age_days=30, max_bytes=0) == 1
+    assert served.exists() and not stale.exists()
+
+
+def test_download_statement_renders_then_serves_cache(client, TenantSession, seed_tenant_data, statement_cache, monkeypatch):
+    from models.tenant import Member
+    from routes.mobile.deps import get_current_member
+    from routes.mobile.statements import _encode_statement_id
+
+    db = TenantSession()
+    member = db.query(Member).filter(Member.id == TEST_MEMBER_ID).first()
+    client.app.dependency_overrides[get_current_member] = lambda: {
+        "member": member, "session": TenantSession(), "org_id": TEST_ORG_ID,
+    }
+    renders = []
+    submit = renderer.submit_statement_render
+
+    def counting_submit(*args):
+        renders.append(args[1:])
+        return submit(*args)
+
+    monkeypatch.setattr("routes.mobile.statements.submit_statement_render", counting_submit)
+    statement_id = _encode_statement_id({
+        "member_id": TEST_MEMBER_ID, "account_type": "savings",
+        "start_date": datetime(2020, 1, 1).isoformat(), "end_date": datetime(2020, 1, 31).isoformat(),
+    })
+    try:
+        for _ in range(2):
+            resp = client.get(f"/api/mobile/me/statements/{statement_id}/download")
+            assert resp.status_code == 200
+            assert resp.headers["content-type"] == "application/pdf"
+            assert resp.content.startswith(b"%PDF")
+        assert len(renders) == 1
+
+        other = _encode_statement_id({"member_id": "someone-else", "start_date": "2020-01-01T00:00:00", "end_date": "2020-01-31T00:00:00"})
+        assert client.get(f"/api/mobile/me/statements/{other}/download").status_code == 403
+    finally:
+        client.app.dependency_overrides.pop(get_current_member, None)
+        db.close()
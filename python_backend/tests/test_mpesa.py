@@ -0,0 +1,202 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from tests.conftest import TEST_MEMBER_ID, TEST_BRANCH_ID, TEST_ORG_ID, FakeTenantContext
+from models.master import MpesaCallback, Organization, StkPushRequest
+from models.tenant import LoanApplication, LoanProduct, Member, MpesaPayment, PaymentReference
+from services.payment_reference import resolve_payer, member_by_phone
+from services.mpesa_inbox import CALLBACK_C2B, LEASE, claim_next, record_callback, renew_lease, replay_callback
+from services.stk_reconciler import RateLimiter, sweep, track_stk_push
+
+
+def test_member_references_follow_writes(tenant_db, seed_tenant_data):
+    member = Member(
+        id=str(uuid.uuid4()), member_number="MP0001", first_name="Peter", last_name="Kariuki",
+        phone="0722 111 222", branch_id=TEST_BRANCH_ID,
+    )
+    tenant_db.add(member)
+    tenant_db.commit()
+
+    assert resolve_payer(tenant_db, " mp0001 ")[0].id == member.id
+    assert member_by_phone(tenant_db, "254722111222").id == member.id
+
+    member.member_number = "MP0002"
+    tenant_db.commit()
+    assert resolve_payer(tenant_db, "MP0001")[0] is None
+    assert resolve_payer(tenant_db, "mp0002")[0].id == member.id
+
+    tenant_db.delete(member)
+    tenant_db.commit()
+    assert tenant_db.query(PaymentReference).filter(PaymentReference.member_id == member.id).count() == 0
+
+
+def test_loan_number_resolves_borrower(tenant_db, seed_tenant_data):
+    product = LoanProduct(
+        id=str(uuid.uuid4()), name="M-Pesa Test", code=f"MPT{uuid.uuid4().hex[:4]}", interest_rate=Decimal("2"),
+        min_amount=1, max_amount=100000, min_term_months=1, max_term_months=12,
+    )
+    tenant_db.add(product)
+    tenant_db.flush()
+    loan = LoanApplication(
+        application_number=f"LNMP{uuid.uuid4().hex[:6]}", member_id=TEST_MEMBER_ID, loan_product_id=product.id,
+        amount=Decimal("5000"), term_months=3, interest_rate=Decimal("2"), status="disbursed",
+    )
+    tenant_db.add(loan)
+    tenant_db.commit()
+
+    member, found = resolve_payer(tenant_db, loan.application_number.lower(), "254700000000")
+    assert found.id == loan.id
+    assert member.id == TEST_MEMBER_ID
+
+    assert resolve_payer(tenant_db, f"LOAN:{loan.id}")[1].id == loan.id
+
+    loan.status = "paid"
+    tenant_db.commit()
+    assert resolve_payer(tenant_db, loan.application_number)[1] is None
+
+
+def test_callback_inbox_dedupes_and_orders(master_db, seed_master_data):
+    first, created = record_callback(master_db, TEST_ORG_ID, CALLBACK_C2B, {"TransID": "INBOX1", "TransAmount": "10"})
+    assert created
+    again, created = record_callback(master_db, TEST_ORG_ID, CALLBACK_C2B, {"TransID": "INBOX1", "TransAmount": "10"})
+    assert not created and again.id == first.id
+    record_callback(master_db, TEST_ORG_ID, CALLBACK_C2B, {"TransID": "INBOX2", "TransAmount": "20"})
+
+    claimed = claim_next(master_db)
+    assert claimed.id == first.id and claimed.status == "processing"
+    # The tenant's next callback waits until the head of its queue is settled
+    assert claim_next(master_db) is None
+
+    claimed.status = "dead"
+    master_db.commit()
+    assert claim_next(master_db).dedupe_key == "INBOX2"
+
+    replay_callback(master_db, claimed)
+    assert claimed.status == "queued" and claimed.attempts == 0
+
+
+class _JsonRequest:
+    def __init__(self, body):
+        self._body = body
+
+    async def json(self):
+        return self._body
+
+
+def test_confirmation_callback_records_once(master_db, seed_master_data):
+    from routes.mpesa import mpesa_confirmation
+
+    body = {"TransID": "CONF1", "TransAmount": "75"}
+    assert asyncio.run(mpesa_confirmation(TEST_ORG_ID, _JsonRequest(body), master_db))["ResultDesc"] == "Accepted"
+    assert asyncio.run(mpesa_confirmation(TEST_ORG_ID, _JsonRequest(body), master_db))["ResultDesc"] == "Duplicate transaction"
+    assert asyncio.run(mpesa_confirmation("missing-org", _JsonRequest(body), master_db))["ResultCode"] == "C2B00012"
+    assert master_db.query(MpesaCallback).filter(MpesaCallback.dedupe_key == "CONF1").count() == 1
+
+
+def test_callback_in_backoff_does_not_block_its_org(master_db, seed_master_data):
+    org = Organization(id=str(uuid.uuid4()), name="Backoff SACCO", code=f"BO{uuid.uuid4().hex[:6]}")
+    master_db.add(org)
+    master_db.commit()
+    poison, _ = record_callback(master_db, org.id, CALLBACK_C2B, {"TransID": "POISON1", "TransAmount": "10"})
+    record_callback(master_db, org.id, CALLBACK_C2B, {"TransID": "AFTER1", "TransAmount": "20"})
+
+    assert claim_next(master_db).id == poison.id
+    before = poison.locked_until
+    assert renew_lease(master_db, poison.id)
+    master_db.refresh(poison)
+    assert poison.locked_until >= before and poison.locked_until > datetime.utcnow() + LEASE - timedelta(seconds=5)
+
+    # A failed head waiting out its backoff lets the org's later callbacks through
+    poison.status = "queued"
+    poison.next_attempt_at = datetime.utcnow() + timedelta(minutes=5)
+    master_db.commit()
+    later = claim_next(master_db)
+    assert later.dedupe_key == "AFTER1"
+    # ...but only one callback of an org is processed at a time
+    poison.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    master_db.commit()
+    assert claim_next(master_db) is None
+
+    later.status = "done"
+    master_db.commit()
+    assert not renew_lease(master_db, later.id)
+    assert claim_next(master_db).id == poison.id
+    master_db.query(MpesaCallback).filter(MpesaCallback.organization_id == org.id).update({"status": "done"})
+    master_db.commit()
+
+
+def test_daraja_requests_are_prepared_from_settings(tenant_db, seed_tenant_data, monkeypatch):
+    from models.tenant import OrganizationSettings
+    from routes.mpesa import b2c_disbursement_request, stk_push_request
+
+    monkeypatch.setattr("routes.mpesa.is_demo_mode", lambda: False)
+    settings = [OrganizationSettings(setting_key=key, setting_value=value) for key, value in (
+        ("mpesa_consumer_key", "ck"), ("mpesa_consumer_secret", "cs"), ("mpesa_passkey", "pk"),
+        ("mpesa_environment", "production"), ("mpesa_stk_callback_url", "https://example.test/cb"),
+    )]
+    tenant_db.add_all(settings)
+    tenant_db.commit()
+    try:
+        with pytest.raises(ValueError):
+            b2c_disbursement_request(tenant_db, "254711000000", Decimal("500"))
+
+        paybill = OrganizationSettings(setting_key="mpesa_paybill", setting_value="600100")
+        tenant_db.add(paybill)
+        tenant_db.commit()
+        settings.append(paybill)
+        creds, payload = stk_push_request(tenant_db, "0711 000000", Decimal("250.50"), "ACC1", "Deposit", org_id=TEST_ORG_ID)
+        assert (creds.consumer_key, creds.consumer_secret) == ("ck", "cs")
+        assert payload["PartyA"] == "254711000000" and payload["Amount"] == 250
+        assert payload["BusinessShortCode"] == "600100" and payload["CallBackURL"] == "https://example.test/cb"
+        creds, payload = b2c_disbursement_request(tenant_db, "254711000000", Decimal("500"), occasion="LN1")
+        assert payload["PartyA"] == "600100" and payload["Occasion"] == "LN1"
+    finally:
+        for setting in settings:
+            tenant_db.delete(setting)
+        tenant_db.commit()
+
+
+def test_stk_reconciler_credits_once(master_db, tenant_db, seed_master_data, seed_tenant_data, TenantSession, monkeypatch):
+    checkout_id = f"ws_CO_{uuid.uuid4().hex[:12]}"
+    tenant_db.add(MpesaPayment(
+        trans_id=f"PENDING-{checkout_id}", amount=Decimal("250"), bill_ref_number=checkout_id,
+        transaction_type="STK", member_id=TEST_MEMBER_ID, status="pending",
+        notes="payment_type:deposit | account_type:savings",
+    ))
+    tenant_db.commit()
+    assert track_stk_push(master_db, TEST_ORG_ID, checkout_id)
+    assert not track_stk_push(master_db, TEST_ORG_ID, checkout_id)
+
+    queries = []
+
+    async def fake_query(tenant_session, checkout_request_id):
+        queries.append(checkout_request_id)
+        return {"ResultCode": "0", "ResultDesc": "Processed", "MpesaReceiptNumber": f"R{checkout_id[-8:]}"}
+
+    monkeypatch.setattr("services.tenant_context.TenantContext", lambda _: FakeTenantContext(TenantSession))
+    monkeypatch.setattr("routes.mpesa.query_stk_push_status", fake_query)
+
+    def make_due():
+        request = master_db.query(StkPushRequest).filter(StkPushRequest.checkout_request_id == checkout_id).one()
+        request.status = "pending"
+        request.next_query_at = datetime.utcnow() - timedelta(seconds=1)
+        master_db.commit()
+        return request
+
+    request = make_due()
+    assert asyncio.run(sweep(master_db, RateLimiter(0))) == 1
+    master_db.refresh(request)
+    assert request.status == "resolved" and request.last_result_code == "0"
+
+    payment = tenant_db.query(MpesaPayment).filter(MpesaPayment.bill_ref_number == checkout_id).one()
+    tenant_db.refresh(payment)
+    assert payment.status == "credited"
+
+    # A repeated sweep sees the credited record and does not query Safaricom again
+    make_due()
+    asyncio.run(sweep(master_db, RateLimiter(0)))
+    assert queries == [checkout_id]
@@ -0,0 +1,42 @@
+from tests.conftest import TEST_ORG_ID, TEST_BRANCH_ID
+
+
+def test_queue_state_follows_ticket_changes(TenantSession, tenant_db, seed_tenant_data):
+    from datetime import datetime
+    from models.tenant import QueueTicket
+    from services.queue_state import QueueStateService
+
+    state = QueueStateService()
+    tenant_db.query(QueueTicket).filter(QueueTicket.branch_id == TEST_BRANCH_ID).delete()
+    first = QueueTicket(ticket_number="T001", branch_id=TEST_BRANCH_ID, service_category="transactions", status="waiting")
+    tenant_db.add(first)
+    tenant_db.commit()
+
+    board = state.snapshot(TEST_ORG_ID, TEST_BRANCH_ID, TenantSession)
+    assert board["waiting_counts"] == {"transactions": 1}
+
+    # Changes are applied in memory, without another load
+    loan = QueueTicket(ticket_number="L001", branch_id=TEST_BRANCH_ID, service_category="loans", status="waiting", priority=1)
+    tenant_db.add(loan)
+    tenant_db.commit()
+    state.apply(TEST_ORG_ID, TEST_BRANCH_ID, loan)
+    board = state.snapshot(TEST_ORG_ID, TEST_BRANCH_ID, TenantSession)
+    assert [t["ticket_number"] for t in board["waiting"]] == ["L001", "T001"]
+
+    loan.status, loan.counter_number, loan.called_at = "serving", "3", datetime.utcnow()
+    tenant_db.commit()
+    state.apply(TEST_ORG_ID, TEST_BRANCH_ID, loan)
+    first.status = "completed"
+    tenant_db.commit()
+    state.apply(TEST_ORG_ID, TEST_BRANCH_ID, first)
+
+    board = state.snapshot(TEST_ORG_ID, TEST_BRANCH_ID, TenantSession)
+    assert board["waiting_counts"] == {}
+    assert [(t["ticket_number"], t["counter_number"]) for t in board["serving"]] == [("L001", "3")]
+    assert [t["ticket_number"] for t in board["recent_completed"]] == ["T001"]
+
+    # A reload from the database agrees with the applied state
+    fresh = QueueStateService()
+    reloaded = fresh.snapshot(TEST_ORG_ID, TEST_BRANCH_ID, TenantSession)
+    assert {k: reloaded[k] for k in ("serving", "waiting", "recent_completed")} == \
+        {k: board[k] for k in ("serving", "waiting", "recent_completed")}
@@ -1,4 +1,4 @@
-from tests.conftest import TEST_ORG_ID
+from tests.conftest import TEST_MEMBER_ID, TEST_ORG_ID
 
 BASE = f"/api/organizations/{TEST_ORG_ID}/reports"
 
@@ -17,3 +17,149 @@ def test_loan_report(auth_client):
     assert resp.status_code == 200
     data = resp.json()
     assert isinstance(data, (dict, list))
+
+
+def test_aging_report_live_then_snapshot(auth_client, tenant_db):
+    from services.portfolio_snapshot import take_portfolio_snapshot
+
+    live = auth_client.get(f"{BASE}/aging")
+    assert live.status_code == 200
+    live_data = live.json()
+    assert set(live_data["summary"]) == {"current", "1_30_days", "31_60_days", "61_90_days", "over_90_days"}
+    assert "par30" in live_data["par"]
+
+    take_portfolio_snapshot(tenant_db)
+    snap = auth_client.get(f"{BASE}/aging")
+    assert snap.status_code == 200
+    snap_data = snap.json()
+    assert snap_data["source"] == "snapshot"
+    assert snap_data["total_portfolio"] == live_data["total_portfolio"]
+
+
+def test_portfolio_trend(auth_client):
+    resp = auth_client.get(f"{BASE}/portfolio-trend", params={"days": 30})
+    assert resp.status_code == 200
+    assert isinstance(resp.json()["points"], list)
+
+
+def test_latest_snapshot_time_uses_the_local_day(tenant_db, seed_tenant_data):
+    from datetime import date, timedelta
+    from models.tenant import PortfolioSnapshot
+    from services.portfolio_snapshot import latest_snapshot_time, local_day_utc_bounds, local_date
+
+    start, end = local_day_utc_bounds(date.today())
+    assert local_date(start) == date.today() and local_date(end) == date.today() + timedelta(days=1)
+    assert local_date(start - timedelta(seconds=1)) == date.today() - timedelta(days=1)
+
+    tenant_db.query(PortfolioSnapshot).filter(PortfolioSnapshot.snapshot_date == date.today()).delete(synchronize_session=False)
+    tenant_db.add(PortfolioSnapshot(snapshot_date=date.today(), created_at=start))
+    tenant_db.commit()
+    assert latest_snapshot_time(tenant_db, date.today()) == start
+
+    # A row labelled today but taken before the local day began (UTC just before local midnight) does not count
+    tenant_db.query(PortfolioSnapshot).filter(PortfolioSnapshot.snapshot_date == date.today()).update(
+        {"created_at": start - timedelta(minutes=1)}, synchronize_session=False
+    )
+    tenant_db.commit()
+    assert latest_snapshot_time(tenant_db, date.today()) is None
+    tenant_db.query(PortfolioSnapshot).filter(PortfolioSnapshot.snapshot_date == date.today()).delete(synchronize_session=False)
+    tenant_db.commit()
+
+
+def test_balance_at_reads_month_end_snapshots(tenant_db, seed_tenant_data):
+    import uuid
+    from datetime import date, datetime
+    from decimal import Decimal
+
+    from models.tenant import MemberBalanceSnapshot, Transaction
+    from services.balance_snapshots import balance_at, balances_at, run_snapshots
+
+    def txn(at, balance_after, account_type="shares"):
+        return {
+            "id": str(uuid.uuid4()), "transaction_number": f"SNAP{uuid.uuid4().hex[:10]}",
+            "member_id": TEST_MEMBER_ID, "transaction_type": "deposit", "account_type": account_type,
+            "amount": Decimal("10"), "balance_after": Decimal(balance_after), "created_at": at,
+        }
+
+    for at, balance in [(datetime(2024, 1, 10), 100), (datetime(2024, 1, 20), 150), (datetime(2024, 3, 5), 120)]:
+        tenant_db.add(Transaction(**txn(at, balance)))
+    tenant_db.commit()
+
+    # The write path keeps each month's row on its latest transaction
+    jan = tenant_db.get(MemberBalanceSnapshot, (TEST_MEMBER_ID, "shares", date(2024, 1, 1)))
+    assert jan.balance == Decimal("150")
+    assert balance_at(tenant_db, TEST_MEMBER_ID, "shares", datetime(2024, 1, 15)) == Decimal("100")
+    assert balance_at(tenant_db, TEST_MEMBER_ID, "shares", datetime(2024, 2, 15)) == Decimal("150")
+    assert balance_at(tenant_db, TEST_MEMBER_ID, "shares", datetime(2024, 3, 6)) == Decimal("120")
+    assert balance_at(tenant_db, TEST_MEMBER_ID, "shares", datetime(2023, 12, 31)) is None
+
+    # Rows inserted in bulk skip the event; the monthly job rebuilds closed months from transactions
+    tenant_db.execute(Transaction.__table__.insert(), [txn(datetime(2024, 1, 25), 175)])
+    tenant_db.commit()
+    assert balance_at(tenant_db, TEST_MEMBER_ID, "shares", datetime(2024, 2, 15)) == Decimal("150")
+    stats = run_snapshots(tenant_db, today=date(2024, 4, 2), full=True)
+    assert stats["months"] >= 3
+    assert balance_at(tenant_db, TEST_MEMBER_ID, "shares", datetime(2024, 2, 15)) == Decimal("175")
+    assert balances_at(tenant_db, "shares", datetime(2024, 2, 15), [TEST_MEMBER_ID]) == {TEST_MEMBER_ID: Decimal("175")}
+    assert balances_at(tenant_db, "shares", datetime(2024, 3, 6), [TEST_MEMBER_ID]) == {TEST_MEMBER_ID: Decimal("120")}
+
+
+def test_cash_position_close_freezes_past_days(tenant_db, seed_tenant_data):
+    from datetime import date, datetime
+    from decimal import Decimal
+
+    from models.tenant import BranchVault, CashPositionSnapshot, TellerFloat, VaultTransaction
+    from services.cash_position import cash_position_report, close_day
+    from tests.conftest import TEST_BRANCH_ID, TEST_STAFF_ID
+
+    day = date(2024, 5, 14)
+    vault = tenant_db.query(BranchVault).filter(BranchVault.branch_id == TEST_BRANCH_ID).first()
+    if not vault:
+        vault = BranchVault(branch_id=TEST_BRANCH_ID, current_balance=Decimal("0"))
+        tenant_db.add(vault)
+        tenant_db.flush()
+    tenant_db.add_all([
+        VaultTransaction(vault_id=vault.id, transaction_type="deposit", amount=Decimal("5000"),
+                         balance_after=Decimal("5000"), created_at=datetime(2024, 5, 14, 9)),
+        VaultTransaction(vault_id=vault.id, transaction_type="deposit", amount=Decimal("1000"),
+                         balance_after=Decimal("6000"), created_at=datetime(2024, 5, 15, 9)),
+    ])
+    teller_float = TellerFloat(staff_id=TEST_STAFF_ID, branch_id=TEST_BRANCH_ID, date=day, opening_balance=Decimal("2000"),
+                               current_balance=Decimal("2500"), deposits_in=Decimal("700"), withdrawals_out=Decimal("200"))
+    tenant_db.add(teller_float)
+    tenant_db.commit()
+
+    # Live: the vault as it stood at the end of the day, tellers with their names in one go
+    live = cash_position_report(tenant_db, day)
+    branch = next(b for b in live["branches"] if b["branch_id"] == TEST_BRANCH_ID)
+    assert live["source"] == "live"
+    assert branch["vault_balance"] == 5000
+    assert branch["total_cash_in_hand"] == 7500
+    assert [(t["staff_name"], t["current_balance"]) for t in branch["tellers"]] == [("Test Admin", 2500)]
+
+    close_day(tenant_db, day)
+    teller_float.current_balance = Decimal("0")
+    tenant_db.commit()
+
+    closed = cash_position_report(tenant_db, day)
+    assert closed["source"] == "snapshot"
+    assert closed["branches"] == live["branches"]
+    assert closed["totals"] == live["totals"]
+
+    def vault_on(past_day):
+        report = cash_position_report(tenant_db, past_day)
+        return next(b for b in report["branches"] if b["branch_id"] == TEST_BRANCH_ID)["vault_balance"]
+
+    # Before its first transaction the vault held what that transaction started from
+    assert vault_on(date(2024, 5, 13)) == 0
+
+    tenant_db.query(CashPositionSnapshot).filter(CashPositionSnapshot.snapshot_date == day).delete()
+    tenant_db.query(VaultTransaction).filter(VaultTransaction.vault_id == vault.id).delete()
+    tenant_db.delete(teller_float)
+    balance = vault.current_balance
+    vault.current_balance = Decimal("750")
+    tenant_db.commit()
+    # A vault seeded without transactions keeps its balance
+    assert vault_on(date(2024, 5, 13)) == 750
+    vault.current_balance = balance
+    tenant_db.commit()
@@ -20,3 +20,36 @@ def test_create_role(auth_client):
     data = resp.json()
     assert data["name"] == "custom_auditor"
     assert "audit:read" in data.get("permissions", [])
+
+
+def test_role_change_event_clears_permission_cache(tenant_engine):
+    from sqlalchemy.orm import Session
+    from models.tenant import Role
+    from routes import common
+    from services.event_bus import bus
+
+    bus.remember("test-tenant", TEST_ORG_ID)
+    received = []
+    handler = (("role",), lambda org_id, event_type, data, local: received.append((org_id, data, local)))
+    bus.on(*handler)
+    session = Session(bind=tenant_engine, info={"tenant_db": "test-tenant"})
+    try:
+        # A rolled back change announces nothing
+        common._permissions_cache[f"{TEST_ORG_ID}:teller"] = ["members:read"]
+        session.add(Role(name="event_rollback_role"))
+        session.flush()
+        session.rollback()
+        assert received == []
+        assert f"{TEST_ORG_ID}:teller" in common._permissions_cache
+
+        role = Role(name="event_role")
+        session.add(role)
+        session.commit()
+        assert received == [(TEST_ORG_ID, {"role_id": role.id}, True)]
+        assert f"{TEST_ORG_ID}:teller" not in common._permissions_cache
+
+        session.delete(role)
+        session.commit()
+    finally:
+        session.close()
+        bus._handlers.remove(handler)
@@ -117,3 +117,58 @@ def test_transaction_detail(auth_client, tenant_db):
     resp = auth_client.get(f"{BASE}/{txn_id}")
     assert resp.status_code == 200
     assert resp.json()["id"] == txn_id
+
+
+def test_list_transactions_cursor_pages(auth_client, tenant_db):
+    _ensure_teller_float(tenant_db)
+    for amount in ("100", "200", "300"):
+        resp = auth_client.post(BASE, json={
+            "member_id": TEST_MEMBER_ID,
+            "transaction_type": "deposit",
+            "account_type": "savings",
+            "amount": amount,
+            "payment_method": "cash",
+        })
+        assert resp.status_code == 200
+
+    first = auth_client.get(BASE, params={"cursor": "", "page_size": 2, "count": "exact"})
+    assert first.status_code == 200
+    data = first.json()
+    assert len(data["items"]) == 2
+    assert data["has_more"] is True
+    assert data["total"] >= 3
+
+    second = auth_client.get(BASE, params={"cursor": data["next_cursor"], "page_size": 2})
+    assert second.status_code == 200
+    first_ids = {t["id"] for t in data["items"]}
+    assert not first_ids & {t["id"] for t in second.json()["items"]}
+
+
+def test_list_transactions_invalid_cursor(auth_client):
+    resp = auth_client.get(BASE, params={"cursor": "not-a-cursor"})
+    assert resp.status_code == 400
+
+
+def test_date_bounds_cover_whole_days(tenant_db, seed_tenant_data):
+    from datetime import datetime
+    from models.tenant import Transaction
+    from services.partitioning import date_bounds
+
+    day = date(2019, 6, 30)
+    for at in (datetime(2019, 6, 29, 23, 59), datetime(2019, 6, 30, 0, 0), datetime(2019, 6, 30, 23, 59, 59), datetime(2019, 7, 1)):
+        tenant_db.add(Transaction(
+            transaction_number=f"BND{uuid.uuid4().hex[:10]}", member_id=TEST_MEMBER_ID,
+            transaction_type="deposit", account_type="savings", amount=Decimal("1"), created_at=at,
+        ))
+    tenant_db.commit()
+
+    def count(start=None, end=None):
+        return tenant_db.query(Transaction).filter(
+            Transaction.created_at >= datetime(2019, 6, 1), Transaction.created_at < datetime(2019, 8, 1),
+            *date_bounds(Transaction.created_at, start, end),
+        ).count()
+
+    assert count(day, day) == 2
+    assert count(start=day) == 3
+    assert count(end=day) == 3
+    assert count() == 4